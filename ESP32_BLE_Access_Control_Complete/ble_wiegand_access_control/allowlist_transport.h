@@ -0,0 +1,283 @@
+/**
+ * Allowlist Transport Decoder
+ *
+ * Portable C reference decoder for the .nal allowlist and .nap patch files
+ * written by tools/allowlist_transport.py (the file layout is documented
+ * there). It has no Arduino dependencies, so the same code runs in the
+ * firmware and in host tests.
+ *
+ * Typical use on a reader that received a file over OTA:
+ *   AllowlistInfo info;
+ *   if (allowlistReadInfo(data, length, &info) == ALLOWLIST_OK && info.isList) {
+ *     allowlistDecode(data, length, macs, capacity, &info);
+ *   }
+ * and for a patch, allowlistApplyPatch() with the current list and its
+ * content CRC (info.contentCrc of the list it was decoded from).
+ */
+
+#ifndef ALLOWLIST_TRANSPORT_H
+#define ALLOWLIST_TRANSPORT_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+#define ALLOWLIST_FORMAT_VERSION 1
+#define ALLOWLIST_LIST_HEADER_SIZE 32
+#define ALLOWLIST_PATCH_HEADER_SIZE 44
+
+// Return codes
+#define ALLOWLIST_OK 0
+#define ALLOWLIST_ERR_FORMAT -1    // Bad magic, version or length
+#define ALLOWLIST_ERR_CRC -2       // File or content checksum mismatch
+#define ALLOWLIST_ERR_CAPACITY -3  // Output array too small
+#define ALLOWLIST_ERR_BASE -4      // Patch made for a different list
+#define ALLOWLIST_ERR_CORRUPT -5   // Varint overrun or inconsistent patch
+
+typedef struct {
+  int isList;              // 1 for a .nal list, 0 for a .nap patch
+  uint32_t version;        // List version (target version for a patch)
+  uint32_t baseVersion;    // Patch only
+  uint32_t count;          // MACs in a list
+  uint32_t removed;        // Patch only
+  uint32_t added;          // Patch only
+  uint32_t contentCrc;     // Content CRC of the list (target list for a patch)
+  uint32_t baseCrc;        // Patch only
+  const uint8_t* payload;
+  uint32_t payloadLength;
+} AllowlistInfo;
+
+static inline uint32_t allowlistReadU32(const uint8_t* p) {
+  return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+/**
+ * Update a CRC-32 (same polynomial and result as zlib.crc32)
+ * @param crc CRC so far, 0 to start
+ */
+static inline uint32_t allowlistCrc32(uint32_t crc, const uint8_t* data, size_t length) {
+  crc = ~crc;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc >> 1) ^ (0xEDB88320UL & (0UL - (crc & 1)));
+    }
+  }
+  return ~crc;
+}
+
+/**
+ * Add one MAC to a content CRC (6 big-endian bytes)
+ */
+static inline uint32_t allowlistCrcMac(uint32_t crc, uint64_t mac) {
+  uint8_t bytes[6];
+  for (int i = 0; i < 6; i++) {
+    bytes[i] = (uint8_t)(mac >> (40 - 8 * i));
+  }
+  return allowlistCrc32(crc, bytes, 6);
+}
+
+/**
+ * Check a list or patch file and read its header
+ * @return ALLOWLIST_OK, ALLOWLIST_ERR_FORMAT or ALLOWLIST_ERR_CRC
+ */
+static inline int allowlistReadInfo(const uint8_t* data, size_t length, AllowlistInfo* info) {
+  size_t headerSize;
+  memset(info, 0, sizeof(*info));
+
+  if (length >= ALLOWLIST_LIST_HEADER_SIZE && memcmp(data, "NCALST01", 8) == 0) {
+    headerSize = ALLOWLIST_LIST_HEADER_SIZE;
+    info->isList = 1;
+  } else if (length >= ALLOWLIST_PATCH_HEADER_SIZE && memcmp(data, "NCAPAT01", 8) == 0) {
+    headerSize = ALLOWLIST_PATCH_HEADER_SIZE;
+  } else {
+    return ALLOWLIST_ERR_FORMAT;
+  }
+  if ((data[8] | (data[9] << 8)) != ALLOWLIST_FORMAT_VERSION) {
+    return ALLOWLIST_ERR_FORMAT;
+  }
+
+  info->payloadLength = allowlistReadU32(data + headerSize - 8);
+  if (length != headerSize + info->payloadLength) {
+    return ALLOWLIST_ERR_FORMAT;
+  }
+  uint32_t crc = allowlistCrc32(0, data, headerSize - 4);
+  if (allowlistCrc32(crc, data + headerSize, info->payloadLength) != allowlistReadU32(data + headerSize - 4)) {
+    return ALLOWLIST_ERR_CRC;
+  }
+
+  info->payload = data + headerSize;
+  if (info->isList) {
+    info->version = allowlistReadU32(data + 12);
+    info->count = allowlistReadU32(data + 16);
+    info->contentCrc = allowlistReadU32(data + 20);
+  } else {
+    info->baseVersion = allowlistReadU32(data + 12);
+    info->version = allowlistReadU32(data + 16);
+    info->baseCrc = allowlistReadU32(data + 20);
+    info->contentCrc = allowlistReadU32(data + 24);
+    info->removed = allowlistReadU32(data + 28);
+    info->added = allowlistReadU32(data + 32);
+  }
+  return ALLOWLIST_OK;
+}
+
+/**
+ * Decode a run of delta varints
+ * @param pos In: offset of the first varint; out: offset after the last
+ * @return ALLOWLIST_OK or ALLOWLIST_ERR_CORRUPT
+ */
+static inline int allowlistDecodeRun(const uint8_t* payload, uint32_t length, uint32_t* pos,
+                                     uint32_t count, uint64_t* out) {
+  uint64_t mac = 0;
+  uint32_t p = *pos;
+  for (uint32_t n = 0; n < count; n++) {
+    uint64_t delta = 0;
+    int shift = 0;
+    uint8_t byte;
+    do {
+      if (p >= length || shift > 49) {
+        return ALLOWLIST_ERR_CORRUPT;
+      }
+      byte = payload[p++];
+      delta |= (uint64_t)(byte & 0x7F) << shift;
+      shift += 7;
+    } while (byte & 0x80);
+    mac += delta;
+    out[n] = mac;
+  }
+  *pos = p;
+  return ALLOWLIST_OK;
+}
+
+/**
+ * Decode a list file into a sorted MAC array
+ * @param macs Output array of 48-bit MACs
+ * @param capacity Size of macs
+ * @param info Filled in from the header
+ * @return ALLOWLIST_OK or an ALLOWLIST_ERR_ code
+ */
+static inline int allowlistDecode(const uint8_t* data, size_t length, uint64_t* macs,
+                                  uint32_t capacity, AllowlistInfo* info) {
+  int status = allowlistReadInfo(data, length, info);
+  if (status != ALLOWLIST_OK) {
+    return status;
+  }
+  if (!info->isList) {
+    return ALLOWLIST_ERR_FORMAT;
+  }
+  if (info->count > capacity) {
+    return ALLOWLIST_ERR_CAPACITY;
+  }
+
+  uint32_t pos = 0;
+  status = allowlistDecodeRun(info->payload, info->payloadLength, &pos, info->count, macs);
+  if (status != ALLOWLIST_OK || pos != info->payloadLength) {
+    return ALLOWLIST_ERR_CORRUPT;
+  }
+
+  uint32_t crc = 0;
+  for (uint32_t i = 0; i < info->count; i++) {
+    crc = allowlistCrcMac(crc, macs[i]);
+  }
+  return crc == info->contentCrc ? ALLOWLIST_OK : ALLOWLIST_ERR_CRC;
+}
+
+/**
+ * Apply a patch file to a sorted MAC array
+ *
+ * Removed and added MACs are decoded one at a time and merged with the
+ * base list, so no scratch memory is needed besides the output array.
+ *
+ * @param base Current sorted MAC list
+ * @param baseCount Number of MACs in base
+ * @param baseCrc Content CRC of base
+ * @param out Output array for the patched list (must not overlap base)
+ * @param capacity Size of out
+ * @param outCount Number of MACs written to out
+ * @param info Filled in from the patch header
+ * @return ALLOWLIST_OK or an ALLOWLIST_ERR_ code
+ */
+static inline int allowlistApplyPatch(const uint8_t* data, size_t length, const uint64_t* base,
+                                      uint32_t baseCount, uint32_t baseCrc, uint64_t* out,
+                                      uint32_t capacity, uint32_t* outCount, AllowlistInfo* info) {
+  int status = allowlistReadInfo(data, length, info);
+  if (status != ALLOWLIST_OK) {
+    return status;
+  }
+  if (info->isList) {
+    return ALLOWLIST_ERR_FORMAT;
+  }
+  if (info->baseCrc != baseCrc) {
+    return ALLOWLIST_ERR_BASE;
+  }
+  if (info->removed > baseCount || baseCount - info->removed + info->added > capacity) {
+    return ALLOWLIST_ERR_CAPACITY;
+  }
+
+  // Find where the added run starts by skipping the removed run
+  uint32_t removePos = 0;
+  uint32_t addPos = 0;
+  for (uint32_t n = 0; n < info->removed; n++) {
+    do {
+      if (addPos >= info->payloadLength) {
+        return ALLOWLIST_ERR_CORRUPT;
+      }
+    } while (info->payload[addPos++] & 0x80);
+  }
+
+  uint32_t removedLeft = info->removed;
+  uint32_t addedLeft = info->added;
+  uint64_t nextRemoved = 0;
+  uint64_t nextAdded = 0;
+  if (removedLeft && allowlistDecodeRun(info->payload, info->payloadLength, &removePos, 1, &nextRemoved) != ALLOWLIST_OK) {
+    return ALLOWLIST_ERR_CORRUPT;
+  }
+  if (addedLeft && allowlistDecodeRun(info->payload, info->payloadLength, &addPos, 1, &nextAdded) != ALLOWLIST_OK) {
+    return ALLOWLIST_ERR_CORRUPT;
+  }
+
+  uint64_t value;
+  uint32_t n = 0;
+  uint32_t crc = 0;
+  uint32_t i = 0;
+  while (i < baseCount || addedLeft) {
+    uint64_t mac;
+    if (addedLeft && (i >= baseCount || nextAdded < base[i])) {
+      mac = nextAdded;
+      if (--addedLeft) {
+        if (allowlistDecodeRun(info->payload, info->payloadLength, &addPos, 1, &value) != ALLOWLIST_OK) {
+          return ALLOWLIST_ERR_CORRUPT;
+        }
+        nextAdded += value;
+      }
+    } else {
+      mac = base[i++];
+      if (addedLeft && mac == nextAdded) {
+        return ALLOWLIST_ERR_CORRUPT;  // Added MAC already present
+      }
+      if (removedLeft && mac == nextRemoved) {
+        if (--removedLeft) {
+          if (allowlistDecodeRun(info->payload, info->payloadLength, &removePos, 1, &value) != ALLOWLIST_OK) {
+            return ALLOWLIST_ERR_CORRUPT;
+          }
+          nextRemoved += value;
+        }
+        continue;
+      }
+      if (removedLeft && mac > nextRemoved) {
+        return ALLOWLIST_ERR_CORRUPT;  // Removed MAC not in the list
+      }
+    }
+    out[n++] = mac;
+    crc = allowlistCrcMac(crc, mac);
+  }
+
+  if (removedLeft || addPos != info->payloadLength) {
+    return ALLOWLIST_ERR_CORRUPT;
+  }
+  *outCount = n;
+  return crc == info->contentCrc ? ALLOWLIST_OK : ALLOWLIST_ERR_CRC;
+}
+
+#endif // ALLOWLIST_TRANSPORT_H
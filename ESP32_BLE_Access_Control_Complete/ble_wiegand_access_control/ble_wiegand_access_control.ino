@@ -30,23 +30,68 @@
 #define WIEGAND_D0_PIN 25
 #define WIEGAND_D1_PIN 26
 
+// Per-Door Configuration
+// Uncomment to take the settings below from door_config.h generated by
+// tools/site_build.py; it also selects that door's authorized_devices.h
+// #define USE_DOOR_CONFIG
+
+#ifdef USE_DOOR_CONFIG
+#include "door_config.h"
+#endif
+
 // Output Format Selection
 // Options: 26 (Wiegand 26-bit), 34 (Wiegand 34-bit), 40 (EM4100)
+#ifndef OUTPUT_FORMAT
 #define OUTPUT_FORMAT 26  // Change to 26, 34, or 40
+#endif
+
+// EM4100 Card ID (for 40-bit format)
+// Sketches before October 2025 sent MAC bytes 3-6 as the card ID; the tools
+// use bytes 2-5. Set to true to keep the old IDs on a reflashed reader
+// instead of re-enrolling its tokens (see README, Upgrading: EM4100 Card ID)
+#ifndef EM4100_CARD_ID_LEGACY
+#define EM4100_CARD_ID_LEGACY false
+#endif
 
 // Facility Code (for 26-bit format)
+#ifndef FACILITY_CODE
 #define FACILITY_CODE 123
+#endif
 
 // BLE Scan Settings
+#ifndef BLE_SCAN_TIME
 #define BLE_SCAN_TIME 5        // Scan duration in seconds
+#endif
+#ifndef BLE_SCAN_INTERVAL
 #define BLE_SCAN_INTERVAL 100  // Scan interval in ms
+#endif
 
 // Debounce/Cooldown Settings
+#ifndef DEVICE_COOLDOWN_MS
 #define DEVICE_COOLDOWN_MS 5000  // 5 seconds cooldown per device
+#endif
 
 // Debug Mode
+#ifndef DEBUG_MODE
 #define DEBUG_MODE true
+#endif
 
+// Generated Allowlist
+// Uncomment to use authorized_devices.h from tools/allowlist_header.py instead
+// of the list below: lookups become a binary search over 48-bit MACs and the
+// credentials are precomputed, so no String parsing happens per advertisement
+// #define USE_ALLOWLIST_HEADER
+
+#ifdef USE_ALLOWLIST_HEADER
+#include "authorized_devices.h"
+#if AUTHORIZED_FACILITY_CODE != FACILITY_CODE
+#error "authorized_devices.h was generated for a different FACILITY_CODE"
+#endif
+#if EM4100_CARD_ID_LEGACY && OUTPUT_FORMAT == 40
+#error "authorized_devices.h holds bytes 2-5 EM4100 card IDs; EM4100_CARD_ID_LEGACY needs the list below"
+#endif
+const int numAuthorizedDevices = NUM_AUTHORIZED_DEVICES;
+#else
 // Authorized BLE Device MAC Addresses
 // Add MAC addresses in the format "aa:bb:cc:dd:ee:ff"
 const char* authorizedDevices[] = {
@@ -55,6 +100,17 @@ const char* authorizedDevices[] = {
   // Add more devices here
 };
 const int numAuthorizedDevices = sizeof(authorizedDevices) / sizeof(authorizedDevices[0]);
+#endif
+
+// Allowlist Prefilter
+// Uncomment to reject unknown advertisers with allowlist_filter.h from
+// tools/allowlist_filter.py (Bloom filter or perfect hash) before the
+// allowlist itself is searched
+// #define USE_ALLOWLIST_FILTER
+
+#ifdef USE_ALLOWLIST_FILTER
+#include "allowlist_filter.h"
+#endif
 
 // ==================== GLOBAL OBJECTS ====================
 
@@ -80,6 +136,7 @@ String normalizeMacAddress(String mac) {
   return mac;
 }
 
+#ifndef USE_ALLOWLIST_HEADER
 /**
  * Check if a device is in the authorized list
  */
@@ -93,6 +150,7 @@ bool isDeviceAuthorized(String macAddress) {
   }
   return false;
 }
+#endif
 
 /**
  * Check if a device is in cooldown period
@@ -223,7 +281,8 @@ void sendCredential(String macAddress) {
     
   } else if (OUTPUT_FORMAT == 40) {
     // 40-bit EM4100 format
-    // Use first byte of MAC as version, last 4 bytes as card ID
+    // Use first byte of MAC as version, next 4 bytes as card ID
+    // (or the last 4 bytes with EM4100_CARD_ID_LEGACY)
     String cleanMac = macAddress;
     cleanMac.replace(":", "");
     
@@ -231,8 +290,9 @@ void sendCredential(String macAddress) {
     String versionStr = cleanMac.substring(0, 2);
     uint8_t version = strtoul(versionStr.c_str(), NULL, 16);
     
-    // Extract card ID (last 4 bytes = 32 bits)
-    String cardIdStr = cleanMac.substring(4, 12);
+    // Extract card ID (bytes 2-5 = 32 bits, as in mac_to_credential.py)
+    String cardIdStr = EM4100_CARD_ID_LEGACY ? cleanMac.substring(4, 12)
+                                             : cleanMac.substring(2, 10);
     uint32_t cardId = strtoul(cardIdStr.c_str(), NULL, 16);
     
     if (DEBUG_MODE) {
@@ -255,6 +315,24 @@ void sendCredential(String macAddress) {
   }
 }
 
+#ifdef USE_ALLOWLIST_HEADER
+/**
+ * Send the precomputed credential of an allowlist entry
+ * @param slot Index returned by findAuthorizedDevice
+ */
+void sendAllowlistCredential(int slot) {
+  const AuthorizedCredential& credential = authorizedCredentials[slot];
+  
+  if (OUTPUT_FORMAT == 26) {
+    wiegandOut.send(credential.w26, 26, true);
+  } else if (OUTPUT_FORMAT == 34) {
+    wiegandOut.send(credential.w34, 34, true);
+  } else if (OUTPUT_FORMAT == 40) {
+    wiegandOut.sendEM4100(credential.emVersion, credential.emCardId);
+  }
+}
+#endif
+
 // ==================== BLE CALLBACK CLASS ====================
 
 class MyAdvertisedDeviceCallbacks: public BLEAdvertisedDeviceCallbacks {
@@ -268,8 +346,23 @@ class MyAdvertisedDeviceCallbacks: public BLEAdvertisedDeviceCallbacks {
       Serial.println(advertisedDevice.getRSSI());
     }
     
+#ifdef USE_ALLOWLIST_FILTER
+    // Most advertisers are not enrolled; drop them after a few table reads
+    if (!allowlistMayContain(allowlistFilterMac(*advertisedDevice.getAddress().getNative()))) {
+      if (DEBUG_MODE) {
+        Serial.println("  -> Not authorized");
+      }
+      return;
+    }
+#endif
+    
     // Check if device is authorized
+#ifdef USE_ALLOWLIST_HEADER
+    int slot = findAuthorizedDevice(allowlistMacFromBytes(*advertisedDevice.getAddress().getNative()));
+    if (slot >= 0) {
+#else
     if (isDeviceAuthorized(macAddress)) {
+#endif
       Serial.print("✓ Authorized device detected: ");
       Serial.println(macAddress);
       
@@ -282,7 +375,11 @@ class MyAdvertisedDeviceCallbacks: public BLEAdvertisedDeviceCallbacks {
       }
       
       // Send credential (Wiegand or EM4100)
+#ifdef USE_ALLOWLIST_HEADER
+      sendAllowlistCredential(slot);
+#else
       sendCredential(macAddress);
+#endif
       
       // Update cooldown
       updateDeviceCooldown(macAddress);
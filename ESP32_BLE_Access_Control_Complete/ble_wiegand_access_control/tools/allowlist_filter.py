@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+"""
+Firmware Allowlist Prefilter Generator
+
+onResult runs for every advertisement in range, and at a busy site nearly
+all of them come from phones that are not enrolled. This tool builds a
+small filter over the allowlist MACs that rejects those in a few memory
+reads, before any String handling or table search:
+
+- bloom: a Bloom filter sized for a target false-positive rate, probed
+  with double hashing (k bit tests per lookup).
+- mph:   a minimal perfect hash (hash-and-displace with 16-bit pilots per
+  bucket) mapping every enrolled MAC to its own slot, plus a fingerprint
+  per slot. With --fp-rate 0 the slot holds the full MAC instead, so a
+  hit is exact.
+
+Both write allowlist_filter.h with the tables and allowlistMayContain().
+Define USE_ALLOWLIST_FILTER in ble_wiegand_access_control.ino to use it.
+A filter never rejects an enrolled MAC; `verify` reads the generated
+header back, proves that for the whole list, measures the false-positive
+rate on random MACs and times lookups on the host.
+
+The hash is a SplitMix64 finalizer over the 48-bit MAC; the C and Python
+versions below must stay bit-identical.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import random
+import bisect
+
+from credential_collisions import iter_valid_macs
+from credential_io import DEFAULT_CHUNK_SIZE, iter_mac_lines, open_error_sink, open_input
+
+
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+FILTER_TYPES = ['bloom', 'mph']
+
+# Average keys per hash-and-displace bucket; smaller builds faster, larger
+# needs less pilot storage
+MPH_BUCKET_SIZE = 4
+MAX_PILOT = 0xFFFF
+# Global seeds tried before a perfect hash build gives up
+MAX_SEEDS = 16
+
+
+def filter_hash(mac, seed):
+    """
+    64-bit hash of a MAC address, as allowlistFilterHash in the header
+
+    Args:
+        mac: 48-bit MAC integer
+        seed: 32-bit seed
+
+    Returns:
+        64-bit hash value
+    """
+    z = (mac + seed * 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def collect_macs(mac_addresses, chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Parse a MAC list into sorted, distinct 48-bit integers
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        chunk_size: MACs parsed per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Sorted list of MAC integers
+    """
+    macs = set()
+    for values in iter_valid_macs(mac_addresses, chunk_size, errors or sys.stderr):
+        macs.update(values.tolist() if hasattr(values, 'tolist') else values)
+    return sorted(macs)
+
+
+class BloomFilter:
+    """Bloom filter probed with k = h1 + i*h2 double hashing"""
+
+    def __init__(self, bits, hashes, seed=0, table=None):
+        """
+        Args:
+            bits: Filter size in bits
+            hashes: Bit tests per lookup (k)
+            seed: Hash seed
+            table: Existing bit table as bytes, or None for an empty filter
+        """
+        self.bits = bits
+        self.hashes = hashes
+        self.seed = seed
+        self.table = bytearray(table) if table is not None else bytearray((bits + 7) // 8)
+
+    @staticmethod
+    def bits_for(count, fp_rate):
+        """Filter size in bits (whole bytes) meeting fp_rate for count keys"""
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"A Bloom filter needs a false-positive rate between 0 and 1, got {fp_rate}")
+        bits = max(64, math.ceil(-max(count, 1) * math.log(fp_rate) / math.log(2) ** 2))
+        return (bits + 7) // 8 * 8
+
+    @classmethod
+    def build(cls, macs, fp_rate=0.01, budget=None, seed=0, shrink=False):
+        """
+        Size a filter for the list and add every MAC
+
+        Args:
+            macs: Distinct MAC integers
+            fp_rate: Target false-positive rate
+            budget: Maximum table size in bytes
+            seed: Hash seed
+            shrink: Shrink the filter to fit budget, giving up fp_rate, instead of failing
+
+        Returns:
+            BloomFilter
+        """
+        n = max(len(macs), 1)
+        bits = cls.bits_for(n, fp_rate)
+        if budget is not None and bits > budget * 8:
+            if not shrink:
+                raise ValueError(f"Bloom filter needs {bits // 8} bytes for a {fp_rate:g} false-positive "
+                                 f"rate, over the {budget}-byte budget; raise --fp-rate or "
+                                 f"add --shrink-to-budget")
+            bits = budget * 8
+        if bits < 8 or bits > MASK32:
+            raise ValueError(f"Bloom filter size out of range: {bits} bits")
+        hashes = max(1, min(16, round(bits / n * math.log(2))))
+
+        bloom = cls(bits, hashes, seed)
+        for mac in macs:
+            bloom.add(mac)
+        return bloom
+
+    def _positions(self, mac):
+        h = filter_hash(mac, self.seed)
+        h1, h2 = h & MASK32, (h >> 32) | 1
+        return [((h1 + i * h2) & MASK32) % self.bits for i in range(self.hashes)]
+
+    def add(self, mac):
+        """Add one MAC integer"""
+        for bit in self._positions(mac):
+            self.table[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, mac):
+        table = self.table
+        return all(table[bit >> 3] >> (bit & 7) & 1 for bit in self._positions(mac))
+
+    @property
+    def size(self):
+        """Table size in bytes"""
+        return len(self.table)
+
+    def expected_fp_rate(self, count):
+        """False-positive rate predicted for count keys"""
+        return (1 - math.exp(-self.hashes * count / self.bits)) ** self.hashes
+
+
+class PerfectHashFilter:
+    """
+    Minimal perfect hash with per-slot fingerprints
+
+    bucket = (h >> 32) % buckets
+    slot   = ((h ^ hash(pilot[bucket])) & 0xFFFFFFFF) % slots
+    where h = hash(mac, seed). The fingerprint is the low fingerprint_bits
+    of hash(mac, seed + 1), or the MAC itself when fingerprint_bits is 48.
+    """
+
+    def __init__(self, slots, pilots, fingerprints, fingerprint_bits, seed=0):
+        """
+        Args:
+            slots: Number of slots (the key count for a minimal hash)
+            pilots: Displacement value per bucket
+            fingerprints: Fingerprint (or MAC) per slot
+            fingerprint_bits: 8, 16, 32, or 48 for full MACs
+            seed: Hash seed
+        """
+        self.slots = slots
+        self.pilots = list(pilots)
+        self.fingerprints = list(fingerprints)
+        self.fingerprint_bits = fingerprint_bits
+        self.seed = seed
+        self._pilot_mix = {}
+
+    @staticmethod
+    def fingerprint_bits_for(fp_rate):
+        """Smallest supported fingerprint width meeting fp_rate (48 = exact)"""
+        if fp_rate <= 0:
+            return 48
+        if fp_rate >= 1:
+            raise ValueError(f"False-positive rate must be below 1, got {fp_rate}")
+        for bits in (8, 16, 32):
+            if 2.0 ** -bits <= fp_rate:
+                return bits
+        return 48
+
+    @classmethod
+    def build(cls, macs, fp_rate=0.0, budget=None, seed=0, load_factor=1.0):
+        """
+        Build a perfect hash over the list
+
+        Args:
+            macs: Distinct MAC integers
+            fp_rate: Target false-positive rate; 0 stores full MACs
+            budget: Maximum table size in bytes
+            seed: First hash seed to try
+            load_factor: Keys per slot; 1.0 is minimal, lower builds faster
+
+        Returns:
+            PerfectHashFilter
+        """
+        if not macs:
+            raise ValueError("A perfect hash needs at least one MAC address")
+        if not 0 < load_factor <= 1:
+            raise ValueError(f"Load factor must be in (0, 1], got {load_factor}")
+        fingerprint_bits = cls.fingerprint_bits_for(fp_rate)
+        slots = max(len(macs), math.ceil(len(macs) / load_factor))
+        buckets = max(1, math.ceil(len(macs) / MPH_BUCKET_SIZE))
+
+        size = buckets * 2 + slots * (8 if fingerprint_bits == 48 else fingerprint_bits // 8)
+        if budget is not None and size > budget:
+            raise ValueError(f"Perfect hash needs {size} bytes, over the {budget}-byte budget; "
+                             f"raise --fp-rate or use --type bloom")
+
+        for attempt in range(seed, seed + MAX_SEEDS):
+            pilots = cls._place(macs, slots, buckets, attempt)
+            if pilots is not None:
+                break
+        else:
+            raise ValueError(f"No perfect hash found after {MAX_SEEDS} seeds; "
+                             f"lower --load-factor")
+
+        mph = cls(slots, pilots, [0] * slots, fingerprint_bits, attempt)
+        for mac in macs:
+            mph.fingerprints[mph.slot(mac)] = mph.fingerprint(mac)
+        return mph
+
+    @staticmethod
+    def _place(macs, slots, buckets, seed):
+        """Find a pilot per bucket, largest buckets first; None if stuck"""
+        groups = [[] for _ in range(buckets)]
+        for mac in macs:
+            h = filter_hash(mac, seed)
+            groups[(h >> 32) % buckets].append(h & MASK32)
+
+        taken = bytearray(slots)
+        pilots = [0] * buckets
+        pilot_mix = [filter_hash(p, seed) & MASK32 for p in range(MAX_PILOT + 1)]
+        for bucket in sorted(range(buckets), key=lambda b: -len(groups[b])):
+            keys = groups[bucket]
+            if not keys:
+                break
+            for pilot, mix in enumerate(pilot_mix):
+                positions = {(key ^ mix) % slots for key in keys}
+                if len(positions) == len(keys) and not any(taken[p] for p in positions):
+                    for p in positions:
+                        taken[p] = 1
+                    pilots[bucket] = pilot
+                    break
+            else:
+                return None
+        return pilots
+
+    def slot(self, mac):
+        """Slot of a MAC integer (meaningful only for enrolled MACs)"""
+        h = filter_hash(mac, self.seed)
+        pilot = self.pilots[(h >> 32) % len(self.pilots)]
+        mix = self._pilot_mix.get(pilot)
+        if mix is None:
+            mix = self._pilot_mix[pilot] = filter_hash(pilot, self.seed) & MASK32
+        return ((h & MASK32) ^ mix) % self.slots
+
+    def fingerprint(self, mac):
+        """Value stored in the slot of an enrolled MAC"""
+        if self.fingerprint_bits == 48:
+            return mac
+        return filter_hash(mac, self.seed + 1) & ((1 << self.fingerprint_bits) - 1)
+
+    def __contains__(self, mac):
+        return self.fingerprints[self.slot(mac)] == self.fingerprint(mac)
+
+    @property
+    def size(self):
+        """Table size in bytes"""
+        width = 8 if self.fingerprint_bits == 48 else self.fingerprint_bits // 8
+        return len(self.pilots) * 2 + self.slots * width
+
+    def expected_fp_rate(self, count=None):
+        """False-positive rate for MACs outside the list"""
+        return 0.0 if self.fingerprint_bits == 48 else 2.0 ** -self.fingerprint_bits
+
+
+HASH_FUNCTION = """/**
+ * SplitMix64 finalizer over a 48-bit MAC; tools/allowlist_filter.py uses the same
+ */
+static inline uint64_t allowlistFilterHash(uint64_t mac, uint32_t seed) {
+  uint64_t z = mac + (uint64_t)seed * 0x9E3779B97F4A7C15ULL;
+  z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+  return z ^ (z >> 31);
+}
+
+/**
+ * Fold the 6 address bytes (as in BLEAddress::getNative) into a 48-bit integer
+ */
+static inline uint64_t allowlistFilterMac(const uint8_t* addr) {
+  uint64_t value = 0;
+  for (int i = 0; i < 6; i++) {
+    value = (value << 8) | addr[i];
+  }
+  return value;
+}
+"""
+
+
+def _write_table(f, ctype, name, values, per_line, width, suffix=''):
+    """Write a C array, per_line hex values per line"""
+    f.write(f"static const {ctype} {name}[] = {{\n")
+    for i in range(0, len(values), per_line):
+        f.write("  " + ", ".join(f"0x{v:0{width}X}{suffix}" for v in values[i:i + per_line]) + ",\n")
+    f.write("};\n\n")
+
+
+def write_header(flt, count, output_file, source=None):
+    """
+    Write the prefilter header
+
+    Args:
+        flt: BloomFilter or PerfectHashFilter
+        count: Number of MACs in the filter
+        output_file: Header filename, e.g. allowlist_filter.h
+        source: Name of the MAC list, for the header comment
+    """
+    kind = 'bloom' if isinstance(flt, BloomFilter) else 'mph'
+    with open(output_file, 'w') as f:
+        f.write(f"""/**
+ * Authorized BLE Devices Prefilter
+ *
+ * Generated by tools/allowlist_filter.py{f' from {source}' if source else ''}.
+ * Do not edit by hand; re-run the generator instead.
+ *
+ * allowlistMayContain() never rejects an enrolled MAC. A true result may
+ * be a false positive (expected rate {flt.expected_fp_rate(count):.3g}), so confirm it with
+ * the allowlist itself.
+ */
+
+#ifndef ALLOWLIST_FILTER_H
+#define ALLOWLIST_FILTER_H
+
+#include <stdbool.h>
+#include <stdint.h>
+
+#define ALLOWLIST_FILTER_TYPE_{kind.upper()}
+#define ALLOWLIST_FILTER_COUNT {count}
+#define ALLOWLIST_FILTER_SEED {flt.seed}U
+#define ALLOWLIST_FILTER_BYTES {flt.size}
+""")
+        if kind == 'bloom':
+            f.write(f"#define ALLOWLIST_FILTER_BITS {flt.bits}U\n"
+                    f"#define ALLOWLIST_FILTER_HASHES {flt.hashes}\n\n")
+            _write_table(f, 'uint8_t', 'allowlistFilterBits', flt.table, 16, 2)
+            f.write(HASH_FUNCTION)
+            f.write("""
+/**
+ * Check whether a MAC may be in the allowlist
+ * @param mac MAC address as a 48-bit integer
+ * @return false if the MAC is certainly not authorized
+ */
+static inline bool allowlistMayContain(uint64_t mac) {
+  uint64_t h = allowlistFilterHash(mac, ALLOWLIST_FILTER_SEED);
+  uint32_t h1 = (uint32_t)h;
+  uint32_t h2 = (uint32_t)(h >> 32) | 1;
+  for (int i = 0; i < ALLOWLIST_FILTER_HASHES; i++) {
+    uint32_t bit = (h1 + (uint32_t)i * h2) % ALLOWLIST_FILTER_BITS;
+    if (!(allowlistFilterBits[bit >> 3] & (1 << (bit & 7)))) {
+      return false;
+    }
+  }
+  return true;
+}
+""")
+        else:
+            exact = flt.fingerprint_bits == 48
+            ctype = 'uint64_t' if exact else f'uint{flt.fingerprint_bits}_t'
+            f.write(f"#define ALLOWLIST_FILTER_SLOTS {flt.slots}U\n"
+                    f"#define ALLOWLIST_FILTER_BUCKETS {len(flt.pilots)}U\n"
+                    f"#define ALLOWLIST_FILTER_FINGERPRINT_BITS {flt.fingerprint_bits}\n\n")
+            _write_table(f, 'uint16_t', 'allowlistFilterPilots', flt.pilots, 12, 4)
+            if exact:
+                _write_table(f, ctype, 'allowlistFilterKeys', flt.fingerprints, 4, 12, 'ULL')
+            else:
+                _write_table(f, ctype, 'allowlistFilterKeys', flt.fingerprints,
+                             16 if flt.fingerprint_bits == 8 else 8, flt.fingerprint_bits // 4)
+            fingerprint = ('mac' if exact else
+                           f"({ctype})allowlistFilterHash(mac, ALLOWLIST_FILTER_SEED + 1)")
+            f.write(HASH_FUNCTION)
+            f.write(f"""
+/**
+ * Slot of a MAC in the perfect hash
+ */
+static inline uint32_t allowlistFilterSlot(uint64_t mac) {{
+  uint64_t h = allowlistFilterHash(mac, ALLOWLIST_FILTER_SEED);
+  uint16_t pilot = allowlistFilterPilots[(uint32_t)(h >> 32) % ALLOWLIST_FILTER_BUCKETS];
+  uint32_t mix = (uint32_t)allowlistFilterHash(pilot, ALLOWLIST_FILTER_SEED);
+  return ((uint32_t)h ^ mix) % ALLOWLIST_FILTER_SLOTS;
+}}
+
+/**
+ * Check whether a MAC may be in the allowlist
+ * @param mac MAC address as a 48-bit integer
+ * @return false if the MAC is certainly not authorized{'; true only for enrolled MACs' if exact else ''}
+ */
+static inline bool allowlistMayContain(uint64_t mac) {{
+  return allowlistFilterKeys[allowlistFilterSlot(mac)] == {fingerprint};
+}}
+""")
+        f.write("\n#endif // ALLOWLIST_FILTER_H\n")
+
+
+_DEFINE_RE = re.compile(r'#define (ALLOWLIST_FILTER_\w+)(?: (\d+)U?)?$', re.MULTILINE)
+_TABLE_RE = re.compile(r'static const \w+ (\w+)\[\] = \{(.*?)\};', re.DOTALL)
+
+
+def read_header(header_file):
+    """
+    Rebuild a filter from a generated header
+
+    Args:
+        header_file: Header written by write_header
+
+    Returns:
+        Tuple (filter, count)
+    """
+    with open(header_file) as f:
+        text = f.read()
+    defines = {name: int(value) if value else None for name, value in _DEFINE_RE.findall(text)}
+    tables = {name: [int(v, 16) for v in re.findall(r'0x([0-9A-F]+)', body)]
+              for name, body in _TABLE_RE.findall(text)}
+    try:
+        count = defines['ALLOWLIST_FILTER_COUNT']
+        seed = defines['ALLOWLIST_FILTER_SEED']
+        if 'ALLOWLIST_FILTER_TYPE_BLOOM' in defines:
+            flt = BloomFilter(defines['ALLOWLIST_FILTER_BITS'], defines['ALLOWLIST_FILTER_HASHES'],
+                              seed, bytes(tables['allowlistFilterBits']))
+        else:
+            flt = PerfectHashFilter(defines['ALLOWLIST_FILTER_SLOTS'], tables['allowlistFilterPilots'],
+                                    tables['allowlistFilterKeys'],
+                                    defines['ALLOWLIST_FILTER_FINGERPRINT_BITS'], seed)
+    except KeyError as e:
+        raise ValueError(f"{header_file} is not an allowlist filter header (missing {e.args[0]})")
+    return flt, count
+
+
+def verify_filter(flt, macs, samples=100000, seed=1):
+    """
+    Check a filter against its MAC list and time host lookups
+
+    Args:
+        flt: BloomFilter or PerfectHashFilter
+        macs: Sorted list of the enrolled MAC integers
+        samples: Random non-enrolled MACs to probe
+        seed: Seed for the random MACs
+
+    Returns:
+        Dictionary of results; 'false_negatives' lists every enrolled MAC
+        the filter rejects (must be empty)
+    """
+    false_negatives = [mac for mac in macs if mac not in flt]
+
+    rng = random.Random(seed)
+    enrolled = set(macs)
+    probes = []
+    while len(probes) < samples:
+        mac = rng.getrandbits(48)
+        if mac not in enrolled:
+            probes.append(mac)
+
+    start = time.perf_counter()
+    false_positives = sum(1 for mac in probes if mac in flt)
+    filter_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for mac in probes:
+        i = bisect.bisect_left(macs, mac)
+        if i < len(macs) and macs[i] == mac:
+            pass
+    search_time = time.perf_counter() - start
+
+    return {
+        'count': len(macs),
+        'bytes': flt.size,
+        'bits_per_mac': flt.size * 8 / max(len(macs), 1),
+        'false_negatives': false_negatives,
+        'samples': samples,
+        'false_positives': false_positives,
+        'fp_rate': false_positives / samples if samples else 0.0,
+        'expected_fp_rate': flt.expected_fp_rate(len(macs)),
+        'filter_ns': filter_time * 1e9 / max(samples, 1),
+        'search_ns': search_time * 1e9 / max(samples, 1),
+        'reads_per_lookup': flt.hashes if isinstance(flt, BloomFilter) else 2,
+    }
+
+
+def print_report(result, stream=None):
+    """
+    Print a verification report
+
+    Args:
+        result: Dictionary from verify_filter
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+    lines = [
+        "",
+        "=" * 60,
+        "ALLOWLIST FILTER VERIFICATION",
+        "=" * 60,
+        f"MACs in list:                {result['count']}",
+        f"Table size:                  {result['bytes']} bytes ({result['bits_per_mac']:.1f} bits/MAC)",
+        f"False negatives:             {len(result['false_negatives'])}",
+        f"False positives:             {result['false_positives']} of {result['samples']} random MACs "
+        f"({result['fp_rate']:.3g}, expected {result['expected_fp_rate']:.3g})",
+        f"Table reads/lookup:          {result['reads_per_lookup']} (worst case)",
+        f"Host lookup (Python model):  {result['filter_ns']:.0f} ns filter, "
+        f"{result['search_ns']:.0f} ns sorted-list bisect",
+    ]
+    for mac in result['false_negatives'][:20]:
+        lines.append(f"  REJECTED ENROLLED MAC: {mac:012X}")
+    lines.append("=" * 60)
+    lines.append("FAILED" if result['false_negatives'] else "OK: every enrolled MAC passes the filter")
+    stream.write('\n'.join(lines) + '\n\n')
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generate a Bloom filter or perfect-hash prefilter for the firmware allowlist',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # 1% Bloom filter, at most 2 KB of flash
+  python allowlist_filter.py build -i mac_list.txt -o ../allowlist_filter.h --fp-rate 0.01 \\
+      --flash-budget 2048
+
+  # Fit 512 bytes whatever the false-positive rate; warns and exits 1 if shrunk
+  python allowlist_filter.py build -i mac_list.txt -o ../allowlist_filter.h --fp-rate 0.001 \\
+      --flash-budget 512 --shrink-to-budget
+
+  # Exact minimal perfect hash (full MACs in the slots)
+  python allowlist_filter.py build -i mac_list.txt -o ../allowlist_filter.h --type mph --fp-rate 0
+
+  # Prove zero false negatives and measure the false-positive rate
+  python allowlist_filter.py verify -i mac_list.txt ../allowlist_filter.h
+        """
+    )
+
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build a filter header from a MAC list')
+    build.add_argument('-i', '--input', required=True,
+                       help='Input file with MAC addresses (one per line); - for stdin')
+    build.add_argument('-o', '--output', default='allowlist_filter.h',
+                       help='Header file to write (default: allowlist_filter.h)')
+    build.add_argument('--type', choices=FILTER_TYPES, default='bloom',
+                       help='Filter structure (default: bloom)')
+    build.add_argument('--fp-rate', type=float, default=0.01,
+                       help='Target false-positive rate; 0 with --type mph stores full MACs (default: 0.01)')
+    build.add_argument('--flash-budget', type=int, metavar='BYTES',
+                       help='Maximum table size; a filter that cannot meet --fp-rate within it fails')
+    build.add_argument('--shrink-to-budget', action='store_true',
+                       help='Shrink a Bloom filter to fit --flash-budget, giving up --fp-rate; '
+                            'the header is written but the exit status is 1')
+    build.add_argument('--load-factor', type=float, default=1.0,
+                       help='MACs per slot for --type mph; 1.0 is minimal (default: 1.0)')
+    build.add_argument('--seed', type=int, default=0, help='Hash seed (default: 0)')
+    build.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    verify = sub.add_parser('verify', help='Check a generated header against its MAC list')
+    verify.add_argument('header', help='Header written by build')
+    verify.add_argument('-i', '--input', required=True,
+                       help='Input file with MAC addresses (one per line); - for stdin')
+    verify.add_argument('--samples', type=int, default=100000,
+                       help='Random non-enrolled MACs to probe (default: 100000)')
+    verify.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    args = parser.parse_args()
+
+    try:
+        with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+            macs = collect_macs(iter_mac_lines(f), errors=errors)
+
+        if args.command == 'build':
+            if args.type == 'bloom':
+                flt = BloomFilter.build(macs, args.fp_rate, args.flash_budget, args.seed,
+                                        args.shrink_to_budget)
+            else:
+                flt = PerfectHashFilter.build(macs, args.fp_rate, args.flash_budget, args.seed,
+                                              args.load_factor)
+            write_header(flt, len(macs), args.output, os.path.basename(args.input))
+            print(f"{args.type} filter over {len(macs)} devices ({flt.size} bytes, expected "
+                  f"false-positive rate {flt.expected_fp_rate(len(macs)):.3g}) written to {args.output}")
+            if args.type == 'bloom' and flt.bits < BloomFilter.bits_for(len(macs), args.fp_rate):
+                print(f"WARNING: filter shrunk to the {args.flash_budget}-byte budget; expected "
+                      f"false-positive rate {flt.expected_fp_rate(len(macs)):.3g} misses the "
+                      f"requested {args.fp_rate:g}")
+                sys.exit(1)
+            return
+
+        flt, count = read_header(args.header)
+        if count != len(macs):
+            print(f"WARNING: header was built from {count} MACs, the list has {len(macs)}")
+        result = verify_filter(flt, macs, args.samples)
+        print_report(result)
+        if result['false_negatives']:
+            sys.exit(1)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
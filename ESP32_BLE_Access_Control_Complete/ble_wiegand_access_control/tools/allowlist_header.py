@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Firmware Allowlist Header Generator
+
+isDeviceAuthorized compares the advertised MAC against every entry of
+authorizedDevices[], lowercasing a fresh Arduino String for each one, and
+sendCredential then re-parses the MAC with substring/strtoul. This tool
+turns a MAC list into authorized_devices.h instead:
+
+- authorizedMacs[]: the MACs as sorted 48-bit integers, searched with a
+  binary search straight from the advertisement's address bytes.
+- authorizedCredentials[]: a parallel array with the precomputed W26, W34
+  and EM4100 values, ready for wiegandOut.send / sendEM4100.
+
+Define USE_ALLOWLIST_HEADER in ble_wiegand_access_control.ino to use it.
+Credentials follow the mac_to_credential.py rules (and --allocate
+assignment tables), so the reader sends exactly what was enrolled.
+
+With --bench, a host-side C harness is written too; it checks the table
+against the String-style linear scan and times both.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+
+from credential_io import iter_chunks, iter_mac_lines, open_error_sink, open_input
+from credential_formats import format_mac_batch
+from credential_batch import batch_columns
+
+
+def collect_allowlist(mac_addresses, facility_code=123, allocator=None, errors=None):
+    """
+    Convert a MAC list into sorted allowlist entries
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        facility_code: Facility code for 26-bit format
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        List of (mac, w26, w34, em_version, em_card_id) tuples sorted by MAC,
+        without duplicates; w26/w34 are the data values passed to send()
+    """
+    errors = errors or sys.stderr
+    entries = {}
+    for chunk in iter_chunks(mac_addresses, 4096):
+        values, columns, failed = batch_columns(chunk, 'all', facility_code, allocator)
+        if failed:
+            errors.write(''.join(f"ERROR processing {chunk[i]}: {failed[i]}\n" for i in sorted(failed)))
+        macs = values.tolist() if hasattr(values, 'tolist') else values
+        rows = zip(macs, columns['w26_facility_code'], columns['w26_card_number'],
+                   columns['w34_facility_code'], columns['w34_card_number'],
+                   columns['em4100_version'], columns['em4100_card_id'])
+        for i, (mac, fc26, cn26, fc34, cn34, version, card_id) in enumerate(rows):
+            if i not in failed:
+                entries[mac] = (mac, fc26 << 16 | cn26, fc34 << 16 | cn34, version, card_id)
+    return [entries[mac] for mac in sorted(entries)]
+
+
+def write_header(entries, output_file, facility_code=123, source=None):
+    """
+    Write the allowlist header
+
+    Args:
+        entries: Sorted entries from collect_allowlist
+        output_file: Header filename, e.g. authorized_devices.h
+        facility_code: Facility code the W26 values were built with
+        source: Name of the MAC list, for the header comment
+    """
+    macs = format_mac_batch([entry[0] for entry in entries])
+
+    with open(output_file, 'w') as f:
+        f.write(f"""/**
+ * Authorized BLE Devices
+ *
+ * Generated by tools/allowlist_header.py{f' from {source}' if source else ''}.
+ * Do not edit by hand; re-run the generator instead.
+ */
+
+#ifndef AUTHORIZED_DEVICES_H
+#define AUTHORIZED_DEVICES_H
+
+#include <stdint.h>
+
+#define NUM_AUTHORIZED_DEVICES {len(entries)}
+#define AUTHORIZED_FACILITY_CODE {facility_code}
+
+// MAC addresses as 48-bit integers, sorted ascending
+static const uint64_t authorizedMacs[] = {{
+""")
+        for (mac, *_), text in zip(entries, macs):
+            f.write(f"  0x{mac:012X}ULL,  // {text}\n")
+        f.write("  0  // padding so the array is never empty\n};\n\n")
+
+        f.write("""// Precomputed credentials, parallel to authorizedMacs
+typedef struct {
+  uint32_t w26;       // (facility code << 16) | card number, for send(value, 26, true)
+  uint32_t w34;       // (facility code << 16) | card number, for send(value, 34, true)
+  uint32_t emCardId;  // EM4100 card ID, for sendEM4100
+  uint8_t emVersion;  // EM4100 version, for sendEM4100
+} AuthorizedCredential;
+
+static const AuthorizedCredential authorizedCredentials[] = {
+""")
+        for _, w26, w34, version, card_id in entries:
+            f.write(f"  {{0x{w26:06X}, 0x{w34:08X}, 0x{card_id:08X}, 0x{version:02X}}},\n")
+        f.write("  {0, 0, 0, 0}\n};\n\n")
+
+        f.write("""/**
+ * Fold the 6 address bytes (as in BLEAddress::getNative) into a 48-bit integer
+ */
+static inline uint64_t allowlistMacFromBytes(const uint8_t* addr) {
+  uint64_t value = 0;
+  for (int i = 0; i < 6; i++) {
+    value = (value << 8) | addr[i];
+  }
+  return value;
+}
+
+/**
+ * Find a MAC in the allowlist
+ * @param mac MAC address as a 48-bit integer
+ * @return Index into authorizedCredentials, or -1 if the MAC is not authorized
+ */
+static inline int findAuthorizedDevice(uint64_t mac) {
+  int low = 0;
+  int high = NUM_AUTHORIZED_DEVICES - 1;
+  while (low <= high) {
+    int mid = low + (high - low) / 2;
+    if (authorizedMacs[mid] == mac) {
+      return mid;
+    }
+    if (authorizedMacs[mid] < mac) {
+      low = mid + 1;
+    } else {
+      high = mid - 1;
+    }
+  }
+  return -1;
+}
+
+#endif // AUTHORIZED_DEVICES_H
+""")
+
+
+def write_bench(output_file, header_file, iterations=200):
+    """
+    Write a host-side C harness comparing the table with the linear scan
+
+    The linear side mirrors the firmware: each lookup copies and lowercases
+    the advertised MAC, then copies and lowercases every list entry until
+    one matches, and a hit re-parses the MAC with strtoul.
+
+    Args:
+        output_file: C source filename, e.g. allowlist_bench.c
+        header_file: Path of the generated header, as it will be #included
+        iterations: Passes over the query set per timing run
+    """
+    with open(output_file, 'w') as f:
+        f.write(f"""/**
+ * Allowlist lookup benchmark (host build)
+ *
+ * Generated by tools/allowlist_header.py.
+ * Build: gcc -O2 -o allowlist_bench {os.path.basename(output_file)} && ./allowlist_bench
+ */
+
+#define _POSIX_C_SOURCE 200809L
+
+#include <ctype.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "{header_file}"
+
+#define ITERATIONS {iterations}
+
+static char listMacs[NUM_AUTHORIZED_DEVICES + 1][18];
+
+static void formatMac(uint64_t mac, char* out) {{
+  sprintf(out, "%02x:%02x:%02x:%02x:%02x:%02x",
+          (unsigned)(mac >> 40) & 0xFF, (unsigned)(mac >> 32) & 0xFF, (unsigned)(mac >> 24) & 0xFF,
+          (unsigned)(mac >> 16) & 0xFF, (unsigned)(mac >> 8) & 0xFF, (unsigned)mac & 0xFF);
+}}
+
+/* Like normalizeMacAddress(String(...)): a heap copy, lowercased */
+static char* normalizedCopy(const char* mac) {{
+  char* copy = strdup(mac);
+  for (char* p = copy; *p; p++) *p = (char)tolower((unsigned char)*p);
+  return copy;
+}}
+
+/* isDeviceAuthorized: linear scan over String copies */
+static int linearLookup(const char* mac) {{
+  char* wanted = normalizedCopy(mac);
+  int found = -1;
+  for (int i = 0; i < NUM_AUTHORIZED_DEVICES && found < 0; i++) {{
+    char* entry = normalizedCopy(listMacs[i]);
+    if (strcmp(wanted, entry) == 0) found = i;
+    free(entry);
+  }}
+  free(wanted);
+  return found;
+}}
+
+/* sendCredential: strip colons, then substring + strtoul per field */
+static uint32_t parseField(const char* mac, int start, int length) {{
+  char clean[13];
+  char field[9];
+  int n = 0;
+  for (const char* p = mac; *p && n < 12; p++) {{
+    if (*p != ':') clean[n++] = *p;
+  }}
+  clean[n] = 0;
+  memcpy(field, clean + start, length);
+  field[length] = 0;
+  return (uint32_t)strtoul(field, NULL, 16);
+}}
+
+static double seconds(void) {{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return ts.tv_sec + ts.tv_nsec / 1e9;
+}}
+
+int main(void) {{
+  int queries = 2 * NUM_AUTHORIZED_DEVICES + 2;
+  uint64_t* macs = malloc(sizeof(uint64_t) * queries);
+  char (*texts)[18] = malloc(18 * queries);
+  uint64_t state = 0x9E3779B97F4A7C15ULL;
+  int failures = 0;
+  int allocated = 0;
+
+  for (int i = 0; i < NUM_AUTHORIZED_DEVICES; i++) formatMac(authorizedMacs[i], listMacs[i]);
+
+  /* Half hits (every entry, upper case as BLE stacks may report), half misses */
+  for (int i = 0; i < queries; i++) {{
+    if (i < NUM_AUTHORIZED_DEVICES) {{
+      macs[i] = authorizedMacs[i];
+    }} else {{
+      state ^= state << 13; state ^= state >> 7; state ^= state << 17;
+      macs[i] = state & 0xFFFFFFFFFFFFULL;
+    }}
+    formatMac(macs[i], texts[i]);
+    if (i < NUM_AUTHORIZED_DEVICES) {{
+      for (char* p = texts[i]; *p; p++) *p = (char)toupper((unsigned char)*p);
+    }}
+  }}
+
+  /* Correctness: same decisions, same credentials */
+  for (int i = 0; i < queries; i++) {{
+    int linear = linearLookup(texts[i]);
+    int table = findAuthorizedDevice(macs[i]);
+    if ((linear < 0) != (table < 0)) {{
+      printf("MISMATCH lookup %s: linear %d, table %d\\n", texts[i], linear, table);
+      failures++;
+      continue;
+    }}
+    if (table < 0) continue;
+    const AuthorizedCredential* c = &authorizedCredentials[table];
+    uint32_t cardNumber = parseField(texts[i], 8, 4);
+    uint32_t w26 = ((uint32_t)AUTHORIZED_FACILITY_CODE << 16) | cardNumber;
+    uint32_t w34 = (parseField(texts[i], 4, 4) << 16) | cardNumber;
+    if (c->w26 != w26 || c->w34 != w34 || c->emVersion != parseField(texts[i], 0, 2) ||
+        c->emCardId != parseField(texts[i], 2, 8)) {{
+      allocated++;
+    }}
+  }}
+
+  volatile long sink = 0;
+  double start = seconds();
+  for (int r = 0; r < ITERATIONS; r++) {{
+    for (int i = 0; i < queries; i++) {{
+      int slot = linearLookup(texts[i]);
+      if (slot >= 0) sink += parseField(texts[i], 8, 4) + parseField(texts[i], 4, 4);
+    }}
+  }}
+  double linearTime = seconds() - start;
+
+  start = seconds();
+  for (int r = 0; r < ITERATIONS; r++) {{
+    for (int i = 0; i < queries; i++) {{
+      int slot = findAuthorizedDevice(macs[i]);
+      if (slot >= 0) sink += authorizedCredentials[slot].w26 + authorizedCredentials[slot].w34;
+    }}
+  }}
+  double tableTime = seconds() - start;
+
+  long lookups = (long)ITERATIONS * queries;
+  printf("Devices:            %d\\n", NUM_AUTHORIZED_DEVICES);
+  printf("Lookups per run:    %ld (half hits)\\n", lookups);
+  printf("Linear String scan: %.1f ns/lookup\\n", linearTime * 1e9 / lookups);
+  printf("Sorted table:       %.1f ns/lookup\\n", tableTime * 1e9 / lookups);
+  printf("Speedup:            %.1fx\\n", linearTime / (tableTime > 0 ? tableTime : 1e-9));
+  printf("Not MAC-derived:    %d (credentials from an allocator table)\\n", allocated);
+  printf("%s\\n", failures ? "FAILED" : "OK");
+
+  free(macs);
+  free(texts);
+  return failures ? 1 : 0;
+}}
+""")
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generate a sorted allowlist header with precomputed credentials',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Generate the header next to the sketch
+  python allowlist_header.py -i mac_list.txt -o ../authorized_devices.h -c 123
+
+  # Use allocated credentials, and write the host benchmark
+  python allowlist_header.py -i mac_list.txt -o authorized_devices.h --allocate assignments.csv \\
+      --bench allowlist_bench.c
+  gcc -O2 -o allowlist_bench allowlist_bench.c && ./allowlist_bench
+        """
+    )
+
+    parser.add_argument('-i', '--input', required=True,
+                       help='Input file with MAC addresses (one per line); - for stdin')
+    parser.add_argument('-o', '--output', default='authorized_devices.h',
+                       help='Header file to write (default: authorized_devices.h)')
+    parser.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit format; must match FACILITY_CODE (default: 123)')
+    parser.add_argument('--allocate', metavar='TABLE',
+                       help='Use unique W26/W34 credentials from this assignment table')
+    parser.add_argument('--bench', help='Also write a host-side C benchmark harness to this file')
+    parser.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    args = parser.parse_args()
+
+    if not 0 <= args.facility_code <= 255:
+        print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
+        sys.exit(1)
+
+    try:
+        allocator = None
+        if args.allocate:
+            from credential_allocator import CredentialAllocator
+            allocator = CredentialAllocator(args.allocate, args.facility_code)
+
+        with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+            entries = collect_allowlist(iter_mac_lines(f), args.facility_code, allocator, errors)
+        if allocator is not None:
+            allocator.save()
+            allocator.close()
+
+        write_header(entries, args.output, args.facility_code, os.path.basename(args.input))
+        print(f"Header with {len(entries)} authorized devices written to {args.output}")
+
+        if args.bench:
+            header = os.path.relpath(args.output, os.path.dirname(os.path.abspath(args.bench)))
+            write_bench(args.bench, header)
+            print(f"Benchmark harness written to {args.bench}")
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
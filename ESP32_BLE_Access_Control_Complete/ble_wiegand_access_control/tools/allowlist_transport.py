@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+"""
+Delta-Compressed Allowlist Transport Format (.nal / .nap)
+
+A compact binary allowlist for pushing enrollment changes to readers
+without a reflash. The MACs are sorted, and each one is stored as the
+difference to the previous MAC in LEB128 varint form, so a dense estate
+list costs about 3-4 bytes per device instead of 6 (or 18 as text).
+Between two versions, a patch carries only the removed and added MACs.
+
+List file (.nal, little-endian):
+
+    header, 32 bytes
+        8s   magic 'NCALST01'
+        u16  file format version (1)
+        u16  reserved
+        u32  list version (set by whoever publishes the list)
+        u32  MAC count
+        u32  content CRC: CRC-32 of the sorted MACs as 6 big-endian bytes each
+        u32  payload length in bytes
+        u32  file CRC: CRC-32 of the header bytes before it plus the payload
+
+    payload
+        count varints: the first MAC, then MAC - previous MAC (always > 0)
+
+Patch file (.nap, little-endian):
+
+    header, 44 bytes
+        8s   magic 'NCAPAT01'
+        u16  file format version (1)
+        u16  reserved
+        u32  base list version
+        u32  target list version
+        u32  base content CRC (the patch only applies to this exact list)
+        u32  target content CRC (checked after applying)
+        u32  removed MAC count
+        u32  added MAC count
+        u32  payload length in bytes
+        u32  file CRC, as for lists
+
+    payload
+        removed MACs, then added MACs, each run delta-encoded as above
+
+The content CRC does not depend on the encoding, so a reader can keep it
+next to its decoded list and check patches against it directly. The
+portable C decoder is ../allowlist_transport.h; `bench` compiles it on the
+host (when a C compiler is available) to time it next to this module.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import time
+import zlib
+import shutil
+import random
+import struct
+import tempfile
+import subprocess
+
+from credential_collisions import iter_valid_macs
+from credential_io import DEFAULT_CHUNK_SIZE, iter_mac_lines, open_error_sink, open_input, open_output
+from credential_formats import format_mac_batch
+
+
+LIST_MAGIC = b'NCALST01'
+PATCH_MAGIC = b'NCAPAT01'
+TRANSPORT_VERSION = 1
+LIST_HEADER = struct.Struct('<8sHHIIII')
+PATCH_HEADER = struct.Struct('<8sHHIIIIIII')
+
+C_DECODER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'allowlist_transport.h')
+
+BENCH_SIZES = [1000, 10000, 100000]
+
+
+def encode_deltas(macs):
+    """
+    Delta + varint encode a sorted run of distinct MACs
+
+    Args:
+        macs: Sorted list of distinct 48-bit MAC integers
+
+    Returns:
+        bytes
+    """
+    out = bytearray()
+    append = out.append
+    previous = 0
+    for mac in macs:
+        delta = mac - previous
+        previous = mac
+        while delta >= 0x80:
+            append(delta & 0x7F | 0x80)
+            delta >>= 7
+        append(delta)
+    return bytes(out)
+
+
+def decode_deltas(data, count, offset=0):
+    """
+    Decode count delta-encoded MACs
+
+    Args:
+        data: Buffer holding the varints
+        count: Number of MACs to decode
+        offset: Position of the first varint
+
+    Returns:
+        Tuple (macs, offset after the last varint)
+    """
+    macs = []
+    append = macs.append
+    mac = 0
+    end = len(data)
+    for _ in range(count):
+        delta = shift = 0
+        while True:
+            if offset >= end or shift > 49:
+                raise ValueError("Allowlist payload is truncated or corrupt")
+            byte = data[offset]
+            offset += 1
+            delta |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        mac += delta
+        append(mac)
+    return macs, offset
+
+
+def content_crc(macs):
+    """
+    CRC-32 of a sorted MAC list, independent of the encoding
+
+    Args:
+        macs: Sorted list of 48-bit MAC integers
+
+    Returns:
+        32-bit CRC
+    """
+    crc = 0
+    for i in range(0, len(macs), 65536):
+        crc = zlib.crc32(b''.join([mac.to_bytes(6, 'big') for mac in macs[i:i + 65536]]), crc)
+    return crc
+
+
+def encode_list(macs, list_version):
+    """
+    Build a .nal list blob
+
+    Args:
+        macs: Sorted list of distinct 48-bit MAC integers
+        list_version: Version number of this list
+
+    Returns:
+        bytes
+    """
+    payload = encode_deltas(macs)
+    header = LIST_HEADER.pack(LIST_MAGIC, TRANSPORT_VERSION, 0, list_version, len(macs),
+                              content_crc(macs), len(payload))
+    return header + struct.pack('<I', zlib.crc32(payload, zlib.crc32(header))) + payload
+
+
+def encode_patch(removed, added, base_version, target_version, base_crc, target_crc):
+    """
+    Build a .nap patch blob
+
+    Args:
+        removed: Sorted MACs to remove from the base list
+        added: Sorted MACs to add to it
+        base_version: Version of the list the patch applies to
+        target_version: Version of the list it produces
+        base_crc: Content CRC of the base list
+        target_crc: Content CRC of the target list
+
+    Returns:
+        bytes
+    """
+    payload = encode_deltas(removed) + encode_deltas(added)
+    header = PATCH_HEADER.pack(PATCH_MAGIC, TRANSPORT_VERSION, 0, base_version, target_version,
+                               base_crc, target_crc, len(removed), len(added), len(payload))
+    return header + struct.pack('<I', zlib.crc32(payload, zlib.crc32(header))) + payload
+
+
+class AllowlistBlob:
+    """A parsed .nal list or .nap patch"""
+
+    def __init__(self, data):
+        """
+        Args:
+            data: Complete file contents
+
+        Raises:
+            ValueError: On a bad magic, version, length or CRC
+        """
+        magic = bytes(data[:8])
+        if magic == LIST_MAGIC:
+            self.kind = 'list'
+            header = LIST_HEADER
+        elif magic == PATCH_MAGIC:
+            self.kind = 'patch'
+            header = PATCH_HEADER
+        else:
+            raise ValueError("Not an allowlist list or patch file")
+        if len(data) < header.size + 4:
+            raise ValueError("Allowlist file is truncated")
+
+        fields = header.unpack_from(data)
+        if fields[1] != TRANSPORT_VERSION:
+            raise ValueError(f"Unsupported allowlist format version {fields[1]}")
+        payload_length = fields[-1]
+        (file_crc,) = struct.unpack_from('<I', data, header.size)
+        start = header.size + 4
+        if len(data) != start + payload_length:
+            raise ValueError("Allowlist file length does not match its header")
+        if zlib.crc32(data[start:], zlib.crc32(data[:header.size])) != file_crc:
+            raise ValueError("Allowlist file failed its checksum")
+
+        if self.kind == 'list':
+            _, _, _, self.version, count, self.crc, _ = fields
+            self.macs, end = decode_deltas(data, count, start)
+        else:
+            (_, _, _, self.base_version, self.version, self.base_crc, self.crc,
+             removed, added, _) = fields
+            self.removed, end = decode_deltas(data, removed, start)
+            self.added, end = decode_deltas(data, added, end)
+        if end != len(data):
+            raise ValueError("Allowlist payload has trailing bytes")
+
+    @classmethod
+    def read(cls, path):
+        """Parse a file"""
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+
+def diff_lists(base, target):
+    """
+    Minimal patch between two sorted MAC lists, by sorted merge
+
+    Args:
+        base: Sorted list of distinct MACs
+        target: Sorted list of distinct MACs
+
+    Returns:
+        Tuple (removed, added), both sorted
+    """
+    removed, added = [], []
+    i = j = 0
+    while i < len(base) and j < len(target):
+        if base[i] == target[j]:
+            i += 1
+            j += 1
+        elif base[i] < target[j]:
+            removed.append(base[i])
+            i += 1
+        else:
+            added.append(target[j])
+            j += 1
+    removed.extend(base[i:])
+    added.extend(target[j:])
+    return removed, added
+
+
+def apply_patch(macs, patch, base_crc=None):
+    """
+    Apply a patch to a sorted MAC list
+
+    Args:
+        macs: Sorted list of distinct MACs (the base list)
+        patch: AllowlistBlob of kind 'patch'
+        base_crc: Content CRC of macs, if already known
+
+    Returns:
+        Sorted target MAC list
+
+    Raises:
+        ValueError: If the patch is for another list or does not produce
+                    the target CRC
+    """
+    if (content_crc(macs) if base_crc is None else base_crc) != patch.base_crc:
+        raise ValueError(f"Patch is for list version {patch.base_version} with a different content")
+
+    removed = set(patch.removed)
+    kept = [mac for mac in macs if mac not in removed]
+    if len(kept) != len(macs) - len(removed):
+        raise ValueError("Patch removes MACs that are not in the list")
+
+    result = []
+    i = j = 0
+    added = patch.added
+    while i < len(kept) and j < len(added):
+        if kept[i] < added[j]:
+            result.append(kept[i])
+            i += 1
+        elif kept[i] > added[j]:
+            result.append(added[j])
+            j += 1
+        else:
+            raise ValueError("Patch adds a MAC that is already in the list")
+    result.extend(kept[i:])
+    result.extend(added[j:])
+
+    if content_crc(result) != patch.crc:
+        raise ValueError("Patched list does not match the target checksum")
+    return result
+
+
+def collect_macs(mac_addresses, chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Parse a MAC list into sorted, distinct 48-bit integers
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        chunk_size: MACs parsed per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Sorted list of MAC integers
+    """
+    macs = set()
+    for values in iter_valid_macs(mac_addresses, chunk_size, errors or sys.stderr):
+        macs.update(values.tolist() if hasattr(values, 'tolist') else values)
+    return sorted(macs)
+
+
+def write_file(path, data):
+    """Write a blob atomically"""
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+# Host harness for the C decoder: decode each file argument N times
+C_BENCH = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include "allowlist_transport.h"
+
+int main(int argc, char** argv) {
+  int rounds = atoi(argv[1]);
+  for (int a = 2; a < argc; a++) {
+    FILE* f = fopen(argv[a], "rb");
+    fseek(f, 0, SEEK_END);
+    long length = ftell(f);
+    fseek(f, 0, SEEK_SET);
+    uint8_t* data = malloc(length);
+    if (fread(data, 1, length, f) != (size_t)length) return 2;
+    fclose(f);
+    AllowlistInfo info;
+    if (allowlistReadInfo(data, length, &info) != ALLOWLIST_OK) return 3;
+    uint64_t* macs = malloc(sizeof(uint64_t) * (info.count + 1));
+    struct timespec t0, t1;
+    int status = ALLOWLIST_OK;
+    clock_gettime(CLOCK_MONOTONIC, &t0);
+    for (int r = 0; r < rounds && status == ALLOWLIST_OK; r++) {
+      status = allowlistDecode(data, length, macs, info.count, &info);
+    }
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    double ns = (t1.tv_sec - t0.tv_sec) * 1e9 + (t1.tv_nsec - t0.tv_nsec);
+    printf("%d %.3f\n", status, ns / rounds / (info.count ? info.count : 1));
+    free(macs);
+    free(data);
+  }
+  return 0;
+}
+"""
+
+
+def run_c_bench(paths, rounds, cc):
+    """
+    Compile the C decoder harness and time it on each file
+
+    Args:
+        paths: .nal files to decode
+        rounds: Decodes per file
+        cc: C compiler command
+
+    Returns:
+        List of ns/MAC per file, or None if the compiler is unavailable
+    """
+    if not shutil.which(cc):
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'bench.c')
+        binary = os.path.join(tmp, 'bench')
+        with open(source, 'w') as f:
+            f.write(C_BENCH)
+        build = subprocess.run([cc, '-O2', '-I', os.path.dirname(C_DECODER), '-o', binary, source],
+                               capture_output=True, text=True)
+        if build.returncode != 0:
+            raise ValueError(f"Compiling the C decoder failed:\n{build.stderr}")
+        output = subprocess.run([binary, str(rounds), *paths], capture_output=True, text=True,
+                                check=True).stdout.split('\n')
+    results = []
+    for line in output[:len(paths)]:
+        status, ns = line.split()
+        if status != '0':
+            raise ValueError(f"C decoder rejected a benchmark file (status {status})")
+        results.append(float(ns))
+    return results
+
+
+def bench(sizes=BENCH_SIZES, churn=0.01, seed=1, cc='cc', stream=None):
+    """
+    Measure encoded sizes and decode speed on seeded synthetic lists
+
+    Args:
+        sizes: List sizes to test
+        churn: Fraction of the list replaced between versions, for patch sizes
+        seed: Random seed
+        cc: C compiler for the C decoder timing ('' to skip)
+        stream: Text stream for the report (default: stdout)
+
+    Returns:
+        List of result dictionaries, one per size
+    """
+    stream = stream or sys.stdout
+    rng = random.Random(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for size in sizes:
+            # A few vendor OUIs, as in a real fleet, plus random devices
+            ouis = [rng.getrandbits(24) for _ in range(8)]
+            macs = set()
+            while len(macs) < size:
+                if rng.random() < 0.7:
+                    macs.add(rng.choice(ouis) << 24 | rng.getrandbits(24))
+                else:
+                    macs.add(rng.getrandbits(48))
+            macs = sorted(macs)
+            changed = max(1, int(size * churn))
+            target = set(macs).difference(rng.sample(macs, changed))
+            while len(target) < size:
+                target.add(rng.choice(ouis) << 24 | rng.getrandbits(24))
+            target = sorted(target)
+
+            start = time.perf_counter()
+            blob = encode_list(macs, 1)
+            encode_time = time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = AllowlistBlob(blob).macs
+            decode_time = time.perf_counter() - start
+            if decoded != macs:
+                raise ValueError("Round trip mismatch in benchmark")
+
+            removed, added = diff_lists(macs, target)
+            patch = encode_patch(removed, added, 1, 2, content_crc(macs), content_crc(target))
+            if apply_patch(macs, AllowlistBlob(patch)) != target:
+                raise ValueError("Patch mismatch in benchmark")
+
+            path = os.path.join(tmp, f'{size}.nal')
+            write_file(path, blob)
+            paths.append(path)
+            results.append({
+                'devices': size,
+                'list_bytes': len(blob),
+                'bytes_per_mac': len(blob) / size,
+                'text_bytes': size * 18,
+                'patch_changes': len(removed) + len(added),
+                'patch_bytes': len(patch),
+                'encode_ns_per_mac': encode_time * 1e9 / size,
+                'decode_ns_per_mac': decode_time * 1e9 / size,
+                'c_decode_ns_per_mac': None,
+            })
+
+        c_times = run_c_bench(paths, 20, cc) if cc else None
+        for result, ns in zip(results, c_times or []):
+            result['c_decode_ns_per_mac'] = ns
+
+    stream.write(f"\n{'Devices':>8} {'List':>10} {'B/MAC':>6} {'Text':>10} {'Patch':>14} "
+                 f"{'Py enc':>8} {'Py dec':>8} {'C dec':>8}\n")
+    for r in results:
+        c_dec = f"{r['c_decode_ns_per_mac']:.1f}" if r['c_decode_ns_per_mac'] is not None else '-'
+        stream.write(f"{r['devices']:>8} {r['list_bytes']:>10} {r['bytes_per_mac']:>6.2f} "
+                     f"{r['text_bytes']:>10} {r['patch_bytes']:>7} ({r['patch_changes']:>4}) "
+                     f"{r['encode_ns_per_mac']:>8.0f} {r['decode_ns_per_mac']:>8.0f} {c_dec:>8}\n")
+    stream.write(f"\nSizes in bytes; patches replace {churn:.1%} of the list; times in ns/MAC"
+                 f"{'' if c_times else ' (C decoder not timed: no compiler)'}\n\n")
+    return results
+
+
+def print_info(blob, path, stream=None):
+    """Print the header of a list or patch"""
+    stream = stream or sys.stdout
+    lines = ["", "=" * 60, f"{path}", "=" * 60]
+    if blob.kind == 'list':
+        lines += [f"Type:            allowlist",
+                  f"Version:         {blob.version}",
+                  f"Devices:         {len(blob.macs)}",
+                  f"Content CRC:     0x{blob.crc:08X}"]
+    else:
+        lines += [f"Type:            patch",
+                  f"Versions:        {blob.base_version} -> {blob.version}",
+                  f"Removed:         {len(blob.removed)}",
+                  f"Added:           {len(blob.added)}",
+                  f"Base CRC:        0x{blob.base_crc:08X}",
+                  f"Target CRC:      0x{blob.crc:08X}"]
+    lines.append("=" * 60)
+    stream.write('\n'.join(lines) + '\n\n')
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Encode, diff and patch compact binary allowlists for OTA updates',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Publish version 7 of the allowlist
+  python allowlist_transport.py encode -i mac_list.txt -o allowlist_v7.nal --list-version 7
+
+  # Patch from version 7 to version 8
+  python allowlist_transport.py diff allowlist_v7.nal allowlist_v8.nal -o v7_to_v8.nap
+
+  # Apply it (as a reader would) and check the result
+  python allowlist_transport.py apply allowlist_v7.nal v7_to_v8.nap -o check_v8.nal
+
+  # Sizes and decode speed at 1k/10k/100k devices
+  python allowlist_transport.py bench
+        """
+    )
+
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    encode = sub.add_parser('encode', help='Encode a MAC list as a .nal file')
+    encode.add_argument('-i', '--input', required=True,
+                        help='Input file with MAC addresses (one per line); - for stdin')
+    encode.add_argument('-o', '--output', required=True, help='List file to write')
+    encode.add_argument('--list-version', type=int, required=True,
+                        help='Version number of this list (0-4294967295)')
+    encode.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    decode = sub.add_parser('decode', help='Check a list or patch, and optionally write its MACs')
+    decode.add_argument('file', help='.nal list or .nap patch')
+    decode.add_argument('-o', '--output', help='Write the MACs of a list as text; - for stdout')
+
+    diff = sub.add_parser('diff', help='Write the patch between two list versions')
+    diff.add_argument('base', help='Older .nal list')
+    diff.add_argument('target', help='Newer .nal list')
+    diff.add_argument('-o', '--output', required=True, help='Patch file to write')
+
+    apply = sub.add_parser('apply', help='Apply a patch to a list')
+    apply.add_argument('base', help='.nal list the patch was made for')
+    apply.add_argument('patch', help='.nap patch')
+    apply.add_argument('-o', '--output', required=True, help='Patched list file to write')
+
+    bench_parser = sub.add_parser('bench', help='Benchmark sizes and decode speed')
+    bench_parser.add_argument('--sizes', type=int, nargs='+', default=BENCH_SIZES,
+                              help='List sizes (default: 1000 10000 100000)')
+    bench_parser.add_argument('--churn', type=float, default=0.01,
+                              help='Fraction of devices replaced per version (default: 0.01)')
+    bench_parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    bench_parser.add_argument('--cc', default='cc',
+                              help="C compiler for timing the C decoder; '' to skip (default: cc)")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'encode':
+            if not 0 <= args.list_version <= 0xFFFFFFFF:
+                raise ValueError(f"List version must fit in 32 bits, got {args.list_version}")
+            with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+                macs = collect_macs(iter_mac_lines(f), errors=errors)
+            blob = encode_list(macs, args.list_version)
+            write_file(args.output, blob)
+            print(f"Allowlist version {args.list_version} with {len(macs)} devices written to "
+                  f"{args.output} ({len(blob)} bytes)")
+
+        elif args.command == 'decode':
+            blob = AllowlistBlob.read(args.file)
+            if args.output and blob.kind == 'list':
+                with open_output(args.output) as out:
+                    for i in range(0, len(blob.macs), DEFAULT_CHUNK_SIZE):
+                        out.write(''.join(mac + '\n' for mac in
+                                          format_mac_batch(blob.macs[i:i + DEFAULT_CHUNK_SIZE])))
+            if args.output != '-':
+                print_info(blob, args.file)
+
+        elif args.command == 'diff':
+            base, target = AllowlistBlob.read(args.base), AllowlistBlob.read(args.target)
+            if base.kind != 'list' or target.kind != 'list':
+                raise ValueError("diff needs two list files")
+            removed, added = diff_lists(base.macs, target.macs)
+            patch = encode_patch(removed, added, base.version, target.version, base.crc, target.crc)
+            write_file(args.output, patch)
+            print(f"Patch {base.version} -> {target.version}: {len(removed)} removed, "
+                  f"{len(added)} added, {len(patch)} bytes written to {args.output}")
+
+        elif args.command == 'apply':
+            base, patch = AllowlistBlob.read(args.base), AllowlistBlob.read(args.patch)
+            if base.kind != 'list' or patch.kind != 'patch':
+                raise ValueError("apply needs a list file and a patch file")
+            if base.version != patch.base_version:
+                raise ValueError(f"Patch is for version {patch.base_version}, list is version {base.version}")
+            macs = apply_patch(base.macs, patch, base.crc)
+            write_file(args.output, encode_list(macs, patch.version))
+            print(f"Allowlist version {patch.version} with {len(macs)} devices written to {args.output}")
+
+        else:
+            bench(args.sizes, args.churn, args.seed, args.cc)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
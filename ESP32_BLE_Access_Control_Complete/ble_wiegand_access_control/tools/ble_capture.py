@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+Offline BLE Capture Replay
+
+Answers "which phones should this door have seen, and what would it have
+sent?" from an advertising capture taken with a Linux sniffer, instead of
+cross-referencing mac_to_credential.py output by hand:
+
+- Streams btsnoop files (btmon -w, Android HCI snoop logs) and pcap files
+  (tcpdump/Wireshark on a Bluetooth HCI interface), plain, .gz or .zst, in
+  fixed-size blocks, so multi-gigabyte captures replay in bounded memory.
+- Extracts every LE Advertising Report (legacy, extended and directed):
+  advertiser address, address type, RSSI and timestamp.
+- Matches advertisers against the allowlist and converts them in bulk with
+  the mac_to_credential.py rules; the firmware cooldown
+  (DEVICE_COOLDOWN_MS over a ring of deviceCooldowns[10] slots) decides
+  which matches would have been sent. The result is a timeline of
+  credentials, one row per send.
+- Classifies random addresses: resolvable and non-resolvable private
+  addresses change every few minutes and can never match a static
+  allowlist entry, so they are counted and flagged separately.
+
+HCI captures are supported (btsnoop H1/H4/monitor, pcap link types 187,
+201 and 254); link-layer sniffer captures carry no advertising reports.
+The timeline applies the cooldown only, not the reader's scan windows:
+replay the --all output with scan_simulator.py --trace for that.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; records are then decoded one at a time
+    np = None
+
+from credential_io import (OUTPUT_FORMATS, RecordWriter, iter_chunks, open_binary_input,
+                           open_output, output_format_for)
+from credential_formats import convert_batch, format_mac_batch, output_fields
+from scan_simulator import DEFAULT_COOLDOWN_MS, DEFAULT_COOLDOWN_SLOTS, load_allowlist
+
+
+# Capture bytes read per block; a batch of reports never spans more than one
+READ_BLOCK = 1 << 22
+# Unseen MACs are formatted this many at a time
+REPORT_BATCH = 65536
+
+BTSNOOP_MAGIC = b'btsnoop\0'
+PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),   # nanosecond timestamps
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+PCAPNG_MAGIC = b'\x0a\x0d\x0d\x0a'
+
+# btsnoop timestamps are microseconds since 0000-01-01; this is 1970-01-01
+BTSNOOP_EPOCH_DELTA = 0x00DCDDB30F2F8000
+
+# btsnoop datalink types
+BTSNOOP_H1 = 1001        # un-encapsulated HCI, packet kind in the flags
+BTSNOOP_H4 = 1002        # HCI UART, packet kind in the first byte
+BTSNOOP_MONITOR = 2001   # Linux monitor (btmon), opcode in the flags
+
+# pcap link types
+DLT_BLUETOOTH_HCI_H4 = 187
+DLT_BLUETOOTH_HCI_H4_WITH_PHDR = 201
+DLT_BLUETOOTH_LINUX_MONITOR = 254
+
+H4_EVENT = 0x04
+MONITOR_EVENT = 0x0003
+
+# HCI LE Meta event and its advertising report subevents
+LE_META_EVENT = 0x3E
+LE_ADVERTISING_REPORT = 0x02
+LE_DIRECTED_ADVERTISING_REPORT = 0x0B
+LE_EXTENDED_ADVERTISING_REPORT = 0x0D
+
+RSSI_UNAVAILABLE = 127
+
+# Address kinds; the private ones are never the same address twice
+ADDRESS_KINDS = ['public', 'random_static', 'resolvable_private', 'non_resolvable_private',
+                 'public_identity', 'random_identity', 'anonymous']
+PRIVATE_KINDS = {'resolvable_private', 'non_resolvable_private', 'anonymous'}
+
+# HCI address type -> kind; random addresses are split by their top two bits
+_TYPE_KINDS = {0: 'public', 2: 'public_identity', 3: 'random_identity'}
+_RANDOM_KINDS = ['non_resolvable_private', 'resolvable_private', 'non_resolvable_private',
+                 'random_static']
+
+TIMELINE_COLUMNS = ['Time', 'MAC', 'Address Type', 'RSSI', 'Authorized', 'Sent']
+
+# HCI event code, (parameter length,) LE subevent and report count
+_EVENT_HEADER = struct.Struct('<BxBB')
+# Report fields up to the advertising data; addresses are little-endian
+# 32 + 16 bits. Legacy: event type, address type, address, data length
+# (the data and RSSI follow); extended: 24 bytes with the RSSI at 13;
+# directed: 16 bytes ending in the RSSI
+_LEGACY_REPORT = struct.Struct('<xBIHB')
+_EXTENDED_REPORT = struct.Struct('<2xBIH4xb9xB')
+_DIRECTED_REPORT = struct.Struct('<xBIH7xb')
+
+
+def address_kind(address_type, mac):
+    """
+    Classify an advertiser address
+
+    Args:
+        address_type: HCI address type (0 public, 1 random, 2/3 identity
+                      addresses resolved by the controller, 0xFF anonymous)
+        mac: 48-bit address
+
+    Returns:
+        One of ADDRESS_KINDS
+    """
+    if address_type == 1:
+        return _RANDOM_KINDS[mac >> 46]
+    return _TYPE_KINDS.get(address_type, 'anonymous')
+
+
+class CaptureLayout:
+    """
+    Where a capture format keeps the fields the parser needs
+
+    Every record is a fixed-size header with the captured length, followed
+    by the packet. Event packets are recognized by header flags (btsnoop
+    H1 and monitor) or by bytes at the start of the packet (H4 packet type,
+    pcap monitor opcode); the HCI event follows skip bytes in.
+    """
+
+    def __init__(self, header_size, endian, length_offset, skip=0, checks=(),
+                 flags_mask=0, flags_value=0, time_format='btsnoop', time_scale=1e-6):
+        """
+        Args:
+            header_size: Record header size in bytes
+            endian: '<' or '>' for the header fields
+            length_offset: Offset of the 32-bit captured length in the header
+            skip: Packet bytes before the HCI event
+            checks: (packet offset, byte value) pairs that mark an event packet
+            flags_mask: Mask of the 32-bit header flags at offset 8 (btsnoop)
+            flags_value: Flags value, after masking, of an event packet
+            time_format: 'btsnoop' (64-bit microseconds at 16) or 'pcap'
+                         (seconds and fraction at 0 and 4)
+            time_scale: Seconds per pcap fraction unit
+        """
+        self.header_size = header_size
+        self.endian = endian
+        self.length = struct.Struct(f'{endian}{length_offset}xI').unpack_from
+        self.skip = skip
+        self.checks = list(checks)
+        self.flags_mask = flags_mask
+        self.flags_value = flags_value
+        self.time_format = time_format
+        self.time_scale = time_scale
+        if time_format == 'btsnoop':
+            self.fields = struct.Struct(f'{endian}8xI4xq').unpack_from
+        else:
+            self.fields = struct.Struct(f'{endian}II').unpack_from
+
+    def packet_time(self, buf, start):
+        """
+        Decode a record's header
+
+        Returns:
+            Tuple (flags, seconds since the Unix epoch)
+        """
+        if self.time_format == 'btsnoop':
+            flags, timestamp = self.fields(buf, start)
+            return flags, (timestamp - BTSNOOP_EPOCH_DELTA) / 1e6
+        seconds, fraction = self.fields(buf, start)
+        return 0, seconds + fraction * self.time_scale
+
+
+def read_layout(stream):
+    """
+    Read a capture file header
+
+    Args:
+        stream: Binary stream at the start of the capture
+
+    Returns:
+        CaptureLayout for the records that follow
+    """
+    magic = stream.read(4)
+    if magic == BTSNOOP_MAGIC[:4]:
+        header = stream.read(12)
+        if len(header) < 12 or header[:4] != BTSNOOP_MAGIC[4:]:
+            raise ValueError("Not a btsnoop capture")
+        datalink = struct.unpack('>I', header[8:])[0]
+        if datalink == BTSNOOP_H4:
+            return CaptureLayout(24, '>', 4, skip=1, checks=[(0, H4_EVENT)])
+        if datalink == BTSNOOP_H1:
+            # Bit 0: received, bit 1: command/event; both set is an event
+            return CaptureLayout(24, '>', 4, flags_mask=0x3, flags_value=0x3)
+        if datalink == BTSNOOP_MONITOR:
+            return CaptureLayout(24, '>', 4, flags_mask=0xFFFF, flags_value=MONITOR_EVENT)
+        raise ValueError(f"Unsupported btsnoop datalink type {datalink} (need HCI H1, H4 or monitor)")
+
+    if magic in PCAP_MAGICS:
+        endian, scale = PCAP_MAGICS[magic]
+        header = stream.read(20)
+        if len(header) < 20:
+            raise ValueError("Truncated pcap header")
+        linktype = struct.unpack(endian + 'HHiIII', header)[5] & 0x0FFFFFFF
+        if linktype == DLT_BLUETOOTH_HCI_H4:
+            return CaptureLayout(16, endian, 8, 1, [(0, H4_EVENT)], time_format='pcap',
+                                 time_scale=scale)
+        if linktype == DLT_BLUETOOTH_HCI_H4_WITH_PHDR:
+            # 4-byte direction, then the H4 packet type
+            return CaptureLayout(16, endian, 8, 5, [(4, H4_EVENT)], time_format='pcap',
+                                 time_scale=scale)
+        if linktype == DLT_BLUETOOTH_LINUX_MONITOR:
+            # Adapter index and opcode, both big-endian 16-bit
+            return CaptureLayout(16, endian, 8, 4, [(2, 0), (3, MONITOR_EVENT)],
+                                 time_format='pcap', time_scale=scale)
+        raise ValueError(f"Unsupported pcap link type {linktype} "
+                         f"(need Bluetooth HCI: {DLT_BLUETOOTH_HCI_H4}, "
+                         f"{DLT_BLUETOOTH_HCI_H4_WITH_PHDR} or {DLT_BLUETOOTH_LINUX_MONITOR})")
+
+    if magic == PCAPNG_MAGIC:
+        raise ValueError("pcapng is not supported; convert it with: editcap -F pcap in.pcapng out.pcap")
+    raise ValueError("Unrecognized capture format (need btsnoop or pcap)")
+
+
+def _record_starts(buf, layout):
+    """
+    Find the complete records in a buffer
+
+    Record boundaries only follow from the captured lengths, so this walk
+    is the one per-record loop that cannot be vectorized.
+
+    Returns:
+        Tuple (list of record start offsets, offset just past the last one)
+    """
+    size = layout.header_size
+    length = layout.length
+    end = len(buf)
+    starts = []
+    append = starts.append
+    pos = 0
+    while end - pos >= size:
+        stop = pos + size + length(buf, pos)[0]
+        if stop > end:
+            break
+        append(pos)
+        pos = stop
+    return starts, pos
+
+
+def _parse_le_meta(buf, p, end, t, columns):
+    """
+    Append the advertising reports of an HCI event to columns
+
+    Args:
+        buf: Buffer holding the event
+        p: Offset of the event code
+        end: Offset just past the event
+        t: Packet time in seconds since the Unix epoch
+        columns: Lists (times, macs, address types, rssis) to extend
+    """
+    if end - p < _EVENT_HEADER.size + _LEGACY_REPORT.size + 1:
+        return
+    code, subevent, count = _EVENT_HEADER.unpack_from(buf, p)
+    if code != LE_META_EVENT:
+        return
+    times, macs, types, rssis = columns
+    p += _EVENT_HEADER.size
+
+    for _ in range(count):
+        if subevent == LE_ADVERTISING_REPORT:
+            if p + _LEGACY_REPORT.size >= end:
+                return
+            address_type, low, high, length = _LEGACY_REPORT.unpack_from(buf, p)
+            p += _LEGACY_REPORT.size + length + 1
+            if p > end:
+                return
+            rssi = buf[p - 1]
+            rssi = rssi - 256 if rssi > 127 else rssi
+        elif subevent == LE_EXTENDED_ADVERTISING_REPORT:
+            if p + _EXTENDED_REPORT.size > end:
+                return
+            address_type, low, high, rssi, length = _EXTENDED_REPORT.unpack_from(buf, p)
+            p += _EXTENDED_REPORT.size + length
+            if p > end:
+                return
+        elif subevent == LE_DIRECTED_ADVERTISING_REPORT:
+            if p + _DIRECTED_REPORT.size > end:
+                return
+            address_type, low, high, rssi = _DIRECTED_REPORT.unpack_from(buf, p)
+            p += _DIRECTED_REPORT.size
+        else:
+            return
+        times.append(t)
+        macs.append(high << 32 | low)
+        types.append(address_type)
+        rssis.append(rssi)
+
+
+def _event_start(buf, start, stop, layout):
+    """Offset of the HCI event in a record, or None if it is not an event packet"""
+    p = start + layout.header_size
+    if stop - p <= layout.skip + 3:
+        return None
+    for offset, value in layout.checks:
+        if buf[p + offset] != value:
+            return None
+    return p + layout.skip
+
+
+def _decode_records(buf, starts, stops, layout):
+    """
+    Decode the advertising reports of a buffer's records one at a time
+
+    Returns:
+        Lists (times, macs, address types, rssis)
+    """
+    columns = ([], [], [], [])
+    for start, stop in zip(starts, stops):
+        p = _event_start(buf, start, stop, layout)
+        if p is None or buf[p] != LE_META_EVENT:
+            continue
+        flags, t = layout.packet_time(buf, start)
+        if flags & layout.flags_mask == layout.flags_value:
+            _parse_le_meta(buf, p, stop, t, columns)
+    return columns
+
+
+def _gather(data, offsets, dtype):
+    """Read a (possibly unaligned) integer of the given dtype at every offset"""
+    width = np.dtype(dtype).itemsize
+    return data[offsets[:, None] + np.arange(width)].view(dtype).ravel()
+
+
+def _decode_records_numpy(buf, starts, stops, layout):
+    """
+    Decode the advertising reports of a buffer's records as arrays
+
+    Single-report legacy and extended advertising events, which is what
+    scanners deliver, are decoded for all records at once; anything else
+    (several reports per event, directed reports) goes through
+    _parse_le_meta. Reports stay in capture order.
+
+    Returns:
+        Arrays (times, macs, address types, rssis)
+    """
+    data = np.frombuffer(buf, np.uint8)
+    starts = np.asarray(starts, np.int64)
+    stops = np.asarray(stops, np.int64)
+    p = starts + layout.header_size
+
+    keep = stops - p > layout.skip + 3
+    starts, stops, p = starts[keep], stops[keep], p[keep]
+    for offset, value in layout.checks:
+        keep = data[p + offset] == value
+        starts, stops, p = starts[keep], stops[keep], p[keep]
+    if layout.flags_mask:
+        flags = _gather(data, starts + 8, layout.endian + 'u4')
+        keep = flags & layout.flags_mask == layout.flags_value
+        starts, stops, p = starts[keep], stops[keep], p[keep]
+    p = p + layout.skip
+    keep = data[p] == LE_META_EVENT
+    starts, stops, p = starts[keep], stops[keep], p[keep]
+
+    if layout.time_format == 'btsnoop':
+        times = (_gather(data, starts + 16, '>i8') - BTSNOOP_EPOCH_DELTA) / 1e6
+    else:
+        times = (_gather(data, starts, layout.endian + 'u4')
+                 + _gather(data, starts + 4, layout.endian + 'u4') * layout.time_scale)
+
+    subevent = data[p + 2]
+    single = data[p + 3] == 1
+    report = p + 4
+    last = len(data) - 1
+    # Legacy: data length at 8, RSSI after the data; extended: 24 fixed bytes
+    legacy = single & (subevent == LE_ADVERTISING_REPORT) & (report + 9 < stops)
+    legacy_end = report + 10 + data[np.minimum(report + 8, last)]
+    legacy &= legacy_end <= stops
+    extended = single & (subevent == LE_EXTENDED_ADVERTISING_REPORT) & (report + 24 <= stops)
+    extended_end = report + 24 + data[np.minimum(report + 23, last)]
+    extended &= extended_end <= stops
+
+    fast = legacy | extended
+    shift = np.where(extended, 1, 0)
+    at = report[fast] + shift[fast]
+    macs = _gather(data, at + 2, '<u8') & np.uint64(0xFFFFFFFFFFFF)
+    types = data[at + 1]
+    rssi_at = np.where(extended, report + 13, legacy_end - 1)[fast]
+    columns = [times[fast], macs, types, data[rssi_at].view(np.int8).astype(np.int16)]
+
+    slow = ~fast & ((subevent == LE_DIRECTED_ADVERTISING_REPORT) | ~single)
+    if slow.any():
+        # Reports from the rare events, merged back in by record position
+        order = [starts[fast]]
+        extra = ([], [], [], [])
+        positions = []
+        for start, event, stop, t in zip(starts[slow].tolist(), p[slow].tolist(),
+                                         stops[slow].tolist(), times[slow].tolist()):
+            before = len(extra[0])
+            _parse_le_meta(buf, event, stop, t, extra)
+            positions.extend([start] * (len(extra[0]) - before))
+        order.append(np.asarray(positions, np.int64))
+        merged = np.argsort(np.concatenate(order), kind='stable')
+        columns = [np.concatenate([column, np.asarray(values, dtype=column.dtype)])[merged]
+                   for column, values in zip(columns, extra)]
+    return columns
+
+
+def iter_report_batches(stream, stats=None):
+    """
+    Stream the advertising reports of a btsnoop or pcap capture
+
+    Args:
+        stream: Binary stream, e.g. from open_binary_input
+        stats: Optional dictionary; 'packets' counts the capture records
+
+    Yields:
+        Tuples (times, macs, address types, rssis) of equal-length columns
+        (NumPy arrays when NumPy is available, else lists), one per block,
+        in capture order. Times are seconds since the Unix epoch and rssis
+        are dBm (127 when the controller did not measure it)
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('packets', 0)
+    layout = read_layout(stream)
+    decode = _decode_records if np is None else _decode_records_numpy
+
+    buf = b''
+    for block in iter(lambda: stream.read(READ_BLOCK), b''):
+        buf += block
+        starts, end = _record_starts(buf, layout)
+        if starts:
+            stats['packets'] += len(starts)
+            columns = decode(buf, starts, starts[1:] + [end], layout)
+            if len(columns[0]):
+                yield columns
+        # A trailing partial record (capture cut off mid-write) is dropped
+        buf = buf[end:]
+
+
+class CooldownRing:
+    """
+    The firmware's deviceCooldowns[] ring: a device is sent unless it holds
+    a slot updated less than DEVICE_COOLDOWN_MS ago, and a new device takes
+    the oldest slot
+    """
+
+    def __init__(self, cooldown_ms=DEFAULT_COOLDOWN_MS, slots=DEFAULT_COOLDOWN_SLOTS):
+        self.cooldown = cooldown_ms / 1000
+        self.slots = [None] * slots
+        self.slot_of = {}
+        self.next_slot = 0
+
+    def send(self, mac, t):
+        """
+        Decide whether an authorized advertisement is sent, and record it
+
+        Args:
+            mac: 48-bit address
+            t: Time in seconds
+
+        Returns:
+            True if the credential is sent, False if the device is in cooldown
+        """
+        slot = self.slot_of.get(mac)
+        if slot is not None:
+            if t - self.slots[slot][1] < self.cooldown:
+                return False
+            self.slots[slot] = (mac, t)
+            return True
+        if not self.slots:
+            return True
+        evicted = self.slots[self.next_slot]
+        if evicted is not None:
+            del self.slot_of[evicted[0]]
+        self.slots[self.next_slot] = (mac, t)
+        self.slot_of[mac] = self.next_slot
+        self.next_slot = (self.next_slot + 1) % len(self.slots)
+        return True
+
+
+def _classify(macs, types, allowlist):
+    """
+    Address kinds and allowlist matches for a batch of reports
+
+    Args:
+        macs: Column of 48-bit addresses
+        types: Column of HCI address types
+        allowlist: Sorted NumPy array (or set, without NumPy) of MACs, or None
+
+    Returns:
+        Tuple (kind indexes into ADDRESS_KINDS, list of authorized report indexes)
+    """
+    if np is None:
+        kinds = [ADDRESS_KINDS.index(address_kind(t, m)) for t, m in zip(types, macs)]
+        authorized = [] if allowlist is None else \
+            [i for i, mac in enumerate(macs) if mac in allowlist]
+        return kinds, authorized
+
+    kinds = np.full(len(macs), ADDRESS_KINDS.index('anonymous'), np.uint8)
+    for address_type, kind in _TYPE_KINDS.items():
+        kinds[types == address_type] = ADDRESS_KINDS.index(kind)
+    random = types == 1
+    table = np.array([ADDRESS_KINDS.index(kind) for kind in _RANDOM_KINDS], np.uint8)
+    kinds[random] = table[(macs[random] >> np.uint64(46)).astype(np.intp)]
+    if allowlist is None or not len(allowlist):
+        return kinds, []
+    found = np.searchsorted(allowlist, macs)
+    matched = allowlist[np.minimum(found, len(allowlist) - 1)] == macs
+    return kinds, np.flatnonzero(matched).tolist()
+
+
+def replay_capture(batches, output_file, allowlist=None, format_type='26', facility_code=123,
+                   cooldown=None, all_reports=False, output_format=None, stats=None):
+    """
+    Turn advertising reports into a credential timeline
+
+    Args:
+        batches: Report batches from iter_report_batches
+        output_file: Output filename, or '-' for stdout
+        allowlist: Set of authorized MAC integers, or None (only with all_reports)
+        format_type: Credential format(s) for the timeline columns
+        facility_code: Facility code for 26-bit format
+        cooldown: CooldownRing, or None to send every authorized report
+        all_reports: Write every report, not only the sends
+        output_format: 'csv' or 'ndjson' (default: from the file extension)
+        stats: Dictionary to add the counts to (default: a new one)
+
+    Returns:
+        Dictionary of counts, including 'seen': the allowlisted MACs that advertised
+    """
+    stats = stats if stats is not None else {}
+    stats.update(reports=0, authorized=0, sent=0, cooldown=0, rows=0, first=None, last=None,
+                 kinds=dict.fromkeys(ADDRESS_KINDS, 0), seen=set())
+    kind_counts = [0] * len(ADDRESS_KINDS)
+    seen = stats['seen']
+    fieldnames, keys = output_fields(format_type)
+    matcher = allowlist
+    if np is not None and allowlist is not None:
+        matcher = np.array(sorted(allowlist), np.uint64)
+
+    with open_output(output_file) as out:
+        writer = RecordWriter(out, TIMELINE_COLUMNS + fieldnames[1:],
+                              output_format_for(output_file, output_format))
+        for times, macs, types, rssis in batches:
+            stats['reports'] += len(times)
+            if stats['first'] is None:
+                stats['first'] = float(times[0])
+            stats['last'] = float(times[-1])
+
+            kinds, authorized = _classify(macs, types, matcher)
+            if np is None:
+                for kind in kinds:
+                    kind_counts[kind] += 1
+            else:
+                for kind, count in enumerate(np.bincount(kinds, minlength=len(ADDRESS_KINDS))):
+                    kind_counts[kind] += int(count)
+
+            # Only the authorized reports go through the cooldown, in time order
+            sent = []
+            for i in authorized:
+                mac = int(macs[i])
+                seen.add(mac)
+                if cooldown is None or cooldown.send(mac, float(times[i])):
+                    sent.append(i)
+            stats['authorized'] += len(authorized)
+            stats['sent'] += len(sent)
+            stats['cooldown'] += len(authorized) - len(sent)
+
+            if all_reports:
+                rows = range(len(times))
+            else:
+                rows = sent
+            if not rows:
+                continue
+            if np is None:
+                selected = [[column[i] for i in rows] for column in (times, macs, kinds, rssis)]
+            else:
+                index = np.asarray(rows, np.intp)
+                selected = [column[index].tolist() for column in (times, macs, kinds, rssis)]
+            if allowlist is None:
+                flags = [(None, None)] * len(rows)
+            else:
+                matched, sent = set(authorized), set(sent)
+                flags = [(i in matched, i in sent) for i in rows]
+
+            row_macs = selected[1]
+            columns = convert_batch(row_macs, format_type, facility_code)
+            writer.write_rows([
+                (round(t, 6), text, ADDRESS_KINDS[kind],
+                 None if rssi == RSSI_UNAVAILABLE else rssi, *flag, *fields)
+                for t, text, kind, rssi, flag, *fields
+                in zip(selected[0], format_mac_batch(row_macs), selected[2], selected[3], flags,
+                       *[columns[key] for key in keys])])
+            stats['rows'] += len(rows)
+
+    stats['kinds'] = dict(zip(ADDRESS_KINDS, kind_counts))
+    return stats
+
+
+def print_summary(stats, allowlist=None, stream=None):
+    """
+    Print a capture replay summary
+
+    Args:
+        stats: Dictionary from replay_capture
+        allowlist: The allowlist set, for the seen/unseen counts
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+    private = sum(stats['kinds'][kind] for kind in PRIVATE_KINDS)
+    print("\n" + "="*60, file=stream)
+    print("BLE CAPTURE SUMMARY", file=stream)
+    print("="*60, file=stream)
+    print(f"Packets:             {stats['packets']:,}", file=stream)
+    print(f"Advertising reports: {stats['reports']:,}", file=stream)
+    if stats['first'] is not None:
+        print(f"Capture span:        {stats['last'] - stats['first']:.1f} s", file=stream)
+    for kind in ADDRESS_KINDS:
+        if stats['kinds'][kind]:
+            print(f"  {kind + ':':<24}{stats['kinds'][kind]:,}", file=stream)
+    if private:
+        print(f"Private addresses:   {private:,} reports ({private / stats['reports']:.1%}) "
+              f"can never match a static allowlist entry", file=stream)
+    if allowlist is not None:
+        print(f"Authorized reports:  {stats['authorized']:,}", file=stream)
+        print(f"Credentials sent:    {stats['sent']:,}", file=stream)
+        print(f"Cooldown skips:      {stats['cooldown']:,}", file=stream)
+        print(f"Allowlisted seen:    {len(stats['seen']):,} of {len(allowlist):,}", file=stream)
+    print("="*60 + "\n", file=stream)
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Replay a btsnoop/pcap BLE capture into the credentials a reader would have sent',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Record on a Linux sniffer, then build the credential timeline
+  btmon -w lobby.btsnoop
+  python ble_capture.py -i lobby.btsnoop --allowlist mac_list.txt -o timeline.csv
+
+  # EM4100 with the door's cooldown, and the enrolled phones that never showed up
+  python ble_capture.py -i lobby.pcap.gz --allowlist mac_list.txt -f 40 --cooldown 3000 \\
+      --unseen missing.txt
+
+  # Every advertisement, replayable with scan_simulator.py
+  python ble_capture.py -i lobby.btsnoop --allowlist mac_list.txt --all -o trace.csv
+  python scan_simulator.py --trace trace.csv --scan-time 1 2 5
+        """
+    )
+
+    parser.add_argument('-i', '--input', required=True,
+                       help='btsnoop or pcap capture (optionally .gz/.zst); - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='Timeline file (default: stdout)')
+    parser.add_argument('--allowlist', help='MAC list of enrolled devices (needed unless --all)')
+    parser.add_argument('-f', '--format', default='26',
+                       help='Credential format(s) for the timeline: 26, 34, 40 or a list '
+                            '(default: 26)')
+    parser.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit format (default: 123)')
+    parser.add_argument('--cooldown', type=int, default=DEFAULT_COOLDOWN_MS,
+                       help=f'DEVICE_COOLDOWN_MS; 0 sends every authorized report '
+                            f'(default: {DEFAULT_COOLDOWN_MS})')
+    parser.add_argument('--slots', type=int, default=DEFAULT_COOLDOWN_SLOTS,
+                       help=f'Cooldown table size (default: {DEFAULT_COOLDOWN_SLOTS})')
+    parser.add_argument('--all', action='store_true',
+                       help='Write every advertising report, not only the credentials sent')
+    parser.add_argument('--unseen', help='Write the allowlisted MACs that never advertised to this file')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS[:2],
+                       help='Output file format (default: ndjson for .ndjson/.jsonl, else csv)')
+
+    args = parser.parse_args()
+
+    if not args.allowlist and not args.all:
+        parser.error('--allowlist is needed unless --all is given')
+    if args.unseen and not args.allowlist:
+        parser.error('--unseen needs --allowlist')
+    if args.cooldown < 0 or args.slots < 0:
+        parser.error('--cooldown and --slots cannot be negative')
+    if not 0 <= args.facility_code <= 255:
+        print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
+        sys.exit(1)
+
+    try:
+        output_fields(args.format)
+        allowlist = load_allowlist(args.allowlist) if args.allowlist else None
+        cooldown = CooldownRing(args.cooldown, args.slots) if args.cooldown else None
+        stats = {}
+        with open_binary_input(args.input) as f:
+            stats = replay_capture(iter_report_batches(f, stats), args.output, allowlist,
+                                   args.format, args.facility_code, cooldown, args.all,
+                                   args.output_format, stats)
+
+        if args.unseen:
+            unseen = sorted(allowlist - stats['seen'])
+            with open_output(args.unseen) as out:
+                for chunk in iter_chunks(unseen, REPORT_BATCH):
+                    out.write(''.join(mac + '\n' for mac in format_mac_batch(chunk)))
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    print_summary(stats, allowlist, sys.stderr if args.output == '-' else sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
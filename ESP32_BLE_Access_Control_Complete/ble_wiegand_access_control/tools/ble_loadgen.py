@@ -0,0 +1,908 @@
+#!/usr/bin/env python3
+"""
+Synthetic BLE Advertisement Load Generator
+
+The onResult path (isDeviceAuthorized, isDeviceInCooldown,
+updateDeviceCooldown) has only ever seen a handful of devices at once.
+This tool generates advertisement streams of any size for a busy entrance
+and replays them through host models of the allowlist lookup and the
+cooldown ring:
+
+- Population: a fixed set of devices, a share of them enrolled, arriving
+  as a Poisson process and staying an exponential dwell time. Devices come
+  back on later visits, as staff do.
+- Per device: an advertising interval picked from a list (plus the 0-10 ms
+  random advDelay of the BLE spec) and, for a share of devices, a
+  resolvable private address that rotates every --rotation seconds; an
+  enrolled phone that randomizes never matches its allowlist entry.
+- Per advertisement: a reception probability, and an RSSI around the
+  visit's mean (visits differ by --rssi-spread, advertisements within a
+  visit by --rssi-jitter; both approximately normal).
+
+Every random value is a hash of (seed, quantity, index) instead of a draw
+from a shared generator, so a seed gives the same stream with or without
+NumPy and in any batch size. With NumPy, whole batches of visits are
+generated at once, fast enough for hundreds of millions of events.
+
+Streams are written in a compact binary format (16 bytes per event), or
+as CSV/NDJSON with the Time, MAC and Authorized columns that
+scan_simulator.py --trace replays. The bench command times allowlist
+lookups (hash set, binary search over the sorted table as in
+authorized_devices.h, the firmware's linear scan on a sample, and NumPy)
+and cooldown rings of several sizes, with every advertisement delivered
+as a callback.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import json
+import math
+import time
+import heapq
+import bisect
+import struct
+import itertools
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; visits are then generated one at a time
+    np = None
+
+from credential_io import RecordWriter, open_binary_input, open_output, output_format_for
+from credential_formats import format_mac_batch
+from credential_bench import parse_size
+from ble_capture import CooldownRing
+from scan_simulator import DEFAULT_COOLDOWN_MS, DEFAULT_COOLDOWN_SLOTS, load_allowlist
+
+
+# Binary stream: a header, then one record per event in time order. A
+# record is the time in microseconds, then MAC | RSSI << 48 | flags << 56
+# (RSSI as a two's complement byte), both little-endian 64-bit
+MAGIC = b'BLELOAD\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sII')      # magic, version, record size
+RECORD = struct.Struct('<QQ')
+
+FLAG_AUTHORIZED = 0x01   # the advertised MAC is on the allowlist
+FLAG_ENROLLED = 0x02     # the device is enrolled, even if its address is private
+FLAG_PRIVATE = 0x04      # resolvable private (rotating) address
+
+OUTPUT_TYPES = ['binary', 'csv', 'ndjson']
+TRACE_COLUMNS = ['Time', 'MAC', 'Address Type', 'RSSI', 'Authorized', 'Enrolled']
+
+DEFAULT_DEVICES = 10000
+DEFAULT_ARRIVALS = 60.0
+DEFAULT_DURATION = 600.0
+DEFAULT_ADV_INTERVALS = [100.0]
+DEFAULT_ROTATION = 900.0      # s; Android and iOS rotate about every 15 minutes
+
+MIN_ADV_INTERVAL_MS = 20.0    # shortest advertising interval the spec allows
+ADV_DELAY_US = 10000          # random delay added to every interval
+MIN_DWELL_US = 1000000
+MAX_DWELL_US = 86400 * 1000000
+RSSI_MIN, RSSI_MAX = -127, 20
+
+# Events per batch; generation memory is a few times this many events
+BATCH_EVENTS = 1 << 20
+
+LOOKUPS = ['hash', 'sorted', 'linear', 'numpy']
+DEFAULT_LINEAR_SAMPLE = 10000
+
+# Hash streams, one per random quantity
+(_GAP, _DEVICE, _DWELL, _PHASE, _RSSI, _EVENT,
+ _MAC, _ENROLL, _RANDOMIZE, _INTERVAL, _OFFSET, _RPA) = range(12)
+
+_M64 = (1 << 64) - 1
+_MAC_MASK = (1 << 48) - 1
+# Resolvable private addresses: top two bits 01, the rest random
+_RPA_MASK = (1 << 46) - 1
+_RPA_BITS = 1 << 46
+# Advertisement k of visit v is hashed at v << 24 | k (MAX_DWELL_US at the
+# shortest interval is under 2**24 advertisements)
+_EVENT_SHIFT = 24
+
+
+def _mix(x):
+    """splitmix64 finalizer of a 64-bit integer"""
+    x = (x + 0x9E3779B97F4A7C15) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+
+def _mix_array(x):
+    """_mix of every element of a uint64 array (multiplications wrap)"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(h):
+    """Float in [0, 1) from a hash (exact, so the same with and without NumPy)"""
+    if np is not None and isinstance(h, np.ndarray):
+        return (h >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+    return (h >> 11) * 2.0 ** -53
+
+
+def _lanes(h, first, count):
+    """Sum of count 16-bit lanes of a hash, starting at lane first"""
+    if np is not None and isinstance(h, np.ndarray):
+        total = np.zeros(len(h), np.uint64)
+        for lane in range(first, first + count):
+            total += (h >> np.uint64(16 * lane)) & np.uint64(0xFFFF)
+        return total.astype(np.float64)
+    return float(sum((h >> 16 * lane) & 0xFFFF for lane in range(first, first + count)))
+
+
+class LoadProfile:
+    """Traffic at one entrance"""
+
+    def __init__(self, devices=DEFAULT_DEVICES, arrivals_per_min=DEFAULT_ARRIVALS,
+                 authorized_ratio=0.2, dwell=20.0, adv_intervals_ms=DEFAULT_ADV_INTERVALS,
+                 reception=0.9, rssi_mean=-70.0, rssi_spread=8.0, rssi_jitter=4.0,
+                 random_ratio=0.0, rotation=DEFAULT_ROTATION, duration=DEFAULT_DURATION,
+                 max_events=None, seed=1):
+        """
+        Args:
+            devices: Population size; every visit is by one of these devices
+            arrivals_per_min: Mean visits per minute (Poisson)
+            authorized_ratio: Fraction of devices that are enrolled
+            dwell: Mean seconds a visit stays in range (exponential, at least 1 s)
+            adv_intervals_ms: Advertising intervals; each device uses one of them
+            reception: Probability an advertisement is received
+            rssi_mean: Mean RSSI in dBm
+            rssi_spread: Standard deviation of a visit's mean RSSI, dB
+            rssi_jitter: Standard deviation of RSSI within a visit, dB
+            random_ratio: Fraction of devices advertising a rotating private address
+            rotation: Seconds between private address changes
+            duration: Seconds of arrivals, or None for no limit (needs max_events)
+            max_events: Stop after this many advertisements, or None
+            seed: Random seed
+        """
+        if devices < 1 or arrivals_per_min <= 0 or dwell <= 0 or rotation <= 0:
+            raise ValueError("Devices, arrivals, dwell and rotation must be positive")
+        if not adv_intervals_ms or min(adv_intervals_ms) < MIN_ADV_INTERVAL_MS:
+            raise ValueError(f"Advertising intervals must be at least {MIN_ADV_INTERVAL_MS:g} ms")
+        for name, value in (('Authorized ratio', authorized_ratio), ('Reception', reception),
+                            ('Random address ratio', random_ratio)):
+            if not 0 <= value <= 1:
+                raise ValueError(f"{name} must be between 0 and 1, got {value}")
+        if rssi_spread < 0 or rssi_jitter < 0:
+            raise ValueError("RSSI spread and jitter cannot be negative")
+        if duration is None and max_events is None:
+            raise ValueError("Either a duration or an event count is needed")
+        if duration is not None and duration <= 0:
+            raise ValueError("Duration must be positive")
+
+        self.devices = devices
+        self.arrivals_per_min = arrivals_per_min
+        self.authorized_ratio = authorized_ratio
+        self.dwell = dwell
+        self.adv_intervals_ms = list(adv_intervals_ms)
+        self.reception = reception
+        self.rssi_mean = rssi_mean
+        self.rssi_spread = rssi_spread
+        self.rssi_jitter = rssi_jitter
+        self.random_ratio = random_ratio
+        self.rotation = rotation
+        self.duration = duration
+        self.max_events = max_events
+        self.seed = seed
+
+        # Integer microseconds, so event times add up exactly
+        self.mean_gap_us = 60e6 / arrivals_per_min
+        self.dwell_us = dwell * 1e6
+        self.intervals_us = [round(ms * 1000) for ms in adv_intervals_ms]
+        self.rotation_us = round(rotation * 1e6)
+        self.duration_us = None if duration is None else round(duration * 1e6)
+        self.reception_threshold = round(reception * 65536)
+        # Sums of 4 (visit) and 2 (advertisement) uniform lanes, scaled to
+        # the requested standard deviation
+        self.spread_scale = rssi_spread * math.sqrt(3)
+        self.jitter_scale = rssi_jitter * math.sqrt(6)
+        self.streams = [_mix(((seed & ((1 << 56) - 1)) << 8) | stream) for stream in range(12)]
+
+    def events_per_visit(self):
+        """Expected received advertisements per visit"""
+        interval = sum(self.intervals_us) / len(self.intervals_us) + ADV_DELAY_US / 2
+        return max(1.0, max(self.dwell_us, MIN_DWELL_US) / interval * self.reception)
+
+    def to_dict(self):
+        """Settings as a JSON-serializable dictionary"""
+        return {'devices': self.devices, 'arrivals_per_min': self.arrivals_per_min,
+                'authorized_ratio': self.authorized_ratio, 'dwell': self.dwell,
+                'adv_intervals_ms': self.adv_intervals_ms, 'reception': self.reception,
+                'rssi_mean': self.rssi_mean, 'rssi_spread': self.rssi_spread,
+                'rssi_jitter': self.rssi_jitter, 'random_ratio': self.random_ratio,
+                'rotation': self.rotation, 'duration': self.duration,
+                'max_events': self.max_events, 'seed': self.seed}
+
+
+def device_table(profile):
+    """
+    Per-device attributes of the population
+
+    Args:
+        profile: LoadProfile
+
+    Returns:
+        Columns (identity MACs, enrolled, private, interval in µs, rotation
+        offset in µs), as NumPy arrays when available, else lists
+    """
+    streams = profile.streams
+    intervals = profile.intervals_us
+    if np is None:
+        ids = range(profile.devices)
+        return ([_mix(streams[_MAC] + d) & _MAC_MASK for d in ids],
+                [_uniform(_mix(streams[_ENROLL] + d)) < profile.authorized_ratio for d in ids],
+                [_uniform(_mix(streams[_RANDOMIZE] + d)) < profile.random_ratio for d in ids],
+                [intervals[_mix(streams[_INTERVAL] + d) % len(intervals)] for d in ids],
+                [_mix(streams[_OFFSET] + d) % profile.rotation_us for d in ids])
+
+    ids = np.arange(profile.devices, dtype=np.uint64)
+
+    def hashed(stream):
+        return _mix_array(ids + np.uint64(streams[stream]))
+
+    return (hashed(_MAC) & np.uint64(_MAC_MASK),
+            _uniform(hashed(_ENROLL)) < profile.authorized_ratio,
+            _uniform(hashed(_RANDOMIZE)) < profile.random_ratio,
+            np.array(intervals, np.int64)[(hashed(_INTERVAL) % np.uint64(len(intervals))).astype(np.intp)],
+            (hashed(_OFFSET) % np.uint64(profile.rotation_us)).astype(np.int64))
+
+
+def allowlist_macs(profile, table=None):
+    """
+    The enrolled devices' identity MACs, i.e. the allowlist of the profile
+
+    Args:
+        profile: LoadProfile
+        table: Result of device_table, if already built
+
+    Returns:
+        Sorted list of 48-bit MAC integers
+    """
+    macs, enrolled = (table or device_table(profile))[:2]
+    if np is None:
+        return sorted(mac for mac, flag in zip(macs, enrolled) if flag)
+    return np.unique(macs[enrolled]).tolist()
+
+
+def _visit_python(profile, table, v, clock):
+    """Start, device, dwell, phase, interval and mean RSSI of visit v"""
+    streams = profile.streams
+    start = clock + int(-math.log1p(-_uniform(_mix(streams[_GAP] + v))) * profile.mean_gap_us)
+    device = _mix(streams[_DEVICE] + v) % profile.devices
+    dwell = int(-math.log1p(-_uniform(_mix(streams[_DWELL] + v))) * profile.dwell_us)
+    dwell = min(MAX_DWELL_US, max(MIN_DWELL_US, dwell))
+    interval = table[3][device]
+    phase = int(_uniform(_mix(streams[_PHASE] + v)) * interval)
+    rssi = profile.rssi_mean + profile.spread_scale * (_lanes(_mix(streams[_RSSI] + v), 0, 4) / 65536.0 - 2.0)
+    return start, device, dwell, phase, interval, rssi
+
+
+def _generate_python(profile, table):
+    """Events one visit at a time, merged on a heap; see generate_events"""
+    macs, enrolled, private, _, offsets = table
+    streams = profile.streams
+    heap = []
+    clock = 0
+    v = 0
+    while True:
+        start, device, dwell, phase, interval, rssi_mean = _visit_python(profile, table, v, clock)
+        if profile.duration_us is not None and start >= profile.duration_us:
+            break
+        clock = start
+        # Everything before this visit starts is final
+        while heap and heap[0][0] < start:
+            yield heapq.heappop(heap)
+
+        flags = FLAG_ENROLLED if enrolled[device] else 0
+        if private[device]:
+            flags |= FLAG_PRIVATE
+        elif enrolled[device]:
+            flags |= FLAG_AUTHORIZED
+        end = start + dwell
+        t = start + phase
+        k = 0
+        while t < end:
+            h = _mix(streams[_EVENT] + (v << _EVENT_SHIFT | k))
+            if (h >> 16) & 0xFFFF < profile.reception_threshold:
+                rssi = round(rssi_mean + profile.jitter_scale * (_lanes(h, 2, 2) / 65536.0 - 1.0))
+                mac = macs[device]
+                if private[device]:
+                    epoch = (t + offsets[device]) // profile.rotation_us
+                    mac = _mix(streams[_RPA] + (device << 32 | epoch)) & _RPA_MASK | _RPA_BITS
+                heapq.heappush(heap, (t, v, k, mac, min(RSSI_MAX, max(RSSI_MIN, rssi)), flags))
+            t += interval + ((h & 0xFFFF) * (ADV_DELAY_US + 1) >> 16)
+            k += 1
+        v += 1
+    while heap:
+        yield heapq.heappop(heap)
+
+
+def _visit_events_numpy(profile, table, v0, start, dwell, device):
+    """Events of visits v0.. in (visit, advertisement) order; see generate_events"""
+    macs, enrolled, private, intervals, offsets = table
+    streams = profile.streams
+    count = len(start)
+    visits = np.arange(v0, v0 + count, dtype=np.uint64)
+    interval = intervals[device]
+    phase = (_uniform(_mix_array(visits + np.uint64(streams[_PHASE]))) * interval).astype(np.int64)
+    rssi_mean = profile.rssi_mean + profile.spread_scale * (
+        _lanes(_mix_array(visits + np.uint64(streams[_RSSI])), 0, 4) / 65536.0 - 2.0)
+
+    # Advertisement k is at least phase + k * interval in, so this bounds the count
+    n = np.where(dwell > phase, -((phase - dwell) // interval), 0)
+    first = np.cumsum(n) - n
+    vis = np.repeat(np.arange(count), n)
+    k = np.arange(len(vis), dtype=np.int64) - first[vis]
+    h = _mix_array(((visits[vis] << np.uint64(_EVENT_SHIFT)) | k.astype(np.uint64))
+                   + np.uint64(streams[_EVENT]))
+
+    # advDelay: each advertisement is delayed by the sum of the earlier draws
+    delay = (((h & np.uint64(0xFFFF)) * np.uint64(ADV_DELAY_US + 1)) >> np.uint64(16)).astype(np.int64)
+    before = np.cumsum(delay) - delay
+    before -= before[first[vis]]
+    t = start[vis] + phase[vis] + k * interval[vis] + before
+    keep = (t < (start + dwell)[vis]) & (((h >> np.uint64(16)) & np.uint64(0xFFFF))
+                                         < np.uint64(profile.reception_threshold))
+    t, h, vis = t[keep], h[keep], vis[keep]
+
+    rssi = np.rint(rssi_mean[vis] + profile.jitter_scale * (_lanes(h, 2, 2) / 65536.0 - 1.0))
+    rssi = np.clip(rssi, RSSI_MIN, RSSI_MAX).astype(np.int16)
+    dev = device[vis]
+    mac = macs[dev]
+    rotating = private[dev]
+    if rotating.any():
+        epoch = ((t[rotating] + offsets[dev[rotating]]) // profile.rotation_us).astype(np.uint64)
+        key = (dev[rotating].astype(np.uint64) << np.uint64(32)) | epoch
+        mac[rotating] = ((_mix_array(key + np.uint64(streams[_RPA])) & np.uint64(_RPA_MASK))
+                         | np.uint64(_RPA_BITS))
+    flags = (enrolled[dev].astype(np.uint8) * FLAG_ENROLLED
+             | rotating.astype(np.uint8) * FLAG_PRIVATE
+             | (enrolled[dev] & ~rotating).astype(np.uint8) * FLAG_AUTHORIZED)
+    return t, mac, rssi, flags
+
+
+def _generate_numpy(profile, table, batch_events):
+    """
+    Batches of events from groups of visits; see generate_events
+
+    Each group's events are merged with the ones left over from earlier
+    groups; the events before the next group's first arrival are final.
+    """
+    streams = profile.streams
+    group = max(1, int(batch_events / profile.events_per_visit()))
+    carry = None
+    clock = 0
+    v0 = 0
+    while True:
+        # One visit more than the group, whose start bounds the final events
+        visits = np.arange(v0, v0 + group + 1, dtype=np.uint64)
+        gaps = (-np.log1p(-_uniform(_mix_array(visits + np.uint64(streams[_GAP]))))
+                * profile.mean_gap_us).astype(np.int64)
+        start = clock + np.cumsum(gaps)
+        if profile.duration_us is not None:
+            last = int(np.searchsorted(start, profile.duration_us))
+        else:
+            last = group + 1
+        done = last <= group
+        start = start[:min(last, group)]
+        boundary = None if done else int(start[-1] + gaps[group])
+
+        count = len(start)
+        device = (_mix_array(visits[:count] + np.uint64(streams[_DEVICE]))
+                  % np.uint64(profile.devices)).astype(np.intp)
+        dwell = (-np.log1p(-_uniform(_mix_array(visits[:count] + np.uint64(streams[_DWELL]))))
+                 * profile.dwell_us).astype(np.int64)
+        dwell = np.clip(dwell, MIN_DWELL_US, MAX_DWELL_US)
+        columns = _visit_events_numpy(profile, table, v0, start, dwell, device)
+
+        if carry is not None:
+            columns = [np.concatenate([old, new]) for old, new in zip(carry, columns)]
+        order = np.argsort(columns[0], kind='stable')
+        columns = [column[order] for column in columns]
+        split = len(order) if done else int(np.searchsorted(columns[0], boundary))
+        if split:
+            yield [column[:split] for column in columns]
+        if done:
+            return
+        carry = [column[split:] for column in columns]
+        clock = int(start[-1])
+        v0 += group
+
+
+def generate_events(profile, batch_events=BATCH_EVENTS):
+    """
+    Generate the advertisement stream of a profile
+
+    Events are in time order (ties by visit, then advertisement), and the
+    stream only depends on the profile, not on NumPy or batch_events.
+
+    Args:
+        profile: LoadProfile
+        batch_events: Approximate events per batch
+
+    Yields:
+        Batches (times in µs, MACs, RSSIs, flags) of equal-length columns:
+        NumPy arrays when NumPy is available, else lists
+    """
+    table = device_table(profile)
+    remaining = profile.max_events
+
+    if np is None:
+        events = itertools.islice(_generate_python(profile, table), remaining)
+        batches = ([list(column) for column in zip(*chunk)]
+                   for chunk in iter(lambda: [e[:1] + e[3:] for _, e in
+                                              zip(range(batch_events), events)], []))
+    else:
+        batches = _generate_numpy(profile, table, batch_events)
+
+    for batch in batches:
+        if remaining is not None:
+            if len(batch[0]) >= remaining:
+                yield [column[:remaining] for column in batch]
+                return
+            remaining -= len(batch[0])
+        yield batch
+
+
+def write_binary(batches, stream):
+    """
+    Write events in the binary stream format
+
+    Args:
+        batches: Event batches from generate_events or read_binary
+        stream: Binary stream
+    """
+    stream.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size))
+    for times, macs, rssis, flags in batches:
+        if np is None:
+            stream.write(b''.join(RECORD.pack(t, mac | (rssi & 0xFF) << 48 | flag << 56)
+                                  for t, mac, rssi, flag in zip(times, macs, rssis, flags)))
+            continue
+        records = np.empty(len(times), [('time', '<u8'), ('packed', '<u8')])
+        records['time'] = times
+        records['packed'] = (np.asarray(macs, np.uint64)
+                             | (np.asarray(rssis, np.int16) & 0xFF).astype(np.uint64) << np.uint64(48)
+                             | np.asarray(flags, np.uint64) << np.uint64(56))
+        stream.write(records.tobytes())
+
+
+def read_binary(stream, batch_events=BATCH_EVENTS):
+    """
+    Read a binary event stream
+
+    Args:
+        stream: Binary stream, e.g. from open_binary_input
+        batch_events: Events per batch
+
+    Yields:
+        Batches as from generate_events
+    """
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a ble_loadgen.py binary stream")
+    _, version, size = HEADER.unpack(header)
+    if version != FORMAT_VERSION or size != RECORD.size:
+        raise ValueError(f"Unsupported stream version {version} (record size {size})")
+
+    buf = b''
+    for block in iter(lambda: stream.read(batch_events * RECORD.size), b''):
+        buf += block
+        whole = len(buf) - len(buf) % RECORD.size
+        if not whole:
+            continue
+        data, buf = buf[:whole], buf[whole:]
+        if np is None:
+            records = list(struct.iter_unpack('<QQ', data))
+            yield [[t for t, _ in records], [p & _MAC_MASK for _, p in records],
+                   [(p >> 48 & 0xFF) - ((p >> 48 & 0x80) << 1) for _, p in records],
+                   [p >> 56 for _, p in records]]
+        else:
+            records = np.frombuffer(data, [('time', '<u8'), ('packed', '<u8')])
+            packed = records['packed']
+            yield [records['time'].astype(np.int64), packed & np.uint64(_MAC_MASK),
+                   (packed >> np.uint64(48)).astype(np.uint8).view(np.int8).astype(np.int16),
+                   (packed >> np.uint64(56)).astype(np.uint8)]
+    if buf:
+        raise ValueError("Truncated binary stream")
+
+
+def write_trace(batches, output_file, output_format='csv'):
+    """
+    Write events as a CSV or NDJSON trace for scan_simulator.py --trace
+
+    Args:
+        batches: Event batches
+        output_file: Output filename, or '-' for stdout
+        output_format: 'csv' or 'ndjson'
+    """
+    with open_output(output_file) as out:
+        writer = RecordWriter(out, TRACE_COLUMNS, output_format)
+        for times, macs, rssis, flags in batches:
+            if np is not None:
+                times, macs, rssis, flags = (column.tolist() for column in (times, macs, rssis, flags))
+            writer.write_rows([
+                (t / 1e6, text, 'resolvable_private' if flag & FLAG_PRIVATE else 'public', rssi,
+                 bool(flag & FLAG_AUTHORIZED), bool(flag & FLAG_ENROLLED))
+                for t, text, rssi, flag in zip(times, format_mac_batch(macs), rssis, flags)])
+
+
+def count_events(stats, flags):
+    """Add a batch's events to stats by flag"""
+    if np is None:
+        counts = [0] * 8
+        for flag in flags:
+            counts[flag] += 1
+    else:
+        counts = np.bincount(flags, minlength=8).tolist()
+    stats['events'] += sum(counts)
+    for name, bit in (('authorized', FLAG_AUTHORIZED), ('enrolled', FLAG_ENROLLED),
+                      ('private', FLAG_PRIVATE)):
+        stats[name] += sum(count for flag, count in enumerate(counts) if flag & bit)
+    # Enrolled phones hidden behind a private address
+    stats['enrolled_private'] += counts[FLAG_ENROLLED | FLAG_PRIVATE]
+
+
+def _new_stats():
+    return {'events': 0, 'authorized': 0, 'enrolled': 0, 'private': 0, 'enrolled_private': 0,
+            'first': None, 'last': None}
+
+
+def _timed(batches, stats):
+    """Batches, with their production time added to stats['source_s'] and counts to stats"""
+    stats.setdefault('source_s', 0.0)
+    iterator = iter(batches)
+    while True:
+        started = time.perf_counter()
+        batch = next(iterator, None)
+        stats['source_s'] += time.perf_counter() - started
+        if batch is None:
+            return
+        if len(batch[0]):
+            count_events(stats, batch[3])
+            if stats['first'] is None:
+                stats['first'] = int(batch[0][0])
+            stats['last'] = int(batch[0][-1])
+            yield batch
+
+
+def _lookup_hash(macs, allowlist):
+    table = allowlist['set']
+    return [mac in table for mac in macs]
+
+
+def _lookup_sorted(macs, allowlist):
+    table = allowlist['sorted']
+    size = len(table)
+    found = [bisect.bisect_left(table, mac) for mac in macs]
+    return [i < size and table[i] == mac for i, mac in zip(found, macs)]
+
+
+def _lookup_linear(macs, allowlist):
+    table = allowlist['sorted']
+    return [mac in table for mac in macs]
+
+
+def _lookup_numpy(macs, allowlist):
+    table = allowlist['array']
+    if not len(table):
+        return np.zeros(len(macs), bool)
+    found = np.searchsorted(table, macs)
+    return table[np.minimum(found, len(table) - 1)] == macs
+
+
+_LOOKUP_FUNCTIONS = {'hash': _lookup_hash, 'sorted': _lookup_sorted, 'linear': _lookup_linear,
+                     'numpy': _lookup_numpy}
+
+
+def bench(batches, allowlist, lookups=None, cooldown_ms=DEFAULT_COOLDOWN_MS,
+          slots=(DEFAULT_COOLDOWN_SLOTS,), linear_sample=DEFAULT_LINEAR_SAMPLE):
+    """
+    Time allowlist lookups and cooldown rings over an event stream
+
+    Every lookup is checked against the Authorized flag of the events. The
+    rings see the authorized events in time order, like
+    isDeviceInCooldown/updateDeviceCooldown with every advertisement as a
+    callback; 'unbounded' is a table that never evicts, for reference.
+    Eviction duplicates are sends within the cooldown of the device's
+    previous send, which only happen after its slot was overwritten.
+
+    Args:
+        batches: Event batches from generate_events or read_binary
+        allowlist: Iterable of authorized MAC integers
+        lookups: Lookup strategies (default: all of LOOKUPS available)
+        cooldown_ms: DEVICE_COOLDOWN_MS
+        slots: Cooldown ring sizes
+        linear_sample: Events timed with the linear scan, which is O(allowlist)
+
+    Returns:
+        Dictionary of results
+    """
+    if lookups is None:
+        lookups = [name for name in LOOKUPS if name != 'numpy' or np is not None]
+    ordered = sorted(set(allowlist))
+    tables = {'set': set(ordered), 'sorted': ordered}
+    if np is not None:
+        tables['array'] = np.array(ordered, np.uint64)
+
+    stats = _new_stats()
+    lookup = {name: {'events': 0, 'seconds': 0.0, 'mismatches': 0} for name in lookups}
+    rings = {size: (CooldownRing(cooldown_ms, size) if size else None) for size in slots}
+    unbounded = {}
+    cooldown = {size: {'sends': 0, 'suppressed': 0, 'eviction_duplicates': 0, 'seconds': 0.0,
+                       'last_sent': {}} for size in list(slots) + ['unbounded']}
+    limit = cooldown_ms / 1000
+
+    def send_unbounded(mac, t):
+        last = unbounded.get(mac)
+        if last is not None and t - last < limit:
+            return False
+        unbounded[mac] = t
+        return True
+
+    for times, macs, rssis, flags in _timed(batches, stats):
+        mac_list = macs.tolist() if np is not None else macs
+        if np is not None:
+            expected = (flags & FLAG_AUTHORIZED).astype(bool).tolist()
+        else:
+            expected = [bool(flag & FLAG_AUTHORIZED) for flag in flags]
+
+        for name in lookups:
+            result = lookup[name]
+            events = mac_list
+            if name == 'linear':
+                events = mac_list[:max(0, linear_sample - result['events'])]
+                if not events:
+                    continue
+            started = time.perf_counter()
+            found = _LOOKUP_FUNCTIONS[name](macs if name == 'numpy' else events, tables)
+            result['seconds'] += time.perf_counter() - started
+            result['events'] += len(events)
+            if name == 'numpy':
+                found = found.tolist()
+            result['mismatches'] += sum(1 for got, want in zip(found, expected) if got != want)
+
+        authorized = [i for i, flag in enumerate(expected) if flag]
+        seconds = times.tolist() if np is not None else times
+        pairs = [(mac_list[i], seconds[i] / 1e6) for i in authorized]
+        for size, result in cooldown.items():
+            send = send_unbounded if size == 'unbounded' else \
+                (rings[size].send if rings[size] is not None else (lambda mac, t: True))
+            started = time.perf_counter()
+            decisions = [send(mac, t) for mac, t in pairs]
+            result['seconds'] += time.perf_counter() - started
+            last_sent = result['last_sent']
+            for (mac, t), sent in zip(pairs, decisions):
+                if not sent:
+                    result['suppressed'] += 1
+                    continue
+                result['sends'] += 1
+                previous = last_sent.get(mac)
+                if previous is not None and t - previous < limit:
+                    result['eviction_duplicates'] += 1
+                last_sent[mac] = t
+
+    for result in list(lookup.values()) + list(cooldown.values()):
+        result.pop('last_sent', None)
+    for name, result in lookup.items():
+        result['ns_per_event'] = round(result['seconds'] / result['events'] * 1e9, 1) \
+            if result['events'] else None
+    for result in cooldown.values():
+        result['ns_per_event'] = round(result['seconds'] / stats['authorized'] * 1e9, 1) \
+            if stats['authorized'] else None
+    return {'stream': stats, 'allowlist': len(ordered), 'cooldown_ms': cooldown_ms,
+            'lookups': lookup, 'cooldown': {str(size): result for size, result in cooldown.items()}}
+
+
+def print_stream(stats, stream=None):
+    """
+    Print the event counts of a stream
+
+    Args:
+        stats: Stream statistics from generate or bench
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+    events = stats['events']
+    span = (stats['last'] - stats['first']) / 1e6 if stats['first'] is not None else 0.0
+    rate = f"{events / stats['source_s']:,.0f}" if stats.get('source_s') else '-'
+    print(f"Events:              {events:,} over {span:,.1f} s ({rate} events/s produced)", file=stream)
+    if events:
+        print(f"Authorized:          {stats['authorized']:,} ({stats['authorized'] / events:.1%})",
+              file=stream)
+        print(f"Private addresses:   {stats['private']:,} ({stats['private'] / events:.1%}), "
+              f"{stats['enrolled_private']:,} from enrolled devices that can never match", file=stream)
+
+
+def print_bench(report, stream=None):
+    """
+    Print a bench report
+
+    Args:
+        report: Dictionary from bench
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+    print("\n" + "=" * 72, file=stream)
+    print("ALLOWLIST AND COOLDOWN BENCHMARK", file=stream)
+    print("=" * 72, file=stream)
+    print_stream(report['stream'], stream)
+    print(f"Allowlist:           {report['allowlist']:,} MACs", file=stream)
+    print(f"\n{'Lookup':<10}{'Events':>14}{'ns/event':>12}{'M events/s':>12}{'Mismatches':>12}",
+          file=stream)
+    for name, result in report['lookups'].items():
+        ns = result['ns_per_event']
+        rate = f"{1e3 / ns:.2f}" if ns else '-'
+        print(f"{name:<10}{result['events']:>14,}{ns if ns is not None else '-':>12}{rate:>12}"
+              f"{result['mismatches']:>12,}", file=stream)
+    print(f"\nCooldown {report['cooldown_ms']} ms, authorized events only:", file=stream)
+    print(f"{'Slots':<10}{'Sends':>14}{'Suppressed':>12}{'Evict dups':>12}{'ns/event':>12}", file=stream)
+    for size, result in report['cooldown'].items():
+        ns = result['ns_per_event']
+        print(f"{size if size != '0' else 'none':<10}{result['sends']:>14,}{result['suppressed']:>12,}"
+              f"{result['eviction_duplicates']:>12,}{ns if ns is not None else '-':>12}", file=stream)
+    print("=" * 72 + "\n", file=stream)
+
+
+def _add_profile_arguments(parser):
+    """Add the LoadProfile options to a subcommand"""
+    parser.add_argument('--events', help='Stop after this many advertisements, e.g. 100M')
+    parser.add_argument('--duration', type=float,
+                        help=f'Seconds of arrivals (default: {DEFAULT_DURATION:g}, '
+                             f'unlimited with --events)')
+    parser.add_argument('--devices', type=int, default=DEFAULT_DEVICES,
+                        help=f'Device population (default: {DEFAULT_DEVICES})')
+    parser.add_argument('--arrivals', type=float, default=DEFAULT_ARRIVALS,
+                        help=f'Visits per minute (default: {DEFAULT_ARRIVALS:g})')
+    parser.add_argument('--authorized-ratio', type=float, default=0.2,
+                        help='Fraction of the population that is enrolled (default: 0.2)')
+    parser.add_argument('--dwell', type=float, default=20,
+                        help='Mean seconds in range per visit (default: 20)')
+    parser.add_argument('--adv-interval', type=float, nargs='+', default=DEFAULT_ADV_INTERVALS,
+                        help='Advertising intervals in ms, one per device at random, '
+                             'e.g. 100 211 1000 (default: 100)')
+    parser.add_argument('--reception', type=float, default=0.9,
+                        help='Probability an advertisement is received (default: 0.9)')
+    parser.add_argument('--rssi-mean', type=float, default=-70, help='Mean RSSI in dBm (default: -70)')
+    parser.add_argument('--rssi-spread', type=float, default=8,
+                        help='RSSI standard deviation between visits, dB (default: 8)')
+    parser.add_argument('--rssi-jitter', type=float, default=4,
+                        help='RSSI standard deviation within a visit, dB (default: 4)')
+    parser.add_argument('--random-ratio', type=float, default=0.0,
+                        help='Fraction of devices with a rotating private address (default: 0)')
+    parser.add_argument('--rotation', type=float, default=DEFAULT_ROTATION,
+                        help=f'Seconds between private address changes (default: {DEFAULT_ROTATION:g})')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+
+
+def _profile_from_args(args):
+    max_events = parse_size(args.events) if args.events else None
+    duration = args.duration if args.duration is not None or max_events else DEFAULT_DURATION
+    return LoadProfile(args.devices, args.arrivals, args.authorized_ratio, args.dwell,
+                       args.adv_interval, args.reception, args.rssi_mean, args.rssi_spread,
+                       args.rssi_jitter, args.random_ratio, args.rotation, duration, max_events,
+                       args.seed)
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic BLE advertisement load and benchmark allowlist/cooldown logic',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # 100 million advertisements from a 50,000-device campus, with its allowlist
+  python ble_loadgen.py generate --events 100M --devices 50000 --arrivals 600 \\
+      --adv-interval 100 211 1000 --random-ratio 0.3 -o campus.bin --allowlist-out campus_macs.txt
+
+  # A busy lobby hour as a trace for the scan loop simulator
+  python ble_loadgen.py generate --duration 3600 --arrivals 120 -o lobby.csv
+  python scan_simulator.py --trace lobby.csv --slots 10 32
+
+  # Benchmark lookups and cooldown rings on the fly, or on a saved stream
+  python ble_loadgen.py bench --events 20M --devices 50000 --slots 10 32 128 0
+  python ble_loadgen.py bench -i campus.bin --allowlist campus_macs.txt -o bench.json
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    generate = sub.add_parser('generate', help='Write an advertisement stream')
+    _add_profile_arguments(generate)
+    generate.add_argument('-o', '--output', required=True, help='Output file, or - for stdout')
+    generate.add_argument('--output-format', choices=OUTPUT_TYPES,
+                          help='binary, csv or ndjson (default: from the extension, '
+                               'binary unless .csv/.ndjson/.jsonl)')
+    generate.add_argument('--allowlist-out', help='Write the enrolled MACs to this file')
+
+    run = sub.add_parser('bench', help='Time allowlist lookups and cooldown rings')
+    _add_profile_arguments(run)
+    run.add_argument('-i', '--input', help='Binary stream to replay instead of generating one')
+    run.add_argument('--allowlist', help='MAC list for --input')
+    run.add_argument('--lookups', default=None,
+                     help=f"Lookup strategies, comma-separated (default: {','.join(LOOKUPS)})")
+    run.add_argument('--linear-sample', type=int, default=DEFAULT_LINEAR_SAMPLE,
+                     help=f'Events timed with the linear scan (default: {DEFAULT_LINEAR_SAMPLE})')
+    run.add_argument('--cooldown', type=int, default=DEFAULT_COOLDOWN_MS,
+                     help=f'DEVICE_COOLDOWN_MS (default: {DEFAULT_COOLDOWN_MS})')
+    run.add_argument('--slots', type=int, nargs='+', default=[DEFAULT_COOLDOWN_SLOTS],
+                     help=f'Cooldown ring sizes; 0 for no cooldown (default: {DEFAULT_COOLDOWN_SLOTS})')
+    run.add_argument('-o', '--output', help='Write the results as JSON to this file')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'generate':
+            profile = _profile_from_args(args)
+            output_format = args.output_format or (
+                'binary' if args.output == '-' else
+                output_format_for(args.output) if args.output.endswith(('.csv', '.ndjson', '.jsonl'))
+                else 'binary')
+            stats = _new_stats()
+            batches = _timed(generate_events(profile), stats)
+            if output_format == 'binary':
+                if args.output == '-':
+                    write_binary(batches, sys.stdout.buffer)
+                    sys.stdout.buffer.flush()
+                else:
+                    with open(args.output, 'wb') as out:
+                        write_binary(batches, out)
+            else:
+                write_trace(batches, args.output, output_format)
+
+            if args.allowlist_out:
+                with open_output(args.allowlist_out) as out:
+                    out.write(''.join(mac + '\n' for mac in format_mac_batch(allowlist_macs(profile))))
+            summary = sys.stderr if args.output == '-' else sys.stdout
+            print_stream(stats, summary)
+            if args.output != '-':
+                print(f"Stream written to {args.output}", file=summary)
+            return
+
+        lookups = None
+        if args.lookups:
+            lookups = [name.strip() for name in args.lookups.split(',')]
+            unknown = set(lookups) - set(LOOKUPS)
+            if unknown:
+                parser.error(f"unknown lookup(s): {', '.join(sorted(unknown))}")
+            if 'numpy' in lookups and np is None:
+                parser.error('the numpy lookup needs NumPy')
+        if any(size < 0 for size in args.slots) or args.cooldown < 0:
+            parser.error('--slots and --cooldown cannot be negative')
+
+        if args.input:
+            if not args.allowlist:
+                parser.error('--input needs --allowlist')
+            allowlist = load_allowlist(args.allowlist)
+            with open_binary_input(args.input) as f:
+                report = bench(read_binary(f), allowlist, lookups, args.cooldown, args.slots,
+                               args.linear_sample)
+        else:
+            profile = _profile_from_args(args)
+            report = bench(generate_events(profile), allowlist_macs(profile), lookups,
+                           args.cooldown, args.slots, args.linear_sample)
+            report['profile'] = profile.to_dict()
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    print_bench(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Collision-free Wiegand Credential Allocator
+
+The default MAC-derived mapping gives two devices the same credential
+whenever they share the bytes a format keeps (see credential_collisions.py).
+This tool assigns every MAC a unique 16-bit card number instead:
+
+- The start slot is a keyed BLAKE2b hash of the MAC, so nearby MACs are
+  spread across the card space and the result is reproducible.
+- Taken slots are skipped by linear probing over a 65536-entry occupancy
+  map per facility code (one bytearray.find call, so inserts stay
+  amortized O(1) even for bulk enrollments of 50k+ MACs).
+- Assignments are kept in an append-only CSV table, so an existing
+  assignment never moves when new devices are enrolled. A job holds an
+  exclusive lock on the table (a .lock file next to it) from loading it
+  until close(), so concurrent enrollments queue instead of handing the
+  same free card number to different MACs.
+
+W26 credentials use the configured facility code, which is recorded with
+every assignment; a table only ever holds one W26 facility code, so a
+different -c is refused rather than leaving old devices on the old code.
+W34 credentials keep the facility code derived from MAC bytes 3-4, as
+mac_to_credential.py does, and only the card number is allocated.
+
+The table can be exported as a C header that the firmware's sendCredential
+can search instead of deriving credentials from MAC bytes.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import csv
+import hashlib
+
+try:
+    import fcntl
+except ImportError:  # Windows; tables are then not locked against concurrent jobs
+    fcntl = None
+
+from credential_io import DEFAULT_CHUNK_SIZE, iter_chunks, iter_mac_lines, open_input
+from credential_formats import format_mac_batch, parse_mac_batch, resolve_formats
+
+
+TABLE_FIELDS = ['MAC Address', 'Format', 'Facility Code', 'Card Number']
+
+CARD_SPACE = 1 << 16
+
+DEFAULT_FACILITY_CODE = 123
+
+# Fixed key so that start slots are stable across runs and machines
+HASH_KEY = b'net2-ble-allocator'
+
+
+def _start_slot(mac_value):
+    """
+    Deterministic start slot in the 16-bit card space for a MAC
+
+    Args:
+        mac_value: 48-bit MAC integer
+
+    Returns:
+        Card number to start probing from
+    """
+    digest = hashlib.blake2b(mac_value.to_bytes(6, 'big'), digest_size=4, key=HASH_KEY).digest()
+    return int.from_bytes(digest, 'big') % CARD_SPACE
+
+
+class CredentialAllocator:
+    """
+    Persistent table of unique W26/W34 credential assignments
+    """
+
+    def __init__(self, table_file, facility_code=None):
+        """
+        Args:
+            table_file: Assignment table CSV (created on first save)
+            facility_code: Facility code for new 26-bit assignments (default:
+                the one already in the table, else DEFAULT_FACILITY_CODE)
+
+        Raises:
+            ValueError: If the table's 26-bit assignments use another facility code
+        """
+        self.table_file = table_file
+        # format -> {mac: (facility_code, card_number)}
+        self.assignments = {'26': {}, '34': {}}
+        # (format, facility_code) -> occupancy bytearray, 1 = card number taken
+        self._occupied = {}
+        self._pending = []
+
+        # Held until close(): another job must not allocate from a stale copy
+        self._lock = open(table_file + '.lock', 'a')
+        if fcntl is not None:
+            fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(table_file):
+                self._load()
+            self._check_facility_code(facility_code)
+        except BaseException:
+            self.close()
+            raise
+
+    def _check_facility_code(self, facility_code):
+        """Settle the W26 facility code against the one the table was enrolled with"""
+        table_codes = sorted({fc for fc, _ in self.assignments['26'].values()})
+        if facility_code is None:
+            facility_code = table_codes[0] if len(table_codes) == 1 else DEFAULT_FACILITY_CODE
+        if table_codes and table_codes != [facility_code]:
+            codes = ', '.join(str(fc) for fc in table_codes)
+            raise ValueError(f"Assignment table {self.table_file} has W26 credentials for facility "
+                             f"code {codes}, not {facility_code}; use -c {codes} or a new table "
+                             f"and re-enroll every device")
+        if not 0 <= facility_code <= 255:
+            raise ValueError(f"Facility code must be 0-255, got {facility_code}")
+        self.facility_code = facility_code
+
+    def _slots(self, format_code, facility_code):
+        """Occupancy map for one facility code of one format"""
+        key = (format_code, facility_code)
+        slots = self._occupied.get(key)
+        if slots is None:
+            slots = self._occupied[key] = bytearray(CARD_SPACE)
+        return slots
+
+    def _load(self):
+        """Load existing assignments from the table file"""
+        with open(self.table_file, newline='') as f:
+            for row in csv.DictReader(f):
+                mac = int(row['MAC Address'].replace(':', ''), 16)
+                format_code = row['Format']
+                fc, cn = int(row['Facility Code']), int(row['Card Number'])
+                slots = self._slots(format_code, fc)
+                if slots[cn]:
+                    raise ValueError(f"Assignment table {self.table_file} gives "
+                                     f"FC={fc} CN={cn} to more than one MAC")
+                slots[cn] = 1
+                self.assignments[format_code][mac] = (fc, cn)
+
+    def assign(self, mac_value, format_code):
+        """
+        Look up or allocate the credential for one MAC
+
+        Args:
+            mac_value: 48-bit MAC integer
+            format_code: '26' or '34'
+
+        Returns:
+            Tuple (facility_code, card_number)
+        """
+        existing = self.assignments[format_code].get(mac_value)
+        if existing is not None:
+            return existing
+
+        fc = self.facility_code if format_code == '26' else (mac_value >> 16) & 0xFFFF
+        slots = self._slots(format_code, fc)
+        start = _start_slot(mac_value)
+        cn = slots.find(0, start)
+        if cn < 0:
+            cn = slots.find(0, 0, start)
+        if cn < 0:
+            raise ValueError(f"No free card numbers left for W{format_code} facility code {fc}")
+
+        slots[cn] = 1
+        self.assignments[format_code][mac_value] = (fc, cn)
+        self._pending.append((mac_value, format_code, fc, cn))
+        return fc, cn
+
+    def assign_columns(self, values, format_type, skip=()):
+        """
+        Allocate credentials for a batch, as batch engine columns
+
+        Args:
+            values: Packed MAC integers from parse_mac_batch
+            format_type: '26', '34', '40', or 'all'
+            skip: Indexes of failed MACs to leave unassigned
+
+        Returns:
+            Dictionary of column name to list of ints, replacing the
+            MAC-derived W26/W34 columns from convert_batch
+        """
+        macs = values.tolist() if hasattr(values, 'tolist') else list(values)
+        columns = {}
+        for format_code in ['26', '34']:
+            if format_code not in resolve_formats(format_type):
+                continue
+            pairs = [(0, 0) if i in skip else self.assign(mac, format_code)
+                     for i, mac in enumerate(macs)]
+            columns[f'w{format_code}_facility_code'] = [fc for fc, _ in pairs]
+            columns[f'w{format_code}_card_number'] = [cn for _, cn in pairs]
+        return columns
+
+    def save(self):
+        """
+        Append new assignments to the table file
+
+        The table stays locked until close(), so more assignments can follow.
+
+        Returns:
+            Number of assignments written
+        """
+        if not self._pending:
+            return 0
+
+        new_file = not os.path.exists(self.table_file)
+        with open(self.table_file, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(TABLE_FIELDS)
+            macs = format_mac_batch([mac for mac, _, _, _ in self._pending])
+            writer.writerows((mac, format_code, fc, cn) for mac, (_, format_code, fc, cn)
+                             in zip(macs, self._pending))
+
+        count = len(self._pending)
+        self._pending = []
+        return count
+
+    def close(self):
+        """Release the table lock; unsaved assignments are discarded"""
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def export_header(self, output_file, format_code='26'):
+        """
+        Write the assignments for one format as a firmware lookup header
+
+        The header holds MACs as sorted 48-bit integers with parallel
+        facility code and card number arrays, plus a binary-search lookup
+        that sendCredential can call in place of macToCardNumber.
+
+        Args:
+            output_file: Header filename, e.g. allocated_credentials.h
+            format_code: '26' or '34'
+
+        Returns:
+            Number of entries written
+        """
+        entries = sorted(self.assignments[format_code].items())
+
+        with open(output_file, 'w') as f:
+            f.write(f"""/**
+ * Allocated Wiegand {format_code}-bit Credentials
+ *
+ * Generated by tools/credential_allocator.py from {os.path.basename(self.table_file)}.
+ * Do not edit by hand; re-run the allocator instead.
+ */
+
+#ifndef ALLOCATED_CREDENTIALS_H
+#define ALLOCATED_CREDENTIALS_H
+
+#include <stdint.h>
+#include <stdbool.h>
+
+#define ALLOCATED_CREDENTIAL_FORMAT {format_code}
+#define NUM_ALLOCATED_CREDENTIALS {len(entries)}
+
+// MAC addresses as 48-bit integers, sorted ascending
+static const uint64_t allocatedMacs[] = {{
+""")
+            for mac, _ in entries:
+                f.write(f"  0x{mac:012X}ULL,\n")
+            f.write("  0  // padding so the array is never empty\n};\n\n")
+
+            f.write("static const uint16_t allocatedFacilityCodes[] = {\n")
+            for _, (fc, _) in entries:
+                f.write(f"  {fc},\n")
+            f.write("  0\n};\n\n")
+
+            f.write("static const uint16_t allocatedCardNumbers[] = {\n")
+            for _, (_, cn) in entries:
+                f.write(f"  {cn},\n")
+            f.write("  0\n};\n\n")
+
+            f.write("""/**
+ * Parse "aa:bb:cc:dd:ee:ff" (any case, any separator) into a 48-bit integer
+ */
+static inline uint64_t allocatedMacFromString(const char* mac) {
+  uint64_t value = 0;
+  for (; *mac; mac++) {
+    char c = *mac;
+    if (c >= '0' && c <= '9') value = (value << 4) | (uint64_t)(c - '0');
+    else if (c >= 'a' && c <= 'f') value = (value << 4) | (uint64_t)(c - 'a' + 10);
+    else if (c >= 'A' && c <= 'F') value = (value << 4) | (uint64_t)(c - 'A' + 10);
+  }
+  return value;
+}
+
+/**
+ * Look up the allocated credential for a MAC address
+ * @param mac MAC address as a 48-bit integer
+ * @param facilityCode Receives the facility code
+ * @param cardNumber Receives the card number
+ * @return true if the MAC has an allocated credential
+ */
+static inline bool lookupAllocatedCredential(uint64_t mac, uint32_t* facilityCode,
+                                             uint32_t* cardNumber) {
+  int low = 0;
+  int high = NUM_ALLOCATED_CREDENTIALS - 1;
+  while (low <= high) {
+    int mid = low + (high - low) / 2;
+    if (allocatedMacs[mid] == mac) {
+      *facilityCode = allocatedFacilityCodes[mid];
+      *cardNumber = allocatedCardNumbers[mid];
+      return true;
+    }
+    if (allocatedMacs[mid] < mac) {
+      low = mid + 1;
+    } else {
+      high = mid - 1;
+    }
+  }
+  return false;
+}
+
+#endif // ALLOCATED_CREDENTIALS_H
+""")
+
+        return len(entries)
+
+
+def allocate_file(allocator, mac_addresses, format_type='all', chunk_size=DEFAULT_CHUNK_SIZE,
+                  errors=None):
+    """
+    Allocate credentials for every MAC in an iterable
+
+    Args:
+        allocator: CredentialAllocator
+        mac_addresses: Iterable of MAC address strings
+        format_type: '26', '34', or 'all'
+        chunk_size: MACs parsed per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Number of MACs processed
+    """
+    errors = errors or sys.stderr
+    count = 0
+    for chunk in iter_chunks(mac_addresses, chunk_size):
+        values, failed = parse_mac_batch(chunk)
+        if failed:
+            errors.write(''.join(f"ERROR processing {chunk[i]}: {failed[i]}\n" for i in sorted(failed)))
+        allocator.assign_columns(values, format_type, failed)
+        count += len(chunk) - len(failed)
+    return count
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Assign unique Wiegand credentials to BLE MAC addresses',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Enroll a MAC list into the assignment table
+  python credential_allocator.py -i mac_list.txt -t assignments.csv
+
+  # Export the 26-bit assignments for the firmware
+  python credential_allocator.py -t assignments.csv --export-header allocated_credentials.h -f 26
+
+  # Write a credentials CSV using the allocated numbers
+  python mac_to_credential.py -i mac_list.txt -o credentials.csv --allocate assignments.csv
+        """
+    )
+
+    parser.add_argument('-i', '--input', help='Input file with MAC addresses to enroll; - for stdin')
+    parser.add_argument('-t', '--table', required=True, help='Assignment table CSV')
+    parser.add_argument('-f', '--format', choices=['26', '34', 'all'], default='all',
+                       help='Formats to allocate; 26 or 34 for --export-header (default: all)')
+    parser.add_argument('-c', '--facility-code', type=int,
+                       help='Facility code for 26-bit assignments; must match the table\'s '
+                            f'(default: the table\'s, else {DEFAULT_FACILITY_CODE})')
+    parser.add_argument('--export-header', help='Write a firmware lookup header to this file')
+
+    args = parser.parse_args()
+
+    if args.export_header and args.format == 'all':
+        parser.error('--export-header needs -f 26 or -f 34')
+
+    try:
+        with CredentialAllocator(args.table, args.facility_code) as allocator:
+            if args.input:
+                with open_input(args.input) as f:
+                    count = allocate_file(allocator, iter_mac_lines(f), args.format)
+                added = allocator.save()
+                print(f"Processed {count} MACs, {added} new assignments saved to {args.table}")
+
+            if args.export_header:
+                count = allocator.export_header(args.export_header, args.format)
+                print(f"Header with {count} W{args.format} credentials written to "
+                      f"{args.export_header}")
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
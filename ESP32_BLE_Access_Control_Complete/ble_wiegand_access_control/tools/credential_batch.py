@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Batch Conversion Helpers
+
+The chunked MAC -> credential pipeline shared by the converter CLIs and
+the fleet tools (credential_sync.py, credential_service.py, site_build.py,
+allowlist_header.py, credential_shards.py, credential_store.py,
+wiegand_frames.py): parse a chunk with parse_mac_batch, encode it with
+convert_batch, optionally swap in allocated W26/W34 credentials, and report
+the MACs that failed. Chunks are yielded as columns or as output rows, so
+memory stays flat whatever the input size.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+from contextlib import nullcontext
+
+from credential_formats import convert_batch, format_mac_batch, parse_mac_batch
+from credential_io import DEFAULT_CHUNK_SIZE, iter_chunks
+
+
+_NO_STAGE = nullcontext()
+
+
+def profile_stage(profile, name):
+    """Stage timer of an optional PipelineProfile"""
+    return _NO_STAGE if profile is None else profile.stage(name)
+
+
+def batch_columns(mac_addresses, format_type='all', facility_code=123, allocator=None,
+                  profile=None):
+    """
+    Convert a list of MAC addresses into packed MACs and credential columns
+
+    Args:
+        mac_addresses: List of MAC address strings
+        format_type: Format code, 'all', or comma-separated codes (see credential_formats.py)
+        facility_code: Facility code for 26-bit format
+        allocator: Optional CredentialAllocator supplying unique W26/W34
+                   credentials instead of the MAC-derived ones
+        profile: Optional PipelineProfile (see credential_profile.py)
+
+    Returns:
+        Tuple (values, columns, errors): packed MACs from parse_mac_batch,
+        the columns from convert_batch, and a dict of input index to ValueError
+    """
+    with profile_stage(profile, 'parse'):
+        values, errors = parse_mac_batch(mac_addresses)
+
+    with profile_stage(profile, 'convert'):
+        try:
+            columns = convert_batch(values, format_type, facility_code)
+        except ValueError as e:
+            # Same outcome as the per-MAC path: every parsable MAC fails on the facility code
+            columns = convert_batch(values, format_type, 0)
+            errors = {i: errors.get(i, e) for i in range(len(values))}
+
+        if allocator is not None:
+            columns.update(allocator.assign_columns(values, format_type, errors))
+
+    return values, columns, errors
+
+
+def batch_records(mac_addresses, format_type='all', facility_code=123, allocator=None):
+    """
+    Convert a list of MAC addresses through the batch engine
+
+    Args:
+        mac_addresses: List of MAC address strings
+        format_type: Format code, 'all', or comma-separated codes (see credential_formats.py)
+        facility_code: Facility code for 26-bit format
+        allocator: Optional CredentialAllocator supplying unique W26/W34
+                   credentials instead of the MAC-derived ones
+
+    Returns:
+        Tuple (macs, columns, errors): normalized MAC strings, the columns
+        from convert_batch, and a dict of input index to ValueError
+    """
+    values, columns, errors = batch_columns(mac_addresses, format_type, facility_code, allocator)
+    return format_mac_batch(values), columns, errors
+
+
+def iter_column_chunks(mac_addresses, format_type='all', facility_code=123,
+                       chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None, profile=None):
+    """
+    Lazily convert MAC addresses into credential columns, one chunk at a time
+
+    Failed MACs are reported to the error stream; their slots stay in the
+    yielded columns and are listed in the failed dict.
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        format_type: Format code, 'all', or comma-separated codes (see credential_formats.py)
+        facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+        profile: Optional PipelineProfile (see credential_profile.py)
+
+    Yields:
+        Tuples (values, columns, failed) as returned by batch_columns
+    """
+    if errors is None:
+        errors = sys.stderr
+
+    chunks = iter_chunks(mac_addresses, chunk_size)
+    if profile is not None:
+        chunks = profile.timed('read', chunks)
+
+    for chunk in chunks:
+        values, columns, failed = batch_columns(chunk, format_type, facility_code, allocator,
+                                                profile)
+        if failed:
+            with profile_stage(profile, 'errors'):
+                errors.write(''.join(f"ERROR processing {chunk[i]}: {failed[i]}\n"
+                                     for i in sorted(failed)))
+        if profile is not None:
+            profile.record_chunk(len(chunk), failed)
+        yield values, columns, failed
+
+
+def iter_row_chunks(mac_addresses, keys, format_type='all', facility_code=123,
+                    chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None, profile=None):
+    """
+    Lazily convert MAC addresses into output rows, one chunk at a time
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        keys: convert_batch column names to emit after the MAC column
+        format_type: Format code, 'all', or comma-separated codes (see credential_formats.py)
+        facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+        profile: Optional PipelineProfile (see credential_profile.py)
+
+    Yields:
+        Lists of row tuples, in input order
+    """
+    for values, columns, failed in iter_column_chunks(mac_addresses, format_type, facility_code,
+                                                      chunk_size, errors, allocator, profile):
+        with profile_stage(profile, 'format'):
+            rows = list(zip(format_mac_batch(values), *[columns[key] for key in keys]))
+            if failed:
+                rows = [row for i, row in enumerate(rows) if i not in failed]
+        yield rows
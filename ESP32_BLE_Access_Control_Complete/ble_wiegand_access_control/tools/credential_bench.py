@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for the Conversion and Export Paths
+
+Gives every change to the converters a performance baseline at estate
+scale. The suite runs on seeded synthetic MAC corpora (1k to 10M entries)
+that look like real lists: colon, dash, Cisco dot and bare forms in both
+cases, stray whitespace, comments, blank lines and about 4% malformed
+entries, as in example_mac_list.txt. It measures:
+
+- function: normalize_mac, mac_to_wiegand_26/34, mac_to_em4100 (per MAC),
+  parse_mac_batch, batch_convert and generate_csv, each in a fresh worker
+  process, so that its peak RSS is its own
+- cli:      mac_to_credential.py and mac_to_wiegand.py end to end on the
+  corpus file, with throughput and peak RSS
+- startup:  single-MAC CLI calls and a bare interpreter, median of N runs
+
+Results are written as JSON. Given a baseline file from an earlier run,
+every metric is compared and the run fails (exit code 1) when throughput
+drops, or time or memory grows, by more than the threshold.
+
+Corpora are cached by size and seed, so repeated runs do not regenerate
+multi-million line files.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # recorded in the results; the converters run either way
+    np = None
+
+from credential_io import iter_chunks, iter_mac_lines, open_input
+from credential_formats import (mac_to_em4100, mac_to_wiegand_26, mac_to_wiegand_34, normalize_mac,
+                                parse_mac_batch)
+from mac_to_credential import batch_convert, generate_csv
+
+
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = '1k,10k,100k,1M'
+
+# Bump when the corpus generator changes, so cached corpora are rebuilt
+CORPUS_VERSION = 1
+
+# Corpus lines held in memory at a time by function benchmarks
+BENCH_CHUNK = 1000000
+
+DEFAULT_THRESHOLD = 0.10
+
+# Small corpora are passed over repeatedly until a timed run lasts this long
+MIN_RUN_SECONDS = 0.2
+MAX_LOOPS = 1000
+
+KINDS = ['function', 'cli', 'startup']
+
+SAMPLE_MAC = 'AA:BB:CC:DD:EE:FF'
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry forms in a corpus and their share; malformed entries are errors
+# for every converter
+CORPUS_MIX = [
+    ('colon', 0.40),
+    ('colon_lower', 0.10),
+    ('dash', 0.15),
+    ('dot', 0.10),
+    ('bare', 0.15),
+    ('padded', 0.06),
+    ('malformed', 0.04),
+]
+
+# Extra non-entry lines per entry
+COMMENT_RATE = 0.005
+BLANK_RATE = 0.005
+
+
+def parse_size(text):
+    """
+    Parse a corpus size such as '10k', '1M' or '2500'
+
+    Args:
+        text: Size string
+
+    Returns:
+        Integer size
+    """
+    text = text.strip()
+    scale = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}.get(text[-1:], 1)
+    try:
+        size = int(float(text[:-1] if scale > 1 else text) * scale)
+    except ValueError:
+        raise ValueError(f"Invalid size: {text}")
+    if size < 1:
+        raise ValueError(f"Size must be positive: {text}")
+    return size
+
+
+def _malformed(rng, text):
+    """One malformed entry derived from a valid 12-digit hex string"""
+    kind = rng.randrange(4)
+    if kind == 0:
+        return ':'.join([text[i:i+2] for i in range(0, 10, 2)])      # too short
+    if kind == 1:
+        return ':'.join([text[i:i+2] for i in range(0, 12, 2)])[:-1] + 'G'  # bad hex
+    if kind == 2:
+        return text + 'AB'                                            # too long
+    return rng.choice(['unknown', 'n/a', 'TBD', 'device-7'])
+
+
+def write_corpus(path, count, seed=1):
+    """
+    Write a seeded synthetic MAC list
+
+    Args:
+        path: Output filename
+        count: MAC entries (valid and malformed), not counting comments and blank lines
+        seed: Random seed
+
+    Returns:
+        Number of lines written
+    """
+    rng = random.Random(seed)
+    forms = [form for form, _ in CORPUS_MIX]
+    weights = [share for _, share in CORPUS_MIX]
+    lines = 0
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(f"# Synthetic MAC corpus: {count} entries, seed {seed}\n")
+        lines += 1
+        for chunk in iter_chunks(range(count), 100000):
+            out = []
+            for form in rng.choices(forms, weights, k=len(chunk)):
+                text = f'{rng.getrandbits(48):012X}'
+                if form == 'colon':
+                    entry = ':'.join([text[i:i+2] for i in range(0, 12, 2)])
+                elif form == 'colon_lower':
+                    entry = ':'.join([text[i:i+2] for i in range(0, 12, 2)]).lower()
+                elif form == 'dash':
+                    entry = '-'.join([text[i:i+2] for i in range(0, 12, 2)])
+                elif form == 'dot':
+                    entry = '.'.join([text[i:i+4] for i in range(0, 12, 4)]).lower()
+                elif form == 'bare':
+                    entry = text
+                elif form == 'padded':
+                    entry = '  ' + ':'.join([text[i:i+2] for i in range(0, 12, 2)]) + ' \t'
+                else:
+                    entry = _malformed(rng, text)
+                out.append(entry)
+                roll = rng.random()
+                if roll < COMMENT_RATE:
+                    out.append('# decommissioned')
+                elif roll < COMMENT_RATE + BLANK_RATE:
+                    out.append('')
+            f.write('\n'.join(out) + '\n')
+            lines += len(out)
+    os.replace(path + '.tmp', path)
+    return lines
+
+
+def corpus_path(corpus_dir, count, seed=1):
+    """
+    Cached corpus for a size and seed, generating it if needed
+
+    Args:
+        corpus_dir: Cache directory
+        count: MAC entries
+        seed: Random seed
+
+    Returns:
+        Corpus filename
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f'macs_{count}_s{seed}_v{CORPUS_VERSION}.txt')
+    if not os.path.exists(path):
+        write_corpus(path, count, seed)
+    return path
+
+
+def _per_mac(function):
+    """Benchmark body calling a single-MAC function on every entry"""
+    def run(lines, tmp, sink):
+        for mac in lines:
+            try:
+                function(mac)
+            except ValueError:
+                pass
+    return run
+
+
+def _batch_convert(lines, tmp, sink):
+    with contextlib.redirect_stdout(sink):
+        batch_convert(lines, errors=sink)
+
+
+def _generate_csv(lines, tmp, sink):
+    with contextlib.redirect_stdout(sink):
+        generate_csv(lines, os.path.join(tmp, 'credentials.csv'), errors=sink)
+
+
+# Function benchmarks: name -> body(lines, tmp_dir, sink)
+FUNCTIONS = {
+    'normalize_mac': _per_mac(normalize_mac),
+    'mac_to_wiegand_26': _per_mac(mac_to_wiegand_26),
+    'mac_to_wiegand_34': _per_mac(mac_to_wiegand_34),
+    'mac_to_em4100': _per_mac(mac_to_em4100),
+    'parse_mac_batch': lambda lines, tmp, sink: parse_mac_batch(lines),
+    'batch_convert': _batch_convert,
+    'generate_csv': _generate_csv,
+}
+
+# CLI benchmarks: script -> extra arguments
+CLIS = {
+    'mac_to_credential.py': ['-f', 'all'],
+    'mac_to_wiegand.py': ['-f', 'both'],
+}
+
+
+def time_function(name, corpus, repeat=3):
+    """
+    Time one function benchmark over a corpus file, in this process
+
+    The corpus is read BENCH_CHUNK entries at a time; only the function
+    calls are timed. Corpora that fit in one chunk are passed over several
+    times per run, until a run takes at least MIN_RUN_SECONDS, so that
+    small sizes are not lost in timer noise.
+
+    Args:
+        name: Key of FUNCTIONS
+        corpus: Corpus filename
+        repeat: Runs; the fastest is kept
+
+    Returns:
+        Tuple (seconds per pass over the corpus, entries)
+    """
+    body = FUNCTIONS[name]
+
+    def chunks():
+        with open_input(corpus) as f:
+            yield from iter_chunks(iter_mac_lines(f), BENCH_CHUNK)
+
+    loaded = None
+    for chunk in chunks():
+        loaded = [chunk] if loaded is None else None
+        if loaded is None:
+            break
+
+    best = None
+    loops = 1
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as sink:
+        for run in range(repeat + (loaded is not None)):
+            elapsed = entries = 0
+            for _ in range(loops):
+                for lines in loaded or chunks():
+                    start = time.perf_counter()
+                    body(lines, tmp, sink)
+                    elapsed += time.perf_counter() - start
+                    entries += len(lines)
+            if loaded is not None and run == 0:
+                # Calibration pass for an in-memory corpus
+                loops = max(1, min(MAX_LOOPS, int(MIN_RUN_SECONDS / max(elapsed, 1e-9)) + 1))
+                continue
+            best = elapsed / loops if best is None else min(best, elapsed / loops)
+    return best, entries // loops
+
+
+def run_child(argv):
+    """
+    Run a child process and measure it
+
+    Args:
+        argv: Command line
+
+    Returns:
+        Tuple (stdout bytes, seconds, peak RSS in KB or None)
+    """
+    with tempfile.TemporaryFile() as err:
+        start = time.perf_counter()
+        # Fixed hash seed: dict and set layouts, and so timings, repeat across runs
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=err, cwd=TOOLS_DIR,
+                                env=dict(os.environ, PYTHONHASHSEED='0'))
+        if hasattr(os, 'wait4'):
+            out = proc.stdout.read()
+            _, status, usage = os.wait4(proc.pid, 0)
+            elapsed = time.perf_counter() - start
+            proc.stdout.close()
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in bytes on macOS and KB elsewhere
+            rss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        else:
+            out = proc.communicate()[0]
+            elapsed = time.perf_counter() - start
+            rss = None
+        if proc.returncode != 0:
+            err.seek(0)
+            raise ValueError(f"{' '.join(argv)} failed: {err.read().decode(errors='replace').strip()}")
+    return out, elapsed, rss
+
+
+def _result(kind, name, size, seconds, items=None, rss=None):
+    result = {'kind': kind, 'name': name, 'size': size, 'seconds': round(seconds, 6)}
+    if items is not None:
+        result['items_per_s'] = round(items / seconds, 1) if seconds else None
+    if rss is not None:
+        result['peak_rss_kb'] = rss
+    return result
+
+
+def bench_functions(corpus, size, names=None, repeat=3):
+    """
+    Run function benchmarks, each in a fresh worker process
+
+    Args:
+        corpus: Corpus filename
+        size: Corpus size, for the results
+        names: Function names (default: all of FUNCTIONS)
+        repeat: Runs per function; the fastest is kept
+
+    Returns:
+        List of result dictionaries
+    """
+    results = []
+    for name in names or FUNCTIONS:
+        out, _, rss = run_child([sys.executable, os.path.abspath(__file__), 'worker', name,
+                                 corpus, '--repeat', str(repeat)])
+        seconds, entries = json.loads(out)
+        results.append(_result('function', name, size, seconds, entries, rss))
+    return results
+
+
+def bench_clis(corpus, size):
+    """
+    Run each converter end to end on a corpus file
+
+    Args:
+        corpus: Corpus filename
+        size: Corpus size, for the results
+
+    Returns:
+        List of result dictionaries
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for script, extra in CLIS.items():
+            _, seconds, rss = run_child([sys.executable, script, '-i', corpus,
+                                         '-o', os.path.join(tmp, 'out.csv'),
+                                         '--errors', os.devnull] + extra)
+            results.append(_result('cli', script, size, seconds, size, rss))
+    return results
+
+
+def bench_startup(runs=10):
+    """
+    Median wall time of single-MAC CLI calls and of a bare interpreter
+
+    Args:
+        runs: Calls per command
+
+    Returns:
+        List of result dictionaries
+    """
+    commands = {'python': [sys.executable, '-c', 'pass']}
+    for script in CLIS:
+        commands[script] = [sys.executable, script, '-m', SAMPLE_MAC]
+    results = []
+    for name, argv in commands.items():
+        samples = [run_child(argv)[1:] for _ in range(runs)]
+        seconds = statistics.median(s for s, _ in samples)
+        rss = max((r for _, r in samples if r is not None), default=None)
+        results.append(_result('startup', name, 1, seconds, rss=rss))
+    return results
+
+
+def environment():
+    """
+    Describe the machine and build the results were taken on
+
+    Returns:
+        Dictionary of environment details
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=TOOLS_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__ if np is not None else None,
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def run_suite(sizes, kinds=KINDS, seed=1, repeat=3, startup_runs=10, corpus_dir=None,
+              stream=None):
+    """
+    Run the benchmark suite
+
+    Args:
+        sizes: Corpus sizes
+        kinds: Benchmark kinds to run (see KINDS)
+        seed: Corpus seed
+        repeat: Runs per function benchmark
+        startup_runs: Calls per startup benchmark
+        corpus_dir: Corpus cache directory
+        stream: Text stream for progress (default: stderr)
+
+    Returns:
+        Results dictionary, as written to JSON
+    """
+    stream = stream or sys.stderr
+    corpus_dir = corpus_dir or os.path.join(tempfile.gettempdir(), 'net2_bench_corpora')
+    results = []
+    for size in sizes:
+        if 'function' not in kinds and 'cli' not in kinds:
+            break
+        stream.write(f"Corpus of {size:,} entries...\n")
+        corpus = corpus_path(corpus_dir, size, seed)
+        if 'function' in kinds:
+            results.extend(bench_functions(corpus, size, repeat=repeat))
+        if 'cli' in kinds:
+            results.extend(bench_clis(corpus, size))
+    if 'startup' in kinds:
+        stream.write("Startup...\n")
+        results.extend(bench_startup(startup_runs))
+
+    return {'version': RESULTS_VERSION, 'environment': environment(),
+            'settings': {'seed': seed, 'repeat': repeat, 'startup_runs': startup_runs,
+                         'corpus_version': CORPUS_VERSION},
+            'results': results}
+
+
+def print_results(report, stream=None):
+    """
+    Print results as a table
+
+    Args:
+        report: Dictionary from run_suite
+        stream: Output stream (default: stdout)
+    """
+    out = stream or sys.stdout
+    env = report['environment']
+    out.write(f"\nPython {env['python']} on {env['machine']}, NumPy {env['numpy'] or 'not installed'}"
+              f", commit {env['commit'] or 'unknown'}\n")
+    out.write(f"{'Kind':<9}{'Benchmark':<22}{'Size':>12}{'Seconds':>11}{'Items/s':>14}{'Peak RSS':>11}\n")
+    for r in report['results']:
+        rate = f"{r['items_per_s']:,.0f}" if r.get('items_per_s') else '-'
+        rss = f"{r['peak_rss_kb'] / 1024:.1f} MB" if r.get('peak_rss_kb') else '-'
+        out.write(f"{r['kind']:<9}{r['name']:<22}{r['size']:>12,}{r['seconds']:>11.4f}"
+                  f"{rate:>14}{rss:>11}\n")
+
+
+# Metric -> True when higher is better
+METRICS = {'items_per_s': True, 'seconds': False, 'peak_rss_kb': False}
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, stream=None):
+    """
+    Compare a run against a baseline
+
+    Throughput is compared where a benchmark has it, and time only where it
+    does not (startup); peak RSS is always compared when both runs have it.
+
+    Args:
+        baseline: Results dictionary of the baseline run
+        current: Results dictionary of the new run
+        threshold: Allowed relative change for the worse, e.g. 0.10
+        stream: Output stream for the report (default: stdout)
+
+    Returns:
+        List of regression descriptions (empty when there are none)
+    """
+    out = stream or sys.stdout
+    base_env, env = baseline['environment'], current['environment']
+    for key in ['python', 'numpy', 'machine']:
+        if base_env.get(key) != env.get(key):
+            out.write(f"WARNING: baseline {key} {base_env.get(key)} differs from {env.get(key)}\n")
+
+    base = {(r['kind'], r['name'], r['size']): r for r in baseline['results']}
+    regressions = []
+    out.write(f"\n{'Benchmark':<40}{'Metric':<14}{'Baseline':>14}{'Current':>14}{'Change':>9}\n")
+    for r in current['results']:
+        key = (r['kind'], r['name'], r['size'])
+        old = base.get(key)
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric == 'seconds' and 'items_per_s' in r:
+                continue
+            if not old.get(metric) or r.get(metric) is None:
+                continue
+            change = r[metric] / old[metric] - 1
+            worse = -change if higher_is_better else change
+            status = ''
+            if worse > threshold:
+                status = '  REGRESSION'
+                regressions.append(f"{r['kind']} {r['name']} @ {r['size']:,}: {metric} "
+                                   f"{change:+.1%}")
+            label = f"{r['kind']} {r['name']} @ {r['size']:,}"
+            out.write(f"{label:<40}{metric:<14}{old[metric]:>14,.4g}{r[metric]:>14,.4g}"
+                      f"{change:>+9.1%}{status}\n")
+
+    missing = set(base) - {(r['kind'], r['name'], r['size']) for r in current['results']}
+    if missing:
+        out.write(f"{len(missing)} baseline benchmarks were not run\n")
+    return regressions
+
+
+def load_results(path):
+    """
+    Load a results file
+
+    Args:
+        path: JSON filename from run
+
+    Returns:
+        Results dictionary
+    """
+    with open(path) as f:
+        report = json.load(f)
+    if not isinstance(report, dict) or report.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{path} is not a version {RESULTS_VERSION} benchmark results file")
+    return report
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the MAC conversion and export paths',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Exit codes: 0 = ok, 1 = regression against the baseline, 2 = usage or input error
+
+Examples:
+  # Record a baseline
+  python credential_bench.py run -o baseline.json
+
+  # Check a change against it, failing on >10% regressions
+  python credential_bench.py run --baseline baseline.json -o after.json
+
+  # Estate scale: 10M entries, functions and CLIs only
+  python credential_bench.py run --sizes 1M,10M --kinds function,cli --repeat 1 -o big.json
+
+  # Compare two saved runs, or write a corpus for other tools
+  python credential_bench.py compare baseline.json after.json --threshold 0.05
+  python credential_bench.py corpus -n 100k -o mac_list.txt
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Run the benchmark suite')
+    run.add_argument('--sizes', default=DEFAULT_SIZES,
+                     help=f'Comma-separated corpus sizes, e.g. 1k,10M (default: {DEFAULT_SIZES})')
+    run.add_argument('--kinds', default=','.join(KINDS),
+                     help=f"Benchmark kinds to run (default: {','.join(KINDS)})")
+    run.add_argument('--seed', type=int, default=1, help='Corpus seed (default: 1)')
+    run.add_argument('--repeat', type=int, default=3,
+                     help='Runs per function benchmark, fastest kept (default: 3)')
+    run.add_argument('--startup-runs', type=int, default=10,
+                     help='Calls per startup benchmark, median kept (default: 10)')
+    run.add_argument('--corpus-dir', help='Corpus cache directory (default: system temp dir)')
+    run.add_argument('-o', '--output', help='Write the results as JSON to this file')
+    run.add_argument('--baseline', help='Compare against this results file')
+    run.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                     help=f'Allowed relative regression (default: {DEFAULT_THRESHOLD})')
+
+    compare = sub.add_parser('compare', help='Compare two results files')
+    compare.add_argument('baseline', help='Baseline results file')
+    compare.add_argument('current', help='New results file')
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help=f'Allowed relative regression (default: {DEFAULT_THRESHOLD})')
+
+    corpus = sub.add_parser('corpus', help='Write a synthetic MAC corpus')
+    corpus.add_argument('-n', '--count', default='100k', help='MAC entries (default: 100k)')
+    corpus.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    corpus.add_argument('-o', '--output', required=True, help='Output file')
+
+    worker = sub.add_parser('worker', help='Time one function benchmark (used by run)')
+    worker.add_argument('function', choices=list(FUNCTIONS))
+    worker.add_argument('corpus')
+    worker.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'worker':
+            print(json.dumps(time_function(args.function, args.corpus, args.repeat)))
+            return
+
+        if args.command == 'corpus':
+            lines = write_corpus(args.output, parse_size(args.count), args.seed)
+            print(f"Corpus with {lines:,} lines written to {args.output}")
+            return
+
+        if args.command == 'compare':
+            baseline, report = load_results(args.baseline), load_results(args.current)
+        else:
+            kinds = [kind.strip() for kind in args.kinds.split(',')]
+            unknown = set(kinds) - set(KINDS)
+            if unknown:
+                parser.error(f"unknown kind(s): {', '.join(sorted(unknown))}")
+            if args.repeat < 1 or args.startup_runs < 1:
+                parser.error('--repeat and --startup-runs must be positive')
+            sizes = [parse_size(size) for size in args.sizes.split(',')]
+            baseline = load_results(args.baseline) if args.baseline else None
+            report = run_suite(sizes, kinds, args.seed, args.repeat, args.startup_runs,
+                               args.corpus_dir)
+            print_results(report)
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(report, f, indent=2)
+                print(f"\nResults written to {args.output}")
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(2)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
+
+    if baseline is not None:
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
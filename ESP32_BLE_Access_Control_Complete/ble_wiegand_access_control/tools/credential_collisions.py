@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Credential Collision Detector
+
+Every supported format keeps only part of the MAC address: Wiegand 26-bit
+uses the last 2 bytes with one fixed facility code, Wiegand 34-bit the last
+4 bytes, and EM4100 the first 5 bytes. Two devices that share those bytes
+send the same credential and are indistinguishable to the controller.
+
+This tool scans a MAC list in a single hash-indexed pass and reports every
+group of distinct MACs that map to the same credential. Exit code 1 means
+at least one collision was found, so it can gate enrollment in CI.
+
+An index of an already-checked estate can be saved to SQLite; later runs
+check only the new MACs against it, without rescanning the full list. The
+index records the formats it was built for, and checking a format it does
+not hold is an error (or, with --update-index, the format is backfilled).
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import json
+import sqlite3
+
+from credential_io import (DEFAULT_CHUNK_SIZE, iter_chunks, iter_mac_lines, open_error_sink,
+                           open_input)
+from credential_formats import convert_batch, format_mac_batch, parse_mac_batch, resolve_formats
+
+
+# Format code -> (report label, field labels)
+COLLISION_FORMATS = {
+    '26': ('W26', ('FC', 'CN')),
+    '34': ('W34', ('FC', 'CN')),
+    '40': ('EM4100', ('Ver', 'ID')),
+}
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS credentials (
+    format TEXT NOT NULL,
+    credential INTEGER NOT NULL,
+    mac INTEGER NOT NULL,
+    PRIMARY KEY (format, credential, mac)
+) WITHOUT ROWID;
+"""
+
+
+def _format_list(format_type):
+    """Expand '26', '34', '40' or 'all' into a list of format codes"""
+    return list(COLLISION_FORMATS) if format_type == 'all' else [format_type]
+
+
+def credential_keys(values, format_type='all', facility_code=123):
+    """
+    Compute the credential each MAC sends, as one integer key per format
+
+    Uses convert_batch, so keys follow exactly the same rules as
+    mac_to_credential.py output.
+
+    Args:
+        values: Packed MAC integers from parse_mac_batch
+        format_type: '26', '34', '40', 'all', or a comma-separated list
+        facility_code: Facility code for 26-bit format
+
+    Returns:
+        Dictionary of format code to list of integer keys
+    """
+    codes = resolve_formats(format_type)
+    columns = convert_batch(values, format_type, facility_code)
+    keys = {}
+    if '26' in codes:
+        keys['26'] = [facility_code << 16 | cn for cn in columns['w26_card_number']]
+    if '34' in codes:
+        keys['34'] = [fc << 16 | cn for fc, cn in zip(columns['w34_facility_code'],
+                                                     columns['w34_card_number'])]
+    if '40' in codes:
+        keys['40'] = [ver << 32 | cid for ver, cid in zip(columns['em4100_version'],
+                                                         columns['em4100_card_id'])]
+    return keys
+
+
+def describe_credential(format_code, key):
+    """
+    Human-readable form of a credential key
+
+    Args:
+        format_code: '26', '34' or '40'
+        key: Integer key from credential_keys
+
+    Returns:
+        String such as 'W26 FC=123 CN=61183'
+    """
+    label, (first, second) = COLLISION_FORMATS[format_code]
+    if format_code == '40':
+        return f"{label} {first}={key >> 32} {second}={key & 0xFFFFFFFF}"
+    return f"{label} {first}={key >> 16} {second}={key & 0xFFFF}"
+
+
+def iter_valid_macs(mac_addresses, chunk_size, errors):
+    """Yield the packed MACs of each chunk, reporting bad MACs to errors"""
+    for chunk in iter_chunks(mac_addresses, chunk_size):
+        values, failed = parse_mac_batch(chunk)
+        if failed:
+            errors.write(''.join(f"ERROR processing {chunk[i]}: {failed[i]}\n" for i in sorted(failed)))
+            keep = [i for i in range(len(chunk)) if i not in failed]
+            values = values[keep] if hasattr(values, 'shape') else [values[i] for i in keep]
+        yield values
+
+
+def find_collisions(mac_addresses, format_type='all', facility_code=123, save_index=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Find credential collisions in one O(n) pass
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        save_index: Also write every MAC to this SQLite index during the pass
+        chunk_size: MACs parsed per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Tuple (collisions, stats). collisions maps format code to a dict of
+        key -> sorted list of distinct MAC integers sharing it; stats has
+        per-format counts.
+    """
+    errors = errors or sys.stderr
+    formats = _format_list(format_type)
+    first_seen = {code: {} for code in formats}
+    collisions = {code: {} for code in formats}
+    seen_macs = set()
+    db, indexed = open_index(save_index, facility_code, formats) if save_index else (None, formats)
+
+    for values in iter_valid_macs(mac_addresses, chunk_size, errors):
+        macs = values.tolist() if hasattr(values, 'tolist') else values
+        keys = credential_keys(values, ','.join(indexed), facility_code)
+        for code in formats:
+            index = first_seen[code]
+            clashes = collisions[code]
+            for mac, key in zip(macs, keys[code]):
+                other = index.setdefault(key, mac)
+                if other != mac:
+                    clashes.setdefault(key, {other}).add(mac)
+        if db is not None:
+            for code in indexed:
+                db.executemany("INSERT OR IGNORE INTO credentials VALUES (?, ?, ?)",
+                               zip([code] * len(macs), keys[code], macs))
+        seen_macs.update(macs)
+
+    if db is not None:
+        db.commit()
+        db.close()
+
+    stats = {code: {'macs': len(seen_macs), 'credentials': len(first_seen[code])}
+             for code in formats}
+    return _finish(collisions, stats), stats
+
+
+def _finish(collisions, stats):
+    """Sort collision groups and add group counts to stats"""
+    result = {}
+    for code, groups in collisions.items():
+        result[code] = {key: sorted(macs) for key, macs in sorted(groups.items())}
+        stats[code]['groups'] = len(groups)
+        stats[code]['colliding_macs'] = sum(len(macs) for macs in groups.values())
+    return result
+
+
+def _indexed_formats(db):
+    """Format codes an index holds; indexes without the meta row list their rows"""
+    row = db.execute("SELECT value FROM meta WHERE key = 'formats'").fetchone()
+    if row is not None:
+        return [code for code in row[0].split(',') if code]
+    rows = db.execute("SELECT DISTINCT format FROM credentials").fetchall()
+    return [code for code in COLLISION_FORMATS if (code,) in rows]
+
+
+def _backfill(db, formats, facility_code, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Add keys for more formats to every MAC already in an index"""
+    macs = [mac for mac, in db.execute("SELECT DISTINCT mac FROM credentials")]
+    with db:
+        for chunk in iter_chunks(macs, chunk_size):
+            keys = credential_keys(chunk, ','.join(formats), facility_code)
+            for code in formats:
+                db.executemany("INSERT OR IGNORE INTO credentials VALUES (?, ?, ?)",
+                               zip([code] * len(chunk), keys[code], chunk))
+
+
+def open_index(path, facility_code, formats=tuple(COLLISION_FORMATS), backfill=False):
+    """
+    Open a collision index, checking it was built with the same facility code
+    and holds every requested format
+
+    A new index is set up for the requested formats. Checking an index for a
+    format it was not built with would report no collisions for it, so that
+    is an error unless backfill is set.
+
+    Args:
+        path: Index database filename
+        facility_code: Facility code for 26-bit format
+        formats: Format codes that will be checked
+        backfill: Add missing formats for the indexed MACs instead of failing
+
+    Returns:
+        Tuple (sqlite3 connection, format codes the index holds); new MACs
+        must be added for all of them
+
+    Raises:
+        ValueError: If the facility code differs or formats are missing
+    """
+    db = sqlite3.connect(path)
+    # Bulk loads are dominated by B-tree page writes; trade durability of the
+    # last transaction for speed, the index can always be rebuilt
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute("PRAGMA cache_size = -131072")
+    db.executescript(INDEX_SCHEMA)
+    row = db.execute("SELECT value FROM meta WHERE key = 'facility_code'").fetchone()
+    if row is None:
+        with db:
+            db.execute("INSERT INTO meta VALUES ('facility_code', ?)", (str(facility_code),))
+    elif int(row[0]) != facility_code:
+        db.close()
+        raise ValueError(f"Index {path} was built with facility code {row[0]}, not {facility_code}")
+
+    stored = indexed = _indexed_formats(db)
+    empty = db.execute("SELECT 1 FROM credentials LIMIT 1").fetchone() is None
+    missing = [code for code in formats if code not in indexed]
+    if missing and not empty:
+        if not backfill:
+            db.close()
+            raise ValueError(f"Index {path} was built for formats {','.join(indexed)} and has no "
+                             f"{','.join(missing)} credentials; rebuild it with --save-index, or "
+                             f"add --update-index to backfill them")
+        _backfill(db, missing, facility_code)
+    if missing or empty:
+        indexed = [code for code in COLLISION_FORMATS if code in indexed or code in formats]
+    if indexed != stored or db.execute("SELECT 1 FROM meta WHERE key = 'formats'").fetchone() is None:
+        with db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('formats', ?)", (','.join(indexed),))
+    return db, indexed
+
+
+def check_against_index(path, mac_addresses, format_type='all', facility_code=123,
+                        update=False, chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Check new MACs against a saved index without rescanning the estate
+
+    Each batch of new MACs is joined against the indexed credentials, so
+    the cost is proportional to the number of new MACs.
+
+    Args:
+        path: Index database filename
+        mac_addresses: Iterable of new MAC address strings
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        update: Add the new MACs to the index afterwards, first backfilling
+            any requested format the index was not built with
+        chunk_size: MACs parsed per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Same (collisions, stats) as find_collisions, where each group holds
+        the new MACs plus the indexed MACs they clash with
+    """
+    errors = errors or sys.stderr
+    formats = _format_list(format_type)
+    db, indexed = open_index(path, facility_code, formats, backfill=update)
+    db.execute("CREATE TEMP TABLE incoming (format TEXT, credential INTEGER, mac INTEGER)")
+    collisions = {code: {} for code in formats}
+    new_macs = set()
+
+    for values in iter_valid_macs(mac_addresses, chunk_size, errors):
+        macs = values.tolist() if hasattr(values, 'tolist') else values
+        keys = credential_keys(values, ','.join(indexed), facility_code)
+        for code in indexed:
+            db.executemany("INSERT INTO incoming VALUES (?, ?, ?)",
+                           zip([code] * len(macs), keys[code], macs))
+        new_macs.update(macs)
+
+    # New vs indexed, and new vs new
+    query = """
+        SELECT i.format, i.credential, i.mac, c.mac FROM incoming i
+        JOIN credentials c ON c.format = i.format AND c.credential = i.credential
+        WHERE c.mac != i.mac
+        UNION
+        SELECT a.format, a.credential, a.mac, b.mac FROM incoming a
+        JOIN incoming b ON a.format = b.format AND a.credential = b.credential
+        WHERE a.mac < b.mac
+    """
+    for code, key, mac, other in db.execute(query):
+        if code not in collisions:
+            continue
+        collisions[code].setdefault(key, set()).update((mac, other))
+
+    stats = {code: {'macs': len(new_macs)} for code in formats}
+
+    if update:
+        with db:
+            db.execute("INSERT OR IGNORE INTO credentials SELECT format, credential, mac FROM incoming")
+    db.close()
+    return _finish(collisions, stats), stats
+
+
+def print_report(collisions, stats, stream=None, max_groups=None):
+    """
+    Print a collision report
+
+    Args:
+        collisions: Collision groups from find_collisions/check_against_index
+        stats: Per-format counts
+        stream: Text stream (default: stdout)
+        max_groups: Maximum groups to list per format (None for all)
+    """
+    stream = stream or sys.stdout
+    print("\n" + "="*60, file=stream)
+    print("CREDENTIAL COLLISION REPORT", file=stream)
+    print("="*60, file=stream)
+
+    for code, groups in collisions.items():
+        s = stats[code]
+        label = COLLISION_FORMATS[code][0]
+        print(f"\n{label}: {s['macs']} MACs checked, {s['groups']} collision groups, "
+              f"{s['colliding_macs']} MACs affected", file=stream)
+        for n, (key, macs) in enumerate(groups.items()):
+            if max_groups is not None and n >= max_groups:
+                print(f"  ... {len(groups) - max_groups} more groups", file=stream)
+                break
+            print(f"  {describe_credential(code, key)} ({len(macs)} MACs): "
+                  f"{', '.join(format_mac_batch(macs))}", file=stream)
+
+    print("\n" + "="*60 + "\n", file=stream)
+
+
+def report_to_json(collisions, stats):
+    """
+    Convert a collision report to a JSON-serializable dictionary
+
+    Args:
+        collisions: Collision groups from find_collisions/check_against_index
+        stats: Per-format counts
+
+    Returns:
+        Dictionary keyed by format label
+    """
+    report = {}
+    for code, groups in collisions.items():
+        label, (first, second) = COLLISION_FORMATS[code]
+        shift, mask = (32, 0xFFFFFFFF) if code == '40' else (16, 0xFFFF)
+        report[label] = dict(stats[code], collisions=[
+            {first: key >> shift, second: key & mask, 'count': len(macs),
+             'macs': format_mac_batch(macs)}
+            for key, macs in groups.items()])
+    return report
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Find BLE MACs that map to the same access control credential',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Exit codes: 0 = no collisions, 1 = collisions found, 2 = usage or input error
+
+Examples:
+  # Check a full MAC list for clashes in every format
+  python credential_collisions.py -i mac_list.txt
+
+  # Check the estate once and save an index
+  python credential_collisions.py -i estate.txt --save-index estate.db
+
+  # Check new enrollments against the saved index, then add them to it
+  python credential_collisions.py -i new_macs.txt --index estate.db --update-index
+        """
+    )
+
+    parser.add_argument('-i', '--input', required=True,
+                       help='Input file with MAC addresses (one per line); - for stdin')
+    parser.add_argument('-f', '--format', choices=['26', '34', '40', 'all'], default='all',
+                       help='Format to check (default: all)')
+    parser.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit Wiegand format (default: 123)')
+    parser.add_argument('--index', help='Check the input against this saved SQLite index')
+    parser.add_argument('--update-index', action='store_true',
+                       help='With --index, add the input MACs to the index after checking '
+                            '(and backfill formats the index lacks)')
+    parser.add_argument('--save-index', help='During a full scan, also save an index to this file')
+    parser.add_argument('--json', help='Also write the report as JSON to this file')
+    parser.add_argument('--max-groups', type=int,
+                       help='List at most this many groups per format in the text report')
+    parser.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    args = parser.parse_args()
+
+    if not 0 <= args.facility_code <= 255:
+        print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
+        sys.exit(2)
+    if args.update_index and not args.index:
+        parser.error('--update-index needs --index')
+    if args.index and args.save_index:
+        parser.error('use --update-index to extend an existing index')
+
+    try:
+        with open_error_sink(args.errors) as errors:
+            with open_input(args.input) as f:
+                if args.index:
+                    collisions, stats = check_against_index(
+                        args.index, iter_mac_lines(f), args.format, args.facility_code,
+                        args.update_index, errors=errors)
+                else:
+                    collisions, stats = find_collisions(
+                        iter_mac_lines(f), args.format, args.facility_code, args.save_index,
+                        errors=errors)
+    except FileNotFoundError:
+        print(f"ERROR: File not found: {args.input}")
+        sys.exit(2)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
+
+    print_report(collisions, stats, max_groups=args.max_groups)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report_to_json(collisions, stats), f, indent=2)
+
+    sys.exit(1 if any(collisions.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
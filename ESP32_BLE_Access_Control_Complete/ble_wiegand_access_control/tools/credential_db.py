@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Compact Binary Credential Database (.ncdb)
+
+A fixed-width binary alternative to the credential CSV. Each device takes
+20 bytes instead of a ~90 character CSV line, and the reader memory-maps
+the file and exposes the records as a zero-copy NumPy structured array (or
+struct views without NumPy), so opening a million-device database is a
+header check and an mmap call.
+
+File layout (little-endian):
+
+    header, 32 bytes
+        4s   magic 'NCDB'
+        u16  file format version (1)
+        u16  record size (20)
+        u8   formats present: bit 0 = W26, bit 1 = W34, bit 2 = EM4100
+        u8   W26 facility code used when the file was written
+        u16  flags: bit 0 = credentials from an allocator assignment table,
+                    bit 1 = records in ascending MAC order
+        u64  record count
+        u32  CRC-32 of all record bytes
+        u32  reserved
+
+    record, 20 bytes
+        6s   MAC address, big-endian (AA:BB:CC:DD:EE:FF -> AA BB CC DD EE FF)
+        u8   W26 facility code
+        u8   EM4100 version
+        u16  W26 card number
+        u16  W34 facility code
+        u16  W34 card number
+        u32  EM4100 card ID
+        u16  reserved
+
+Fields of formats that were not written are zero. Records keep input order;
+when that order is ascending by MAC (as for sorted enrolment lists), bit 1
+of the flags is set and lookups binary-search the mapped records directly.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import mmap
+import zlib
+import struct
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the reader falls back to struct views
+    np = None
+
+from credential_formats import resolve_formats
+from credential_io import DEFAULT_CHUNK_SIZE, RecordWriter, open_output, output_format_for
+
+
+DB_MAGIC = b'NCDB'
+DB_VERSION = 1
+HEADER = struct.Struct('<4sHHBBHQII')
+RECORD = struct.Struct('<6sBBHHHIH')
+
+FORMAT_BITS = {'26': 1, '34': 2, '40': 4}
+FLAG_ALLOCATED = 1
+FLAG_SORTED = 2
+
+# Record fields in struct order, matching the batch engine column names
+RECORD_FIELDS = ['mac', 'w26_facility_code', 'em4100_version', 'w26_card_number',
+                 'w34_facility_code', 'w34_card_number', 'em4100_card_id']
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ('mac', 'u1', (6,)),
+        ('w26_facility_code', 'u1'),
+        ('em4100_version', 'u1'),
+        ('w26_card_number', '<u2'),
+        ('w34_facility_code', '<u2'),
+        ('w34_card_number', '<u2'),
+        ('em4100_card_id', '<u4'),
+        ('reserved', '<u2'),
+    ])
+    _MAC_SHIFTS = np.arange(40, -1, -8, dtype=np.uint64)
+
+
+def formats_mask(format_type):
+    """
+    Header bitmask for a format selection
+
+    Args:
+        format_type: '26', '34', '40', 'all', or a comma-separated list
+
+    Returns:
+        Integer bitmask
+    """
+    mask = 0
+    for code in resolve_formats(format_type):
+        if code not in FORMAT_BITS:
+            raise ValueError(f".ncdb files hold formats 26, 34 and 40 only, got {code}")
+        mask |= FORMAT_BITS[code]
+    return mask
+
+
+def _pack_chunk(values, columns, failed):
+    """
+    Pack one chunk of converted MACs into record bytes
+
+    Args:
+        values: Packed MAC integers from the batch engine
+        columns: Credential columns from the batch engine
+        failed: Dict of failed input indexes to skip
+
+    Returns:
+        Bytes of the chunk's records
+    """
+    count = len(values)
+    if np is not None:
+        records = np.zeros(count, dtype=RECORD_DTYPE)
+        records['mac'] = np.asarray(values, dtype='>u8').view(np.uint8).reshape(-1, 8)[:, 2:]
+        for name in RECORD_FIELDS[1:]:
+            if name in columns:
+                records[name] = columns[name]
+        if failed:
+            records = np.delete(records, sorted(failed))
+        return records.tobytes()
+
+    zeros = [0] * count
+    fields = [columns.get(name, zeros) for name in RECORD_FIELDS[1:]]
+    pack = RECORD.pack
+    return b''.join([pack(mac.to_bytes(6, 'big'), *row, 0)
+                     for i, (mac, *row) in enumerate(zip(values, *fields)) if i not in failed])
+
+
+def _ascending(values, failed, previous):
+    """
+    Check that a chunk's written MACs continue an ascending run
+
+    Args:
+        values: Packed MAC integers from the batch engine
+        failed: Dict of failed input indexes (not written)
+        previous: Last MAC written before this chunk, or None
+
+    Returns:
+        Tuple (still ascending, last MAC written so far)
+    """
+    if np is not None:
+        macs = np.asarray(values, dtype=np.uint64)
+        if failed:
+            macs = np.delete(macs, sorted(failed))
+        if not len(macs):
+            return True, previous
+        ascending = bool((macs[1:] >= macs[:-1]).all())
+        first, last = int(macs[0]), int(macs[-1])
+    else:
+        macs = [mac for i, mac in enumerate(values) if i not in failed]
+        if not macs:
+            return True, previous
+        ascending = all(a <= b for a, b in zip(macs, macs[1:]))
+        first, last = macs[0], macs[-1]
+    return ascending and (previous is None or previous <= first), last
+
+
+class _MacColumn:
+    """Sequence view of the big-endian MAC bytes of mapped records, for bisect"""
+
+    def __init__(self, view, count):
+        self._view = view
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = i * RECORD.size
+        return self._view[start:start + 6].tobytes()
+
+
+def write_database(column_chunks, output_file, format_type='all', facility_code=123,
+                   allocated=False):
+    """
+    Stream batch engine output into a .ncdb file
+
+    Records are written as chunks arrive; the header (count and CRC) is
+    filled in at the end, so memory stays flat.
+
+    Args:
+        column_chunks: Iterable of (values, columns, failed) tuples, e.g.
+                       from credential_batch.iter_column_chunks
+        output_file: Database filename (stdout is not supported)
+        format_type: '26', '34', '40', 'all', or a comma-separated list
+        facility_code: Facility code for 26-bit format
+        allocated: Credentials came from an allocator assignment table
+
+    Returns:
+        Number of records written
+    """
+    if output_file == '-':
+        raise ValueError("The binary database format needs an output file, not stdout")
+    formats = formats_mask(format_type)
+
+    count = 0
+    crc = 0
+    ascending, last = True, None
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(bytes(HEADER.size))
+        for values, columns, failed in column_chunks:
+            data = _pack_chunk(values, columns, failed)
+            if ascending:
+                ascending, last = _ascending(values, failed, last)
+            crc = zlib.crc32(data, crc)
+            count += len(data) // RECORD.size
+            f.write(data)
+
+        f.seek(0)
+        flags = (FLAG_ALLOCATED if allocated else 0) | (FLAG_SORTED if ascending else 0)
+        f.write(HEADER.pack(DB_MAGIC, DB_VERSION, RECORD.size, formats,
+                            facility_code, flags, count, crc, 0))
+    os.replace(tmp_file, output_file)
+
+    return count
+
+
+class CredentialDatabase:
+    """
+    Memory-mapped .ncdb reader
+    """
+
+    def __init__(self, db_file, verify=False):
+        """
+        Args:
+            db_file: Database filename
+            verify: Check the record CRC while opening (reads every page)
+        """
+        self.db_file = db_file
+        self._file = open(db_file, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise ValueError(f"{db_file} is not a credential database")
+
+        header = HEADER.unpack(self._file.read(HEADER.size))
+        (magic, self.version, record_size, self.formats, self.facility_code,
+         self.flags, self.count, self.crc, _) = header
+        if magic != DB_MAGIC or self.version != DB_VERSION or record_size != RECORD.size:
+            self._file.close()
+            raise ValueError(f"{db_file} is not a version {DB_VERSION} credential database")
+        if size != HEADER.size + self.count * RECORD.size:
+            self._file.close()
+            raise ValueError(f"{db_file} is truncated")
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+        self._view = memoryview(self._map)[HEADER.size:] if self._map else memoryview(b'')
+        self._records = None
+        self._sorted = None
+        if verify:
+            self.verify()
+
+    def close(self):
+        """Release the mapping and the file"""
+        self._records = self._sorted = None
+        try:
+            self._view.release()
+            if self._map is not None:
+                self._map.close()
+        except BufferError:
+            # Arrays handed out by .records still point into the mapping; it
+            # is unmapped when the last of them is garbage collected
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def verify(self):
+        """
+        Check the record CRC
+
+        Raises:
+            ValueError: If the records do not match the header checksum
+        """
+        if zlib.crc32(self._view) != self.crc:
+            raise ValueError(f"{self.db_file} failed its checksum")
+
+    @property
+    def records(self):
+        """
+        Zero-copy NumPy structured array over the mapped records
+
+        Returns:
+            numpy.ndarray with RECORD_DTYPE
+        """
+        if np is None:
+            raise RuntimeError("NumPy is required for the structured array view")
+        if self._records is None:
+            self._records = np.frombuffer(self._view, dtype=RECORD_DTYPE, count=self.count)
+        return self._records
+
+    def mac_values(self, start=0, stop=None):
+        """
+        MAC addresses as 48-bit integers
+
+        Args:
+            start: First record
+            stop: Record just past the last (default: end)
+
+        Returns:
+            uint64 array with NumPy, else a list of ints
+        """
+        stop = self.count if stop is None else stop
+        if np is not None:
+            macs = self.records['mac'][start:stop].astype(np.uint64)
+            return (macs << _MAC_SHIFTS).sum(axis=1, dtype=np.uint64)
+        return [int.from_bytes(rec[0], 'big') for rec in self.iter_records(start, stop)]
+
+    def iter_records(self, start=0, stop=None):
+        """
+        Iterate over records as struct tuples without NumPy
+
+        Args:
+            start: First record
+            stop: Record just past the last (default: end)
+
+        Yields:
+            Tuples in RECORD_FIELDS order (mac as 6 bytes, then the integers)
+        """
+        stop = self.count if stop is None else stop
+        view = self._view[start * RECORD.size:stop * RECORD.size]
+        for rec in RECORD.iter_unpack(view):
+            yield rec[:-1]
+
+    def columns(self, start=0, stop=None):
+        """
+        Batch engine columns for a range of records
+
+        Args:
+            start: First record
+            stop: Record just past the last (default: end)
+
+        Returns:
+            Dictionary of column name to list of ints
+        """
+        if np is not None:
+            records = self.records[start:stop]
+            return {name: records[name].tolist() for name in RECORD_FIELDS[1:]}
+        rows = list(zip(*self.iter_records(start, stop))) or [[]] * len(RECORD_FIELDS)
+        return {name: list(rows[i]) for i, name in enumerate(RECORD_FIELDS) if i > 0}
+
+    def lookup(self, mac_value):
+        """
+        Find the record of one MAC
+
+        Args:
+            mac_value: 48-bit MAC integer
+
+        Binary search over the mapped records when the file is in MAC order;
+        otherwise over a sorted index built on the first lookup.
+
+        Returns:
+            Dictionary of record fields, or None if the MAC is not present
+        """
+        target = mac_value.to_bytes(6, 'big')
+        if self.flags & FLAG_SORTED:
+            macs = _MacColumn(self._view, self.count)
+            index = bisect_left(macs, target)
+            if index == self.count or macs[index] != target:
+                return None
+        else:
+            keys, order = self._sorted_index()
+            wanted = mac_value if np is not None else target
+            position = bisect_left(keys, wanted)
+            if position == len(keys) or keys[position] != wanted:
+                return None
+            index = int(order[position])
+        row = RECORD.unpack_from(self._view, index * RECORD.size)
+        return dict(zip(RECORD_FIELDS, (mac_value,) + row[1:-1]))
+
+    def _sorted_index(self):
+        """
+        MACs in ascending order with their record numbers, for files not in MAC order
+
+        Returns:
+            Tuple (sorted MACs, record number of each); duplicates keep file order
+        """
+        if self._sorted is None:
+            if np is not None:
+                values = self.mac_values()
+                order = np.argsort(values, kind='stable')
+                self._sorted = (values[order], order)
+            else:
+                macs = _MacColumn(self._view, self.count)
+                order = sorted(range(self.count), key=macs.__getitem__)
+                self._sorted = ([macs[i] for i in order], order)
+        return self._sorted
+
+    def export(self, output_file, format_type='all', output_format=None,
+               chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Export records as CSV or NDJSON, in the same layout as generate_csv
+
+        Args:
+            output_file: Output filename, or '-' for stdout
+            format_type: '26', '34', '40', 'all', or a comma-separated list
+            output_format: 'csv' or 'ndjson' (default: from the file extension)
+            chunk_size: Records per batch
+
+        Returns:
+            Number of rows written
+        """
+        from credential_formats import format_mac_batch, output_fields
+
+        wanted = formats_mask(format_type)
+        if self.formats & wanted != wanted:
+            raise ValueError(f"{self.db_file} does not contain format {format_type}")
+
+        fieldnames, keys = output_fields(format_type)
+        with open_output(output_file) as out:
+            writer = RecordWriter(out, fieldnames, output_format_for(output_file, output_format))
+            for start in range(0, self.count, chunk_size):
+                stop = min(start + chunk_size, self.count)
+                columns = self.columns(start, stop)
+                macs = format_mac_batch(self.mac_values(start, stop))
+                writer.write_rows(list(zip(macs, *[columns[key] for key in keys])))
+        return writer.rows_written
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Inspect and export binary credential databases (.ncdb)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Write a database instead of a CSV
+  python mac_to_credential.py -i mac_list.txt -o credentials.ncdb
+
+  # Check the header and checksum
+  python credential_db.py info credentials.ncdb
+
+  # Export the 26-bit credentials as CSV
+  python credential_db.py export credentials.ncdb -o credentials.csv -f 26
+
+  # Look up one MAC
+  python credential_db.py lookup credentials.ncdb AA:BB:CC:DD:EE:FF
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    info = sub.add_parser('info', help='Show the header and verify the checksum')
+    info.add_argument('database')
+
+    export = sub.add_parser('export', help='Export as CSV or NDJSON')
+    export.add_argument('database')
+    export.add_argument('-o', '--output', default='-', help='Output file (default: stdout)')
+    export.add_argument('-f', '--format', default='all',
+                        help='Formats to export: 26, 34, 40, all, or a comma-separated list (default: all)')
+    export.add_argument('--output-format', choices=['csv', 'ndjson'])
+
+    lookup = sub.add_parser('lookup', help='Show the credentials of one MAC')
+    lookup.add_argument('database')
+    lookup.add_argument('mac')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'info':
+            with CredentialDatabase(args.database, verify=True) as db:
+                formats = [name for name, bit in (('W26', 1), ('W34', 2), ('EM4100', 4))
+                           if db.formats & bit]
+                print(f"Database:        {args.database}")
+                print(f"Records:         {db.count}")
+                print(f"Formats:         {', '.join(formats)}")
+                print(f"Facility Code:   {db.facility_code}")
+                print(f"Allocated:       {'yes' if db.flags & FLAG_ALLOCATED else 'no'}")
+                print(f"MAC order:       {'sorted' if db.flags & FLAG_SORTED else 'input order'}")
+                print(f"CRC-32:          0x{db.crc:08X} (verified)")
+
+        elif args.command == 'export':
+            try:
+                with CredentialDatabase(args.database) as db:
+                    db.export(args.output, args.format, args.output_format)
+            except BrokenPipeError:
+                # The reader went away (e.g. | head); keep the exit flush quiet too
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+        else:
+            from credential_formats import normalize_mac
+            mac = normalize_mac(args.mac)
+            with CredentialDatabase(args.database) as db:
+                record = db.lookup(int(mac.replace(':', ''), 16))
+            if record is None:
+                print(f"{mac}: not found")
+                sys.exit(1)
+            print(f"MAC: {mac}")
+            if db.formats & FORMAT_BITS['26']:
+                print(f"  W26: FC={record['w26_facility_code']}, CN={record['w26_card_number']}")
+            if db.formats & FORMAT_BITS['34']:
+                print(f"  W34: FC={record['w34_facility_code']}, CN={record['w34_card_number']}")
+            if db.formats & FORMAT_BITS['40']:
+                print(f"  EM4100: Ver={record['em4100_version']}, ID={record['em4100_card_id']}")
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+"""
+Credential Format Registry
+
+The conversion core shared by mac_to_credential.py, mac_to_wiegand.py and
+the fleet tools: MAC parsing (single and batch), and a registry of the
+credential formats a MAC can be turned into. Each format declares its
+frame length and its fields as bit slices of the 48-bit MAC, so adding a
+format is one registry entry rather than another conversion function.
+
+Registered formats:
+
+- 26: Wiegand 26-bit (H10301), configured facility code + last 2 bytes
+- 34: Wiegand 34-bit, bytes 3-4 as facility code + last 2 bytes
+- 40: EM4100 40-bit, first byte as version + next 4 bytes as card ID
+- 35: HID Corporate 1000 35-bit, 12-bit company ID + 20-bit card number
+- 37: HID H10304 37-bit, 16-bit facility code + 19-bit card number
+
+The MAC-derived formats take their data bits from the low end of the MAC,
+split at the format's field boundary, the same way 34-bit does. Format
+sets are given as 'all' (26, 34 and 40, the formats the firmware sends)
+or as a comma-separated list such as '26,35'. A MAC is parsed once and
+encoded into every requested format in a single pass; fields shared by
+several formats (the W26/W34 card number) are computed once.
+
+MACs are held as 48-bit integers throughout: MacAddress wraps one for
+single-MAC use, and parse_mac_batch decodes whole lists straight from
+their text. `python credential_formats.py bench` compares bulk parsing
+against the string pipeline normalize_mac used to run per MAC.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import time
+import binascii
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the batch engine falls back to plain ints
+    np = None
+
+
+# One credential field: a bit slice of the MAC, or the configured facility
+# code when shift is None
+Field = namedtuple('Field', ['name', 'title', 'short', 'shift', 'mask'])
+
+
+class CredentialFormat:
+    """A credential format and the MAC bits feeding each of its fields"""
+
+    def __init__(self, code, name, label, bits, fields):
+        """
+        Args:
+            code: Format code used on the command line, e.g. '26'
+            name: Display name, e.g. 'Wiegand 26-bit'
+            label: Column/report prefix, e.g. 'W26'
+            bits: Frame length in bits
+            fields: Fields, most significant first
+        """
+        self.code = code
+        self.name = name
+        self.label = label
+        self.bits = bits
+        self.fields = fields
+
+    def key(self, field):
+        """Batch engine column name for one of this format's fields"""
+        return f'{self.label.lower()}_{field.name}'
+
+    def describe(self, value, facility_code=123):
+        """
+        Credential details for one packed MAC
+
+        Args:
+            value: 48-bit MAC integer
+            facility_code: Configured facility code (26-bit format)
+
+        Returns:
+            Dictionary with format, mac_address, and each field with its hex form
+        """
+        info = {'format': self.name, 'mac_address': format_mac(value)}
+        for field in self.fields:
+            number = facility_code if field.shift is None else (value >> field.shift) & field.mask
+            info[field.name] = number
+            info[f'{field.name}_hex'] = f'0x{number:0{(field.mask.bit_length() + 3) // 4}X}'
+        return info
+
+
+FORMATS = {
+    '26': CredentialFormat('26', 'Wiegand 26-bit', 'W26', 26, [
+        Field('facility_code', 'Facility Code', 'FC', None, 0xFF),
+        Field('card_number', 'Card Number', 'CN', 0, 0xFFFF),
+    ]),
+    '34': CredentialFormat('34', 'Wiegand 34-bit', 'W34', 34, [
+        Field('facility_code', 'Facility Code', 'FC', 16, 0xFFFF),
+        Field('card_number', 'Card Number', 'CN', 0, 0xFFFF),
+    ]),
+    '40': CredentialFormat('40', 'EM4100 40-bit', 'EM4100', 40, [
+        Field('version', 'Version', 'Ver', 40, 0xFF),
+        Field('card_id', 'Card ID', 'ID', 8, 0xFFFFFFFF),
+    ]),
+    '35': CredentialFormat('35', 'HID Corporate 1000 35-bit', 'C1000', 35, [
+        Field('company_id', 'Company ID', 'CID', 20, 0xFFF),
+        Field('card_number', 'Card Number', 'CN', 0, 0xFFFFF),
+    ]),
+    '37': CredentialFormat('37', 'HID H10304 37-bit', 'H10304', 37, [
+        Field('facility_code', 'Facility Code', 'FC', 19, 0xFFFF),
+        Field('card_number', 'Card Number', 'CN', 0, 0x7FFFF),
+    ]),
+}
+
+# Named format sets
+FORMAT_SETS = {'all': ('26', '34', '40')}
+
+if np is not None:
+    # ASCII byte -> nibble value, 0xFF for anything that is not a hex digit
+    _NIBBLE_TABLE = np.full(256, 0xFF, dtype=np.uint8)
+    for _i, _c in enumerate(b'0123456789ABCDEF'):
+        _NIBBLE_TABLE[_c] = _i
+        _NIBBLE_TABLE[bytes([_c]).lower()[0]] = _i
+    _NIBBLE_SHIFTS = np.arange(44, -1, -4, dtype=np.uint64)
+    _HEX_DIGITS = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+    # Column of each hex digit inside "AA:BB:CC:DD:EE:FF"
+    _MAC_DIGIT_COLUMNS = np.array([i + i // 2 for i in range(12)])
+    # ASCII byte -> is a MAC separator
+    _SEPARATOR_TABLE = np.zeros(256, dtype=bool)
+    _SEPARATOR_TABLE[list(b':-.')] = True
+    # Text length -> (hex digit columns, separator columns) of the forms
+    # decoded in bulk; anything else goes through the single-MAC parser
+    _MAC_LAYOUTS = {
+        17: (_MAC_DIGIT_COLUMNS, np.arange(2, 17, 3)),
+        14: (np.array([i + i // 4 for i in range(12)]), np.array([4, 9])),
+        12: (np.arange(12), np.array([], dtype=np.intp)),
+    }
+
+
+def resolve_formats(format_type):
+    """
+    Expand a format selection into format codes
+
+    Args:
+        format_type: A format code, a named set such as 'all', or a
+                     comma-separated list of either
+
+    Returns:
+        Tuple of format codes, in the order given, without repeats
+    """
+    codes = []
+    for code in str(format_type).split(','):
+        code = code.strip()
+        if code in FORMAT_SETS:
+            codes.extend(FORMAT_SETS[code])
+        elif code in FORMATS:
+            codes.append(code)
+        else:
+            raise ValueError(f"Unknown format: {code} (choose from {', '.join(FORMATS)} or all)")
+    return tuple(dict.fromkeys(codes))
+
+
+def output_fields(format_type, labels=None):
+    """
+    CSV/NDJSON column names and the batch engine column feeding each
+
+    A single format uses plain field titles; a set prefixes each with the
+    format label.
+
+    Args:
+        format_type: Format code, named set or comma-separated list
+        labels: Optional format code -> column prefix overrides
+
+    Returns:
+        Tuple (fieldnames, keys)
+    """
+    codes = resolve_formats(format_type)
+    fieldnames, keys = ['MAC Address'], []
+    for code in codes:
+        fmt = FORMATS[code]
+        prefix = (labels or {}).get(code, fmt.label)
+        for field in fmt.fields:
+            fieldnames.append(field.title if len(codes) == 1 else f'{prefix} {field.title}')
+            keys.append(fmt.key(field))
+    return fieldnames, keys
+
+
+class MacAddress:
+    """
+    A MAC address held as one 48-bit integer
+
+    Parses once from str or bytes in any accepted form (AA:BB:CC:DD:EE:FF,
+    AA-BB-CC-DD-EE-FF, AABB.CCDD.EEFF or AABBCCDDEEFF, any case); byte
+    fields are integer properties and text is only built when asked for.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, mac_address):
+        """
+        Args:
+            mac_address: MAC address as str, bytes, or 48-bit integer
+        """
+        if isinstance(mac_address, int):
+            if not 0 <= mac_address <= 0xFFFFFFFFFFFF:
+                raise ValueError(f"MAC address value out of range: {mac_address}")
+            self.value = mac_address
+        else:
+            self.value = _parse_mac(mac_address)
+
+    @property
+    def octets(self):
+        """The six bytes, most significant first"""
+        return tuple(self.value.to_bytes(6, 'big'))
+
+    @property
+    def oui(self):
+        """Upper three bytes (organizationally unique identifier)"""
+        return self.value >> 24
+
+    @property
+    def nic(self):
+        """Lower three bytes"""
+        return self.value & 0xFFFFFF
+
+    def __getitem__(self, index):
+        """Byte index (0-5, or negative from the end) as an int"""
+        return self.octets[index]
+
+    def format(self, separator=':'):
+        """
+        MAC address text
+
+        Args:
+            separator: ':' or '-' between bytes, '.' for Cisco AABB.CCDD.EEFF,
+                       or '' for bare hex
+
+        Returns:
+            Uppercase MAC address string
+        """
+        if separator == '.':
+            text = f'{self.value:012X}'
+            return f'{text[0:4]}.{text[4:8]}.{text[8:12]}'
+        if not separator:
+            return f'{self.value:012X}'
+        return self.value.to_bytes(6, 'big').hex(separator).upper()
+
+    def __str__(self):
+        return self.value.to_bytes(6, 'big').hex(':').upper()
+
+    def __repr__(self):
+        return f"MacAddress('{self}')"
+
+    def __bytes__(self):
+        return self.value.to_bytes(6, 'big')
+
+    def __int__(self):
+        return self.value
+
+    __index__ = __int__
+
+    def __eq__(self, other):
+        return isinstance(other, MacAddress) and self.value == other.value
+
+    def __lt__(self, other):
+        if not isinstance(other, MacAddress):
+            return NotImplemented
+        return self.value < other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+_unhexlify = binascii.unhexlify
+_from_bytes = int.from_bytes
+
+
+def _parse_mac(mac_address):
+    """
+    Parse one MAC address (str or bytes) into its 48-bit integer value
+
+    Raises ValueError with the same messages as normalize_mac always has.
+    """
+    if isinstance(mac_address, (bytes, bytearray)):
+        digits = mac_address.replace(b':', b'').replace(b'-', b'').replace(b'.', b'')
+        shown = mac_address.decode('ascii', 'replace')
+    else:
+        # Chained replace beats str.translate by several times on short strings
+        digits = mac_address.replace(':', '').replace('-', '').replace('.', '')
+        shown = mac_address
+    if len(digits) != 12:
+        raise ValueError(f"Invalid MAC address length: {shown}")
+    try:
+        # unhexlify accepts nothing but hex digits: no signs, prefixes or spaces
+        return _from_bytes(_unhexlify(digits), 'big')
+    except ValueError:
+        raise ValueError(f"Invalid MAC address characters: {shown}") from None
+
+
+def normalize_mac(mac_address):
+    """
+    Normalize MAC address to standard format
+
+    Args:
+        mac_address: MAC address in various formats
+
+    Returns:
+        Normalized MAC address (uppercase with colons)
+    """
+    return format_mac(_parse_mac(mac_address))
+
+
+def mac_to_int(mac_address):
+    """
+    Convert a single MAC address to its 48-bit integer value
+
+    Args:
+        mac_address: MAC address string
+
+    Returns:
+        Integer value of the MAC address
+    """
+    return _parse_mac(mac_address)
+
+
+def format_mac(value):
+    """
+    Format one packed MAC integer as a normalized MAC string
+
+    Args:
+        value: 48-bit MAC integer
+
+    Returns:
+        MAC address (uppercase with colons)
+    """
+    return value.to_bytes(6, 'big').hex(':').upper()
+
+
+def encode_mac(mac_address, format_type='all', facility_code=123):
+    """
+    Parse one MAC address and encode it into every requested format
+
+    Args:
+        mac_address: MAC address string or MacAddress
+        format_type: Format code, named set or comma-separated list
+        facility_code: Facility code for 26-bit format
+
+    Returns:
+        List of dictionaries from CredentialFormat.describe, one per format
+    """
+    value = mac_address.value if isinstance(mac_address, MacAddress) else _parse_mac(mac_address)
+    codes = resolve_formats(format_type)
+    if '26' in codes and not 0 <= facility_code <= 255:
+        raise ValueError(f"Facility code must be 0-255, got {facility_code}")
+    return [FORMATS[code].describe(value, facility_code) for code in codes]
+
+
+def mac_to_wiegand_26(mac_address, facility_code=123):
+    """
+    Convert MAC address to 26-bit Wiegand format
+
+    Args:
+        mac_address: MAC address string
+        facility_code: 8-bit facility code (0-255)
+
+    Returns:
+        Dictionary with facility code and card number
+    """
+    return encode_mac(mac_address, '26', facility_code)[0]
+
+
+def mac_to_wiegand_34(mac_address):
+    """
+    Convert MAC address to 34-bit Wiegand format
+
+    Args:
+        mac_address: MAC address string
+
+    Returns:
+        Dictionary with facility code and card number
+    """
+    return encode_mac(mac_address, '34')[0]
+
+
+def mac_to_em4100(mac_address):
+    """
+    Convert MAC address to 40-bit EM4100 format
+
+    Args:
+        mac_address: MAC address string
+
+    Returns:
+        Dictionary with version and card ID
+    """
+    return encode_mac(mac_address, '40')[0]
+
+
+def parse_mac_batch(mac_addresses):
+    """
+    Parse a list of MAC addresses into packed 48-bit integers in one pass
+
+    Accepts the same input forms as normalize_mac. With NumPy available the
+    hex digits of every well-formed MAC are decoded together as one uint8
+    matrix, straight from the text of the colon/dash, Cisco dot and bare
+    forms; anything else is sent through the single-MAC parser so errors
+    carry exactly the same message.
+
+    Args:
+        mac_addresses: List of MAC address strings
+
+    Returns:
+        Tuple (values, errors). values has one entry per input MAC (a uint64
+        array, or a list of ints without NumPy) with 0 in failed slots;
+        errors maps input index to the ValueError raised for that MAC.
+    """
+    errors = {}
+
+    if np is None:
+        values = []
+        for i, mac in enumerate(mac_addresses):
+            try:
+                values.append(_parse_mac(mac))
+            except ValueError as e:
+                errors[i] = e
+                values.append(0)
+        return values, errors
+
+    count = len(mac_addresses)
+    values = np.zeros(count, dtype=np.uint64)
+    lengths = np.fromiter(map(len, mac_addresses), dtype=np.intp, count=count)
+    slow = set(np.flatnonzero(~np.isin(lengths, list(_MAC_LAYOUTS))).tolist())
+
+    # Each accepted layout is decoded in place, without per-MAC strings;
+    # a non-ASCII character becomes one '?' and fails the digit check
+    for length, (digit_columns, separator_columns) in _MAC_LAYOUTS.items():
+        index = np.flatnonzero(lengths == length)
+        if not len(index):
+            continue
+        group = mac_addresses if len(index) == count else [mac_addresses[i] for i in index.tolist()]
+        blob = ''.join(group).encode('ascii', 'replace')
+        text = np.frombuffer(blob, dtype=np.uint8).reshape(-1, length)
+        nibbles = _NIBBLE_TABLE[text[:, digit_columns]]
+        bad = (nibbles == 0xFF).any(axis=1)
+        if len(separator_columns):
+            bad |= ~_SEPARATOR_TABLE[text[:, separator_columns]].all(axis=1)
+        values[index] = (nibbles.astype(np.uint64) << _NIBBLE_SHIFTS).sum(axis=1, dtype=np.uint64)
+        slow.update(index[bad].tolist())
+
+    for i in sorted(slow):
+        try:
+            values[i] = _parse_mac(mac_addresses[i])
+        except ValueError as e:
+            errors[i] = e
+            values[i] = 0
+
+    return values, errors
+
+
+def format_mac_batch(values):
+    """
+    Format packed MAC integers as normalized MAC strings
+
+    Args:
+        values: Sequence of 48-bit MAC integers from parse_mac_batch
+
+    Returns:
+        List of MAC addresses (uppercase with colons)
+    """
+    if np is None:
+        return [format_mac(v) for v in values]
+
+    values = np.asarray(values, dtype=np.uint64)
+    digits = (values[:, None] >> _NIBBLE_SHIFTS) & np.uint64(0xF)
+    text = np.full((len(values), 17), ord(':'), dtype=np.uint8)
+    text[:, _MAC_DIGIT_COLUMNS] = _HEX_DIGITS[digits.astype(np.intp)]
+    blob = text.tobytes().decode('ascii')
+    return [blob[i:i+17] for i in range(0, len(blob), 17)]
+
+
+def convert_batch(values, format_type='all', facility_code=123):
+    """
+    Compute credential fields for a batch of packed MAC integers
+
+    Every requested format is filled in one pass over the registry; each
+    distinct bit slice is one whole-array shift and mask, shared by all the
+    formats that use it.
+
+    Args:
+        values: Sequence of 48-bit MAC integers from parse_mac_batch
+        format_type: Format code, named set or comma-separated list
+        facility_code: Facility code for 26-bit format
+
+    Returns:
+        Dictionary of column name to list of ints
+    """
+    codes = resolve_formats(format_type)
+    if '26' in codes and not 0 <= facility_code <= 255:
+        raise ValueError(f"Facility code must be 0-255, got {facility_code}")
+
+    if np is None:
+        def field(shift, mask):
+            return [(v >> shift) & mask for v in values]
+    else:
+        values = np.asarray(values, dtype=np.uint64)
+
+        def field(shift, mask):
+            return ((values >> np.uint64(shift)) & np.uint64(mask)).tolist()
+
+    slices = {}
+    columns = {}
+    for code in codes:
+        fmt = FORMATS[code]
+        for spec in fmt.fields:
+            if spec.shift is None:
+                column = [facility_code] * len(values)
+            else:
+                if (spec.shift, spec.mask) not in slices:
+                    slices[spec.shift, spec.mask] = field(spec.shift, spec.mask)
+                column = slices[spec.shift, spec.mask]
+            columns[fmt.key(spec)] = column
+
+    return columns
+
+
+def _string_mac_to_int(mac_address):
+    """The string pipeline MAC parsing used before MacAddress, kept as the benchmark baseline"""
+    mac = mac_address.replace(':', '').replace('-', '').replace('.', '').upper()
+    if len(mac) != 12:
+        raise ValueError(f"Invalid MAC address length: {mac_address}")
+    if not all(c in '0123456789ABCDEF' for c in mac):
+        raise ValueError(f"Invalid MAC address characters: {mac_address}")
+    return int(':'.join([mac[i:i+2] for i in range(0, 12, 2)]).replace(':', ''), 16)
+
+
+def bench_parse(count=1000000, seed=1, stream=None):
+    """
+    Time bulk MAC parsing against the string pipeline it replaced
+
+    The corpus mixes colon, dash, Cisco dot and bare forms in both cases,
+    with about 1% malformed lines.
+
+    Args:
+        count: MACs to parse
+        seed: Random seed
+        stream: Text stream for the report (default: stdout)
+
+    Returns:
+        Dictionary of parser name to nanoseconds per MAC
+    """
+    import random
+
+    stream = stream or sys.stdout
+    rng = random.Random(seed)
+    macs = []
+    for _ in range(count):
+        text = f'{rng.getrandbits(48):012X}'
+        if rng.random() < 0.5:
+            text = text.lower()
+        form = rng.random()
+        if form < 0.01:
+            text = text[:11] + 'G'
+        elif form < 0.6:
+            text = ':'.join([text[i:i+2] for i in range(0, 12, 2)])
+        elif form < 0.8:
+            text = '-'.join([text[i:i+2] for i in range(0, 12, 2)])
+        elif form < 0.9:
+            text = '.'.join([text[i:i+4] for i in range(0, 12, 4)])
+        macs.append(text)
+
+    def per_mac(parse):
+        values = []
+        for mac in macs:
+            try:
+                values.append(parse(mac))
+            except ValueError:
+                values.append(None)
+        return values
+
+    runs = [
+        ('string pipeline (old normalize_mac)', lambda: per_mac(_string_mac_to_int)),
+        ('MacAddress', lambda: per_mac(lambda mac: MacAddress(mac).value)),
+        ('parse_mac_batch' + (' (NumPy)' if np is not None else ''), lambda: parse_mac_batch(macs)),
+    ]
+    results = {}
+    reference = None
+    for name, run in runs:
+        start = time.perf_counter()
+        output = run()
+        elapsed = time.perf_counter() - start
+        if isinstance(output, tuple):
+            values, errors = output
+            output = [None if i in errors else int(v) for i, v in enumerate(values)]
+        if reference is None:
+            reference = output
+        elif output != reference:
+            raise ValueError(f"{name} disagrees with the string pipeline")
+        results[name] = elapsed * 1e9 / count
+
+    baseline = next(iter(results.values()))
+    stream.write(f"Parsing {count:,} MACs\n")
+    for name, ns in results.items():
+        stream.write(f"  {name:<38} {ns:8.0f} ns/MAC  {baseline / ns:5.1f}x\n")
+    return results
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Credential format registry and MAC parsing core',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # List the registered formats and their field layouts
+  python credential_formats.py formats
+
+  # Time parsing 1M MACs against the old string pipeline
+  python credential_formats.py bench -n 1000000
+        """
+    )
+
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('formats', help='List the registered formats')
+    bench = sub.add_parser('bench', help='Benchmark bulk MAC parsing')
+    bench.add_argument('-n', '--count', type=int, default=1000000, help='MACs to parse (default: 1000000)')
+    bench.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+
+    args = parser.parse_args()
+
+    if args.command == 'formats':
+        for fmt in FORMATS.values():
+            layout = []
+            for field in fmt.fields:
+                if field.shift is None:
+                    layout.append(f"{field.title} = configured")
+                else:
+                    top = field.shift + field.mask.bit_length() - 1
+                    layout.append(f"{field.title} = MAC bits {top}..{field.shift}")
+            print(f"{fmt.code:>3}  {fmt.name:<26} {fmt.bits} bits  {', '.join(layout)}")
+        for name, codes in FORMAT_SETS.items():
+            print(f"{name:>3}  = {','.join(codes)}")
+    else:
+        bench_parse(args.count, args.seed)
+
+
+if __name__ == '__main__':
+    main()
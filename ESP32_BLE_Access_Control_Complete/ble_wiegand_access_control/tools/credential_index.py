@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Reverse Credential Index: Wiegand/EM4100 Credential -> MAC Address
+
+Net2 audit logs and SIEM events carry a facility code and card number (or
+an EM4100 version and card ID), not a MAC address. This tool builds a
+sorted, fixed-width binary index of (credential, MAC) records once, then
+resolves log events against it by memory-mapping the file:
+
+- With NumPy, each chunk of events is resolved with one searchsorted call
+  over the mapped key column (O(log n) per event, vectorized).
+- Without NumPy, a binary search runs directly over a memoryview of the
+  mapped file; records are never loaded into Python objects.
+
+Index file layout (little-endian):
+    header  32 bytes: magic 'NCRIDX01', u32 version, u32 reserved,
+                      u64 record count, u64 reserved
+    records 16 bytes each, sorted by key then MAC:
+                      u64 key = format << 48 | credential, u64 MAC
+where credential is FC << 16 | CN for W26/W34 and version << 32 | card ID
+for EM4100, and format is 26, 34 or 40.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import csv
+import mmap
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; lookups fall back to a memoryview bisect
+    np = None
+
+from credential_io import (DEFAULT_CHUNK_SIZE, RecordWriter, iter_chunks, iter_mac_lines,
+                           open_error_sink, open_input, open_output, output_format_for)
+from credential_collisions import credential_keys, iter_valid_macs
+from credential_formats import format_mac_batch
+
+
+INDEX_MAGIC = b'NCRIDX01'
+INDEX_VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+RECORD_SIZE = 16
+
+FORMAT_CODES = {'26': 26, '34': 34, '40': 40}
+
+# Default event CSV columns per format: (first field, second field)
+EVENT_COLUMNS = {
+    '26': ('Facility Code', 'Card Number'),
+    '34': ('Facility Code', 'Card Number'),
+    '40': ('Version', 'Card ID'),
+}
+
+# Largest (first, second) field value per format; wider values would spill
+# into the neighbouring field of the key and match another credential
+FIELD_LIMITS = {
+    '26': (0xFF, 0xFFFF),
+    '34': (0xFFFF, 0xFFFF),
+    '40': (0xFF, 0xFFFFFFFF),
+}
+
+
+def index_key(format_code, first, second):
+    """
+    Index key for a credential
+
+    Args:
+        format_code: '26', '34' or '40'
+        first: Facility code, or EM4100 version
+        second: Card number, or EM4100 card ID
+
+    Returns:
+        64-bit integer key
+
+    Raises:
+        ValueError: If a field is negative or too wide for the format
+    """
+    first_max, second_max = FIELD_LIMITS[format_code]
+    if not (0 <= first <= first_max and 0 <= second <= second_max):
+        raise ValueError(f"Credential fields out of range for format {format_code}: "
+                         f"{first}:{second} (limits {first_max}:{second_max})")
+    shift = 32 if format_code == '40' else 16
+    return FORMAT_CODES[format_code] << 48 | first << shift | second
+
+
+def build_index(mac_addresses, index_file, format_type='all', facility_code=123,
+                chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Build a reverse index file from a MAC list
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        index_file: Output index filename
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        chunk_size: MACs parsed per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Number of records written
+    """
+    errors = errors or sys.stderr
+    key_parts, mac_parts = [], []
+    for values in iter_valid_macs(mac_addresses, chunk_size, errors):
+        macs = values.tolist() if hasattr(values, 'tolist') else values
+        for code, keys in credential_keys(values, format_type, facility_code).items():
+            tag = FORMAT_CODES[code] << 48
+            if np is not None:
+                key_parts.append(np.asarray(keys, dtype=np.uint64) | np.uint64(tag))
+                mac_parts.append(np.asarray(macs, dtype=np.uint64))
+            else:
+                # One int per record: key in the high bits, 48-bit MAC below
+                key_parts.extend((tag | key) << 48 | mac for key, mac in zip(keys, macs))
+
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        if np is not None:
+            records = np.empty((0, 2), dtype='<u8')
+            if key_parts:
+                keys, macs = np.concatenate(key_parts), np.concatenate(mac_parts)
+                # Sort by key then MAC; duplicate MACs in the input give identical records
+                records = np.unique(np.stack([keys, macs], axis=1), axis=0).astype('<u8')
+            count = len(records)
+            f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, count, 0))
+            f.write(records.tobytes())
+        else:
+            records = sorted(set(key_parts))
+            count = len(records)
+            f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, count, 0))
+            pack = struct.Struct('<QQ').pack
+            for batch in iter_chunks(records, chunk_size):
+                f.write(b''.join([pack(r >> 48, r & 0xFFFFFFFFFFFF) for r in batch]))
+    os.replace(tmp_file, index_file)
+
+    return count
+
+
+class _KeyColumn:
+    """Sequence view of the key column of a mapped index, for bisect"""
+
+    def __init__(self, words, count):
+        self._words = words
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        return self._words[2 * i]
+
+
+class CredentialIndex:
+    """
+    Memory-mapped reverse index reader
+    """
+
+    def __init__(self, index_file):
+        """
+        Args:
+            index_file: Index filename from build_index
+        """
+        self._file = open(index_file, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{index_file} is not a credential index")
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, _ = HEADER.unpack_from(self._map)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{index_file} is not a version {INDEX_VERSION} credential index")
+        if size != HEADER.size + count * RECORD_SIZE:
+            raise ValueError(f"{index_file} is truncated")
+
+        self.count = count
+        self._words = memoryview(self._map)[HEADER.size:].cast('Q')
+        if np is not None:
+            records = np.frombuffer(self._map, dtype='<u8', count=2 * count, offset=HEADER.size)
+            self._keys = records[0::2]
+            self._macs = records[1::2]
+        else:
+            self._keys = _KeyColumn(self._words, count)
+
+    def close(self):
+        """Release the mapping and the file"""
+        self._words.release()
+        self._keys = self._macs = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, key):
+        """
+        Find every MAC recorded under one key
+
+        Args:
+            key: Key from index_key
+
+        Returns:
+            List of MAC integers (usually one; more means a collision)
+        """
+        return self.lookup_batch([key])[0]
+
+    def lookup_batch(self, keys):
+        """
+        Resolve a batch of keys
+
+        Args:
+            keys: List of keys from index_key
+
+        Returns:
+            List of lists of MAC integers, one per key
+        """
+        if np is not None:
+            wanted = np.asarray(keys, dtype=np.uint64)
+            lo = np.searchsorted(self._keys, wanted, side='left')
+            hi = np.searchsorted(self._keys, wanted, side='right')
+            counts = hi - lo
+            # Gather every matching record in one fancy-indexing call, then split per key
+            starts = np.cumsum(counts) - counts
+            positions = np.repeat(lo - starts, counts) + np.arange(counts.sum())
+            flat = self._macs[positions].tolist()
+            result, offset = [], 0
+            for n in counts.tolist():
+                result.append(flat[offset:offset + n])
+                offset += n
+            return result
+
+        from bisect import bisect_left, bisect_right
+        words = self._words
+        result = []
+        for key in keys:
+            a = bisect_left(self._keys, key)
+            b = bisect_right(self._keys, key, a)
+            result.append([words[2 * i + 1] for i in range(a, b)])
+        return result
+
+
+def resolve_events(index, events, output_file, format_type, columns=None,
+                   output_format=None, chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Stream log events through the index and append the matching MACs
+
+    Args:
+        index: Open CredentialIndex
+        events: Text stream of CSV events with a header row
+        output_file: Output filename, or '-' for stdout
+        format_type: '26', '34' or '40' for every event
+        columns: (first, second) column names (default: EVENT_COLUMNS)
+        output_format: 'csv' or 'ndjson' (default: from the file extension)
+        chunk_size: Events resolved per batch
+        errors: Text stream for unparsable events (default: stderr)
+
+    Returns:
+        Tuple (events, resolved)
+    """
+    errors = errors or sys.stderr
+    first_col, second_col = columns or EVENT_COLUMNS[format_type]
+    reader = csv.reader(events)
+    header = next(reader, None)
+    if header is None:
+        return 0, 0
+    try:
+        first_pos, second_pos = header.index(first_col), header.index(second_col)
+    except ValueError:
+        raise ValueError(f"Event file needs '{first_col}' and '{second_col}' columns")
+
+    total = resolved = 0
+    with open_output(output_file) as out:
+        writer = RecordWriter(out, header + ['MAC Address', 'Matches'],
+                              output_format_for(output_file, output_format))
+        for chunk in iter_chunks(reader, chunk_size):
+            keys = []
+            for line, row in enumerate(chunk):
+                try:
+                    keys.append(index_key(format_type, int(row[first_pos]), int(row[second_pos])))
+                except (ValueError, IndexError, KeyError):
+                    errors.write(f"ERROR parsing event: {','.join(row)}\n")
+                    keys.append(0)
+
+            matches = index.lookup_batch(keys)
+            # Format every matched MAC of the chunk in one call
+            names = iter(format_mac_batch([mac for macs in matches for mac in macs]))
+            rows = []
+            for row, macs in zip(chunk, matches):
+                rows.append(row + [';'.join([next(names) for _ in macs]), len(macs)])
+                resolved += bool(macs)
+            writer.write_rows(rows)
+            total += len(chunk)
+
+    return total, resolved
+
+
+def parse_query(query):
+    """
+    Parse a command-line query such as '26:123:61183'
+
+    Args:
+        query: 'FORMAT:FC:CN' or '40:VERSION:CARD_ID'
+
+    Returns:
+        Index key
+    """
+    try:
+        format_code, first, second = query.split(':')
+        first, second = int(first), int(second)
+        FIELD_LIMITS[format_code]
+    except (ValueError, KeyError):
+        raise ValueError(f"Query must look like 26:FC:CN, 34:FC:CN or 40:VERSION:ID, got {query}")
+    return index_key(format_code, first, second)
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Resolve Wiegand/EM4100 credentials back to BLE MAC addresses',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Build the index once per enrollment
+  python credential_index.py build -i mac_list.txt -x credentials.idx
+
+  # Look up a single credential
+  python credential_index.py query -x credentials.idx 26:123:61183
+
+  # Add a MAC column to a Net2 audit log export
+  python credential_index.py resolve -x credentials.idx -e audit.csv -f 26 -o audit_macs.csv
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build an index from a MAC list')
+    build.add_argument('-i', '--input', required=True, help='MAC list; - for stdin')
+    build.add_argument('-x', '--index', required=True, help='Index file to write')
+    build.add_argument('-f', '--format', choices=['26', '34', '40', 'all'], default='all',
+                       help='Formats to index (default: all)')
+    build.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit Wiegand format (default: 123)')
+    build.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    query = sub.add_parser('query', help='Look up one or more credentials')
+    query.add_argument('-x', '--index', required=True, help='Index file')
+    query.add_argument('credentials', nargs='+', help='FORMAT:FC:CN, e.g. 26:123:61183')
+
+    resolve = sub.add_parser('resolve', help='Resolve a CSV of log events')
+    resolve.add_argument('-x', '--index', required=True, help='Index file')
+    resolve.add_argument('-e', '--events', required=True, help='Event CSV; - for stdin')
+    resolve.add_argument('-f', '--format', choices=['26', '34', '40'], required=True,
+                         help='Credential format of the events')
+    resolve.add_argument('-o', '--output', default='-', help='Output file (default: stdout)')
+    resolve.add_argument('--output-format', choices=['csv', 'ndjson'])
+    resolve.add_argument('--columns', nargs=2, metavar=('FIRST', 'SECOND'),
+                         help='Event columns holding FC and CN (or version and card ID)')
+    resolve.add_argument('--errors', help='Write unparsable events to this file (default: stderr)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            if not 0 <= args.facility_code <= 255:
+                raise ValueError(f"Facility code must be 0-255, got {args.facility_code}")
+            with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+                count = build_index(iter_mac_lines(f), args.index, args.format,
+                                    args.facility_code, errors=errors)
+            print(f"Index with {count} records written to {args.index}")
+
+        elif args.command == 'query':
+            keys = [parse_query(q) for q in args.credentials]
+            with CredentialIndex(args.index) as index:
+                for q, macs in zip(args.credentials, index.lookup_batch(keys)):
+                    print(f"{q}: {', '.join(format_mac_batch(macs)) or 'not found'}")
+
+        else:
+            with CredentialIndex(args.index) as index, open_input(args.events) as events, \
+                    open_error_sink(args.errors) as errors:
+                total, resolved = resolve_events(index, events, args.output, args.format,
+                                                 args.columns, args.output_format, errors=errors)
+            print(f"Resolved {resolved} of {total} events", file=sys.stderr)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Streaming Input/Output Helpers for the Converter Tools
+
+Shared by mac_to_wiegand.py and mac_to_credential.py so that both tools can
+read MAC lists lazily from files, stdin or gzip/zstd-compressed inputs,
+convert them in fixed-size chunks, and write CSV or NDJSON to a file or
+stdout. Memory use depends on the chunk size, not on the input size.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import io
+import csv
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:  # zstd input is optional; gzip and plain text always work
+    zstandard = None
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# MACs converted per batch; large enough to amortize the batch engine,
+# small enough that memory stays flat
+DEFAULT_CHUNK_SIZE = 65536
+
+# Output buffer size for file and stdout sinks
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+TEXT_FORMATS = ['csv', 'ndjson']
+
+# ncdb is the binary database written by credential_db.py
+OUTPUT_FORMATS = TEXT_FORMATS + ['ncdb']
+
+
+def open_input(path):
+    """
+    Open a MAC list for reading, decompressing it if needed
+
+    Compression is detected from the first bytes of the stream, so it works
+    for stdin and for files without a .gz/.zst extension.
+
+    Args:
+        path: Input filename, or '-' for stdin
+
+    Returns:
+        Text stream over the (decompressed) input
+    """
+    return io.TextIOWrapper(open_binary_input(path), encoding='utf-8', errors='surrogateescape')
+
+
+def open_binary_input(path):
+    """
+    Open a binary input (e.g. a capture file), decompressing it if needed
+
+    Args:
+        path: Input filename, or '-' for stdin
+
+    Returns:
+        Binary stream over the (decompressed) input
+    """
+    if path == '-':
+        raw = open(sys.stdin.fileno(), 'rb', closefd=False)
+    else:
+        raw = open(path, 'rb')
+
+    magic = raw.peek(4)[:4]
+    if magic.startswith(GZIP_MAGIC):
+        if path == '-':
+            raw = gzip.GzipFile(fileobj=raw)
+        else:
+            raw.close()
+            raw = gzip.open(path, 'rb')
+    elif magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raw.close()
+            raise ValueError(f"{path} is zstd-compressed; install the 'zstandard' package to read it")
+        raw = zstandard.ZstdDecompressor().stream_reader(raw, closefd=path != '-')
+        raw = io.BufferedReader(raw, OUTPUT_BUFFER_SIZE)
+
+    return raw
+
+
+def iter_mac_lines(stream):
+    """
+    Lazily yield MAC address lines from a text stream
+
+    Blank lines and lines starting with '#' are skipped, as in the
+    original list-based readers.
+
+    Args:
+        stream: Text stream, e.g. from open_input
+
+    Yields:
+        Stripped MAC address strings
+    """
+    for line in stream:
+        if line.startswith('#'):
+            continue
+        mac = line.strip()
+        if mac:
+            yield mac
+
+
+def iter_chunks(items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Group an iterable into lists of at most chunk_size items
+
+    Args:
+        items: Any iterable
+        chunk_size: Maximum items per chunk
+
+    Yields:
+        Lists of items
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def open_output(path):
+    """
+    Open an output sink with a large write buffer
+
+    Args:
+        path: Output filename, or '-' for stdout
+
+    Returns:
+        Text stream for writing
+    """
+    if path == '-':
+        return open(sys.stdout.fileno(), 'w', newline='', buffering=OUTPUT_BUFFER_SIZE,
+                    encoding='utf-8', closefd=False)
+    return open(path, 'w', newline='', buffering=OUTPUT_BUFFER_SIZE, encoding='utf-8')
+
+
+def open_error_sink(path=None):
+    """
+    Open the sink for per-MAC conversion errors
+
+    Args:
+        path: Error log filename, or None for stderr
+
+    Returns:
+        Text stream for error lines
+    """
+    if path is None or path == '-':
+        return open(sys.stderr.fileno(), 'w', encoding='utf-8', errors='backslashreplace',
+                    closefd=False)
+    return open(path, 'w', encoding='utf-8', errors='backslashreplace')
+
+
+def output_format_for(path, output_format=None):
+    """
+    Pick the output format for a sink
+
+    Args:
+        path: Output filename
+        output_format: Explicit 'csv', 'ndjson' or 'ncdb', or None to infer
+
+    Returns:
+        'csv', 'ndjson' or 'ncdb'
+    """
+    if output_format:
+        return output_format
+    if path.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if path.endswith('.ncdb'):
+        return 'ncdb'
+    return 'csv'
+
+
+class RecordWriter:
+    """
+    Buffered CSV or NDJSON writer for converted rows
+
+    Rows are plain tuples in fieldnames order, so callers can hand over
+    whole chunks with write_rows.
+    """
+
+    def __init__(self, stream, fieldnames, output_format='csv', header=True):
+        """
+        Args:
+            stream: Text stream from open_output
+            fieldnames: Column names, in row order
+            output_format: 'csv' or 'ndjson'
+            header: Write the CSV header row (off for shards that are
+                    concatenated after a single header)
+        """
+        if output_format not in TEXT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        self.stream = stream
+        self.fieldnames = list(fieldnames)
+        self.output_format = output_format
+        self.rows_written = 0
+
+        if output_format == 'csv':
+            self._csv = csv.writer(stream)
+            if header:
+                self._csv.writerow(self.fieldnames)
+
+    def write_rows(self, rows):
+        """
+        Write a batch of rows
+
+        Args:
+            rows: List of tuples in fieldnames order
+        """
+        if self.output_format == 'csv':
+            self._csv.writerows(rows)
+        else:
+            fieldnames = self.fieldnames
+            self.stream.write(''.join(
+                json.dumps(dict(zip(fieldnames, row))) + '\n' for row in rows))
+        self.rows_written += len(rows)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Long-Running Conversion Service for mac_to_credential.py
+
+Provisioning systems that shell out once per device pay interpreter
+startup and imports for a microsecond of conversion. `mac_to_credential.py
+--serve` keeps one process running instead:
+
+- On localhost HTTP: POST /convert with a JSON body, GET /stats, GET /health.
+- On a Unix socket (unix:/path): one JSON request per line, one JSON
+  response per line; {"op": "stats"} returns the statistics.
+
+A request is {"mac": "..."} or {"macs": [...]}, optionally with "format"
+('26', '34', '40', '35', '37', 'all' or a comma-separated list) and "facility_code". A batch goes through the
+batch engine in one pass; recent results are kept in a bounded LRU cache,
+so repeated lookups skip conversion altogether. Each result uses the same
+keys as the NDJSON output of `-o credentials.ndjson`, or carries an
+"error" for MACs that failed. Per-request latency percentiles are kept
+over the most recent requests.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import json
+import stat
+import time
+import threading
+import socketserver
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from credential_formats import format_mac_batch, output_fields
+from credential_batch import batch_columns
+
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 65536
+
+# Requests kept for latency percentiles
+LATENCY_WINDOW = 10000
+
+# Largest accepted request body / line, bytes
+MAX_REQUEST_BYTES = 64 << 20
+
+
+class ConversionService:
+    """Batch conversion with an LRU result cache and latency statistics"""
+
+    def __init__(self, format_type='all', facility_code=123, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            format_type: Default format for requests that do not name one
+            facility_code: Default facility code for 26-bit format
+            cache_size: Results kept in the LRU cache (0 disables it)
+        """
+        self.format_type = format_type
+        self.facility_code = facility_code
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self.counts = {'requests': 0, 'failed_requests': 0, 'macs': 0, 'cache_hits': 0,
+                       'conversion_errors': 0}
+
+    def convert(self, macs, format_type=None, facility_code=None):
+        """
+        Convert a batch of MACs
+
+        Args:
+            macs: List of MAC address strings
+            format_type: Format code, 'all', or comma-separated codes (default: the service default)
+            facility_code: Facility code for 26-bit format (default: the service default)
+
+        Returns:
+            List of result dictionaries, in input order
+        """
+        format_type = format_type or self.format_type
+        facility_code = self.facility_code if facility_code is None else facility_code
+        fieldnames, keys = output_fields(format_type)
+        # bool is an int subclass; JSON true must not pass as facility code 1
+        if isinstance(facility_code, bool) or not isinstance(facility_code, int) \
+                or not 0 <= facility_code <= 255:
+            raise ValueError(f"Facility code must be 0-255, got {facility_code}")
+        if not all(isinstance(mac, str) for mac in macs):
+            raise ValueError("MAC addresses must be strings")
+
+        results = [None] * len(macs)
+        misses = []
+        with self._lock:
+            cache = self._cache
+            for i, mac in enumerate(macs):
+                hit = cache.get((format_type, facility_code, mac))
+                if hit is None:
+                    misses.append(i)
+                else:
+                    cache.move_to_end((format_type, facility_code, mac))
+                    results[i] = hit
+            self.counts['cache_hits'] += len(macs) - len(misses)
+
+        if misses:
+            chunk = [macs[i] for i in misses]
+            values, columns, failed = batch_columns(chunk, format_type, facility_code)
+            texts = format_mac_batch(values)
+            fields = [columns[key] for key in keys]
+            fresh = []
+            for j, i in enumerate(misses):
+                if j in failed:
+                    result = {'input': chunk[j], 'error': str(failed[j])}
+                else:
+                    result = dict(zip(fieldnames, (texts[j], *[field[j] for field in fields])))
+                results[i] = result
+                fresh.append(((format_type, facility_code, chunk[j]), result))
+
+            with self._lock:
+                self.counts['conversion_errors'] += len(failed)
+                if self.cache_size:
+                    cache = self._cache
+                    cache.update(fresh)
+                    while len(cache) > self.cache_size:
+                        cache.popitem(last=False)
+
+        return results
+
+    def handle(self, request):
+        """
+        Serve one decoded JSON request
+
+        Args:
+            request: Request dictionary
+
+        Returns:
+            Response dictionary
+        """
+        start = time.perf_counter()
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            if request.get('op') == 'stats':
+                return self.stats()
+            if 'macs' in request:
+                macs = request['macs']
+                if not isinstance(macs, list):
+                    raise ValueError("'macs' must be a list")
+            elif 'mac' in request:
+                macs = [request['mac']]
+            else:
+                raise ValueError("Request needs 'mac' or 'macs'")
+            results = self.convert(macs, request.get('format'), request.get('facility_code'))
+        except ValueError as e:
+            with self._lock:
+                self.counts['requests'] += 1
+                self.counts['failed_requests'] += 1
+            return {'error': str(e)}
+
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.counts['requests'] += 1
+            self.counts['macs'] += len(macs)
+            self._latencies.append(latency)
+        return {'results': results, 'latency_ms': round(latency * 1000, 3)}
+
+    def stats(self):
+        """
+        Service statistics
+
+        Returns:
+            Dictionary with counters, cache size and latency percentiles (ms)
+            over the last LATENCY_WINDOW requests
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.counts)
+            stats['cache_entries'] = len(self._cache)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 3)
+
+        stats.update({
+            'uptime_s': round(time.time() - self.started, 1),
+            'cache_hit_rate': stats['cache_hits'] / stats['macs'] if stats['macs'] else None,
+            'latency_ms': {'p50': percentile(0.50), 'p95': percentile(0.95),
+                           'p99': percentile(0.99), 'max': percentile(1.0),
+                           'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None},
+        })
+        return stats
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """POST /convert, GET /stats, GET /health"""
+
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, self.service.stats())
+        elif self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/convert':
+            self._send(404, {'error': f"Unknown path: {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send(413, {'error': 'Request too large'})
+            self.close_connection = True
+            return
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._send(400, {'error': 'Request body is not valid JSON'})
+            return
+        response = self.service.handle(request)
+        self._send(400 if 'error' in response else 200, response)
+
+    def log_message(self, format, *args):
+        """Keep request logging off the hot path"""
+
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    """Newline-delimited JSON over a stream socket"""
+
+    service = None
+
+    def handle(self):
+        while True:
+            # Bounded read, so an endless line cannot be buffered whole
+            line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            if not line:
+                return
+            if len(line) > MAX_REQUEST_BYTES:
+                # Drop the rest of the oversized line
+                while line and not line.endswith(b'\n'):
+                    line = self.rfile.readline(MAX_REQUEST_BYTES)
+                response = {'error': 'Request too large'}
+            elif not line.strip():
+                continue
+            else:
+                try:
+                    response = self.service.handle(json.loads(line))
+                except ValueError:
+                    response = {'error': 'Request line is not valid JSON'}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def parse_address(address):
+    """
+    Parse a --serve address
+
+    Args:
+        address: 'unix:/path', 'host:port' or 'port'
+
+    Returns:
+        ('unix', path) or ('http', (host, port))
+    """
+    if address.startswith('unix:'):
+        return 'unix', address[5:]
+    host, _, port = address.rpartition(':')
+    try:
+        return 'http', (host or '127.0.0.1', int(port))
+    except ValueError:
+        raise ValueError(f"Invalid service address: {address} (use unix:/path or host:port)")
+
+
+def _is_socket(path):
+    """True if path is a Unix socket (not following symlinks)"""
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def make_server(address, service):
+    """
+    Create the server for an address
+
+    Args:
+        address: 'unix:/path', 'host:port' or 'port'
+        service: ConversionService
+
+    Returns:
+        A socketserver server, not yet serving
+    """
+    kind, where = parse_address(address)
+    if kind == 'unix':
+        if _is_socket(where):
+            os.unlink(where)
+        elif os.path.lexists(where):
+            raise ValueError(f"{where} exists and is not a socket; not replacing it")
+        handler = type('Handler', (_LineHandler,), {'service': service})
+        return _UnixServer(where, handler)
+    handler = type('Handler', (_HTTPHandler,), {'service': service})
+    server = ThreadingHTTPServer(where, handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(address, format_type='all', facility_code=123, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Run the conversion service until interrupted
+
+    Args:
+        address: 'unix:/path', 'host:port' or 'port'
+        format_type: Default format for requests
+        facility_code: Default facility code for 26-bit format
+        cache_size: Results kept in the LRU cache
+    """
+    service = ConversionService(format_type, facility_code, cache_size)
+    server = make_server(address, service)
+    kind, where = parse_address(address)
+    shown = where if kind == 'unix' else f"http://{where[0]}:{server.server_address[1]}/convert"
+    print(f"Conversion service listening on {shown} (Ctrl-C to stop)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if kind == 'unix' and _is_socket(where):
+            os.unlink(where)
+        stats = service.stats()
+        print(f"Served {stats['requests']} requests, {stats['macs']} MACs "
+              f"(p50 {stats['latency_ms']['p50']} ms, p99 {stats['latency_ms']['p99']} ms)",
+              file=sys.stderr)
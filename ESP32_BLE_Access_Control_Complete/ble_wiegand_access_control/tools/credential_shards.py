@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Multi-core Sharded Conversion for mac_to_credential.py
+
+Splits an uncompressed MAC list into byte-range shards and converts them in
+a process pool. Each worker streams its shard through the same batch engine
+as the single-process path and writes a shard file; the parent then either
+concatenates the shards back in input order or keeps them as separate
+per-shard outputs. Per-worker throughput is reported on stderr.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from credential_io import (DEFAULT_CHUNK_SIZE, GZIP_MAGIC, ZSTD_MAGIC, RecordWriter,
+                           iter_mac_lines, open_output, output_format_for)
+from credential_formats import output_fields
+from credential_batch import iter_row_chunks
+
+
+def plan_shards(path, jobs):
+    """
+    Split a file into byte ranges of roughly equal size
+
+    Ranges are raw byte offsets; a line belongs to the shard its first byte
+    falls in, so workers never need to agree on boundaries in advance.
+
+    Args:
+        path: Input filename
+        jobs: Number of shards
+
+    Returns:
+        List of (start, end) byte offsets
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+    step = -(-size // max(1, min(jobs, size)))
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def _iter_shard_lines(path, start, end):
+    """
+    Yield the decoded lines whose first byte lies in [start, end)
+
+    Args:
+        path: Input filename
+        start: First byte offset of the shard
+        end: Byte offset just past the shard
+
+    Yields:
+        Text lines, including their line terminator
+    """
+    with open(path, 'rb') as f:
+        if start > 0:
+            # Skip the tail of a line that began in the previous shard
+            f.seek(start - 1)
+            pos = start - 1 + len(f.readline())
+        else:
+            pos = 0
+
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.decode('utf-8', 'surrogateescape')
+
+
+def _convert_shard(task):
+    """
+    Convert one shard in a worker process
+
+    Args:
+        task: Tuple (index, path, start, end, shard_output, error_output,
+              format_type, facility_code, output_format, chunk_size, header)
+
+    Returns:
+        Dictionary of shard statistics
+    """
+    (index, path, start, end, shard_output, error_output,
+     format_type, facility_code, output_format, chunk_size, header) = task
+    fieldnames, keys = output_fields(format_type)
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    with open_output(shard_output) as out, \
+            open(error_output, 'w', encoding='utf-8', errors='backslashreplace') as errors:
+        writer = RecordWriter(out, fieldnames, output_format, header=header)
+        for rows in iter_row_chunks(iter_mac_lines(_iter_shard_lines(path, start, end)), keys,
+                                    format_type, facility_code, chunk_size, errors):
+            writer.write_rows(rows)
+        error_bytes = errors.tell()
+
+    return {
+        'shard': index,
+        'pid': os.getpid(),
+        'bytes': end - start,
+        'rows': writer.rows_written,
+        'has_errors': error_bytes > 0,
+        'seconds': time.perf_counter() - wall_start,
+        'cpu_seconds': time.process_time() - cpu_start,
+    }
+
+
+def shard_output_name(output_file, index):
+    """
+    Name of the per-shard output file for a given shard
+
+    Args:
+        output_file: Requested output filename, e.g. credentials.csv
+        index: Shard number
+
+    Returns:
+        Filename such as credentials.part0003.csv
+    """
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}.part{index:04d}{ext}"
+
+
+def print_worker_report(stats, total_seconds, stream=None):
+    """
+    Print per-worker throughput
+
+    Args:
+        stats: List of dictionaries from _convert_shard
+        total_seconds: Wall time of the whole run
+        stream: Text stream (default: stderr)
+    """
+    stream = stream or sys.stderr
+    print(f"\n{'Shard':>5} {'PID':>7} {'Rows':>10} {'MB':>8} {'Wall s':>8} {'CPU s':>8} "
+          f"{'Rows/s':>10} {'MB/s':>7}", file=stream)
+    for s in sorted(stats, key=lambda s: s['shard']):
+        seconds = s['seconds'] or 1e-9
+        print(f"{s['shard']:>5} {s['pid']:>7} {s['rows']:>10} {s['bytes'] / 1e6:>8.1f} "
+              f"{s['seconds']:>8.2f} {s['cpu_seconds']:>8.2f} {s['rows'] / seconds:>10.0f} "
+              f"{s['bytes'] / 1e6 / seconds:>7.1f}", file=stream)
+
+    rows = sum(s['rows'] for s in stats)
+    total_bytes = sum(s['bytes'] for s in stats)
+    total_seconds = total_seconds or 1e-9
+    print(f"{'total':>5} {'':>7} {rows:>10} {total_bytes / 1e6:>8.1f} {total_seconds:>8.2f} "
+          f"{sum(s['cpu_seconds'] for s in stats):>8.2f} {rows / total_seconds:>10.0f} "
+          f"{total_bytes / 1e6 / total_seconds:>7.1f}\n", file=stream)
+
+
+def convert_sharded(input_file, output_file, format_type='all', facility_code=123, jobs=None,
+                    output_format=None, chunk_size=DEFAULT_CHUNK_SIZE, errors=None,
+                    split_output=False, report=True):
+    """
+    Convert a MAC list file using a pool of worker processes
+
+    Args:
+        input_file: Uncompressed input filename (stdin and compressed input
+                    cannot be split into byte ranges)
+        output_file: Output filename, or '-' for stdout
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        jobs: Number of worker processes (default: CPU count)
+        output_format: 'csv' or 'ndjson' (default: from the file extension)
+        chunk_size: MACs converted per batch in each worker
+        errors: Text stream for error lines (default: stderr)
+        split_output: Keep one output file per shard instead of merging
+        report: Print per-worker throughput to stderr
+
+    Returns:
+        List of per-shard statistics dictionaries
+    """
+    if input_file == '-':
+        raise ValueError("--jobs needs a regular input file, not stdin")
+    with open(input_file, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC) or magic == ZSTD_MAGIC:
+        raise ValueError("--jobs needs an uncompressed input file")
+    if split_output and output_file == '-':
+        raise ValueError("Per-shard output needs an output filename, not stdout")
+
+    if errors is None:
+        errors = sys.stderr
+    jobs = jobs or os.cpu_count() or 1
+    output_format = output_format_for(output_file, output_format)
+    shards = plan_shards(input_file, jobs)
+
+    temp_dir = os.path.dirname(os.path.abspath(output_file)) if output_file != '-' else None
+    work_dir = tempfile.mkdtemp(prefix='mac_shards_', dir=temp_dir)
+    wall_start = time.perf_counter()
+
+    try:
+        tasks = []
+        for index, (start, end) in enumerate(shards):
+            if split_output:
+                shard_output = shard_output_name(output_file, index)
+            else:
+                shard_output = os.path.join(work_dir, f"shard{index:04d}.out")
+            tasks.append((index, input_file, start, end, shard_output,
+                          os.path.join(work_dir, f"shard{index:04d}.err"),
+                          format_type, facility_code, output_format, chunk_size, split_output))
+
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            stats = list(pool.map(_convert_shard, tasks))
+
+        # Errors, then output, are merged back in input order
+        for task, s in zip(tasks, stats):
+            if s['has_errors']:
+                with open(task[5], encoding='utf-8', errors='surrogateescape') as f:
+                    shutil.copyfileobj(f, errors)
+
+        if not split_output:
+            with open_output(output_file) as out:
+                RecordWriter(out, output_fields(format_type)[0], output_format)
+                out.flush()
+                with open(out.fileno(), 'wb', closefd=False) as raw:
+                    for task in tasks:
+                        with open(task[4], 'rb') as f:
+                            shutil.copyfileobj(f, raw, 1 << 20)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if report:
+        print_worker_report(stats, time.perf_counter() - wall_start)
+
+    return stats
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Incremental Credential Export Store
+
+Keeps the rows of the last export in a local SQLite database so that each
+new run of mac_to_credential.py can emit a delta file with only the added,
+changed and removed rows next to the full snapshot. Rows are keyed on the
+normalized MAC plus the export parameters (format, facility code and
+whether allocated credentials were used), so exports with different
+parameters never overwrite each other.
+
+Only the delta is written back to the store, so a nightly sync of an MDM
+export costs database writes in proportion to the churn, not the fleet.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+from credential_io import (DEFAULT_CHUNK_SIZE, RecordWriter, open_output, output_format_for)
+from credential_formats import output_fields
+from credential_batch import iter_row_chunks
+
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS credential_rows (
+    params TEXT NOT NULL,
+    mac TEXT NOT NULL,
+    row TEXT NOT NULL,
+    PRIMARY KEY (params, mac)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS exports (
+    params TEXT PRIMARY KEY,
+    exported_at TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    changed INTEGER NOT NULL,
+    removed INTEGER NOT NULL
+);
+"""
+
+CHANGE_TYPES = ['added', 'changed', 'removed']
+
+
+def export_params(format_type, facility_code, allocated=False):
+    """
+    Store key for one set of export parameters
+
+    Args:
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        allocated: Whether W26/W34 credentials came from an assignment table
+
+    Returns:
+        String such as 'format=all;fc=123'
+    """
+    params = f"format={format_type};fc={facility_code}"
+    return params + ";allocated" if allocated else params
+
+
+def open_store(path):
+    """
+    Open (and create if needed) an export store
+
+    Args:
+        path: SQLite database filename
+
+    Returns:
+        sqlite3 connection
+    """
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.executescript(STORE_SCHEMA)
+    return db
+
+
+def export_incremental(mac_addresses, store_file, output_file=None, delta_file=None,
+                       format_type='all', facility_code=123, output_format=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None, profile=None):
+    """
+    Convert MAC addresses, write the snapshot and a delta against the store
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        store_file: SQLite store filename
+        output_file: Full snapshot filename, '-' for stdout, or None to skip
+        delta_file: Delta filename, or None to only update the store
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        output_format: 'csv' or 'ndjson' (default: from the file extension)
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+        profile: Optional PipelineProfile (see credential_profile.py)
+
+    Returns:
+        Dictionary with counts of rows, added, changed and removed
+    """
+    fieldnames, keys = output_fields(format_type)
+    params = export_params(format_type, facility_code, allocator is not None)
+    db = open_store(store_file)
+    db.execute("CREATE TEMP TABLE current (mac TEXT PRIMARY KEY, row TEXT NOT NULL) WITHOUT ROWID")
+
+    out = open_output(output_file) if output_file else None
+    try:
+        writer = RecordWriter(out, fieldnames, output_format_for(output_file, output_format)) \
+            if out else None
+        for rows in iter_row_chunks(mac_addresses, keys, format_type, facility_code, chunk_size,
+                                    errors, allocator, profile):
+            if writer:
+                if profile is None:
+                    writer.write_rows(rows)
+                else:
+                    with profile.stage('write'):
+                        writer.write_rows(rows)
+            db.executemany("INSERT OR REPLACE INTO current VALUES (?, ?)",
+                           [(row[0], json.dumps(row[1:])) for row in rows])
+    finally:
+        if out:
+            out.close()
+
+    queries = {
+        'added': """
+            SELECT c.mac, c.row FROM current c
+            LEFT JOIN credential_rows s ON s.params = ? AND s.mac = c.mac
+            WHERE s.mac IS NULL ORDER BY c.mac""",
+        'changed': """
+            SELECT c.mac, c.row FROM current c
+            JOIN credential_rows s ON s.params = ? AND s.mac = c.mac
+            WHERE s.row != c.row ORDER BY c.mac""",
+        'removed': """
+            SELECT s.mac, s.row FROM credential_rows s
+            WHERE s.params = ? AND s.mac NOT IN (SELECT mac FROM current) ORDER BY s.mac""",
+    }
+
+    counts = {'rows': db.execute("SELECT COUNT(*) FROM current").fetchone()[0]}
+    delta = open_output(delta_file) if delta_file else None
+    try:
+        delta_writer = RecordWriter(delta, ['Change'] + fieldnames,
+                                    output_format_for(delta_file, output_format)) if delta else None
+        with db:
+            for change in CHANGE_TYPES:
+                rows = db.execute(queries[change], (params,)).fetchall()
+                counts[change] = len(rows)
+                if delta_writer:
+                    delta_writer.write_rows([(change, mac, *json.loads(row)) for mac, row in rows])
+
+                # Apply only the churn to the store
+                if change == 'removed':
+                    db.executemany("DELETE FROM credential_rows WHERE params = ? AND mac = ?",
+                                   [(params, mac) for mac, _ in rows])
+                else:
+                    db.executemany("INSERT OR REPLACE INTO credential_rows VALUES (?, ?, ?)",
+                                   [(params, mac, row) for mac, row in rows])
+
+            db.execute("INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?, ?, ?)",
+                       (params, datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                        counts['rows'], counts['added'], counts['changed'], counts['removed']))
+    finally:
+        if delta:
+            delta.close()
+        db.close()
+
+    return counts
+
+
+def print_summary(counts, store_file, stream=None):
+    """
+    Print an incremental export summary
+
+    Args:
+        counts: Dictionary from export_incremental
+        store_file: SQLite store filename
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+    print(f"\nIncremental export against {store_file}: {counts['rows']} rows, "
+          f"{counts['added']} added, {counts['changed']} changed, {counts['removed']} removed\n",
+          file=stream)
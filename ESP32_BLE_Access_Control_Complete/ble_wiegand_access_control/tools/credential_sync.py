@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+Fleet-to-Controller Sync Diff
+
+Works out what has to change on the access controller so that it holds
+exactly the credentials of the current MAC list, instead of regenerating
+credentials.csv and reconciling it by hand against a Net2 user export:
+
+- add:    credentials of enrolled MACs the controller does not have yet
+- remove: controller tokens that no enrolled MAC sends any more
+- update: users to edit in place, either renamed (same token, new name)
+          or re-tokened (a remove and an add with the same user name,
+          e.g. after a facility code change), so existing users keep their
+          access levels
+
+Both sides are normalized to one integer key per credential and sorted,
+then compared in a single merge pass. Sorting happens in memory up to
+--run-size rows per side; beyond that, sorted runs are spilled to
+temporary files and merged back with heapq.merge, so memory stays flat
+and the diff scales to multi-million row exports.
+
+The MAC list has one MAC per line, optionally followed by a comma and the
+user name (e.g. 'AA:BB:CC:DD:EE:FF,Jane Smith'); names are only compared
+when given. For 26-bit, only controller tokens with the configured facility
+code are considered, so cards on other facility codes are left alone.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import heapq
+import pickle
+import tempfile
+from operator import itemgetter
+
+from credential_io import (DEFAULT_CHUNK_SIZE, RecordWriter, iter_chunks, iter_mac_lines,
+                           open_error_sink, open_input, open_output)
+from credential_formats import FORMATS, format_mac_batch
+from credential_batch import batch_columns
+
+
+# Rows sorted in memory per side before a run is spilled to disk
+DEFAULT_RUN_SIZE = 1000000
+
+# Rows per pickle record in a spilled run
+SPILL_BATCH = 8192
+
+CHANGE_FILES = ['add', 'remove', 'update']
+
+# Default controller export column(s) holding the user name
+DEFAULT_NAME_COLUMNS = ['Name']
+
+_FIRST = itemgetter(0)
+
+
+class RunSorter:
+    """
+    Sort tuples on their first item with bounded memory
+
+    Rows are sorted in memory until run_size is reached, then written to a
+    temporary file as a sorted run; sorted() merges the runs lazily. The
+    sort is stable: rows with the same first item keep their input order.
+    """
+
+    def __init__(self, run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+        """
+        Args:
+            run_size: Rows held in memory before spilling a run
+            tmp_dir: Directory for spilled runs (default: system temp dir)
+        """
+        self.run_size = run_size
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self._rows = []
+        self._runs = []
+
+    @property
+    def spilled_runs(self):
+        """Number of runs written to disk"""
+        return len(self._runs)
+
+    def extend(self, rows):
+        """
+        Add rows
+
+        Args:
+            rows: List of tuples
+        """
+        start = 0
+        while start < len(rows):
+            room = self.run_size - len(self._rows)
+            self._rows.extend(rows[start:start + room])
+            start += room
+            if len(self._rows) >= self.run_size:
+                self._spill()
+        self.count += len(rows)
+
+    def _spill(self):
+        """Write the in-memory rows as one sorted run"""
+        self._rows.sort(key=_FIRST)
+        f = tempfile.TemporaryFile(dir=self.tmp_dir)
+        for batch in iter_chunks(self._rows, SPILL_BATCH):
+            pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+        f.seek(0)
+        self._runs.append(f)
+        self._rows = []
+
+    @staticmethod
+    def _read_run(f):
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+    def sorted(self):
+        """
+        Iterate over all rows in sorted order (call once)
+
+        Returns:
+            Iterator of rows
+        """
+        if not self._runs:
+            self._rows.sort(key=_FIRST)
+            return iter(self._rows)
+        if self._rows:
+            self._spill()
+        return heapq.merge(*[self._read_run(f) for f in self._runs], key=_FIRST)
+
+    def close(self):
+        """Delete spilled runs"""
+        for f in self._runs:
+            f.close()
+        self._runs = []
+        self._rows = []
+
+
+def _credential_fields(format_code):
+    """The two field specs of a registered format"""
+    if format_code not in FORMATS:
+        raise ValueError(f"Unsupported format: {format_code}")
+    return FORMATS[format_code].fields
+
+
+def load_mac_list(lines, sorter, format_code='26', facility_code=123,
+                  chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None):
+    """
+    Convert the MAC list and feed (key, MAC, name) rows to a sorter
+
+    Args:
+        lines: Iterable of 'MAC' or 'MAC,Name' strings
+        sorter: RunSorter
+        format_code: Credential format code (see credential_formats.py)
+        facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+
+    Returns:
+        Dictionary with counts of valid MACs, named MACs and invalid lines
+    """
+    errors = errors or sys.stderr
+    first, second = (FORMATS[format_code].key(field) for field in _credential_fields(format_code))
+    counts = {'macs': 0, 'named': 0, 'invalid': 0}
+
+    for chunk in iter_chunks(lines, chunk_size):
+        macs, names = [], []
+        for line in chunk:
+            mac, _, name = line.partition(',')
+            macs.append(mac.strip())
+            names.append(name.strip())
+        if not counts['macs'] and not counts['invalid'] and macs[0].lower() == 'mac address':
+            # Header row of a CSV export
+            del macs[0], names[0]
+
+        values, columns, failed = batch_columns(macs, format_code, facility_code, allocator)
+        if failed:
+            errors.write(''.join(f"ERROR processing {macs[i]}: {failed[i]}\n" for i in sorted(failed)))
+        values = values.tolist() if hasattr(values, 'tolist') else values
+        rows = [(a << 32 | b, mac, name)
+                for a, b, mac, name in zip(columns[first], columns[second], values, names)]
+        if failed:
+            rows = [row for i, row in enumerate(rows) if i not in failed]
+
+        sorter.extend(rows)
+        counts['macs'] += len(rows)
+        counts['invalid'] += len(failed)
+        counts['named'] += sum(1 for row in rows if row[2])
+
+    return counts
+
+
+def load_controller_export(stream, sorter, format_code='26', facility_code=123, columns=None,
+                           name_columns=None, chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Read a controller user export and feed (key, name) rows to a sorter
+
+    Args:
+        stream: Text stream of a CSV export with a header row
+        sorter: RunSorter
+        format_code: Credential format code of the tokens
+        facility_code: For 26-bit, only tokens with this facility code are read
+        columns: (first, second) credential columns (default: the format's field titles)
+        name_columns: Columns joined with spaces into the user name (default: 'Name')
+        chunk_size: Rows read per batch
+        errors: Text stream for unparsable rows (default: stderr)
+
+    Returns:
+        Dictionary with counts of rows read, rows out of scope and invalid rows
+    """
+    errors = errors or sys.stderr
+    fields = _credential_fields(format_code)
+    first_col, second_col = columns or [field.title for field in fields]
+    name_columns = name_columns or DEFAULT_NAME_COLUMNS
+    limits = [field.mask for field in fields]
+    # 26-bit tokens carry the configured facility code; others are not ours
+    scope = facility_code if fields[0].shift is None else None
+
+    reader = csv.reader(stream)
+    header = next(reader, None) or []
+    try:
+        first_pos, second_pos = header.index(first_col), header.index(second_col)
+        name_pos = [header.index(column) for column in name_columns]
+    except ValueError:
+        raise ValueError(f"Controller export needs '{first_col}', '{second_col}' and "
+                         f"{', '.join(repr(c) for c in name_columns)} columns")
+
+    counts = {'rows': 0, 'out_of_scope': 0, 'invalid': 0}
+    single_name = name_pos[0] if len(name_pos) == 1 else None
+    for chunk in iter_chunks(reader, chunk_size):
+        rows = []
+        for row in chunk:
+            try:
+                a, b = int(row[first_pos]), int(row[second_pos])
+                if not (0 <= a <= limits[0] and 0 <= b <= limits[1]):
+                    raise ValueError
+                if single_name is not None:
+                    name = row[single_name].strip()
+                else:
+                    name = ' '.join(filter(None, [row[i].strip() for i in name_pos]))
+            except (ValueError, IndexError):
+                errors.write(f"ERROR parsing controller row: {','.join(row)}\n")
+                counts['invalid'] += 1
+                continue
+            if scope is not None and a != scope:
+                counts['out_of_scope'] += 1
+                continue
+            rows.append((a << 32 | b, name))
+        sorter.extend(rows)
+        counts['rows'] += len(rows)
+
+    return counts
+
+
+def merge_join(left, right):
+    """
+    Merge two row streams sorted on their first item
+
+    Args:
+        left: Sorted tuples, e.g. (key, MAC, name) rows
+        right: Sorted tuples, e.g. (key, name) rows
+
+    Yields:
+        Tuples (first item, left rows, right rows); one side may be empty
+    """
+    left, right = iter(left), iter(right)
+    l, r = next(left, None), next(right, None)
+    while l is not None or r is not None:
+        # Groups are almost always a single row; collect any run of equal keys
+        key = l[0] if r is None or (l is not None and l[0] <= r[0]) else r[0]
+        lrows, rrows = [], []
+        while l is not None and l[0] == key:
+            lrows.append(l)
+            l = next(left, None)
+        while r is not None and r[0] == key:
+            rrows.append(r)
+            r = next(right, None)
+        yield key, lrows, rrows
+
+
+class ChangeWriter:
+    """The add, remove and update change files of one sync"""
+
+    def __init__(self, output_dir, format_code, output_format='csv'):
+        """
+        Args:
+            output_dir: Directory for add/remove/update files (created if needed)
+            format_code: Credential format code, for the column names
+            output_format: 'csv' or 'ndjson'
+        """
+        first, second = (field.title for field in _credential_fields(format_code))
+        os.makedirs(output_dir, exist_ok=True)
+        extension = 'ndjson' if output_format == 'ndjson' else 'csv'
+        fieldnames = {
+            'add': ['Name', first, second, 'MAC Address'],
+            'remove': ['Name', first, second],
+            'update': ['Name', first, second, 'MAC Address', 'Change',
+                       'Old Name', f'Old {first}', f'Old {second}'],
+        }
+        self.paths = {}
+        self._streams = {}
+        self._writers = {}
+        self._pending = {change: [] for change in CHANGE_FILES}
+        for change in CHANGE_FILES:
+            path = self.paths[change] = os.path.join(output_dir, f"{change}.{extension}")
+            stream = self._streams[change] = open_output(path)
+            self._writers[change] = RecordWriter(stream, fieldnames[change], output_format)
+
+    def add(self, key, mac, name):
+        self._queue('add', (name, key >> 32, key & 0xFFFFFFFF, mac))
+
+    def remove(self, key, name):
+        self._queue('remove', (name, key >> 32, key & 0xFFFFFFFF))
+
+    def update(self, key, mac, name, change, old_key, old_name):
+        self._queue('update', (name, key >> 32, key & 0xFFFFFFFF, mac, change,
+                               old_name, old_key >> 32, old_key & 0xFFFFFFFF))
+
+    def _queue(self, change, row):
+        pending = self._pending[change]
+        pending.append(row)
+        if len(pending) >= DEFAULT_CHUNK_SIZE:
+            self._flush(change)
+
+    def _flush(self, change):
+        """Write queued rows, formatting their MACs in one batch call"""
+        rows = self._pending[change]
+        if not rows:
+            return
+        if change != 'remove':
+            # Unnamed devices are added under their MAC address
+            macs = format_mac_batch([row[3] for row in rows])
+            rows = [(row[0] or mac,) + row[1:3] + (mac,) + row[4:] for row, mac in zip(rows, macs)]
+        self._writers[change].write_rows(rows)
+        self._pending[change] = []
+
+    def close(self):
+        for change in CHANGE_FILES:
+            self._flush(change)
+            self._streams[change].close()
+
+
+def sync_diff(desired, controller, changes, pair_by_name=True, run_size=DEFAULT_RUN_SIZE,
+              tmp_dir=None):
+    """
+    Compare sorted MAC list and controller rows and write the change files
+
+    Args:
+        desired: RunSorter of (key, MAC, name) rows from load_mac_list
+        controller: RunSorter of (key, name) rows from load_controller_export
+        changes: ChangeWriter
+        pair_by_name: Turn removes and adds with the same user name into updates
+        run_size: Rows in memory per sorter for the pairing pass
+        tmp_dir: Directory for spilled runs
+
+    Returns:
+        Dictionary of result counts
+    """
+    counts = {'in_sync': 0, 'add': 0, 'remove': 0, 'renamed': 0, 'retokened': 0,
+              'duplicate_macs': 0, 'collisions': 0, 'duplicate_tokens': 0, 'spilled_runs': 0}
+    # Named adds and removes wait for the pairing pass, keyed on the name
+    adds = RunSorter(run_size, tmp_dir)
+    removes = RunSorter(run_size, tmp_dir)
+    add_batch, remove_batch = [], []
+
+    try:
+        for key, want, have in merge_join(desired.sorted(), controller.sorted()):
+            if want:
+                # The first listed MAC keeps the credential
+                kept = want[0]
+                if len(want) > 1:
+                    macs = {row[1] for row in want}
+                    counts['collisions'] += len(macs) - 1
+                    counts['duplicate_macs'] += len(want) - len(macs)
+                if not have:
+                    if pair_by_name and kept[2]:
+                        add_batch.append((kept[2], key, kept[1]))
+                        if len(add_batch) >= SPILL_BATCH:
+                            adds.extend(add_batch)
+                            add_batch = []
+                    else:
+                        changes.add(key, kept[1], kept[2])
+                        counts['add'] += 1
+                    continue
+                current = have[0][1]
+                if kept[2] and kept[2] != current:
+                    changes.update(key, kept[1], kept[2], 'name', key, current)
+                    counts['renamed'] += 1
+                else:
+                    counts['in_sync'] += 1
+                if len(have) == 1:
+                    continue
+                have = have[1:]
+                counts['duplicate_tokens'] += len(have)
+
+            for _, name in have:
+                if pair_by_name and name:
+                    remove_batch.append((name, key))
+                    if len(remove_batch) >= SPILL_BATCH:
+                        removes.extend(remove_batch)
+                        remove_batch = []
+                else:
+                    changes.remove(key, name)
+                    counts['remove'] += 1
+
+        adds.extend(add_batch)
+        removes.extend(remove_batch)
+
+        # Second merge on the user name: a removed and an added token of the same user
+        for _, new, old in merge_join(adds.sorted(), removes.sorted()):
+            for (name, key, mac), (_, old_key) in zip(new, old):
+                changes.update(key, mac, name, 'credential', old_key, name)
+                counts['retokened'] += 1
+            for name, key, mac in new[len(old):]:
+                changes.add(key, mac, name)
+                counts['add'] += 1
+            for name, key in old[len(new):]:
+                changes.remove(key, name)
+                counts['remove'] += 1
+
+        counts['spilled_runs'] = sum(s.spilled_runs for s in (desired, controller, adds, removes))
+    finally:
+        adds.close()
+        removes.close()
+
+    counts['update'] = counts['renamed'] + counts['retokened']
+    return counts
+
+
+def print_summary(summary, stream=None):
+    """
+    Print a sync summary
+
+    Args:
+        summary: Dictionary from run_sync
+        stream: Output stream (default: stdout)
+    """
+    out = stream or sys.stdout
+    label = FORMATS[summary['format']].label
+    out.write(f"\n{'='*60}\n{label} sync: {summary['macs']:,} enrolled MACs vs "
+              f"{summary['controller_rows']:,} controller tokens\n{'='*60}\n")
+    out.write(f"In sync:      {summary['in_sync']:,}\n")
+    out.write(f"Add:          {summary['add']:,}\n")
+    out.write(f"Remove:       {summary['remove']:,}\n")
+    out.write(f"Update:       {summary['update']:,} ({summary['renamed']:,} renamed, "
+              f"{summary['retokened']:,} new token)\n")
+    if summary['out_of_scope']:
+        out.write(f"Ignored {summary['out_of_scope']:,} controller tokens with another facility code\n")
+    if summary['invalid_macs'] or summary['invalid_rows']:
+        out.write(f"Skipped {summary['invalid_macs']:,} invalid MACs and "
+                  f"{summary['invalid_rows']:,} invalid controller rows\n")
+    if summary['collisions']:
+        out.write(f"WARNING: {summary['collisions']:,} MACs share a credential with another MAC "
+                  f"and cannot be enrolled separately (see credential_collisions.py, --allocate)\n")
+    if summary['duplicate_tokens']:
+        out.write(f"{summary['duplicate_tokens']:,} duplicate controller tokens are listed for removal\n")
+    spilled = f", {summary['spilled_runs']} sorted runs spilled" if summary['spilled_runs'] else ''
+    out.write(f"Diffed in {summary['seconds']:.2f}s{spilled}\n")
+    for change, path in summary['files'].items():
+        out.write(f"  {change:<7} {path}\n")
+    out.write('\n')
+
+
+def run_sync(mac_lines, controller_stream, output_dir, format_code='26', facility_code=123,
+             columns=None, name_columns=None, output_format='csv', run_size=DEFAULT_RUN_SIZE,
+             tmp_dir=None, chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None):
+    """
+    Diff a MAC list against a controller export and write the change files
+
+    Args:
+        mac_lines: Iterable of 'MAC' or 'MAC,Name' strings
+        controller_stream: Text stream of the controller user export CSV
+        output_dir: Directory for add/remove/update files
+        format_code: Credential format code
+        facility_code: Facility code for 26-bit format
+        columns: Controller credential columns (default: the format's field titles)
+        name_columns: Controller name columns (default: 'Name')
+        output_format: 'csv' or 'ndjson'
+        run_size: Rows sorted in memory per side before spilling to disk
+        tmp_dir: Directory for spilled runs
+        chunk_size: Rows converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+
+    Returns:
+        Summary dictionary
+    """
+    start = time.perf_counter()
+    desired = RunSorter(run_size, tmp_dir)
+    controller = RunSorter(run_size, tmp_dir)
+    try:
+        mac_counts = load_mac_list(mac_lines, desired, format_code, facility_code, chunk_size,
+                                   errors, allocator)
+        controller_counts = load_controller_export(controller_stream, controller, format_code,
+                                                   facility_code, columns, name_columns,
+                                                   chunk_size, errors)
+        changes = ChangeWriter(output_dir, format_code, output_format)
+        try:
+            counts = sync_diff(desired, controller, changes, mac_counts['named'] > 0,
+                               run_size, tmp_dir)
+        finally:
+            changes.close()
+    finally:
+        desired.close()
+        controller.close()
+
+    summary = {'format': format_code, 'macs': mac_counts['macs'],
+               'invalid_macs': mac_counts['invalid'], 'controller_rows': controller_counts['rows'],
+               'out_of_scope': controller_counts['out_of_scope'],
+               'invalid_rows': controller_counts['invalid']}
+    summary.update(counts)
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    summary['files'] = changes.paths
+    return summary
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Diff the enrolled MAC list against a controller user export',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+The MAC list has one MAC per line, optionally 'MAC,Name'. The controller
+export is a CSV with a header row; by default the columns are 'Facility
+Code', 'Card Number' and 'Name' ('Version' and 'Card ID' for 40-bit).
+
+Examples:
+  # Work out the W26 changes for a Net2 user export
+  python credential_sync.py -i mac_list.txt -e net2_users.csv -c 123 -o changes/
+
+  # Names in separate columns, W34 tokens
+  python credential_sync.py -i devices.csv -e users.csv -f 34 --name-columns "First name" Surname -o changes/
+
+  # Ten-million-line lists with at most 2M rows per sorted run
+  python credential_sync.py -i fleet.txt.gz -e export.csv -o changes/ --run-size 2000000 --tmp-dir /var/tmp
+        """
+    )
+
+    parser.add_argument('-i', '--input', required=True,
+                       help="MAC list, one 'MAC' or 'MAC,Name' per line; - for stdin")
+    parser.add_argument('-e', '--controller', required=True, help='Controller user export CSV')
+    parser.add_argument('-o', '--output-dir', required=True,
+                       help='Directory for the add, remove and update files')
+    parser.add_argument('-f', '--format', choices=list(FORMATS), default='26',
+                       help='Credential format of the controller tokens (default: 26)')
+    parser.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit Wiegand format (default: 123)')
+    parser.add_argument('--columns', nargs=2, metavar=('FIRST', 'SECOND'),
+                       help='Controller columns holding FC and CN (or version and card ID)')
+    parser.add_argument('--name-columns', nargs='+', metavar='COLUMN',
+                       help="Controller columns joined into the user name (default: Name)")
+    parser.add_argument('--output-format', choices=['csv', 'ndjson'], default='csv',
+                       help='Change file format (default: csv)')
+    parser.add_argument('--allocate', metavar='TABLE',
+                       help='Use W26/W34 credentials from an assignment table (see credential_allocator.py)')
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE,
+                       help=f'Rows sorted in memory before spilling to disk (default: {DEFAULT_RUN_SIZE})')
+    parser.add_argument('--tmp-dir', help='Directory for spilled sort runs')
+    parser.add_argument('--summary', help='Also write the summary as JSON to this file')
+    parser.add_argument('--errors', help='Write invalid MACs and rows to this file (default: stderr)')
+
+    args = parser.parse_args()
+
+    if not 0 <= args.facility_code <= 255:
+        print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
+        sys.exit(1)
+    if args.allocate and args.format not in ['26', '34']:
+        parser.error('--allocate needs -f 26 or -f 34')
+    if args.run_size < 1:
+        parser.error('--run-size must be positive')
+
+    try:
+        allocator = None
+        if args.allocate:
+            from credential_allocator import CredentialAllocator
+            allocator = CredentialAllocator(args.allocate, args.facility_code)
+
+        with open_input(args.input) as f, open_input(args.controller) as controller, \
+                open_error_sink(args.errors) as errors:
+            summary = run_sync(iter_mac_lines(f), controller, args.output_dir, args.format,
+                               args.facility_code, args.columns, args.name_columns,
+                               args.output_format, args.run_size, args.tmp_dir, errors=errors,
+                               allocator=allocator)
+        if allocator is not None:
+            allocator.save()
+            allocator.close()
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Differential Test Harness: Python Tools vs Firmware Conversion
+
+The Python tools and the sketch each implement the MAC -> credential rules
+and WiegandOut's parity, and nothing stops the two drifting apart. This
+harness compiles the firmware's own code for the host and checks it
+against the tools, frame by frame:
+
+- macToCardNumber, macToFacilityCode34 and sendCredential are cut out of
+  ble_wiegand_access_control.ino verbatim and compiled together with the
+  unmodified wiegandOutput.h, against a minimal Arduino String/Serial stub.
+- The stub's digitalWrite records every pulse on D0/D1, so what is
+  compared is the exact bit sequence the reader would put on the wire,
+  parity included.
+- The Python side is convert_batch (the mac_to_credential.py rules)
+  followed by wiegand_frames.encode_frames.
+- Sketch settings that change the conversion are built as the sketch sets
+  them: a sketch with EM4100_CARD_ID_LEGACY (or --em4100-legacy) sends
+  the old EM4100 card IDs, and every such frame is reported as a mismatch.
+
+MACs are streamed to the compiled harness in binary batches, as the
+lower- or upper-case "aa:bb:cc:dd:ee:ff" text the BLE stack reports, and
+every mismatch is reported with the fields that differ. The default run
+is a million random MACs plus edge cases; --exhaustive covers the whole
+16-bit card space, for every 26-bit facility code and for a set of
+upper-byte patterns in 34-bit and EM4100, which takes well under a
+minute with NumPy installed.
+
+Needs a C++ compiler (c++, g++ or clang++). Exits with code 1 on any
+mismatch, so it can run in CI.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import struct
+import shutil
+import tempfile
+import subprocess
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; comparisons fall back to plain Python
+    np = None
+
+from credential_formats import FORMATS, convert_batch, format_mac_batch
+from credential_io import iter_mac_lines, open_error_sink, open_input
+from credential_collisions import iter_valid_macs
+from wiegand_frames import FRAME_BITS, FRAME_FIELDS, GOLDEN_MACS, decode_frames, encode_frames
+
+
+FIRMWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKETCH_FILE = os.path.join(FIRMWARE_DIR, 'ble_wiegand_access_control.ino')
+WIEGAND_HEADER = os.path.join(FIRMWARE_DIR, 'wiegandOutput.h')
+
+# Sketch functions compiled into the harness, in dependency order
+FIRMWARE_FUNCTIONS = ['macToCardNumber', 'macToFacilityCode34', 'sendCredential']
+
+DEFAULT_BATCH_SIZE = 65536
+
+# Upper 32 bits combined with every 16-bit card number in --exhaustive runs:
+# none, all, alternating, and each single bit
+UPPER_PATTERNS = [0, 0xFFFFFFFF, 0x55555555, 0xAAAAAAAA] + [1 << bit for bit in range(32)]
+
+ARDUINO_STUB = r"""
+/* Minimal Arduino core for building firmware logic on the host */
+#ifndef ARDUINO_STUB_H
+#define ARDUINO_STUB_H
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <ctype.h>
+#include <string>
+#include <utility>
+
+#define HIGH 1
+#define LOW 0
+#define OUTPUT 1
+#define HEX 16
+
+class String {
+ public:
+  String() {}
+  String(const char* text) : s_(text) {}
+  String(const std::string& text) : s_(text) {}
+  unsigned int length() const { return (unsigned int)s_.size(); }
+  const char* c_str() const { return s_.c_str(); }
+  void toLowerCase() {
+    for (size_t i = 0; i < s_.size(); i++) s_[i] = (char)tolower((unsigned char)s_[i]);
+  }
+  void replace(const String& find, const String& with) {
+    if (find.s_.empty()) return;
+    size_t pos = 0;
+    while ((pos = s_.find(find.s_, pos)) != std::string::npos) {
+      s_.replace(pos, find.s_.size(), with.s_);
+      pos += with.s_.size();
+    }
+  }
+  String substring(unsigned int from) const { return substring(from, length()); }
+  String substring(unsigned int from, unsigned int to) const {
+    /* Arduino semantics: swapped bounds are reordered, the end is clamped */
+    if (from > to) std::swap(from, to);
+    if (from >= s_.size()) return String();
+    if (to > s_.size()) to = (unsigned int)s_.size();
+    return String(s_.substr(from, to - from));
+  }
+  bool operator==(const String& other) const { return s_ == other.s_; }
+
+ private:
+  std::string s_;
+};
+
+/* Debug output is compiled but discarded */
+struct SerialStub {
+  template <typename T> void print(const T&) {}
+  template <typename T> void print(const T&, int) {}
+  template <typename T> void println(const T&) {}
+  template <typename T> void println(const T&, int) {}
+  void println() {}
+};
+extern SerialStub Serial;
+
+void pinMode(int pin, int mode);
+void digitalWrite(int pin, int level);
+void delayMicroseconds(unsigned int us);
+unsigned long millis();
+
+#endif
+"""
+
+HARNESS_SOURCE = r"""
+/* Generated by tools/firmware_diff.py: firmware conversion on the host */
+#include <stdio.h>
+#include <string.h>
+#include <vector>
+
+#include "Arduino.h"
+#include "wiegandOutput.h"
+
+#define WIEGAND_D0_PIN {d0_pin}
+#define WIEGAND_D1_PIN {d1_pin}
+
+SerialStub Serial;
+
+/* Every pulse is one bit: D0 low sends 0, D1 low sends 1 */
+static uint64_t frameBits;
+static int frameLength;
+
+void pinMode(int, int) {{}}
+void delayMicroseconds(unsigned int) {{}}
+unsigned long millis() {{ return 0; }}
+void digitalWrite(int pin, int level) {{
+  if (level == LOW) {{
+    frameBits = frameBits << 1 | (pin == WIEGAND_D1_PIN ? 1 : 0);
+    frameLength++;
+  }}
+}}
+
+/* Sketch settings become run-time values so one build covers every format */
+static int outputFormat = 26;
+static uint32_t facilityCode = 123;
+#define OUTPUT_FORMAT outputFormat
+#define FACILITY_CODE facilityCode
+#define DEBUG_MODE false
+#define EM4100_CARD_ID_LEGACY {em4100_legacy}
+
+WiegandOut wiegandOut(WIEGAND_D0_PIN, WIEGAND_D1_PIN, DEBUG_MODE);
+
+/* ---- From ble_wiegand_access_control.ino ---- */
+{functions}
+/* ---- End of sketch code ---- */
+
+/*
+ * Protocol on stdin/stdout, little-endian:
+ * request  = u32 format, u32 facility code, u32 upper-case flag, u32 count,
+ *            then count u64 MACs
+ * response = count u64: bit count << 56 | bits as sent, first bit highest
+ * A count of 0 ends the run.
+ */
+int main() {{
+  uint32_t header[4];
+  std::vector<uint64_t> macs;
+  std::vector<uint64_t> frames;
+  char text[18];
+
+  while (fread(header, sizeof(header), 1, stdin) == 1 && header[3] > 0) {{
+    outputFormat = (int)header[0];
+    facilityCode = header[1];
+    const char* layout = header[2] ? "%02X:%02X:%02X:%02X:%02X:%02X"
+                                   : "%02x:%02x:%02x:%02x:%02x:%02x";
+    macs.resize(header[3]);
+    frames.resize(header[3]);
+    if (fread(macs.data(), sizeof(uint64_t), macs.size(), stdin) != macs.size()) return 1;
+
+    for (size_t i = 0; i < macs.size(); i++) {{
+      uint64_t mac = macs[i];
+      snprintf(text, sizeof(text), layout,
+               (unsigned)(mac >> 40) & 0xFF, (unsigned)(mac >> 32) & 0xFF,
+               (unsigned)(mac >> 24) & 0xFF, (unsigned)(mac >> 16) & 0xFF,
+               (unsigned)(mac >> 8) & 0xFF, (unsigned)mac & 0xFF);
+      frameBits = 0;
+      frameLength = 0;
+      sendCredential(String(text));
+      frames[i] = (uint64_t)frameLength << 56 | frameBits;
+    }}
+    fwrite(frames.data(), sizeof(uint64_t), frames.size(), stdout);
+    fflush(stdout);
+  }}
+  return 0;
+}}
+"""
+
+
+def extract_function(source, name):
+    """
+    Cut one function definition (with its doc comment) out of C/C++ source
+
+    Args:
+        source: Source text
+        name: Function name
+
+    Returns:
+        The function's source text
+    """
+    match = re.search(r'^[ \t]*[A-Za-z_][\w<>:\*& \t]*\b' + re.escape(name) + r'\s*\([^;{)]*\)\s*\{',
+                      source, re.MULTILINE)
+    if not match:
+        raise ValueError(f"Function {name} not found in the sketch")
+
+    # Include the /** ... */ comment directly above, if any
+    start = match.start()
+    comment = source.rfind('/**', 0, start)
+    if comment >= 0 and source[source.find('*/', comment) + 2:start].strip() == '':
+        start = comment
+
+    depth = 0
+    i = match.end() - 1
+    while i < len(source):
+        char = source[i]
+        if char in '"\'':
+            # Skip a string or character literal
+            i += 1
+            while source[i] != char:
+                i += 2 if source[i] == '\\' else 1
+        elif source.startswith('//', i):
+            i = source.index('\n', i)
+        elif source.startswith('/*', i):
+            i = source.index('*/', i) + 1
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return source[start:i + 1]
+        i += 1
+    raise ValueError(f"Unbalanced braces in {name}")
+
+
+def sketch_define(source, name):
+    """Integer value of a #define in the sketch"""
+    match = re.search(r'^#define\s+' + re.escape(name) + r'\s+(\d+)', source, re.MULTILINE)
+    if not match:
+        raise ValueError(f"#define {name} not found in the sketch")
+    return int(match.group(1))
+
+
+def sketch_flag(source, name):
+    """Boolean value of a true/false #define in the sketch"""
+    match = re.search(r'^#define\s+' + re.escape(name) + r'\s+(true|false)\b', source, re.MULTILINE)
+    if not match:
+        raise ValueError(f"#define {name} not found in the sketch")
+    return match.group(1) == 'true'
+
+
+class FirmwareHarness:
+    """The sketch's conversion code, compiled for the host and run as a subprocess"""
+
+    def __init__(self, sketch_file=SKETCH_FILE, wiegand_header=WIEGAND_HEADER, cxx='c++',
+                 em4100_legacy=None):
+        """
+        Args:
+            sketch_file: Path of ble_wiegand_access_control.ino
+            wiegand_header: Path of wiegandOutput.h
+            cxx: C++ compiler
+            em4100_legacy: EM4100_CARD_ID_LEGACY (default: as set in the sketch)
+        """
+        if not shutil.which(cxx):
+            raise ValueError(f"C++ compiler not found: {cxx}")
+        with open(sketch_file) as f:
+            sketch = f.read()
+
+        if em4100_legacy is None:
+            em4100_legacy = sketch_flag(sketch, 'EM4100_CARD_ID_LEGACY')
+        functions = '\n\n'.join(extract_function(sketch, name) for name in FIRMWARE_FUNCTIONS)
+        source = HARNESS_SOURCE.format(d0_pin=sketch_define(sketch, 'WIEGAND_D0_PIN'),
+                                       d1_pin=sketch_define(sketch, 'WIEGAND_D1_PIN'),
+                                       em4100_legacy='true' if em4100_legacy else 'false',
+                                       functions=functions)
+
+        self._tmp = tempfile.TemporaryDirectory()
+        tmp = self._tmp.name
+        with open(os.path.join(tmp, 'Arduino.h'), 'w') as f:
+            f.write(ARDUINO_STUB)
+        shutil.copy(wiegand_header, os.path.join(tmp, 'wiegandOutput.h'))
+        with open(os.path.join(tmp, 'firmware_harness.cpp'), 'w') as f:
+            f.write(source)
+
+        binary = os.path.join(tmp, 'firmware_harness')
+        build = subprocess.run([cxx, '-O2', '-std=c++11', '-w', '-I', tmp, '-o', binary,
+                                os.path.join(tmp, 'firmware_harness.cpp')],
+                               capture_output=True, text=True)
+        if build.returncode != 0:
+            self._tmp.cleanup()
+            raise ValueError(f"Compiling the firmware harness failed:\n{build.stderr}")
+
+        self._process = subprocess.Popen([binary], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def frames(self, values, format_code, facility_code=123, upper=False):
+        """
+        Run a batch of MACs through sendCredential
+
+        Args:
+            values: Packed 48-bit MAC integers
+            format_code: '26', '34' or '40' (OUTPUT_FORMAT)
+            facility_code: FACILITY_CODE
+            upper: Pass the MACs as upper-case text
+
+        Returns:
+            Tuple (frames, lengths): the bits sent, first bit highest, and
+            the number of bits; uint64 arrays with NumPy, else lists
+        """
+        count = len(values)
+        if np is not None:
+            payload = np.asarray(values, dtype='<u8').tobytes()
+        else:
+            payload = struct.pack(f'<{count}Q', *values)
+        self._process.stdin.write(struct.pack('<IIII', int(format_code), facility_code,
+                                              int(upper), count) + payload)
+        self._process.stdin.flush()
+
+        reply = self._process.stdout.read(8 * count)
+        if len(reply) != 8 * count:
+            raise ValueError("Firmware harness exited unexpectedly")
+        if np is not None:
+            words = np.frombuffer(reply, dtype='<u8')
+            return words & np.uint64((1 << 56) - 1), words >> np.uint64(56)
+        words = struct.unpack(f'<{count}Q', reply)
+        return [w & ((1 << 56) - 1) for w in words], [w >> 56 for w in words]
+
+    def close(self):
+        """Stop the harness process and remove its build directory"""
+        if self._process.poll() is None:
+            self._process.stdin.write(struct.pack('<IIII', 0, 0, 0, 0))
+            self._process.stdin.close()
+            self._process.wait()
+        self._process.stdout.close()
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def tool_frames(values, format_code, facility_code=123):
+    """
+    Frames the Python tools predict for a batch of MACs
+
+    Args:
+        values: Packed 48-bit MAC integers
+        format_code: '26', '34' or '40'
+        facility_code: Facility code for 26-bit format
+
+    Returns:
+        Frames from wiegand_frames.encode_frames
+    """
+    columns = convert_batch(values, format_code, facility_code)
+    first, second = (columns[key] for key in FRAME_FIELDS[format_code])
+    return encode_frames(format_code, first, second)
+
+
+def describe_mismatch(value, format_code, expected, got, got_bits):
+    """
+    One line explaining a mismatch
+
+    Args:
+        value: Packed MAC
+        format_code: '26', '34' or '40'
+        expected: Frame from the tools
+        got: Frame from the firmware
+        got_bits: Bits the firmware sent
+
+    Returns:
+        Report line naming the fields that differ
+    """
+    bits = FRAME_BITS[format_code]
+    mac = format_mac_batch([value])[0]
+    digits = (bits + 3) // 4
+    line = (f"MISMATCH W{format_code} {mac}: tools {expected:0{digits}X}, "
+            f"firmware {got:0{digits}X}")
+    if got_bits != bits:
+        return line + f" ({got_bits} bits sent, expected {bits})"
+
+    fields = FORMATS[format_code].fields
+    expected_fields = [int(v[0]) for v in decode_frames(format_code, [expected])]
+    got_fields = [int(v[0]) for v in decode_frames(format_code, [got])]
+    differing = [f"{field.title} {e} vs {g}"
+                 for field, e, g in zip(fields, expected_fields, got_fields) if e != g]
+    return line + f" ({', '.join(differing) if differing else 'parity'})"
+
+
+def compare_batch(harness, values, format_code, facility_code=123, upper=False):
+    """
+    Run one batch through both implementations
+
+    Args:
+        harness: FirmwareHarness
+        values: Packed 48-bit MAC integers
+        format_code: '26', '34' or '40'
+        facility_code: Facility code for 26-bit format
+        upper: Pass the MACs to the firmware as upper-case text
+
+    Returns:
+        List of (value, expected, got, got_bits) for every mismatch
+    """
+    expected = tool_frames(values, format_code, facility_code)
+    got, got_bits = harness.frames(values, format_code, facility_code, upper)
+    bits = FRAME_BITS[format_code]
+
+    if np is not None:
+        values = np.asarray(values, dtype=np.uint64)
+        bad = np.flatnonzero((expected != got) | (got_bits != bits))
+        return [(int(values[i]), int(expected[i]), int(got[i]), int(got_bits[i])) for i in bad]
+
+    return [(v, e, g, n) for v, e, g, n in zip(values, expected, got, got_bits)
+            if e != g or n != bits]
+
+
+def edge_macs():
+    """
+    Edge-case MACs: the golden vectors, single set and cleared bits in
+    every position, and alternating patterns
+
+    Returns:
+        List of packed MACs
+    """
+    from credential_formats import mac_to_int
+
+    values = [mac_to_int(mac) for mac in GOLDEN_MACS]
+    full = (1 << 48) - 1
+    for bit in range(48):
+        values += [1 << bit, full ^ (1 << bit)]
+    values += [0x555555555555, 0xAAAAAAAAAAAA, 0x00FF00FF00FF, 0xFF00FF00FF00]
+    return values
+
+
+def random_batches(count, batch_size, seed=1):
+    """Yield batches of seeded random MACs, count in total"""
+    rng = random.Random(seed)
+    while count > 0:
+        size = min(batch_size, count)
+        if np is not None:
+            yield np.frombuffer(rng.randbytes(8 * size), dtype='<u8') & np.uint64((1 << 48) - 1)
+        else:
+            yield [rng.getrandbits(48) for _ in range(size)]
+        count -= size
+
+
+def exhaustive_batches(format_code, facility_code=123):
+    """
+    Yield (facility_code, batch) pairs covering the whole 16-bit card space
+
+    26-bit: every card number for every facility code 0-255 (the upper MAC
+    bytes cycle through UPPER_PATTERNS). 34-bit and EM4100: every card
+    number under each of UPPER_PATTERNS.
+    """
+    if np is not None:
+        cards = np.arange(1 << 16, dtype=np.uint64)
+    else:
+        cards = range(1 << 16)
+
+    def batch(upper):
+        if np is not None:
+            return np.uint64(upper) << np.uint64(16) | cards
+        return [upper << 16 | card for card in cards]
+
+    if format_code == '26':
+        for fc in range(256):
+            yield fc, batch(UPPER_PATTERNS[fc % len(UPPER_PATTERNS)])
+    else:
+        for upper in UPPER_PATTERNS:
+            yield facility_code, batch(upper)
+
+
+def run_diff(batches, formats, harness, facility_code=123, max_report=20, stream=None,
+             exhaustive=False):
+    """
+    Compare the tools and the firmware over a MAC corpus
+
+    Args:
+        batches: Callable returning an iterable of packed-MAC batches
+                 (ignored with exhaustive)
+        formats: Format codes to check
+        harness: FirmwareHarness
+        facility_code: Facility code for 26-bit format
+        max_report: Mismatch lines printed per format
+        stream: Text stream for the report (default: stdout)
+        exhaustive: Walk the 16-bit card space instead of batches
+
+    Returns:
+        Dictionary of format code to (checked, mismatches)
+    """
+    stream = stream or sys.stdout
+    results = {}
+    for code in formats:
+        checked = mismatches = 0
+        start = time.perf_counter()
+        if exhaustive:
+            work = exhaustive_batches(code, facility_code)
+        else:
+            work = ((facility_code, values) for values in batches())
+        for n, (fc, values) in enumerate(work):
+            for value, expected, got, got_bits in compare_batch(harness, values, code, fc,
+                                                                upper=n % 2 == 1):
+                if mismatches < max_report:
+                    line = describe_mismatch(value, code, expected, got, got_bits)
+                    stream.write(line + (f" [facility code {fc}]\n" if code == '26' else "\n"))
+                mismatches += 1
+            checked += len(values)
+        elapsed = time.perf_counter() - start
+        results[code] = (checked, mismatches)
+        stream.write(f"W{code}: {checked:,} MACs, {mismatches:,} mismatches "
+                     f"({checked / max(elapsed, 1e-9):,.0f} MACs/s)\n")
+    return results
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Check the firmware conversion and parity code against the Python tools',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # One million random MACs plus edge cases, all formats
+  python firmware_diff.py
+
+  # The whole 16-bit card space (every 26-bit facility code), as in CI
+  python firmware_diff.py --exhaustive
+
+  # A real fleet, 26-bit only
+  python firmware_diff.py -i mac_list.txt -f 26 -c 42
+
+  # How far a reader built with EM4100_CARD_ID_LEGACY drifts from the tools
+  python firmware_diff.py -f 40 -n 10000 --em4100-legacy
+        """
+    )
+
+    parser.add_argument('-i', '--input',
+                       help='Check these MAC addresses (one per line) instead of random ones; - for stdin')
+    parser.add_argument('-n', '--count', type=int, default=1000000,
+                       help='Random MACs per format (default: 1000000)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--exhaustive', action='store_true',
+                       help='Cover every 16-bit card number (and every 26-bit facility code)')
+    parser.add_argument('-f', '--format', choices=['26', '34', '40', 'all'], default='all',
+                       help='Formats to check (default: all)')
+    parser.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit format (default: 123)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                       help=f'MACs per batch sent to the harness (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--max-report', type=int, default=20,
+                       help='Mismatches printed per format (default: 20)')
+    parser.add_argument('--cxx', default='c++', help='C++ compiler (default: c++)')
+    parser.add_argument('--sketch', default=SKETCH_FILE, help='Path of the .ino sketch')
+    parser.add_argument('--em4100-legacy', action='store_true', default=None,
+                       help='Build with EM4100_CARD_ID_LEGACY true (default: as set in the sketch)')
+
+    args = parser.parse_args()
+
+    if not 0 <= args.facility_code <= 255:
+        print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
+        sys.exit(1)
+    if args.exhaustive and args.input:
+        parser.error('--exhaustive cannot be combined with -i')
+
+    formats = list(FRAME_BITS) if args.format == 'all' else [args.format]
+
+    def batches():
+        if args.input:
+            with open_input(args.input) as f, open_error_sink(None) as errors:
+                yield from iter_valid_macs(iter_mac_lines(f), args.batch_size, errors)
+        else:
+            yield edge_macs()
+            yield from random_batches(args.count, args.batch_size, args.seed)
+
+    try:
+        with FirmwareHarness(args.sketch, cxx=args.cxx, em4100_legacy=args.em4100_legacy) as harness:
+            results = run_diff(batches, formats, harness, args.facility_code, args.max_report,
+                               exhaustive=args.exhaustive)
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    total = sum(mismatches for _, mismatches in results.values())
+    print("OK" if not total else f"FAILED: {total:,} mismatches")
+    if total:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,8 @@
 MAC Address to Access Control Credential Converter
 
 This tool helps you convert BLE device MAC addresses to their corresponding
-access control credentials for Wiegand 26-bit, Wiegand 34-bit, and EM4100 40-bit formats.
+access control credentials for Wiegand 26-bit, Wiegand 34-bit, and EM4100 40-bit formats,
+plus HID Corporate 1000 35-bit and H10304 37-bit (see credential_formats.py).
 
 Use this to pre-calculate the credentials that will be sent to your access
 control system so you can add them to your controller configuration.
@@ -13,120 +14,15 @@ Date: October 2025
 """
 
 import sys
-import re
 
+from credential_formats import FORMATS, encode_mac, output_fields, resolve_formats
+from credential_io import (DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, RecordWriter, iter_mac_lines,
+                           open_error_sink, open_input, open_output, output_format_for)
+from credential_batch import iter_column_chunks, iter_row_chunks, profile_stage
 
-def normalize_mac(mac_address):
-    """
-    Normalize MAC address to standard format
-    
-    Args:
-        mac_address: MAC address in various formats
-        
-    Returns:
-        Normalized MAC address (uppercase with colons)
-    """
-    # Remove common separators
-    mac = mac_address.replace(':', '').replace('-', '').replace('.', '').upper()
-    
-    # Validate length
-    if len(mac) != 12:
-        raise ValueError(f"Invalid MAC address length: {mac_address}")
-    
-    # Validate hex characters
-    if not all(c in '0123456789ABCDEF' for c in mac):
-        raise ValueError(f"Invalid MAC address characters: {mac_address}")
-    
-    # Format with colons
-    return ':'.join([mac[i:i+2] for i in range(0, 12, 2)])
-
-
-def mac_to_wiegand_26(mac_address, facility_code=123):
-    """
-    Convert MAC address to 26-bit Wiegand format
-    
-    Args:
-        mac_address: MAC address string
-        facility_code: 8-bit facility code (0-255)
-        
-    Returns:
-        Dictionary with facility code and card number
-    """
-    # Normalize MAC
-    mac = normalize_mac(mac_address)
-    
-    # Extract last 2 bytes for card number
-    mac_bytes = mac.replace(':', '')
-    card_number = int(mac_bytes[-4:], 16)  # Last 4 hex chars = 2 bytes
-    
-    # Validate facility code
-    if not 0 <= facility_code <= 255:
-        raise ValueError(f"Facility code must be 0-255, got {facility_code}")
-    
-    return {
-        'format': 'Wiegand 26-bit',
-        'mac_address': mac,
-        'facility_code': facility_code,
-        'card_number': card_number,
-        'facility_code_hex': f'0x{facility_code:02X}',
-        'card_number_hex': f'0x{card_number:04X}'
-    }
-
-
-def mac_to_wiegand_34(mac_address):
-    """
-    Convert MAC address to 34-bit Wiegand format
-    
-    Args:
-        mac_address: MAC address string
-        
-    Returns:
-        Dictionary with facility code and card number
-    """
-    # Normalize MAC
-    mac = normalize_mac(mac_address)
-    
-    # Extract bytes for facility code and card number
-    mac_bytes = mac.replace(':', '')
-    facility_code = int(mac_bytes[4:8], 16)  # Bytes 3-4
-    card_number = int(mac_bytes[-4:], 16)    # Last 2 bytes
-    
-    return {
-        'format': 'Wiegand 34-bit',
-        'mac_address': mac,
-        'facility_code': facility_code,
-        'card_number': card_number,
-        'facility_code_hex': f'0x{facility_code:04X}',
-        'card_number_hex': f'0x{card_number:04X}'
-    }
-
-
-def mac_to_em4100(mac_address):
-    """
-    Convert MAC address to 40-bit EM4100 format
-    
-    Args:
-        mac_address: MAC address string
-        
-    Returns:
-        Dictionary with version and card ID
-    """
-    # Normalize MAC
-    mac = normalize_mac(mac_address)
-    
-    # Extract bytes
-    mac_bytes = mac.replace(':', '')
-    version = int(mac_bytes[0:2], 16)      # First byte
-    card_id = int(mac_bytes[2:10], 16)     # Next 4 bytes (32 bits)
-    
-    return {
-        'format': 'EM4100 40-bit',
-        'mac_address': mac,
-        'version': version,
-        'card_id': card_id,
-        'version_hex': f'0x{version:02X}',
-        'card_id_hex': f'0x{card_id:08X}'
-    }
+# Re-exported: defined here before the shared core, so existing imports keep working
+from credential_formats import mac_to_em4100, mac_to_wiegand_26, mac_to_wiegand_34, normalize_mac
+from credential_batch import batch_columns, batch_records
 
 
 def print_credential_info(cred_data):
@@ -134,130 +30,106 @@ def print_credential_info(cred_data):
     Print formatted credential information
     
     Args:
-        cred_data: Dictionary from conversion functions
+        cred_data: Dictionary from encode_mac or a conversion function
     """
+    fmt = next(fmt for fmt in FORMATS.values() if fmt.name == cred_data['format'])
+    
     print(f"\n{'='*60}")
     print(f"{cred_data['format']} Conversion")
     print(f"{'='*60}")
     print(f"MAC Address:     {cred_data['mac_address']}")
-    
-    if 'EM4100' in cred_data['format']:
-        print(f"Version:         {cred_data['version']} ({cred_data['version_hex']})")
-        print(f"Card ID:         {cred_data['card_id']} ({cred_data['card_id_hex']})")
-    else:
-        print(f"Facility Code:   {cred_data['facility_code']} ({cred_data['facility_code_hex']})")
-        print(f"Card Number:     {cred_data['card_number']} ({cred_data['card_number_hex']})")
-    
+    for field in fmt.fields:
+        print(f"{field.title + ':':<17}{cred_data[field.name]} ({cred_data[field.name + '_hex']})")
     print(f"{'='*60}\n")
 
 
-def batch_convert(mac_addresses, format_type='all', facility_code=123):
+def batch_convert(mac_addresses, format_type='all', facility_code=123,
+                  chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None, labels=None,
+                  profile=None):
     """
     Convert multiple MAC addresses
     
     Args:
-        mac_addresses: List of MAC address strings
-        format_type: '26', '34', '40', or 'all'
+        mac_addresses: Iterable of MAC address strings
+        format_type: Format code, 'all', or comma-separated codes (see credential_formats.py)
         facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+        labels: Optional format code -> label overrides
+        profile: Optional PipelineProfile (see credential_profile.py)
     """
+    keys = output_fields(format_type)[1]
+    # (label, field short names, first column of the format in each row)
+    formats = []
+    for code in resolve_formats(format_type):
+        fmt = FORMATS[code]
+        formats.append(((labels or {}).get(code, fmt.label), [field.short for field in fmt.fields],
+                        1 + sum(len(spec) for _, spec, _ in formats)))
+    
     print("\n" + "="*60)
     print("BATCH CONVERSION RESULTS")
     print("="*60)
     
-    for mac in mac_addresses:
-        try:
-            if format_type in ['26', 'all']:
-                data_26 = mac_to_wiegand_26(mac, facility_code)
-                print(f"\nMAC: {data_26['mac_address']}")
-                print(f"  W26: FC={data_26['facility_code']}, CN={data_26['card_number']}")
-            
-            if format_type in ['34', 'all']:
-                data_34 = mac_to_wiegand_34(mac)
-                if format_type == 'all':
-                    print(f"  W34: FC={data_34['facility_code']}, CN={data_34['card_number']}")
-                else:
-                    print(f"\nMAC: {data_34['mac_address']}")
-                    print(f"  W34: FC={data_34['facility_code']}, CN={data_34['card_number']}")
-            
-            if format_type in ['40', 'all']:
-                data_40 = mac_to_em4100(mac)
-                if format_type == 'all':
-                    print(f"  EM4100: Ver={data_40['version']}, ID={data_40['card_id']}")
-                else:
-                    print(f"\nMAC: {data_40['mac_address']}")
-                    print(f"  EM4100: Ver={data_40['version']}, ID={data_40['card_id']}")
-                    
-        except ValueError as e:
-            print(f"\nERROR processing {mac}: {e}")
+    for rows in iter_row_chunks(mac_addresses, keys, format_type, facility_code, chunk_size,
+                                errors, allocator, profile):
+        with profile_stage(profile, 'format'):
+            lines = []
+            for row in rows:
+                lines.append(f"\nMAC: {row[0]}")
+                for label, shorts, start in formats:
+                    lines.append(f"  {label}: " + ', '.join(f"{short}={row[start + n]}"
+                                                            for n, short in enumerate(shorts)))
+        if lines:
+            with profile_stage(profile, 'write'):
+                print('\n'.join(lines))
     
     print("\n" + "="*60 + "\n")
 
 
-def generate_csv(mac_addresses, output_file, format_type='all', facility_code=123):
+def generate_csv(mac_addresses, output_file, format_type='all', facility_code=123,
+                 output_format=None, chunk_size=DEFAULT_CHUNK_SIZE, errors=None, allocator=None,
+                 labels=None, profile=None):
     """
     Generate CSV file with MAC to credential mappings
     
     Args:
-        mac_addresses: List of MAC address strings
-        output_file: Output CSV filename
-        format_type: '26', '34', '40', or 'all'
+        mac_addresses: Iterable of MAC address strings
+        output_file: Output filename, or '-' for stdout
+        format_type: Format code, 'all', or comma-separated codes (see credential_formats.py)
         facility_code: Facility code for 26-bit format
+        output_format: 'csv', 'ndjson' or 'ncdb' (default: from the file extension)
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        allocator: Optional CredentialAllocator for W26/W34 credentials
+        labels: Optional format code -> column prefix overrides
+        profile: Optional PipelineProfile (see credential_profile.py)
+        
+    Returns:
+        Number of rows written
     """
-    import csv
+    fieldnames, keys = output_fields(format_type, labels)
+    output_format = output_format_for(output_file, output_format)
     
-    with open(output_file, 'w', newline='') as csvfile:
-        if format_type == 'all':
-            fieldnames = ['MAC Address', 
-                         'W26 Facility Code', 'W26 Card Number',
-                         'W34 Facility Code', 'W34 Card Number',
-                         'EM4100 Version', 'EM4100 Card ID']
-        elif format_type == '26':
-            fieldnames = ['MAC Address', 'Facility Code', 'Card Number']
-        elif format_type == '34':
-            fieldnames = ['MAC Address', 'Facility Code', 'Card Number']
-        elif format_type == '40':
-            fieldnames = ['MAC Address', 'Version', 'Card ID']
-        
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for mac in mac_addresses:
-            try:
-                row = {'MAC Address': normalize_mac(mac)}
-                
-                if format_type in ['26', 'all']:
-                    data_26 = mac_to_wiegand_26(mac, facility_code)
-                    if format_type == 'all':
-                        row['W26 Facility Code'] = data_26['facility_code']
-                        row['W26 Card Number'] = data_26['card_number']
-                    else:
-                        row['Facility Code'] = data_26['facility_code']
-                        row['Card Number'] = data_26['card_number']
-                
-                if format_type in ['34', 'all']:
-                    data_34 = mac_to_wiegand_34(mac)
-                    if format_type == 'all':
-                        row['W34 Facility Code'] = data_34['facility_code']
-                        row['W34 Card Number'] = data_34['card_number']
-                    else:
-                        row['Facility Code'] = data_34['facility_code']
-                        row['Card Number'] = data_34['card_number']
-                
-                if format_type in ['40', 'all']:
-                    data_40 = mac_to_em4100(mac)
-                    if format_type == 'all':
-                        row['EM4100 Version'] = data_40['version']
-                        row['EM4100 Card ID'] = data_40['card_id']
-                    else:
-                        row['Version'] = data_40['version']
-                        row['Card ID'] = data_40['card_id']
-                
-                writer.writerow(row)
-                
-            except ValueError as e:
-                print(f"ERROR processing {mac}: {e}")
+    if output_format == 'ncdb':
+        from credential_db import write_database
+        count = write_database(iter_column_chunks(mac_addresses, format_type, facility_code,
+                                                  chunk_size, errors, allocator, profile),
+                               output_file, format_type, facility_code, allocator is not None)
+        print(f"\nNCDB file generated: {output_file}\n")
+        return count
+    
+    with open_output(output_file) as out:
+        writer = RecordWriter(out, fieldnames, output_format)
+        for rows in iter_row_chunks(mac_addresses, keys, format_type, facility_code, chunk_size,
+                                    errors, allocator, profile):
+            with profile_stage(profile, 'write'):
+                writer.write_rows(rows)
+    
+    if output_file != '-':
+        print(f"\n{output_format.upper()} file generated: {output_file}\n")
     
-    print(f"\nCSV file generated: {output_file}\n")
+    return writer.rows_written
 
 
 def main():
@@ -280,39 +152,106 @@ Examples:
   
   # Generate CSV output
   python mac_to_credential.py -i mac_list.txt -o credentials.csv
+  
+  # Stream a compressed export through a pipeline as NDJSON
+  zcat export.txt.gz | python mac_to_credential.py -i - -o - --output-format ndjson
+  
+  # Nightly export: full snapshot plus only the rows that changed since last run
+  python mac_to_credential.py -i mdm_export.txt -o credentials.csv --state export.db --delta delta.csv
+  
+  # Write a compact binary credential database (see credential_db.py)
+  python mac_to_credential.py -i mac_list.txt -o credentials.ncdb
+  
+  # Convert a multi-million line export on 8 cores
+  python mac_to_credential.py -i estate.txt -o credentials.csv --jobs 8
+  
+  # See where the time goes in a large run (table on stderr, or JSON to a file)
+  python mac_to_credential.py -i estate.txt -o credentials.csv --profile
+  python mac_to_credential.py -i estate.txt -o credentials.csv --profile profile.json
+  
+  # Serve conversions to a provisioning system without per-call startup
+  python mac_to_credential.py --serve 127.0.0.1:8765
+  curl -d '{"macs": ["AA:BB:CC:DD:EE:FF"]}' http://127.0.0.1:8765/convert
         """
     )
     
     parser.add_argument('-m', '--mac', help='Single MAC address to convert')
-    parser.add_argument('-i', '--input', help='Input file with MAC addresses (one per line)')
-    parser.add_argument('-o', '--output', help='Output CSV file')
-    parser.add_argument('-f', '--format', choices=['26', '34', '40', 'all'], default='all',
-                       help='Output format: 26=Wiegand26, 34=Wiegand34, 40=EM4100, all=All formats (default: all)')
+    parser.add_argument('-i', '--input',
+                       help='Input file with MAC addresses (one per line); - for stdin, .gz/.zst accepted')
+    parser.add_argument('-o', '--output',
+                       help='Output CSV, NDJSON or binary .ncdb file; - for stdout (CSV/NDJSON only)')
+    parser.add_argument('-f', '--format', default='all',
+                       help='Output format: 26=Wiegand26, 34=Wiegand34, 40=EM4100, 35=HID Corporate 1000, '
+                            '37=HID H10304, all=26,34,40, or a comma-separated list (default: all)')
     parser.add_argument('-c', '--facility-code', type=int, default=123,
                        help='Facility code for 26-bit Wiegand format (default: 123)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS,
+                       help='Output file format (default: from the extension: .ndjson/.jsonl, .ncdb, else csv)')
+    parser.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                       help=f'MACs converted per batch (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--allocate', metavar='TABLE',
+                       help='Use unique W26/W34 credentials from this assignment table '
+                            '(see credential_allocator.py), allocating new ones as needed')
+    parser.add_argument('--state', metavar='DB',
+                       help='SQLite store of the previous export; enables incremental mode')
+    parser.add_argument('--delta', help='With --state, write added/changed/removed rows to this file')
+    parser.add_argument('-j', '--jobs', type=int,
+                       help='Convert with N worker processes over byte-range shards of -i (needs -o)')
+    parser.add_argument('--split-output', action='store_true',
+                       help='With --jobs, keep one output file per shard instead of merging')
+    parser.add_argument('--serve', metavar='ADDRESS',
+                       help='Run as a conversion service on host:port (HTTP) or unix:/path '
+                            '(one JSON request per line); -f and -c set the defaults')
+    parser.add_argument('--cache-size', type=int, default=65536,
+                       help='With --serve, results kept in the LRU cache (default: 65536)')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                       help='With -i, report per-stage time, rows/s, errors by cause, bytes and '
+                            'peak memory on stderr, or as JSON to FILE')
     
     args = parser.parse_args()
     
+    try:
+        resolve_formats(args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.jobs is not None and (args.jobs < 1 or not args.input or not args.output):
+        parser.error('--jobs needs a positive worker count, -i and -o')
+    if args.serve and (args.mac or args.input):
+        parser.error('--serve cannot be combined with -m or -i')
+    if args.split_output and not args.jobs:
+        parser.error('--split-output needs --jobs')
+    if args.delta and not args.state:
+        parser.error('--delta needs --state')
+    if args.state and (args.jobs or not args.input):
+        parser.error('--state needs -i and cannot be combined with --jobs')
+    if args.allocate and (args.jobs or not args.input):
+        parser.error('--allocate needs -i and cannot be combined with --jobs')
+    if args.profile and (args.jobs or not args.input):
+        parser.error('--profile needs -i and cannot be combined with --jobs')
+    binary_output = args.output and output_format_for(args.output, args.output_format) == 'ncdb'
+    if binary_output and (args.output == '-' or args.jobs or args.state):
+        parser.error('.ncdb output needs an output file and cannot be combined with --jobs or --state')
+    
     # Validate facility code
     if not 0 <= args.facility_code <= 255:
         print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
         sys.exit(1)
     
+    # Conversion service
+    if args.serve:
+        from credential_service import serve
+        try:
+            serve(args.serve, args.format, args.facility_code, args.cache_size)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+    
     # Single MAC conversion
-    if args.mac:
+    elif args.mac:
         try:
-            if args.format in ['26', 'all']:
-                data_26 = mac_to_wiegand_26(args.mac, args.facility_code)
-                print_credential_info(data_26)
-            
-            if args.format in ['34', 'all']:
-                data_34 = mac_to_wiegand_34(args.mac)
-                print_credential_info(data_34)
-            
-            if args.format in ['40', 'all']:
-                data_40 = mac_to_em4100(args.mac)
-                print_credential_info(data_40)
-                
+            for cred_data in encode_mac(args.mac, args.format, args.facility_code):
+                print_credential_info(cred_data)
         except ValueError as e:
             print(f"ERROR: {e}")
             sys.exit(1)
@@ -320,13 +259,51 @@ Examples:
     # Batch conversion from file
     elif args.input:
         try:
-            with open(args.input, 'r') as f:
-                mac_addresses = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            if args.jobs:
+                from credential_shards import convert_sharded
+                with open_error_sink(args.errors) as errors:
+                    convert_sharded(args.input, args.output, args.format, args.facility_code,
+                                    args.jobs, args.output_format, args.chunk_size, errors,
+                                    args.split_output)
+                if args.output != '-' and not args.split_output:
+                    print(f"\n{output_format_for(args.output, args.output_format).upper()} "
+                          f"file generated: {args.output}\n")
+                return
+            
+            profile = None
+            if args.profile:
+                from credential_profile import PipelineProfile
+                profile = PipelineProfile()
+            
+            allocator = None
+            if args.allocate:
+                from credential_allocator import CredentialAllocator
+                allocator = CredentialAllocator(args.allocate, args.facility_code)
+            
+            with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+                mac_addresses = iter_mac_lines(profile.counted_lines(f) if profile else f)
+                
+                if args.state:
+                    from credential_store import export_incremental, print_summary
+                    counts = export_incremental(mac_addresses, args.state, args.output, args.delta,
+                                                args.format, args.facility_code, args.output_format,
+                                                args.chunk_size, errors, allocator, profile)
+                    print_summary(counts, args.state, sys.stderr if args.output == '-' else sys.stdout)
+                elif args.output:
+                    generate_csv(mac_addresses, args.output, args.format, args.facility_code,
+                                 args.output_format, args.chunk_size, errors, allocator,
+                                 profile=profile)
+                else:
+                    batch_convert(mac_addresses, args.format, args.facility_code,
+                                  args.chunk_size, errors, allocator, profile=profile)
+            
+            if allocator is not None:
+                allocator.save()
+                allocator.close()
             
-            if args.output:
-                generate_csv(mac_addresses, args.output, args.format, args.facility_code)
-            else:
-                batch_convert(mac_addresses, args.format, args.facility_code)
+            if profile is not None:
+                from credential_profile import write_profile
+                write_profile(profile, args.profile, args.output)
                 
         except FileNotFoundError:
             print(f"ERROR: File not found: {args.input}")
@@ -3,7 +3,9 @@
 MAC Address to Wiegand Converter
 
 This tool helps you convert BLE device MAC addresses to their corresponding
-Wiegand card numbers and facility codes for both 26-bit and 34-bit formats.
+Wiegand card numbers and facility codes for both 26-bit and 34-bit formats,
+as well as HID Corporate 1000 35-bit and H10304 37-bit. It is a thin wrapper
+around the shared conversion core (credential_formats.py, credential_batch.py).
 
 Use this to pre-calculate the credentials that will be sent to your Paxton
 Net2 Plus controller so you can add them to your access control system.
@@ -13,32 +15,22 @@ Date: October 2025
 """
 
 import sys
-import re
 
+import credential_formats
+from credential_formats import encode_mac
+from credential_io import (DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, iter_mac_lines, open_error_sink,
+                           open_input, output_format_for)
+import mac_to_credential
 
-def normalize_mac(mac_address):
-    """
-    Normalize MAC address to standard format
-    
-    Args:
-        mac_address: MAC address in various formats
-        
-    Returns:
-        Normalized MAC address (uppercase with colons)
-    """
-    # Remove common separators
-    mac = mac_address.replace(':', '').replace('-', '').replace('.', '').upper()
-    
-    # Validate length
-    if len(mac) != 12:
-        raise ValueError(f"Invalid MAC address length: {mac_address}")
-    
-    # Validate hex characters
-    if not all(c in '0123456789ABCDEF' for c in mac):
-        raise ValueError(f"Invalid MAC address characters: {mac_address}")
-    
-    # Format with colons
-    return ':'.join([mac[i:i+2] for i in range(0, 12, 2)])
+# Re-exported: defined here before the shared core, so existing imports keep working
+from credential_formats import normalize_mac
+
+
+# Wiegand format choices -> credential_formats selection
+WIEGAND_FORMATS = {'26': '26', '34': '34', '35': '35', '37': '37', 'both': '26,34'}
+
+# Column and report prefixes this tool has always used
+WIEGAND_LABELS = {'26': '26-bit', '34': '34-bit', '35': '35-bit', '37': '37-bit'}
 
 
 def mac_to_wiegand_26(mac_address, facility_code=123):
@@ -48,29 +40,12 @@ def mac_to_wiegand_26(mac_address, facility_code=123):
     Args:
         mac_address: MAC address string
         facility_code: 8-bit facility code (0-255)
-        
+    
     Returns:
         Dictionary with facility code and card number
     """
-    # Normalize MAC
-    mac = normalize_mac(mac_address)
-    
-    # Extract last 2 bytes for card number
-    mac_bytes = mac.replace(':', '')
-    card_number = int(mac_bytes[-4:], 16)  # Last 4 hex chars = 2 bytes
-    
-    # Validate facility code
-    if not 0 <= facility_code <= 255:
-        raise ValueError(f"Facility code must be 0-255, got {facility_code}")
-    
-    return {
-        'format': '26-bit',
-        'mac_address': mac,
-        'facility_code': facility_code,
-        'card_number': card_number,
-        'facility_code_hex': f'0x{facility_code:02X}',
-        'card_number_hex': f'0x{card_number:04X}'
-    }
+    return dict(credential_formats.mac_to_wiegand_26(mac_address, facility_code),
+                format=WIEGAND_LABELS['26'])
 
 
 def mac_to_wiegand_34(mac_address):
@@ -79,26 +54,11 @@ def mac_to_wiegand_34(mac_address):
     
     Args:
         mac_address: MAC address string
-        
+    
     Returns:
         Dictionary with facility code and card number
     """
-    # Normalize MAC
-    mac = normalize_mac(mac_address)
-    
-    # Extract bytes for facility code and card number
-    mac_bytes = mac.replace(':', '')
-    facility_code = int(mac_bytes[4:8], 16)  # Bytes 3-4
-    card_number = int(mac_bytes[-4:], 16)    # Last 2 bytes
-    
-    return {
-        'format': '34-bit',
-        'mac_address': mac,
-        'facility_code': facility_code,
-        'card_number': card_number,
-        'facility_code_hex': f'0x{facility_code:04X}',
-        'card_number_hex': f'0x{card_number:04X}'
-    }
+    return dict(credential_formats.mac_to_wiegand_34(mac_address), format=WIEGAND_LABELS['34'])
 
 
 def print_wiegand_info(wiegand_data):
@@ -117,92 +77,48 @@ def print_wiegand_info(wiegand_data):
     print(f"{'='*60}\n")
 
 
-def batch_convert(mac_addresses, format_type='both', facility_code=123):
+def batch_convert(mac_addresses, format_type='both', facility_code=123,
+                  chunk_size=DEFAULT_CHUNK_SIZE, errors=None, profile=None):
     """
     Convert multiple MAC addresses
     
     Args:
-        mac_addresses: List of MAC address strings
-        format_type: '26', '34', or 'both'
+        mac_addresses: Iterable of MAC address strings
+        format_type: '26', '34', '35', '37', or 'both'
         facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        profile: Optional PipelineProfile (see credential_profile.py)
     """
-    print("\n" + "="*60)
-    print("BATCH CONVERSION RESULTS")
-    print("="*60)
-    
-    for mac in mac_addresses:
-        try:
-            if format_type in ['26', 'both']:
-                data_26 = mac_to_wiegand_26(mac, facility_code)
-                print(f"\nMAC: {data_26['mac_address']}")
-                print(f"  26-bit: FC={data_26['facility_code']}, CN={data_26['card_number']}")
-            
-            if format_type in ['34', 'both']:
-                data_34 = mac_to_wiegand_34(mac)
-                if format_type == 'both':
-                    print(f"  34-bit: FC={data_34['facility_code']}, CN={data_34['card_number']}")
-                else:
-                    print(f"\nMAC: {data_34['mac_address']}")
-                    print(f"  34-bit: FC={data_34['facility_code']}, CN={data_34['card_number']}")
-                    
-        except ValueError as e:
-            print(f"\nERROR processing {mac}: {e}")
-    
-    print("\n" + "="*60 + "\n")
+    mac_to_credential.batch_convert(mac_addresses, WIEGAND_FORMATS[format_type], facility_code,
+                                    chunk_size, errors, labels=WIEGAND_LABELS, profile=profile)
 
 
-def generate_csv(mac_addresses, output_file, format_type='both', facility_code=123):
+def generate_csv(mac_addresses, output_file, format_type='both', facility_code=123,
+                 output_format=None, chunk_size=DEFAULT_CHUNK_SIZE, errors=None, profile=None):
     """
     Generate CSV file with MAC to Wiegand mappings
     
     Args:
-        mac_addresses: List of MAC address strings
-        output_file: Output CSV filename
-        format_type: '26', '34', or 'both'
+        mac_addresses: Iterable of MAC address strings
+        output_file: Output filename, or '-' for stdout
+        format_type: '26', '34', '35', '37', or 'both'
         facility_code: Facility code for 26-bit format
-    """
-    import csv
-    
-    with open(output_file, 'w', newline='') as csvfile:
-        if format_type == 'both':
-            fieldnames = ['MAC Address', '26-bit Facility Code', '26-bit Card Number', 
-                         '34-bit Facility Code', '34-bit Card Number']
-        elif format_type == '26':
-            fieldnames = ['MAC Address', 'Facility Code', 'Card Number']
-        else:
-            fieldnames = ['MAC Address', 'Facility Code', 'Card Number']
+        output_format: 'csv', 'ndjson' or 'ncdb' (default: from the file extension)
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+        profile: Optional PipelineProfile (see credential_profile.py)
         
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for mac in mac_addresses:
-            try:
-                row = {'MAC Address': normalize_mac(mac)}
-                
-                if format_type in ['26', 'both']:
-                    data_26 = mac_to_wiegand_26(mac, facility_code)
-                    if format_type == 'both':
-                        row['26-bit Facility Code'] = data_26['facility_code']
-                        row['26-bit Card Number'] = data_26['card_number']
-                    else:
-                        row['Facility Code'] = data_26['facility_code']
-                        row['Card Number'] = data_26['card_number']
-                
-                if format_type in ['34', 'both']:
-                    data_34 = mac_to_wiegand_34(mac)
-                    if format_type == 'both':
-                        row['34-bit Facility Code'] = data_34['facility_code']
-                        row['34-bit Card Number'] = data_34['card_number']
-                    else:
-                        row['Facility Code'] = data_34['facility_code']
-                        row['Card Number'] = data_34['card_number']
-                
-                writer.writerow(row)
-                
-            except ValueError as e:
-                print(f"ERROR processing {mac}: {e}")
-    
-    print(f"\nCSV file generated: {output_file}\n")
+    Returns:
+        Number of rows written
+    """
+    selection = WIEGAND_FORMATS[format_type]
+    if format_type == 'both' and output_format_for(output_file, output_format) == 'ncdb':
+        # .ncdb records always carry every firmware format
+        selection = 'all'
+    return mac_to_credential.generate_csv(mac_addresses, output_file, selection, facility_code,
+                                          output_format, chunk_size, errors, labels=WIEGAND_LABELS,
+                                          profile=profile)
 
 
 def main():
@@ -225,19 +141,44 @@ Examples:
   
   # Generate CSV output
   python mac_to_wiegand.py -i mac_list.txt -o credentials.csv
+  
+  # Read from stdin and write CSV to stdout
+  cat mac_list.txt | python mac_to_wiegand.py -i - -o -
+  
+  # Write a compact binary credential database (see credential_db.py)
+  python mac_to_wiegand.py -i mac_list.txt -o credentials.ncdb
+  
+  # Per-stage timings, rows/s and rejected MACs by cause (see credential_profile.py)
+  python mac_to_wiegand.py -i mac_list.txt -o credentials.csv --profile
         """
     )
     
     parser.add_argument('-m', '--mac', help='Single MAC address to convert')
-    parser.add_argument('-i', '--input', help='Input file with MAC addresses (one per line)')
-    parser.add_argument('-o', '--output', help='Output CSV file')
-    parser.add_argument('-f', '--format', choices=['26', '34', 'both'], default='both',
-                       help='Wiegand format (default: both)')
+    parser.add_argument('-i', '--input',
+                       help='Input file with MAC addresses (one per line); - for stdin, .gz/.zst accepted')
+    parser.add_argument('-o', '--output',
+                       help='Output CSV, NDJSON or binary .ncdb file; - for stdout (CSV/NDJSON only)')
+    parser.add_argument('-f', '--format', choices=list(WIEGAND_FORMATS), default='both',
+                       help='Wiegand format: 26, 34, 35=HID Corporate 1000, 37=HID H10304, '
+                            'or both=26 and 34 (default: both)')
     parser.add_argument('-c', '--facility-code', type=int, default=123,
                        help='Facility code for 26-bit format (default: 123)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS,
+                       help='Output file format (default: from the extension: .ndjson/.jsonl, .ncdb, else csv)')
+    parser.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                       help=f'MACs converted per batch (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                       help='With -i, report per-stage time, rows/s, errors by cause, bytes and '
+                            'peak memory on stderr, or as JSON to FILE')
     
     args = parser.parse_args()
     
+    if args.output == '-' and output_format_for(args.output, args.output_format) == 'ncdb':
+        parser.error('.ncdb output needs an output file')
+    if args.profile and not args.input:
+        parser.error('--profile needs -i')
+    
     # Validate facility code
     if not 0 <= args.facility_code <= 255:
         print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
@@ -246,14 +187,9 @@ Examples:
     # Single MAC conversion
     if args.mac:
         try:
-            if args.format in ['26', 'both']:
-                data_26 = mac_to_wiegand_26(args.mac, args.facility_code)
-                print_wiegand_info(data_26)
-            
-            if args.format in ['34', 'both']:
-                data_34 = mac_to_wiegand_34(args.mac)
-                print_wiegand_info(data_34)
-                
+            for wiegand_data in encode_mac(args.mac, WIEGAND_FORMATS[args.format],
+                                           args.facility_code):
+                mac_to_credential.print_credential_info(wiegand_data)
         except ValueError as e:
             print(f"ERROR: {e}")
             sys.exit(1)
@@ -261,13 +197,24 @@ Examples:
     # Batch conversion from file
     elif args.input:
         try:
-            with open(args.input, 'r') as f:
-                mac_addresses = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            profile = None
+            if args.profile:
+                from credential_profile import PipelineProfile
+                profile = PipelineProfile()
+            
+            with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+                mac_addresses = iter_mac_lines(profile.counted_lines(f) if profile else f)
+                
+                if args.output:
+                    generate_csv(mac_addresses, args.output, args.format, args.facility_code,
+                                 args.output_format, args.chunk_size, errors, profile)
+                else:
+                    batch_convert(mac_addresses, args.format, args.facility_code,
+                                  args.chunk_size, errors, profile)
             
-            if args.output:
-                generate_csv(mac_addresses, args.output, args.format, args.facility_code)
-            else:
-                batch_convert(mac_addresses, args.format, args.facility_code)
+            if profile is not None:
+                from credential_profile import write_profile
+                write_profile(profile, args.profile, args.output)
                 
         except FileNotFoundError:
             print(f"ERROR: File not found: {args.input}")
@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Scan / Authorize / Cooldown Loop Simulator
+
+A discrete-event model of the firmware's main loop, for sizing readers at
+busy entrances without standing in the lobby with a logic analyzer:
+
+- loop() scans for BLE_SCAN_TIME, then sleeps delay(1000); advertisements
+  that arrive between scans are lost. With the default callback setup the
+  stack reports each address once per scan.
+- onResult callbacks run one at a time. Each one costs a fixed CPU time
+  plus its Serial output at 115200 baud (only the part that does not fit
+  the 128-byte UART FIFO blocks), and an authorized device outside its
+  cooldown costs a full Wiegand frame: bits * (WIEGAND_PULSE_WIDTH +
+  WIEGAND_PULSE_INTERVAL), about 1.05 ms per bit.
+- Cooldowns live in a fixed ring of slots like deviceCooldowns[10]: a new
+  device overwrites the oldest slot, so with more active devices than
+  slots an evicted device is sent again before its cooldown ends.
+
+Traces are synthetic (Poisson arrivals, exponential dwell, jittered
+advertising interval) or recorded (CSV or NDJSON with time and MAC
+columns, sorted by time). The report gives time-to-credential
+percentiles per visit, sends caused by cooldown eviction, cooldown
+suppressions and Wiegand bus occupancy; every setting accepts several
+values, and the grid is swept and ranked.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import csv
+import json
+import heapq
+import random
+import itertools
+
+from credential_io import OUTPUT_FORMATS, RecordWriter, iter_mac_lines, open_input, open_output
+from credential_formats import parse_mac_batch
+from wiegand_capture import WIEGAND_PULSE_INTERVAL, WIEGAND_PULSE_WIDTH
+from wiegand_frames import FRAME_BITS
+
+
+# Firmware defaults (ble_wiegand_access_control.ino)
+DEFAULT_SCAN_TIME = 5.0         # BLE_SCAN_TIME, s
+DEFAULT_LOOP_DELAY = 1.0        # delay(1000) after each scan, s
+DEFAULT_COOLDOWN_MS = 5000      # DEVICE_COOLDOWN_MS
+DEFAULT_COOLDOWN_SLOTS = 10     # deviceCooldowns[10]
+
+# Seconds per Wiegand bit, as sendBit spends them
+BIT_TIME = (WIEGAND_PULSE_WIDTH + WIEGAND_PULSE_INTERVAL) / 1e6
+
+# Serial at 115200 baud, 10 bits per character, with the UART TX FIFO
+SERIAL_CHAR_TIME = 10 / 115200
+SERIAL_TX_FIFO = 128
+
+# Approximate bytes printed per callback outcome (DEBUG_MODE true); the
+# "Authorized device detected" line is printed even without DEBUG_MODE
+CHARS_FOUND = 49
+CHARS_NOT_AUTHORIZED = 21
+CHARS_AUTHORIZED = 51
+CHARS_COOLDOWN = 38
+CHARS_SEND = 350                # banners, field lines and WiegandOut debug, plus one per bit
+
+# String handling and list scan per callback, s
+DEFAULT_CALLBACK_COST = 200e-6
+
+# Gap between advertisements of one MAC that starts a new visit, s
+DEFAULT_VISIT_GAP = 10.0
+
+# Idle visits are closed every this many events to bound memory
+VISIT_SWEEP_EVENTS = 100000
+
+SWEEP_COLUMNS = ['Scan Time (s)', 'Cooldown (ms)', 'Cooldown Slots', 'Loop Delay (s)',
+                 'Advertisements', 'Lost Between Scans', 'Authorized Visits', 'Missed Visits',
+                 'P50 Latency (s)', 'P95 Latency (s)', 'P99 Latency (s)', 'Max Latency (s)',
+                 'Sends', 'Repeat Sends', 'Eviction Duplicates', 'Cooldown Suppressions',
+                 'Bus Occupancy', 'Callback Busy', 'Mean Cycle (s)']
+
+
+class ReaderConfig:
+    """Settings of one simulated reader"""
+
+    def __init__(self, scan_time=DEFAULT_SCAN_TIME, cooldown_ms=DEFAULT_COOLDOWN_MS,
+                 slots=DEFAULT_COOLDOWN_SLOTS, loop_delay=DEFAULT_LOOP_DELAY, format_code='26',
+                 debug=True, report_duplicates=False, callback_cost=DEFAULT_CALLBACK_COST):
+        """
+        Args:
+            scan_time: BLE_SCAN_TIME in seconds
+            cooldown_ms: DEVICE_COOLDOWN_MS
+            slots: Size of the cooldown ring
+            loop_delay: Delay after each scan in seconds
+            format_code: OUTPUT_FORMAT, '26', '34' or '40'
+            debug: DEBUG_MODE (Serial output per callback)
+            report_duplicates: Deliver every advertisement, not one per scan
+            callback_cost: CPU seconds per callback besides Serial and Wiegand
+        """
+        if slots < 1 or scan_time <= 0:
+            raise ValueError("Scan time and cooldown slots must be positive")
+        self.scan_time = scan_time
+        self.cooldown = cooldown_ms / 1000
+        self.cooldown_ms = cooldown_ms
+        self.slots = slots
+        self.loop_delay = loop_delay
+        self.bits = FRAME_BITS[format_code]
+        self.debug = debug
+        self.report_duplicates = report_duplicates
+        self.callback_cost = callback_cost
+
+
+def synthetic_trace(duration=600.0, arrivals_per_min=30.0, authorized_ratio=0.2, dwell=20.0,
+                    adv_interval_ms=100.0, reception=0.9, seed=1):
+    """
+    Generate advertisements from random visits, in time order
+
+    Each visit is a new device that advertises every adv_interval_ms plus
+    0-10 ms of random delay (as the BLE spec requires) for an exponential
+    dwell time; each advertisement is received with probability reception.
+
+    Args:
+        duration: Seconds of arrivals
+        arrivals_per_min: Mean visits per minute (Poisson)
+        authorized_ratio: Fraction of visits by enrolled devices
+        dwell: Mean seconds a device stays in range
+        adv_interval_ms: Advertising interval
+        reception: Probability an advertisement is received
+        seed: Random seed
+
+    Yields:
+        Tuples (time, mac, authorized)
+    """
+    rng = random.Random(seed)
+    interval = adv_interval_ms / 1000
+
+    def visit(start, mac, authorized, stay):
+        t = start + rng.random() * interval
+        while t < start + stay:
+            if rng.random() < reception:
+                yield t, mac, authorized
+            t += interval + rng.random() * 0.010
+
+    def arrivals():
+        t = 0.0
+        while True:
+            t += rng.expovariate(arrivals_per_min / 60)
+            if t >= duration:
+                return
+            mac = ':'.join(f'{b:02x}' for b in rng.getrandbits(48).to_bytes(6, 'big'))
+            yield t, visit(t, mac, rng.random() < authorized_ratio, max(1.0, rng.expovariate(1 / dwell)))
+
+    # Merge the per-visit streams; a visit joins the heap when it starts
+    heap = []
+    counter = itertools.count()
+    pending = arrivals()
+    next_arrival = next(pending, None)
+    while heap or next_arrival is not None:
+        if next_arrival is not None and (not heap or next_arrival[0] <= heap[0][0]):
+            stream = next_arrival[1]
+            next_arrival = next(pending, None)
+            event = next(stream, None)
+            if event is not None:
+                heapq.heappush(heap, (event[0], next(counter), event, stream))
+            continue
+        _, _, event, stream = heapq.heappop(heap)
+        yield event
+        following = next(stream, None)
+        if following is not None:
+            heapq.heappush(heap, (following[0], next(counter), following, stream))
+
+
+def load_allowlist(path):
+    """
+    Read an allowlist file into a set of MAC integers
+
+    Args:
+        path: MAC list file, one per line
+
+    Returns:
+        set of 48-bit MAC integers
+    """
+    with open_input(path) as f:
+        values, errors = parse_mac_batch(list(iter_mac_lines(f)))
+    values = values.tolist() if hasattr(values, 'tolist') else values
+    return {v for i, v in enumerate(values) if i not in errors}
+
+
+def recorded_trace(stream, allowlist=None):
+    """
+    Read a recorded advertisement trace
+
+    CSV needs a header with a 'time' (or 'timestamp') column in seconds and
+    a 'mac' (or 'address') column; NDJSON needs the same keys. Without an
+    allowlist, an 'authorized' column (true/1) marks enrolled devices.
+
+    Args:
+        stream: Text stream, e.g. from open_input
+        allowlist: Set of authorized MAC integers, or None
+
+    Yields:
+        Tuples (time, mac, authorized)
+    """
+    first = stream.readline()
+    if first.lstrip().startswith('{'):
+        rows = (json.loads(line) for line in itertools.chain([first], stream) if line.strip())
+    else:
+        rows = csv.DictReader(itertools.chain([first], stream))
+
+    known = {}
+    previous = float('-inf')
+    for row in rows:
+        row = {str(k).strip().lower(): v for k, v in row.items()}
+        try:
+            t = float(row['time'] if 'time' in row else row['timestamp'])
+            mac = str(row['mac'] if 'mac' in row else row['address']).strip().lower()
+        except KeyError as e:
+            raise ValueError(f"Trace rows need time and mac columns (missing {e.args[0]})")
+        if t < previous:
+            raise ValueError(f"Trace is not sorted by time at {t}")
+        previous = t
+
+        authorized = known.get(mac)
+        if authorized is None:
+            if allowlist is not None:
+                values, errors = parse_mac_batch([mac])
+                authorized = not errors and int(values[0]) in allowlist
+            else:
+                authorized = str(row.get('authorized', '')).strip().lower() in ('1', 'true', 'yes')
+            known[mac] = authorized
+        yield t, mac, authorized
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def simulate(events, config, visit_gap=DEFAULT_VISIT_GAP):
+    """
+    Run one trace through the firmware loop model
+
+    Args:
+        events: Time-ordered (time, mac, authorized) tuples
+        config: ReaderConfig
+        visit_gap: Seconds without advertisements that end a visit
+
+    Returns:
+        Dictionary of results
+    """
+    stats = {'adverts': 0, 'lost_between_scans': 0, 'filtered_duplicates': 0, 'callbacks': 0,
+             'sends': 0, 'repeat_sends': 0, 'eviction_duplicates': 0, 'cooldown_suppressions': 0,
+             'authorized_visits': 0, 'missed_visits': 0, 'scan_cycles': 0}
+    latencies = []
+    cycle_time = 0.0
+    bus_time = 0.0
+    busy_time = 0.0
+
+    # Loop state
+    cycle_start = None
+    window_end = 0.0
+    cpu_free = 0.0
+    seen = set()
+    ring = [None] * config.slots      # [mac, last update time]
+    ring_index = 0
+    serial_backlog = 0.0              # characters not yet on the wire
+    serial_time = 0.0                 # time serial_backlog refers to
+
+    # mac -> [visit start, last advert, first credential time, sends, last send, authorized]
+    visits = {}
+    frame_time = config.bits * BIT_TIME
+    send_chars = CHARS_SEND + config.bits
+
+    def close_visit(visit):
+        if visit[5]:
+            stats['authorized_visits'] += 1
+            if visit[2] is None:
+                stats['missed_visits'] += 1
+            else:
+                latencies.append(visit[2] - visit[0])
+
+    def serial(now, chars):
+        """Queue Serial output at now; return seconds the caller blocks"""
+        nonlocal serial_backlog, serial_time
+        serial_backlog = max(0.0, serial_backlog - (now - serial_time) / SERIAL_CHAR_TIME) + chars
+        serial_time = now
+        overflow = serial_backlog - SERIAL_TX_FIFO
+        if overflow <= 0:
+            return 0.0
+        serial_backlog = SERIAL_TX_FIFO
+        serial_time = now + overflow * SERIAL_CHAR_TIME
+        return overflow * SERIAL_CHAR_TIME
+
+    first_time = end_time = 0.0
+    for t, mac, authorized in events:
+        stats['adverts'] += 1
+        end_time = t
+        if cycle_start is None:
+            first_time = cycle_start = t
+            window_end = t + config.scan_time
+            cpu_free = serial_time = t
+
+        while t >= window_end:
+            start = max(window_end, cpu_free) + config.loop_delay
+            cycle_time += start - cycle_start
+            stats['scan_cycles'] += 1
+            cycle_start = start
+            window_end = start + config.scan_time
+            seen.clear()
+
+        visit = visits.get(mac)
+        if visit is None or t - visit[1] > visit_gap:
+            if visit is not None:
+                close_visit(visit)
+            visit = visits[mac] = [t, t, None, 0, None, authorized]
+        visit[1] = t
+
+        if stats['adverts'] % VISIT_SWEEP_EVENTS == 0:
+            for key in [k for k, v in visits.items() if t - v[1] > visit_gap]:
+                close_visit(visits.pop(key))
+
+        if t < cycle_start:
+            stats['lost_between_scans'] += 1
+            continue
+        if not config.report_duplicates:
+            if mac in seen:
+                stats['filtered_duplicates'] += 1
+                continue
+            seen.add(mac)
+
+        stats['callbacks'] += 1
+        now = max(t, cpu_free)
+        begin = now
+        now += config.callback_cost
+        if config.debug:
+            now += serial(now, CHARS_FOUND)
+
+        if not authorized:
+            if config.debug:
+                now += serial(now, CHARS_NOT_AUTHORIZED)
+        else:
+            now += serial(now, CHARS_AUTHORIZED)
+            cooling = any(slot is not None and slot[0] == mac and now - slot[1] < config.cooldown
+                          for slot in ring)
+            if cooling:
+                stats['cooldown_suppressions'] += 1
+                if config.debug:
+                    now += serial(now, CHARS_COOLDOWN)
+            else:
+                if config.debug:
+                    now += serial(now, send_chars)
+                send_start = now
+                now += frame_time
+                bus_time += frame_time
+                stats['sends'] += 1
+                if visit[3]:
+                    stats['repeat_sends'] += 1
+                if visit[4] is not None and send_start - visit[4] < config.cooldown:
+                    stats['eviction_duplicates'] += 1
+                if visit[2] is None:
+                    visit[2] = now
+                visit[3] += 1
+                visit[4] = send_start
+
+                # updateDeviceCooldown: refresh the slot, or overwrite the oldest
+                for slot in ring:
+                    if slot is not None and slot[0] == mac:
+                        slot[1] = now
+                        break
+                else:
+                    ring[ring_index] = [mac, now]
+                    ring_index = (ring_index + 1) % config.slots
+
+        busy_time += now - begin
+        cpu_free = now
+
+    for visit in visits.values():
+        close_visit(visit)
+
+    latencies.sort()
+    span = max(end_time, cpu_free) - first_time if stats['adverts'] else 0.0
+    stats.update({
+        'duration': span,
+        'p50_latency': _percentile(latencies, 0.50),
+        'p95_latency': _percentile(latencies, 0.95),
+        'p99_latency': _percentile(latencies, 0.99),
+        'max_latency': latencies[-1] if latencies else None,
+        'bus_occupancy': bus_time / span if span else 0.0,
+        'callback_busy': busy_time / span if span else 0.0,
+        'mean_cycle': cycle_time / stats['scan_cycles'] if stats['scan_cycles'] else None,
+    })
+    return stats
+
+
+def sweep(make_events, configs, visit_gap=DEFAULT_VISIT_GAP):
+    """
+    Simulate every configuration against the same trace
+
+    Args:
+        make_events: Callable returning a fresh event iterator
+        configs: Iterable of ReaderConfig
+        visit_gap: Seconds without advertisements that end a visit
+
+    Returns:
+        List of (config, stats), best first: fewest eviction duplicates,
+        then fewest missed visits, then lowest p95 latency
+    """
+    results = [(config, simulate(make_events(), config, visit_gap)) for config in configs]
+    results.sort(key=lambda r: (r[1]['eviction_duplicates'], r[1]['missed_visits'],
+                                float('inf') if r[1]['p95_latency'] is None else r[1]['p95_latency']))
+    return results
+
+
+def result_row(config, stats):
+    """Row of SWEEP_COLUMNS for one result"""
+    def seconds(value):
+        return '' if value is None else round(value, 3)
+
+    return (config.scan_time, config.cooldown_ms, config.slots, config.loop_delay,
+            stats['adverts'], stats['lost_between_scans'], stats['authorized_visits'],
+            stats['missed_visits'], seconds(stats['p50_latency']), seconds(stats['p95_latency']),
+            seconds(stats['p99_latency']), seconds(stats['max_latency']), stats['sends'],
+            stats['repeat_sends'], stats['eviction_duplicates'], stats['cooldown_suppressions'],
+            round(stats['bus_occupancy'], 5), round(stats['callback_busy'], 5),
+            seconds(stats['mean_cycle']))
+
+
+def print_results(results, stream=None):
+    """
+    Print a sweep table, best configuration first
+
+    Args:
+        results: List from sweep
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+
+    def fmt(value):
+        return '-' if value is None else f"{value:.2f}"
+
+    lines = ["", "=" * 100, "SCAN LOOP SIMULATION", "=" * 100,
+             f"{'Scan':>5} {'Cool ms':>8} {'Slots':>5} {'Delay':>5} | {'Visits':>6} {'Missed':>6} "
+             f"{'p50 s':>6} {'p95 s':>6} {'p99 s':>6} | {'Sends':>6} {'Evicted':>7} {'Suppr':>6} "
+             f"{'Bus %':>6} {'CPU %':>6}"]
+    for config, s in results:
+        lines.append(f"{config.scan_time:>5g} {config.cooldown_ms:>8} {config.slots:>5} "
+                     f"{config.loop_delay:>5g} | {s['authorized_visits']:>6} {s['missed_visits']:>6} "
+                     f"{fmt(s['p50_latency']):>6} {fmt(s['p95_latency']):>6} {fmt(s['p99_latency']):>6} | "
+                     f"{s['sends']:>6} {s['eviction_duplicates']:>7} {s['cooldown_suppressions']:>6} "
+                     f"{s['bus_occupancy'] * 100:>6.2f} {s['callback_busy'] * 100:>6.2f}")
+    first = results[0][1]
+    lines += ["=" * 100,
+              f"Advertisements: {first['adverts']}, lost between scans: {first['lost_between_scans']} "
+              f"(first row); Evicted = sends within the cooldown after a slot was overwritten",
+              ""]
+    if len(results) > 1:
+        best = results[0][0]
+        lines.append(f"Best: BLE_SCAN_TIME {best.scan_time:g}, DEVICE_COOLDOWN_MS {best.cooldown_ms}, "
+                     f"{best.slots} cooldown slots, delay {best.loop_delay:g} s")
+        lines.append("")
+    stream.write('\n'.join(lines) + '\n')
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Simulate the firmware scan/authorize/cooldown loop on advertisement traces',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Busy lobby with the current firmware settings
+  python scan_simulator.py --arrivals 60 --authorized-ratio 0.5 --dwell 30
+
+  # Sweep scan time, cooldown and table size
+  python scan_simulator.py --arrivals 60 --scan-time 1 2 5 --cooldown 3000 5000 \\
+      --slots 10 32 --loop-delay 0 1 -o sweep.csv
+
+  # Replay a recorded trace (CSV with time and mac columns) against an allowlist
+  python scan_simulator.py --trace lobby.csv --allowlist mac_list.txt
+        """
+    )
+
+    parser.add_argument('--trace', help='Recorded trace (CSV or NDJSON, optionally .gz/.zst); '
+                                        'default: synthetic')
+    parser.add_argument('--allowlist', help='MAC list of enrolled devices for a recorded trace')
+    parser.add_argument('--duration', type=float, default=600,
+                       help='Synthetic: seconds of arrivals (default: 600)')
+    parser.add_argument('--arrivals', type=float, default=30,
+                       help='Synthetic: device arrivals per minute (default: 30)')
+    parser.add_argument('--authorized-ratio', type=float, default=0.2,
+                       help='Synthetic: fraction of enrolled devices (default: 0.2)')
+    parser.add_argument('--dwell', type=float, default=20,
+                       help='Synthetic: mean seconds in range (default: 20)')
+    parser.add_argument('--adv-interval', type=float, default=100,
+                       help='Synthetic: advertising interval in ms (default: 100)')
+    parser.add_argument('--reception', type=float, default=0.9,
+                       help='Synthetic: probability an advertisement is received (default: 0.9)')
+    parser.add_argument('--seed', type=int, default=1, help='Synthetic: random seed (default: 1)')
+    parser.add_argument('--scan-time', type=float, nargs='+', default=[DEFAULT_SCAN_TIME],
+                       help=f'BLE_SCAN_TIME values in s (default: {DEFAULT_SCAN_TIME:g})')
+    parser.add_argument('--cooldown', type=int, nargs='+', default=[DEFAULT_COOLDOWN_MS],
+                       help=f'DEVICE_COOLDOWN_MS values (default: {DEFAULT_COOLDOWN_MS})')
+    parser.add_argument('--slots', type=int, nargs='+', default=[DEFAULT_COOLDOWN_SLOTS],
+                       help=f'Cooldown table sizes (default: {DEFAULT_COOLDOWN_SLOTS})')
+    parser.add_argument('--loop-delay', type=float, nargs='+', default=[DEFAULT_LOOP_DELAY],
+                       help=f'Delay after each scan in s (default: {DEFAULT_LOOP_DELAY:g})')
+    parser.add_argument('-f', '--format', choices=['26', '34', '40'], default='26',
+                       help='OUTPUT_FORMAT (default: 26)')
+    parser.add_argument('--no-debug', action='store_true', help='Model DEBUG_MODE false')
+    parser.add_argument('--report-duplicates', action='store_true',
+                       help='Deliver every advertisement, not one per address per scan')
+    parser.add_argument('--visit-gap', type=float, default=DEFAULT_VISIT_GAP,
+                       help=f'Seconds without advertisements that end a visit (default: {DEFAULT_VISIT_GAP:g})')
+    parser.add_argument('-o', '--output', help='Also write the results as CSV or NDJSON')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS[:2],
+                       help='Output file format (default: ndjson for .ndjson/.jsonl, else csv)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.trace:
+            allowlist = load_allowlist(args.allowlist) if args.allowlist else None
+
+            def make_events():
+                with open_input(args.trace) as f:
+                    yield from recorded_trace(f, allowlist)
+        else:
+            def make_events():
+                return synthetic_trace(args.duration, args.arrivals, args.authorized_ratio,
+                                       args.dwell, args.adv_interval, args.reception, args.seed)
+
+        configs = [ReaderConfig(scan_time, cooldown, slots, delay, args.format, not args.no_debug,
+                                args.report_duplicates)
+                   for scan_time, cooldown, slots, delay in itertools.product(
+                       args.scan_time, args.cooldown, args.slots, args.loop_delay)]
+        results = sweep(make_events, configs, args.visit_gap)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    print_results(results)
+
+    if args.output:
+        output_format = args.output_format or ('ndjson' if args.output.endswith(('.ndjson', '.jsonl'))
+                                               else 'csv')
+        with open_output(args.output) as out:
+            writer = RecordWriter(out, SWEEP_COLUMNS, output_format)
+            writer.write_rows([result_row(config, stats) for config, stats in results])
+        if args.output != '-':
+            print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
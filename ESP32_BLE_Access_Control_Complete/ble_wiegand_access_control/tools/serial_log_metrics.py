@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Reader Serial Log Ingestion and Metrics
+
+Turns the firmware's Serial output (115200 baud, DEBUG_MODE) into
+structured events and rolling metrics, for one reader or a whole site:
+
+- Sources are saved captures (plain, .gz or .zst), log files that are
+  still growing (--follow, like tail -F), or serial devices (with the
+  optional pyserial package; devices are always followed). Each source is one reader, named after the
+  file or given as name=path.
+- Lines are matched by prefix, so a single process keeps up with dozens
+  of readers at full serial rate:
+      BLE Device found: <mac> | RSSI: <n>     advertisement
+      ✓ Authorized device detected: <mac>      authorized hit
+        -> Device in cooldown, skipping...     cooldown suppression
+        -> Not authorized                      rejected advertisement
+        Transmission complete                  credential sent
+      Scan complete. Devices found: <n>        end of a scan cycle
+- Timestamps come from the capture tool when it adds them (Arduino IDE
+  "HH:MM:SS.mmm -> ", ISO 8601, or epoch seconds in brackets); otherwise
+  the time the line was read is used, which is right for live sources.
+
+Metrics over a rolling window: advertisements per second, authorized hit
+rate, cooldown suppressions, detect-to-transmit latency (authorized line
+to "Transmission complete") and scan-cycle duration. They are written as
+NDJSON every --interval seconds of log time, or as Prometheus text format
+(overwritten in place, for the node_exporter textfile collector).
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import re
+import sys
+import json
+import stat
+import time
+from collections import deque
+from datetime import datetime
+
+try:
+    import serial
+except ImportError:  # pyserial is optional; only serial devices need it
+    serial = None
+
+from credential_io import open_input, open_output
+
+
+# Rolling metrics window and emission interval, s
+DEFAULT_WINDOW = 60.0
+DEFAULT_INTERVAL = 10.0
+
+# Bytes read per source per pass
+READ_SIZE = 1 << 16
+
+# Pause when no source had new data while following, s
+FOLLOW_POLL = 0.2
+
+# Detect-to-transmit latencies kept per reader for quantiles
+LATENCY_SAMPLES = 4096
+
+LATENCY_QUANTILES = [0.5, 0.95, 0.99]
+
+_TIMESTAMP_RE = re.compile(
+    r'(?:(?P<clock>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2}\.\d+) -> '
+    r'|(?P<iso>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?)\S*\s+'
+    r'|\[(?P<epoch>\d{9,11}(?:\.\d+)?)\]\s*)')
+
+
+def parse_line(line):
+    """
+    Split a capture line into its timestamp and the firmware text
+
+    Args:
+        line: One line, without the newline
+
+    Returns:
+        Tuple (time in seconds or None, text). Arduino IDE clock times are
+        seconds since midnight.
+    """
+    match = _TIMESTAMP_RE.match(line)
+    if match is None:
+        return None, line
+    if match.group('clock') is not None:
+        stamp = (int(match.group('clock')) * 3600 + int(match.group('minute')) * 60
+                 + float(match.group('second')))
+    elif match.group('iso') is not None:
+        stamp = datetime.fromisoformat(match.group('iso').replace(' ', 'T')).timestamp()
+    else:
+        stamp = float(match.group('epoch'))
+    return stamp, line[match.end():]
+
+
+class ReaderMetrics:
+    """Event parser and rolling metrics for one reader"""
+
+    def __init__(self, name, window=DEFAULT_WINDOW):
+        """
+        Args:
+            name: Reader name, used as the Prometheus label
+            window: Rolling window in seconds
+        """
+        self.name = name
+        self.window = window
+        self.totals = {'lines': 0, 'advertisements': 0, 'authorized': 0, 'not_authorized': 0,
+                       'cooldown_suppressions': 0, 'transmissions': 0, 'scan_cycles': 0}
+        self._recent = {key: deque() for key in ('advertisements', 'authorized',
+                                                 'cooldown_suppressions', 'transmissions')}
+        self._latencies = deque()      # (time, seconds)
+        self._cycles = deque()         # (time, seconds)
+        self._pending = None           # (time, mac) of the last authorized hit
+        self._last_scan = None
+        self._day_offset = 0.0
+        self._last_stamp = None
+        self.start = None
+        self.now = None
+
+    def _clock(self, stamp, read_time):
+        """Event time: capture timestamp (midnight wrap handled) or read time"""
+        if stamp is None:
+            return read_time
+        if stamp < 86400 and self._last_stamp is not None and stamp + 43200 < self._last_stamp:
+            self._day_offset += 86400
+        self._last_stamp = stamp
+        return stamp + self._day_offset
+
+    def feed(self, line, read_time):
+        """
+        Parse one line
+
+        Args:
+            line: Line text, without the newline
+            read_time: Wall-clock time the line was read
+
+        Returns:
+            Event dictionary, or None for lines that are not events
+        """
+        self.totals['lines'] += 1
+        stamp, text = parse_line(line)
+        t = self.now = self._clock(stamp, read_time)
+        if self.start is None:
+            self.start = t
+
+        if text.startswith('BLE Device found: '):
+            mac, _, rssi = text[18:].partition(' | RSSI: ')
+            self._count('advertisements', t)
+            try:
+                rssi = int(rssi)
+            except ValueError:
+                rssi = None
+            return {'reader': self.name, 'time': t, 'event': 'advertisement', 'mac': mac.strip(),
+                    'rssi': rssi}
+        if text.startswith('  -> Not authorized'):
+            self.totals['not_authorized'] += 1
+            return None
+        if 'Authorized device detected: ' in text:
+            mac = text.rpartition(': ')[2].strip()
+            self._count('authorized', t)
+            self._pending = (t, mac)
+            return {'reader': self.name, 'time': t, 'event': 'authorized', 'mac': mac}
+        if text.startswith('  -> Device in cooldown'):
+            self._count('cooldown_suppressions', t)
+            mac = self._pending[1] if self._pending else None
+            self._pending = None
+            return {'reader': self.name, 'time': t, 'event': 'cooldown', 'mac': mac}
+        if text.startswith('  Transmission complete'):
+            self._count('transmissions', t)
+            event = {'reader': self.name, 'time': t, 'event': 'transmit', 'mac': None, 'latency': None}
+            if self._pending is not None:
+                latency = t - self._pending[0]
+                self._latencies.append((t, latency))
+                event.update(mac=self._pending[1], latency=latency)
+                self._pending = None
+            return event
+        if text.startswith('Scan complete. Devices found: '):
+            self.totals['scan_cycles'] += 1
+            cycle = None
+            if self._last_scan is not None:
+                cycle = t - self._last_scan
+                self._cycles.append((t, cycle))
+            self._last_scan = t
+            try:
+                devices = int(text[30:])
+            except ValueError:
+                devices = None
+            return {'reader': self.name, 'time': t, 'event': 'scan_complete', 'devices': devices,
+                    'cycle': cycle}
+        return None
+
+    def _count(self, key, t):
+        self.totals[key] += 1
+        self._recent[key].append(t)
+
+    def _expire(self):
+        cutoff = self.now - self.window
+        for times in self._recent.values():
+            while times and times[0] < cutoff:
+                times.popleft()
+        for samples in (self._latencies, self._cycles):
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+        while len(self._latencies) > LATENCY_SAMPLES:
+            self._latencies.popleft()
+
+    def snapshot(self):
+        """
+        Rolling metrics at the time of the last line
+
+        Returns:
+            Dictionary of metrics
+        """
+        if self.now is None:
+            return None
+        self._expire()
+        recent = {key: len(times) for key, times in self._recent.items()}
+        span = max(1.0, min(self.window, self.now - self.start))
+        latencies = sorted(value for _, value in self._latencies)
+        cycles = [value for _, value in self._cycles]
+
+        def quantile(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            'reader': self.name,
+            'time': self.now,
+            'window': self.window,
+            'advertisements_per_second': recent['advertisements'] / span,
+            'authorized_hit_rate': (recent['authorized'] / recent['advertisements']
+                                    if recent['advertisements'] else None),
+            'cooldown_suppressions': recent['cooldown_suppressions'],
+            'transmissions': recent['transmissions'],
+            'latency': {str(q): quantile(q) for q in LATENCY_QUANTILES},
+            'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+            'scan_cycle_mean': sum(cycles) / len(cycles) if cycles else None,
+            'totals': dict(self.totals),
+        }
+
+
+def _label_value(value):
+    """Escape a Prometheus label value (backslash, double quote, newline)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshots):
+    """
+    Render snapshots in the Prometheus text exposition format
+
+    Args:
+        snapshots: List of ReaderMetrics.snapshot dictionaries
+
+    Returns:
+        str
+    """
+    metrics = [
+        ('ble_reader_lines_total', 'counter', 'Serial lines read', lambda s: s['totals']['lines']),
+        ('ble_reader_advertisements_total', 'counter', 'BLE advertisements reported',
+         lambda s: s['totals']['advertisements']),
+        ('ble_reader_authorized_total', 'counter', 'Authorized devices detected',
+         lambda s: s['totals']['authorized']),
+        ('ble_reader_cooldown_suppressions_total', 'counter', 'Sends skipped by the cooldown',
+         lambda s: s['totals']['cooldown_suppressions']),
+        ('ble_reader_transmissions_total', 'counter', 'Credentials transmitted',
+         lambda s: s['totals']['transmissions']),
+        ('ble_reader_scan_cycles_total', 'counter', 'Completed scan cycles',
+         lambda s: s['totals']['scan_cycles']),
+        ('ble_reader_advertisements_per_second', 'gauge', 'Advertisements per second over the window',
+         lambda s: s['advertisements_per_second']),
+        ('ble_reader_authorized_hit_ratio', 'gauge', 'Authorized share of advertisements over the window',
+         lambda s: s['authorized_hit_rate']),
+        ('ble_reader_scan_cycle_seconds', 'gauge', 'Mean scan cycle duration over the window',
+         lambda s: s['scan_cycle_mean']),
+    ]
+    lines = []
+    for name, kind, help_text, value in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for s in snapshots:
+            v = value(s)
+            if v is not None:
+                lines.append(f'{name}{{reader="{_label_value(s["reader"])}"}} {v:g}')
+
+    name = 'ble_reader_detect_to_transmit_seconds'
+    lines.append(f"# HELP {name} Authorized detection to transmission complete over the window")
+    lines.append(f"# TYPE {name} gauge")
+    for s in snapshots:
+        for q, v in s['latency'].items():
+            if v is not None:
+                lines.append(f'{name}{{reader="{_label_value(s["reader"])}",quantile="{q}"}} {v:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def _is_serial_device(path):
+    """Whether path is a character device such as /dev/ttyUSB0"""
+    if path in ('-', os.devnull):
+        return False
+    try:
+        return stat.S_ISCHR(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+class LogSource:
+    """One reader's serial log: a capture file, a growing log, or a device"""
+
+    def __init__(self, spec, follow=False, baud=115200):
+        """
+        Args:
+            spec: path or name=path; - for stdin
+            follow: Keep reading at end of file (always on for serial devices)
+            baud: Baud rate for serial devices
+        """
+        name, sep, path = spec.partition('=')
+        if not sep:
+            name, path = os.path.basename(spec) or spec, spec
+        self.name = name
+        self.path = path
+        self._buffer = ''
+        self.closed = False
+        # A serial port has no end of file: an empty read only means no data yet
+        device = _is_serial_device(path)
+        self.follow = follow or device
+
+        if device:
+            if serial is None:
+                raise ValueError(f"Reading serial device {path} needs pyserial (pip install pyserial)")
+            self._handle = serial.Serial(path, baud, timeout=0)
+        elif follow and path != '-':
+            self._handle = open(path, 'r', encoding='utf-8', errors='replace', newline='')
+        else:
+            # Saved capture: open_input handles stdin and compression
+            self._handle = open_input(path)
+
+    def read_lines(self):
+        """
+        Read what is available
+
+        Returns:
+            List of complete lines, without line endings; empty if nothing new
+        """
+        data = self._handle.read(READ_SIZE)
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        if not data:
+            if not self.follow:
+                self.closed = True
+                if self._buffer:
+                    tail, self._buffer = self._buffer, ''
+                    return [tail.rstrip('\r')]
+            return []
+        lines = (self._buffer + data).split('\n')
+        self._buffer = lines.pop()
+        return [line.rstrip('\r') for line in lines]
+
+    def close(self):
+        self._handle.close()
+
+
+def run(sources, events_out=None, metrics_out=None, metrics_format='ndjson',
+        window=DEFAULT_WINDOW, interval=DEFAULT_INTERVAL):
+    """
+    Read every source until all are exhausted (or forever when following)
+
+    Args:
+        sources: List of LogSource
+        events_out: Text stream for NDJSON events, or None
+        metrics_out: NDJSON stream, or Prometheus file path, or None
+        metrics_format: 'ndjson' or 'prometheus'
+        window: Rolling window in seconds
+        interval: Seconds of log time between metric snapshots
+
+    Returns:
+        Dictionary of reader name to final snapshot
+    """
+    readers = {source.name: ReaderMetrics(source.name, window) for source in sources}
+    next_emit = {}
+
+    def emit(names):
+        snapshots = [s for s in (readers[n].snapshot() for n in names) if s is not None]
+        if metrics_out is None or not snapshots:
+            return
+        if metrics_format == 'prometheus':
+            everything = [s for s in (r.snapshot() for r in readers.values()) if s is not None]
+            write_prometheus(metrics_out, everything)
+        else:
+            metrics_out.write(''.join(json.dumps(s) + '\n' for s in snapshots))
+            metrics_out.flush()
+
+    active = list(sources)
+    while active:
+        got_data = False
+        for source in list(active):
+            lines = source.read_lines()
+            if source.closed:
+                active.remove(source)
+            if not lines:
+                continue
+            got_data = True
+            reader = readers[source.name]
+            now = time.time()
+            events = []
+            for line in lines:
+                event = reader.feed(line, now)
+                if event is not None and events_out is not None:
+                    events.append(event)
+            if events:
+                events_out.write(''.join(json.dumps(e) + '\n' for e in events))
+                if source.follow:
+                    events_out.flush()
+            due = next_emit.setdefault(source.name, reader.now + interval)
+            if reader.now >= due:
+                next_emit[source.name] = reader.now + interval
+                emit([source.name])
+        if not got_data and active:
+            time.sleep(FOLLOW_POLL)
+
+    emit(list(readers))
+    return {name: reader.snapshot() for name, reader in readers.items()}
+
+
+def write_prometheus(path, snapshots):
+    """Write Prometheus text atomically (stdout for '-')"""
+    text = prometheus_text(snapshots)
+    if path == '-':
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(text)
+    os.replace(tmp_file, path)
+
+
+def print_summary(snapshots, stream=None):
+    """Print final per-reader metrics"""
+    stream = stream or sys.stdout
+
+    def fmt(value, scale=1.0, digits=3):
+        return '-' if value is None else f"{value * scale:.{digits}f}"
+
+    lines = ["", "=" * 96, "READER LOG SUMMARY", "=" * 96,
+             f"{'Reader':<20} {'Lines':>8} {'Adv':>8} {'Adv/s':>7} {'Hit %':>6} {'Cool':>6} "
+             f"{'Sent':>6} {'p50 ms':>7} {'p95 ms':>7} {'Cycle s':>8}"]
+    for name, s in sorted(snapshots.items()):
+        if s is None:
+            lines.append(f"{name:<20} (no lines)")
+            continue
+        totals = s['totals']
+        hit = totals['authorized'] / totals['advertisements'] if totals['advertisements'] else None
+        lines.append(f"{name[:20]:<20} {totals['lines']:>8} {totals['advertisements']:>8} "
+                     f"{s['advertisements_per_second']:>7.2f} {fmt(hit, 100, 1):>6} "
+                     f"{totals['cooldown_suppressions']:>6} {totals['transmissions']:>6} "
+                     f"{fmt(s['latency']['0.5'], 1000, 1):>7} {fmt(s['latency']['0.95'], 1000, 1):>7} "
+                     f"{fmt(s['scan_cycle_mean'], 1, 2):>8}")
+    lines += ["=" * 96, "Totals are for the whole log; rates and latencies are for the last window.", ""]
+    stream.write('\n'.join(lines) + '\n')
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Parse reader serial logs into events and rolling metrics',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Summarize a saved capture
+  python serial_log_metrics.py door3.log
+
+  # Events and per-minute metrics as NDJSON
+  python serial_log_metrics.py door1=door1.log.gz door2=door2.log --events events.ndjson \\
+      --metrics metrics.ndjson --interval 60
+
+  # Follow live logs and keep a Prometheus textfile up to date
+  python serial_log_metrics.py --follow /var/log/readers/*.log \\
+      --metrics /var/lib/node_exporter/ble_readers.prom --metrics-format prometheus
+
+  # Read a reader directly (needs pyserial; devices are always followed)
+  python serial_log_metrics.py lobby=/dev/ttyUSB0 --metrics - --metrics-format prometheus
+        """
+    )
+
+    parser.add_argument('sources', nargs='+', help='Log files or devices, as path or name=path; - for stdin')
+    parser.add_argument('--follow', action='store_true', help='Keep reading as the logs grow')
+    parser.add_argument('--events', help='Write structured events as NDJSON to this file; - for stdout')
+    parser.add_argument('--metrics', help='Write metrics to this file; - for stdout')
+    parser.add_argument('--metrics-format', choices=['ndjson', 'prometheus'], default='ndjson',
+                       help='Metrics format (default: ndjson)')
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW,
+                       help=f'Rolling window in seconds (default: {DEFAULT_WINDOW:g})')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                       help=f'Seconds between metric snapshots (default: {DEFAULT_INTERVAL:g})')
+    parser.add_argument('--baud', type=int, default=115200, help='Serial device baud rate (default: 115200)')
+
+    args = parser.parse_args()
+
+    names = [s.partition('=')[0] if '=' in s else os.path.basename(s) or s for s in args.sources]
+    if len(set(names)) != len(names):
+        parser.error('Reader names must be unique; use name=path')
+
+    sources = []
+    events_out = metrics_out = None
+    try:
+        sources = [LogSource(spec, args.follow, args.baud) for spec in args.sources]
+        if args.events:
+            events_out = open_output(args.events)
+        if args.metrics:
+            metrics_out = args.metrics if args.metrics_format == 'prometheus' else open_output(args.metrics)
+        snapshots = run(sources, events_out, metrics_out, args.metrics_format, args.window,
+                        args.interval)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        snapshots = None
+    finally:
+        for source in sources:
+            source.close()
+        for stream in (events_out, metrics_out):
+            if stream is not None and not isinstance(stream, str):
+                stream.close()
+
+    if snapshots and '-' not in (args.events, args.metrics):
+        print_summary(snapshots)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Multi-Site Firmware Configuration Builder
+
+Every reader has its own allowlist, OUTPUT_FORMAT, FACILITY_CODE and scan
+and cooldown settings. Instead of hand-editing the sketch per door, describe
+the estate once in a JSON site manifest:
+
+    {
+      "defaults": {"format": 26, "facility_code": 123, "cooldown_ms": 5000},
+      "groups": {
+        "staff": "groups/staff.txt",
+        "cleaners": ["a4:c1:38:12:34:56", "a4:c1:38:65:43:21"]
+      },
+      "sites": {
+        "hq": {
+          "facility_code": 10,
+          "doors": {
+            "front": {"groups": ["staff", "cleaners"]},
+            "lab": {"groups": ["staff"], "format": 34, "macs": ["11:22:33:44:55:66"]}
+          }
+        }
+      }
+    }
+
+Groups are MAC list files (relative to the manifest; .gz/.zst accepted) or
+inline lists. Settings are taken from defaults, then the site, then the
+door: format (26, 34 or 40), facility_code, scan_time, scan_interval,
+cooldown_ms and debug.
+
+For each door, OUTPUT/<site>/<door>/ gets:
+
+- door_config.h: the door's settings; copy it next to the sketch and define
+  USE_DOOR_CONFIG in ble_wiegand_access_control.ino.
+- authorized_devices.h: the door's allowlist (see allowlist_header.py).
+- credentials.csv: the credentials the door sends, for enrolment in Net2.
+
+Doors are built in parallel. Each door is keyed on a hash of its settings
+and the content of its groups, kept in OUTPUT/.site_build.json, so a door
+is only rebuilt when one of its inputs changes, and a rebuilt file is only
+replaced when its content actually differs. OUTPUT/changes.json lists the
+doors that were built or removed and every output file that changed.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import filecmp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from credential_io import RecordWriter, iter_mac_lines, open_input
+from credential_formats import format_mac_batch, output_fields
+from allowlist_header import collect_allowlist, write_header
+from credential_batch import iter_row_chunks
+
+
+# Bump when the generated files change shape, so every door is rebuilt
+GENERATOR_VERSION = 1
+
+STATE_FILE = '.site_build.json'
+CHANGES_FILE = 'changes.json'
+DOOR_FILES = ['door_config.h', 'authorized_devices.h', 'credentials.csv']
+
+# Setting -> (sketch #define, default)
+SETTINGS = {
+    'format': ('OUTPUT_FORMAT', 26),
+    'facility_code': ('FACILITY_CODE', 123),
+    'scan_time': ('BLE_SCAN_TIME', 5),
+    'scan_interval': ('BLE_SCAN_INTERVAL', 100),
+    'cooldown_ms': ('DEVICE_COOLDOWN_MS', 5000),
+    'debug': ('DEBUG_MODE', True),         # as in the sketch; serial_log_metrics.py needs it
+}
+
+FIRMWARE_FORMATS = (26, 34, 40)
+
+NAME_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]*')
+
+HASH_BLOCK = 1 << 20
+
+
+def _check_name(name, kind):
+    """Reject site, door and group names that are not safe path components"""
+    if not isinstance(name, str) or not NAME_RE.fullmatch(name):
+        raise ValueError(f"Invalid {kind} name: {name!r} (letters, digits, '_', '.', '-')")
+
+
+def resolve_settings(layers, where):
+    """
+    Merge and validate door settings
+
+    Args:
+        layers: Setting dictionaries, lowest precedence first
+        where: Door or section name, for error messages
+
+    Returns:
+        Dictionary with every key of SETTINGS
+    """
+    settings = {name: default for name, (_, default) in SETTINGS.items()}
+    for layer in layers:
+        for name, value in layer.items():
+            if name not in SETTINGS:
+                raise ValueError(f"{where}: unknown setting '{name}'")
+            settings[name] = value
+
+    if settings['format'] not in FIRMWARE_FORMATS:
+        raise ValueError(f"{where}: format must be 26, 34 or 40, got {settings['format']!r}")
+    if not isinstance(settings['facility_code'], int) or isinstance(settings['facility_code'], bool) \
+            or not 0 <= settings['facility_code'] <= 255:
+        raise ValueError(f"{where}: Facility code must be 0-255, got {settings['facility_code']!r}")
+    for name in ('scan_time', 'scan_interval', 'cooldown_ms'):
+        if not isinstance(settings[name], int) or isinstance(settings[name], bool) \
+                or settings[name] < 0:
+            raise ValueError(f"{where}: {name} must be a non-negative integer")
+    if not isinstance(settings['debug'], bool):
+        raise ValueError(f"{where}: debug must be true or false")
+    return settings
+
+
+def load_manifest(manifest_file):
+    """
+    Read and validate a site manifest
+
+    Args:
+        manifest_file: JSON manifest filename
+
+    Returns:
+        Tuple (groups, doors): groups maps a name to ('file', path) or
+        ('macs', list); doors is a list of dictionaries with id, settings,
+        groups and macs, in manifest order
+    """
+    with open(manifest_file) as f:
+        try:
+            manifest = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{manifest_file}: {e}")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    groups = {}
+    for name, group in manifest.get('groups', {}).items():
+        _check_name(name, 'group')
+        if isinstance(group, str):
+            groups[name] = ('file', os.path.join(base_dir, group))
+        elif isinstance(group, list):
+            groups[name] = ('macs', [str(mac) for mac in group])
+        else:
+            raise ValueError(f"Group '{name}' must be a MAC list filename or a list of MACs")
+
+    defaults = manifest.get('defaults', {})
+    doors = []
+    for site_name, site in manifest.get('sites', {}).items():
+        _check_name(site_name, 'site')
+        site_settings = {k: v for k, v in site.items() if k != 'doors'}
+        for door_name, door in site.get('doors', {}).items():
+            _check_name(door_name, 'door')
+            door_id = f"{site_name}/{door_name}"
+            door_groups = door.get('groups', [])
+            for name in door_groups:
+                if name not in groups:
+                    raise ValueError(f"{door_id}: unknown group '{name}'")
+            door_settings = {k: v for k, v in door.items() if k not in ('groups', 'macs')}
+            doors.append({
+                'id': door_id,
+                'settings': resolve_settings([defaults, site_settings, door_settings], door_id),
+                'groups': list(door_groups),
+                'macs': [str(mac) for mac in door.get('macs', [])],
+            })
+
+    if not doors:
+        raise ValueError(f"{manifest_file} defines no doors")
+    return groups, doors
+
+
+def group_digest(group):
+    """
+    Content hash of a MAC group
+
+    Args:
+        group: ('file', path) or ('macs', list) from load_manifest
+
+    Returns:
+        Hex SHA-256 of the file bytes or of the inline list
+    """
+    digest = hashlib.sha256()
+    kind, source = group
+    if kind == 'file':
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b''):
+                digest.update(block)
+    else:
+        digest.update('\n'.join(source).encode())
+    return digest.hexdigest()
+
+
+def door_inputs(door, digests):
+    """
+    Everything a door's outputs depend on, as stored in the build state
+
+    Args:
+        door: Door dictionary from load_manifest
+        digests: Group name -> content hash
+
+    Returns:
+        Dictionary with the key (a hash over all inputs), settings, group
+        hashes and the hash of the door's own MACs
+    """
+    inputs = {
+        'version': GENERATOR_VERSION,
+        'settings': door['settings'],
+        'groups': {name: digests[name] for name in door['groups']},
+        'macs': hashlib.sha256('\n'.join(door['macs']).encode()).hexdigest(),
+    }
+    # Group order is part of the key: it decides the order errors are reported in
+    key_source = dict(inputs, group_order=door['groups'])
+    inputs['key'] = hashlib.sha256(json.dumps(key_source, sort_keys=True).encode()).hexdigest()
+    return inputs
+
+
+def rebuild_reasons(inputs, previous, door_dir):
+    """
+    Why a door has to be rebuilt
+
+    Args:
+        inputs: Current inputs from door_inputs
+        previous: The door's entry in the build state, or None
+        door_dir: The door's output directory
+
+    Returns:
+        List of reasons; empty when the outputs are up to date
+    """
+    if previous is None:
+        return ['new']
+    reasons = []
+    if previous.get('version') != inputs['version']:
+        reasons.append('generator')
+    if previous.get('settings') != inputs['settings']:
+        reasons.append('settings')
+    old_groups = previous.get('groups', {})
+    reasons.extend(f"group {name}" for name, digest in inputs['groups'].items()
+                   if old_groups.get(name) != digest)
+    reasons.extend(f"group {name} removed" for name in old_groups if name not in inputs['groups'])
+    if previous.get('macs') != inputs['macs']:
+        reasons.append('door macs')
+    if not reasons and previous.get('key') != inputs['key']:
+        reasons.append('group order')
+    if not reasons and not all(os.path.isfile(os.path.join(door_dir, name)) for name in DOOR_FILES):
+        reasons.append('missing outputs')
+    return reasons
+
+
+def write_door_config(output_file, door_id, settings, source=None):
+    """
+    Write a door's door_config.h
+
+    Args:
+        output_file: Header filename
+        door_id: 'site/door'
+        settings: Settings from resolve_settings
+        source: Manifest name, for the header comment
+    """
+    lines = []
+    for name, (define, _) in SETTINGS.items():
+        value = settings[name]
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        lines.append(f"#define {define} {value}")
+
+    with open(output_file, 'w') as f:
+        f.write(f"""/**
+ * Door Configuration: {door_id}
+ *
+ * Generated by tools/site_build.py{f' from {source}' if source else ''}.
+ * Do not edit by hand; re-run the generator instead.
+ */
+
+#ifndef DOOR_CONFIG_H
+#define DOOR_CONFIG_H
+
+#define DOOR_ID "{door_id}"
+{chr(10).join(lines)}
+
+// This door's allowlist
+#define USE_ALLOWLIST_HEADER
+
+#endif // DOOR_CONFIG_H
+""")
+
+
+def _install(tmp_file, output_file):
+    """
+    Move a freshly generated file into place unless the content is unchanged
+
+    Returns:
+        Tuple (content hash, changed)
+    """
+    digest = hashlib.sha256()
+    with open(tmp_file, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    if os.path.isfile(output_file) and filecmp.cmp(tmp_file, output_file, shallow=False):
+        os.remove(tmp_file)
+        return digest.hexdigest(), False
+    os.replace(tmp_file, output_file)
+    return digest.hexdigest(), True
+
+
+def _iter_sources(sources):
+    """MAC strings of a door's groups and own MACs, in manifest order"""
+    for kind, source in sources:
+        if kind == 'file':
+            with open_input(source) as f:
+                yield from iter_mac_lines(f)
+        else:
+            yield from source
+
+
+class _ErrorLines:
+    """Error sink that keeps the lines collect_allowlist writes"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.extend(text.splitlines())
+
+
+def build_door(task):
+    """
+    Generate one door's files (runs in a worker process)
+
+    Args:
+        task: Tuple (door_id, settings, sources, door_dir, source_name)
+
+    Returns:
+        Dictionary with the door id, file hashes, changed files, device
+        count and error lines
+    """
+    door_id, settings, sources, door_dir, source_name = task
+    os.makedirs(door_dir, exist_ok=True)
+    errors = _ErrorLines()
+    format_code = str(settings['format'])
+    facility_code = settings['facility_code']
+
+    entries = collect_allowlist(_iter_sources(sources), facility_code, None, errors)
+
+    paths = {name: os.path.join(door_dir, name) for name in DOOR_FILES}
+    write_door_config(paths['door_config.h'] + '.tmp', door_id, settings, source_name)
+    write_header(entries, paths['authorized_devices.h'] + '.tmp', facility_code,
+                 f"{source_name} ({door_id})")
+
+    fieldnames, keys = output_fields(format_code)
+    with open(paths['credentials.csv'] + '.tmp', 'w', newline='') as out:
+        writer = RecordWriter(out, fieldnames, 'csv')
+        macs = format_mac_batch([entry[0] for entry in entries])
+        for rows in iter_row_chunks(macs, keys, format_code, facility_code, errors=errors):
+            writer.write_rows(rows)
+
+    files, changed = {}, []
+    for name, path in paths.items():
+        files[name], was_changed = _install(path + '.tmp', path)
+        if was_changed:
+            changed.append(name)
+
+    return {'id': door_id, 'files': files, 'changed': changed, 'devices': len(entries),
+            'errors': errors.lines}
+
+
+def remove_door(door_dir, files):
+    """
+    Delete the generated files of a door that left the manifest
+
+    Only files the builder wrote are removed; the directory goes too if
+    that leaves it (and its site directory) empty.
+
+    Returns:
+        List of removed filenames
+    """
+    removed = []
+    for name in files:
+        path = os.path.join(door_dir, name)
+        if os.path.isfile(path):
+            os.remove(path)
+            removed.append(name)
+    for directory in (door_dir, os.path.dirname(door_dir)):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+    return removed
+
+
+def _write_json(path, data):
+    """Write a JSON file atomically"""
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+def build_sites(manifest_file, output_dir, jobs=None, force=False, errors=None):
+    """
+    Build every door of a site manifest, skipping doors whose inputs are unchanged
+
+    Args:
+        manifest_file: JSON site manifest
+        output_dir: Directory for the per-door outputs, build state and changes.json
+        jobs: Worker processes (default: CPU count)
+        force: Rebuild every door
+        errors: Text stream for per-MAC error lines (default: stderr)
+
+    Returns:
+        The change manifest, as written to changes.json
+    """
+    errors = errors or sys.stderr
+    groups, doors = load_manifest(manifest_file)
+    source_name = os.path.basename(manifest_file)
+
+    # Each group is hashed once, however many doors use it
+    used = {name for door in doors for name in door['groups']}
+    digests = {name: group_digest(groups[name]) for name in sorted(used)}
+
+    os.makedirs(output_dir, exist_ok=True)
+    state_file = os.path.join(output_dir, STATE_FILE)
+    state = {}
+    if os.path.isfile(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+
+    tasks, reasons, inputs = [], {}, {}
+    for door in doors:
+        door_dir = os.path.join(output_dir, *door['id'].split('/'))
+        inputs[door['id']] = door_inputs(door, digests)
+        door_reasons = ['forced'] if force else \
+            rebuild_reasons(inputs[door['id']], state.get(door['id']), door_dir)
+        if door_reasons:
+            reasons[door['id']] = door_reasons
+            sources = [groups[name] for name in door['groups']]
+            if door['macs']:
+                sources.append(('macs', door['macs']))
+            tasks.append((door['id'], door['settings'], sources, door_dir, source_name))
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(tasks) <= 1:
+        results = [build_door(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            results = list(pool.map(build_door, tasks,
+                                    chunksize=max(1, len(tasks) // (jobs * 4))))
+
+    built = {}
+    changed_files = []
+    for result in results:
+        door_id = result['id']
+        for line in result['errors']:
+            errors.write(f"[{door_id}] {line}\n")
+        state[door_id] = dict(inputs[door_id], files=result['files'])
+        built[door_id] = {'reasons': reasons[door_id], 'devices': result['devices'],
+                          'rejected': len(result['errors']), 'changed_files': result['changed']}
+        changed_files.extend(f"{door_id}/{name}" for name in result['changed'])
+
+    removed = {}
+    current = {door['id'] for door in doors}
+    for door_id in sorted(set(state) - current):
+        door_dir = os.path.join(output_dir, *door_id.split('/'))
+        removed[door_id] = remove_door(door_dir, state.pop(door_id).get('files', {}))
+        changed_files.extend(f"{door_id}/{name}" for name in removed[door_id])
+
+    _write_json(state_file, state)
+    changes = {
+        'manifest': os.path.abspath(manifest_file),
+        'generated': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'doors': len(doors),
+        'unchanged': len(doors) - len(built),
+        'built': built,
+        'removed': removed,
+        'changed_files': changed_files,
+    }
+    _write_json(os.path.join(output_dir, CHANGES_FILE), changes)
+    return changes
+
+
+def print_changes(changes, output_dir):
+    """
+    Print a summary of a build
+
+    Args:
+        changes: Change manifest from build_sites
+        output_dir: Output directory, for the closing line
+    """
+    print(f"\n{'='*60}")
+    print("SITE BUILD")
+    print(f"{'='*60}")
+    for door_id, door in changes['built'].items():
+        rejected = f", {door['rejected']} rejected" if door['rejected'] else ''
+        print(f"{door_id}: built ({', '.join(door['reasons'])}), {door['devices']} devices"
+              f"{rejected}, {len(door['changed_files'])} files changed")
+    for door_id in changes['removed']:
+        print(f"{door_id}: removed")
+    print(f"\nDoors:         {changes['doors']:,}")
+    print(f"Built:         {len(changes['built']):,}")
+    print(f"Unchanged:     {changes['unchanged']:,}")
+    print(f"Removed:       {len(changes['removed']):,}")
+    print(f"Files changed: {len(changes['changed_files']):,}")
+    print(f"{'='*60}")
+    print(f"Change manifest written to {os.path.join(output_dir, CHANGES_FILE)}\n")
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generate per-door firmware config headers and credential CSVs from a site manifest',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Build (or update) every door; unchanged doors are skipped
+  python site_build.py -m sites.json -o build/
+
+  # Rebuild everything, on 8 worker processes
+  python site_build.py -m sites.json -o build/ --force -j 8
+
+  # Flash one door: copy its headers next to the sketch, define USE_DOOR_CONFIG
+  cp build/hq/front/door_config.h build/hq/front/authorized_devices.h ../
+        """
+    )
+
+    parser.add_argument('-m', '--manifest', required=True, help='JSON site manifest')
+    parser.add_argument('-o', '--output', required=True,
+                       help='Output directory (per-door files, build state, changes.json)')
+    parser.add_argument('-j', '--jobs', type=int,
+                       help='Worker processes (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true',
+                       help='Rebuild every door, even if its inputs are unchanged')
+    parser.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+
+    args = parser.parse_args()
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs needs a positive worker count')
+
+    try:
+        if args.errors:
+            with open(args.errors, 'w') as errors:
+                changes = build_sites(args.manifest, args.output, args.jobs, args.force, errors)
+        else:
+            changes = build_sites(args.manifest, args.output, args.jobs, args.force)
+        print_changes(changes, args.output)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""The sketch's own conversion code against the tools (needs a C++ compiler)"""
+
+import shutil
+import unittest
+
+from wiegand_frames import FRAME_BITS
+from firmware_diff import FirmwareHarness, compare_batch, edge_macs, random_batches
+
+
+@unittest.skipUnless(shutil.which('c++'), 'no C++ compiler')
+class FirmwareDiffTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.macs = edge_macs() + [int(v) for batch in random_batches(5000, 5000) for v in batch]
+
+    def test_sketch_matches_tools(self):
+        with FirmwareHarness() as harness:
+            for code in FRAME_BITS:
+                for facility_code in (0, 123, 255):
+                    for upper in (False, True):
+                        with self.subTest(format=code, facility_code=facility_code, upper=upper):
+                            self.assertEqual(compare_batch(harness, self.macs, code,
+                                                           facility_code, upper), [])
+
+    def test_legacy_em4100_card_id_is_reported(self):
+        with FirmwareHarness(em4100_legacy=True) as harness:
+            self.assertTrue(compare_batch(harness, self.macs, '40'))
+            self.assertEqual(compare_batch(harness, self.macs, '26'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+"""Wiegand/EM4100 frames against the committed golden vectors"""
+
+import os
+import json
+import unittest
+
+from wiegand_frames import check_golden, golden_vectors
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                           'golden_frames.json')
+
+
+class GoldenFramesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(GOLDEN_FILE) as f:
+            cls.golden = json.load(f)
+
+    def test_batch_encoder(self):
+        self.assertEqual(check_golden(self.golden['vectors']), [])
+
+    def test_reference_encoder(self):
+        self.assertEqual(golden_vectors(self.golden['facility_code']), self.golden['vectors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
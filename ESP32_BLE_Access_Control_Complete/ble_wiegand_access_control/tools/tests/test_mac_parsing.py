@@ -0,0 +1,64 @@
+"""parse_mac_batch against the single-MAC parser and the original string pipeline"""
+
+import unittest
+
+import credential_formats
+from credential_formats import _string_mac_to_int, mac_to_int, normalize_mac, parse_mac_batch
+
+EDGE_MACS = [
+    'AA:BB:CC:DD:EE:FF', 'aa-bb-cc-dd-ee-ff', 'aabb.ccdd.eeff', 'aabbccddeeff', 'a4c1.3812.3456',
+    'ffffffffffff', '000000000000', 'AA.BB.CC.DD.EE.FF', 'A-A-B-B-C-C-D-D-E-E-F-F',
+    'AA:BB-CC.DD:EE:FF', 'AA::BBCCDDEEFF',
+    # Wrong length
+    '', 'AA:BB:CC:DD:EE', 'AA:BB:CC:DD:EE:FF:00', 'A4C1.3812.345',
+    # Wrong characters, including ones int() or str.upper() would accept
+    'GG:BB:CC:DD:EE:FF', 'aa:bb:cc:dd:ee:fg', ' AA:BB:CC:DD:EE:FF', 'AA:BB:CC:DD:EE:FF ',
+    'AA_BB_CC_DD_EE_FF', 'AABBCCDDEE_F', 'AA BB CC DD EE FF', '+A:BB:CC:DD:EE:FF',
+    '0x:AA:BB:CC:DD:EE', 'aa:bb:cc:dd:ee:f\n', 'AA:BB:CC:DD:EE:FF\x00',
+    'ＡＡ:BB:CC:DD:EE:FF', 'AA:BB:CC:DD:EE:F٠', 'AA:BB:CC:DD:EE:FÉ',
+    'ǅǅ:BB:CC:DD:EE', 'ßß:BB:CC:DD:EE',
+]
+
+
+class ParseMacBatchTest(unittest.TestCase):
+
+    def check(self, macs):
+        values, errors = parse_mac_batch(macs)
+        self.assertEqual(len(values), len(macs))
+        for i, mac in enumerate(macs):
+            with self.subTest(mac=mac):
+                try:
+                    expected, message = mac_to_int(mac), None
+                    self.assertEqual(normalize_mac(mac), credential_formats.format_mac(expected))
+                except ValueError as e:
+                    expected, message = None, str(e)
+                if message is None:
+                    self.assertNotIn(i, errors)
+                    self.assertEqual(int(values[i]), expected)
+                else:
+                    self.assertIn(i, errors)
+                    self.assertEqual(str(errors[i]), message)
+                    self.assertEqual(int(values[i]), 0)
+
+                # Accepts and rejects exactly what the original string pipeline did
+                try:
+                    original = _string_mac_to_int(mac)
+                except ValueError:
+                    original = None
+                self.assertEqual(original, expected)
+
+    def test_edge_cases(self):
+        self.check(EDGE_MACS)
+
+    def test_single_layout_batch(self):
+        # One input layout only takes the whole-batch fast path
+        self.check(['aa:bb:cc:dd:ee:ff', 'GG:BB:CC:DD:EE:FF', '01:23:45:67:89:ab'])
+
+    def test_empty_batch(self):
+        values, errors = parse_mac_batch([])
+        self.assertEqual(len(values), 0)
+        self.assertEqual(errors, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
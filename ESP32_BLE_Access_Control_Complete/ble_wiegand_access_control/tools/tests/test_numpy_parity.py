@@ -0,0 +1,92 @@
+"""The NumPy batch paths against the pure-Python fallbacks"""
+
+import random
+import unittest
+from unittest import mock
+
+import wiegand_frames
+import credential_formats
+from credential_formats import FORMATS, convert_batch, format_mac_batch, parse_mac_batch
+from wiegand_frames import (FRAME_BITS, check_parity, decode_frames, encode_frames, frame_strings,
+                            pack_frames)
+
+from .test_mac_parsing import EDGE_MACS
+
+
+def as_list(values):
+    """A NumPy array or a list, as a list"""
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def random_macs(count, seed=1):
+    """Seeded random MACs in every accepted layout and case, plus the parsing edge cases"""
+    rng = random.Random(seed)
+    layouts = ['{}:{}:{}:{}:{}:{}', '{}-{}-{}-{}-{}-{}', '{}{}.{}{}.{}{}', '{}{}{}{}{}{}']
+    macs = []
+    for _ in range(count):
+        octets = [f'{rng.getrandbits(8):02x}' for _ in range(6)]
+        if rng.random() < 0.5:
+            octets = [octet.upper() for octet in octets]
+        macs.append(rng.choice(layouts).format(*octets))
+    return macs + EDGE_MACS
+
+
+@unittest.skipIf(credential_formats.np is None, 'NumPy is not installed')
+class NumpyParityTest(unittest.TestCase):
+
+    def both(self, function, *args):
+        """Result of function with NumPy, then with the pure-Python fallback"""
+        fast = function(*args)
+        with mock.patch.object(credential_formats, 'np', None), \
+                mock.patch.object(wiegand_frames, 'np', None):
+            slow = function(*args)
+        return fast, slow
+
+    def test_parse_and_format(self):
+        macs = random_macs(5000)
+        (fast, fast_errors), (slow, slow_errors) = self.both(parse_mac_batch, macs)
+        self.assertEqual(as_list(fast), as_list(slow))
+        self.assertEqual({i: str(e) for i, e in fast_errors.items()},
+                         {i: str(e) for i, e in slow_errors.items()})
+        fast, slow = self.both(format_mac_batch, as_list(fast))
+        self.assertEqual(fast, slow)
+
+    def test_convert_every_format(self):
+        values = as_list(parse_mac_batch(random_macs(5000))[0])
+        for code in list(FORMATS) + ['all']:
+            for facility_code in (0, 123, 255):
+                with self.subTest(format=code, facility_code=facility_code):
+                    fast, slow = self.both(convert_batch, values, code, facility_code)
+                    self.assertEqual({k: as_list(v) for k, v in fast.items()},
+                                     {k: as_list(v) for k, v in slow.items()})
+
+    def test_frames(self):
+        values = as_list(parse_mac_batch(random_macs(5000))[0])
+        columns = convert_batch(values, 'all')
+        fields = {'26': ('w26_facility_code', 'w26_card_number'),
+                  '34': ('w34_facility_code', 'w34_card_number'),
+                  '40': ('em4100_version', 'em4100_card_id')}
+        for code, bits in FRAME_BITS.items():
+            with self.subTest(format=code):
+                first, second = (columns[name] for name in fields[code])
+                fast, slow = self.both(encode_frames, code, first, second)
+                self.assertEqual(as_list(fast), as_list(slow))
+                frames = as_list(slow)
+                # Flip one bit in every other frame so parity failures are covered
+                frames = [frame ^ (i % 2) for i, frame in enumerate(frames)]
+                for function, args in ((decode_frames, (code, frames)),
+                                       (pack_frames, (frames, bits)),
+                                       (frame_strings, (frames, bits))):
+                    fast, slow = self.both(function, *args)
+                    if isinstance(fast, tuple):
+                        fast, slow = [as_list(v) for v in fast], [as_list(v) for v in slow]
+                    elif not isinstance(fast, bytes):
+                        fast, slow = as_list(fast), as_list(slow)
+                    self.assertEqual(fast, slow)
+                if code != '40':
+                    fast, slow = self.both(check_parity, frames, bits)
+                    self.assertEqual([bool(v) for v in fast], [bool(v) for v in slow])
+
+
+if __name__ == '__main__':
+    unittest.main()
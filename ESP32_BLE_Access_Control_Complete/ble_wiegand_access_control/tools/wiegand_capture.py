@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Wiegand Capture Decoder for Logic-Analyzer Traces
+
+Decodes D0/D1 captures (GPIO 25/26 on the reader) taken with a logic
+analyzer, instead of reading the frames off the screen by hand:
+
+- Reads VCD files or CSV sample/transition exports (plain, .gz or .zst)
+  in chunks, so multi-gigabyte captures decode in bounded memory.
+- Turns falling/rising edges into pulses, checks each pulse width and
+  interval against the firmware's WIEGAND_PULSE_WIDTH /
+  WIEGAND_PULSE_INTERVAL (read from wiegandOutput.h), and splits frames on
+  inter-frame gaps.
+- Validates 26/34-bit parity with the same encoder as wiegand_frames.py and
+  maps every frame back to FC/CN and the MAC bytes it came from, using the
+  mac_to_credential.py conversion rules. With a reverse index from
+  credential_index.py, frames are resolved to full MAC addresses.
+
+EM4100 (40-bit) frames are reported with the version in the Facility Code
+column and the card ID in the Card Number column.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import os
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; CSV samples are then scanned in Python
+    np = None
+
+from credential_io import (OUTPUT_FORMATS, RecordWriter, iter_chunks, open_input, open_output,
+                           output_format_for)
+from wiegand_frames import FRAME_BITS, check_parity, decode_frames
+
+
+WIEGAND_HEADER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'wiegandOutput.h')
+
+
+def firmware_timing(header=WIEGAND_HEADER):
+    """
+    Read the pulse timing the firmware sends with from wiegandOutput.h
+
+    Args:
+        header: Path of wiegandOutput.h
+
+    Returns:
+        Tuple of (WIEGAND_PULSE_WIDTH, WIEGAND_PULSE_INTERVAL) in microseconds
+    """
+    with open(header) as f:
+        source = f.read()
+    values = []
+    for name in ('WIEGAND_PULSE_WIDTH', 'WIEGAND_PULSE_INTERVAL'):
+        match = re.search(r'^#define\s+' + name + r'\s+(\d+)', source, re.MULTILINE)
+        if not match:
+            raise ValueError(f"#define {name} not found in {header}")
+        values.append(int(match.group(1)))
+    return tuple(values)
+
+
+# Firmware timing (microseconds); the values below are the shipped
+# wiegandOutput.h, used only when the tools are run without the firmware
+try:
+    WIEGAND_PULSE_WIDTH, WIEGAND_PULSE_INTERVAL = firmware_timing()
+except OSError:
+    WIEGAND_PULSE_WIDTH, WIEGAND_PULSE_INTERVAL = 50, 1000
+
+# sendBit uses delayMicroseconds with interrupts enabled, so measured
+# pulses may drift from the firmware timing by this fraction
+PULSE_TOLERANCE = 0.5
+PULSE_WIDTH_LIMITS = (WIEGAND_PULSE_WIDTH * (1 - PULSE_TOLERANCE),
+                      WIEGAND_PULSE_WIDTH * (1 + PULSE_TOLERANCE))
+PULSE_INTERVAL_LIMITS = (WIEGAND_PULSE_INTERVAL * (1 - PULSE_TOLERANCE),
+                         WIEGAND_PULSE_INTERVAL * (1 + PULSE_TOLERANCE))
+
+# A gap of this many pulse intervals ends a frame
+DEFAULT_FRAME_GAP = 10 * WIEGAND_PULSE_INTERVAL
+
+# Pulses shorter than this are treated as glitches and dropped
+DEFAULT_GLITCH = 2
+
+# Bytes of capture text read per chunk
+READ_CHUNK_BYTES = 1 << 22
+
+# Frames decoded and resolved per batch
+FRAME_BATCH = 4096
+
+TIME_UNITS = {'s': 1e6, 'ms': 1e3, 'us': 1.0, 'ns': 1e-3, 'ps': 1e-6, 'fs': 1e-9}
+
+CAPTURE_COLUMNS = ['Time (s)', 'Bits', 'Format', 'Parity', 'Facility Code', 'Card Number',
+                   'MAC Pattern', 'MAC Address', 'Pulse Width (us)', 'Interval (us)', 'Issues']
+
+
+def iter_vcd_edges(stream, d0='D0', d1='D1'):
+    """
+    Stream D0/D1 level changes from a VCD file
+
+    Args:
+        stream: Text stream of the VCD file
+        d0: Signal name of Data0 (case-insensitive)
+        d1: Signal name of Data1 (case-insensitive)
+
+    Yields:
+        Tuples (time_us, line, level) with line 0 for D0 and 1 for D1
+    """
+    wanted = {d0.lower(): 0, d1.lower(): 1}
+    ids = {}
+    scale = None
+    header = []
+
+    # Header: collect tokens up to $enddefinitions
+    for line in stream:
+        header.extend(line.split())
+        if '$enddefinitions' in line:
+            break
+
+    tokens = iter(header)
+    for token in tokens:
+        if token == '$timescale':
+            spec = ''
+            for part in tokens:
+                if part == '$end':
+                    break
+                spec += part
+            number = spec.rstrip('munpfs')
+            unit = spec[len(number):]
+            if unit not in TIME_UNITS:
+                raise ValueError(f"Unsupported VCD timescale: {spec}")
+            scale = float(number or 1) * TIME_UNITS[unit]
+        elif token == '$var':
+            fields = []
+            for part in tokens:
+                if part == '$end':
+                    break
+                fields.append(part)
+            # $var wire 1 <id> <name> [range] $end
+            if len(fields) >= 4 and fields[3].lower() in wanted:
+                ids[fields[2]] = wanted[fields[3].lower()]
+
+    if len(set(ids.values())) != 2:
+        raise ValueError(f"VCD file has no signals named {d0} and {d1}")
+    scale = scale or TIME_UNITS['ns']
+
+    time = 0.0
+    levels = {0: 1, 1: 1}
+    for line in stream:
+        for token in line.split():
+            head = token[0]
+            if head == '#':
+                time = int(token[1:]) * scale
+            elif head in '01xXzZ':
+                line_id = ids.get(token[1:])
+                if line_id is not None:
+                    level = 1 if head == '1' else 0 if head == '0' else levels[line_id]
+                    if level != levels[line_id]:
+                        levels[line_id] = level
+                        yield time, line_id, level
+
+
+def _csv_columns(header, time_column, d0_column, d1_column):
+    """Resolve CSV column names or indexes to indexes"""
+    names = [name.strip().lower() for name in header] if header else []
+    result = []
+    for column in (time_column, d0_column, d1_column):
+        if str(column).isdigit():
+            result.append(int(column))
+        elif str(column).lower() in names:
+            result.append(names.index(str(column).lower()))
+        else:
+            raise ValueError(f"CSV capture has no column {column}")
+    return result
+
+
+def iter_csv_edges(stream, time_column='0', d0_column='1', d1_column='2', time_unit='s',
+                   threshold=0.5):
+    """
+    Stream D0/D1 level changes from a CSV sample or transition export
+
+    Rows are read in chunks of about READ_CHUNK_BYTES. With NumPy each chunk
+    is parsed by loadtxt and edges are found with one diff per line.
+
+    Args:
+        stream: Text stream of the CSV file
+        time_column: Name or index of the time column
+        d0_column: Name or index of the Data0 column
+        d1_column: Name or index of the Data1 column
+        time_unit: Unit of the time column ('s', 'ms', 'us' or 'ns')
+        threshold: Sample value at or above which a line is high
+
+    Yields:
+        Tuples (time_us, line, level) with line 0 for D0 and 1 for D1
+    """
+    scale = TIME_UNITS[time_unit]
+    first = stream.readline()
+    fields = first.strip().split(',')
+    try:
+        float(fields[0])
+        header, pending = None, [first]
+    except ValueError:
+        header, pending = fields, []
+    columns = _csv_columns(header, time_column, d0_column, d1_column)
+
+    levels = [1, 1]
+    while True:
+        lines = pending + stream.readlines(READ_CHUNK_BYTES)
+        pending = []
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            break
+
+        if np is not None:
+            samples = np.loadtxt(lines, delimiter=',', usecols=columns, ndmin=2)
+            times = samples[:, 0] * scale
+            edges = []
+            for line_id in (0, 1):
+                high = (samples[:, line_id + 1] >= threshold).astype(np.int8)
+                steps = np.diff(high, prepend=np.int8(levels[line_id]))
+                where = np.flatnonzero(steps)
+                edges.append((times[where], np.full(len(where), line_id), high[where]))
+                levels[line_id] = int(high[-1])
+            times, line_ids, new_levels = (np.concatenate(parts) for parts in zip(*edges))
+            order = np.argsort(times, kind='stable')
+            yield from zip(times[order].tolist(), line_ids[order].tolist(),
+                           new_levels[order].tolist())
+        else:
+            t, c0, c1 = columns
+            for line in lines:
+                row = line.split(',')
+                time = float(row[t]) * scale
+                for line_id, column in ((0, c0), (1, c1)):
+                    level = 1 if float(row[column]) >= threshold else 0
+                    if level != levels[line_id]:
+                        levels[line_id] = level
+                        yield time, line_id, level
+
+
+def iter_frames(edges, frame_gap=DEFAULT_FRAME_GAP, glitch=DEFAULT_GLITCH):
+    """
+    Group edges into pulses and pulses into frames
+
+    A bit is a low pulse on D0 (0) or D1 (1). A frame ends when the gap
+    from the end of one pulse to the start of the next exceeds frame_gap.
+
+    Args:
+        edges: Iterable of (time_us, line, level) tuples
+        frame_gap: Gap in microseconds that separates frames
+        glitch: Pulses shorter than this many microseconds are dropped
+
+    Yields:
+        Dictionaries with start (us), bits (list of 0/1), widths and
+        intervals (lists of us), and issues (list of strings)
+    """
+    low_since = [None, None]
+    frame = None
+    last_end = None
+    pending = set()
+
+    def note(issue, time):
+        # Attach to the open frame unless the gap already ended it
+        if frame is not None and time - last_end <= frame_gap:
+            frame['issues'].add(issue)
+        else:
+            pending.add(issue)
+
+    for time, line_id, level in edges:
+        if level == 0:
+            low_since[line_id] = time
+            if low_since[1 - line_id] is not None:
+                note('both lines low', time)
+            continue
+
+        start = low_since[line_id]
+        low_since[line_id] = None
+        if start is None:
+            continue
+        width = time - start
+        if width < glitch:
+            note('glitch', start)
+            continue
+
+        if frame is not None and start - last_end > frame_gap:
+            yield frame
+            frame = None
+        if frame is None:
+            frame = {'start': start, 'bits': [], 'widths': [], 'intervals': [], 'issues': pending}
+            pending = set()
+        else:
+            frame['intervals'].append(start - last_end)
+        frame['bits'].append(line_id)
+        frame['widths'].append(width)
+        last_end = time
+
+    if frame is not None:
+        yield frame
+
+
+def mac_pattern(format_code, first, second):
+    """
+    The MAC bytes a credential carries, by the mac_to_credential.py rules
+
+    Args:
+        format_code: '26', '34' or '40'
+        first: Facility code, or EM4100 version
+        second: Card number, or EM4100 card ID
+
+    Returns:
+        String such as '??:??:??:??:EE:FF' with unknown bytes as ??
+    """
+    if format_code == '26':
+        known = f"{second:04X}"
+        return '??:??:??:??:' + ':'.join([known[0:2], known[2:4]])
+    if format_code == '34':
+        known = f"{first:04X}{second:04X}"
+        return '??:??:' + ':'.join(known[i:i + 2] for i in range(0, 8, 2))
+    known = f"{first:02X}{second:08X}"
+    return ':'.join(known[i:i + 2] for i in range(0, 10, 2)) + ':??'
+
+
+def _span(values):
+    """Format a min-max range of microsecond values"""
+    if not values:
+        return ''
+    low, high = min(values), max(values)
+    return f"{low:.1f}" if high - low < 0.05 else f"{low:.1f}-{high:.1f}"
+
+
+def decode_frame_batch(frames, facility_code=None, index=None):
+    """
+    Decode, validate and resolve a batch of frames
+
+    Args:
+        frames: List of frame dictionaries from iter_frames
+        facility_code: Expected W26 facility code, or None to skip the check
+        index: Optional CredentialIndex for full MAC resolution
+
+    Returns:
+        List of row tuples in CAPTURE_COLUMNS order
+    """
+    rows = [None] * len(frames)
+    by_length = {}
+    for i, frame in enumerate(frames):
+        by_length.setdefault(len(frame['bits']), []).append(i)
+
+    decoded = {}
+    for length, members in by_length.items():
+        code = str(length)
+        if code not in FRAME_BITS:
+            continue
+        values = [int(''.join(map(str, frames[i]['bits'])), 2) for i in members]
+        parity = [True] * len(values) if code == '40' else check_parity(values, length)
+        first, second = decode_frames(code, values)
+        first = first.tolist() if hasattr(first, 'tolist') else first
+        second = second.tolist() if hasattr(second, 'tolist') else second
+        for n, i in enumerate(members):
+            decoded[i] = (code, bool(parity[n]), first[n], second[n])
+
+    matches = {}
+    if index is not None:
+        from credential_index import index_key
+        from credential_formats import format_mac_batch
+        wanted = [i for i, (_, ok, _, _) in decoded.items() if ok]
+        keys = [index_key(decoded[i][0], decoded[i][2], decoded[i][3]) for i in wanted]
+        for i, macs in zip(wanted, index.lookup_batch(keys)):
+            matches[i] = ';'.join(format_mac_batch(macs))
+
+    for i, frame in enumerate(frames):
+        issues = sorted(frame['issues'])
+        widths, intervals = frame['widths'], frame['intervals']
+        if any(not PULSE_WIDTH_LIMITS[0] <= w <= PULSE_WIDTH_LIMITS[1] for w in widths):
+            issues.append('pulse width off firmware timing')
+        if any(not PULSE_INTERVAL_LIMITS[0] <= g <= PULSE_INTERVAL_LIMITS[1] for g in intervals):
+            issues.append('interval off firmware timing')
+
+        if i in decoded:
+            code, ok, first, second = decoded[i]
+            label = 'EM4100' if code == '40' else f'W{code}'
+            if not ok:
+                issues.append('parity')
+            if code == '26' and facility_code is not None and first != facility_code:
+                issues.append(f'facility code {first} != {facility_code}')
+            rows[i] = (f"{frame['start'] / 1e6:.6f}", len(frame['bits']), label,
+                       'n/a' if code == '40' else 'ok' if ok else 'bad', first, second,
+                       mac_pattern(code, first, second) if ok else '', matches.get(i, ''),
+                       _span(widths), _span(intervals), '; '.join(issues))
+        else:
+            issues.append(f"unsupported length {len(frame['bits'])}")
+            rows[i] = (f"{frame['start'] / 1e6:.6f}", len(frame['bits']), '', '', '', '', '', '',
+                       _span(widths), _span(intervals), '; '.join(issues))
+    return rows
+
+
+def decode_capture(edges, output_file, facility_code=None, index=None,
+                   frame_gap=DEFAULT_FRAME_GAP, glitch=DEFAULT_GLITCH, output_format=None):
+    """
+    Decode a whole capture to a CSV/NDJSON frame report
+
+    Args:
+        edges: Iterable of (time_us, line, level) tuples
+        output_file: Output filename, or '-' for stdout
+        facility_code: Expected W26 facility code, or None to skip the check
+        index: Optional CredentialIndex for full MAC resolution
+        frame_gap: Gap in microseconds that separates frames
+        glitch: Pulses shorter than this many microseconds are dropped
+        output_format: 'csv' or 'ndjson' (default: from the file extension)
+
+    Returns:
+        Dictionary of summary counts and mean pulse timing
+    """
+    stats = {'frames': 0, 'bad_parity': 0, 'with_issues': 0, 'pulses': 0,
+             'width_total': 0.0, 'interval_total': 0.0, 'intervals': 0}
+
+    with open_output(output_file) as out:
+        writer = RecordWriter(out, CAPTURE_COLUMNS, output_format_for(output_file, output_format))
+        for frames in iter_chunks(iter_frames(edges, frame_gap, glitch), FRAME_BATCH):
+            rows = decode_frame_batch(frames, facility_code, index)
+            writer.write_rows(rows)
+            stats['frames'] += len(rows)
+            stats['bad_parity'] += sum(1 for row in rows if row[3] == 'bad')
+            stats['with_issues'] += sum(1 for row in rows if row[-1])
+            for frame in frames:
+                stats['pulses'] += len(frame['widths'])
+                stats['width_total'] += sum(frame['widths'])
+                stats['interval_total'] += sum(frame['intervals'])
+                stats['intervals'] += len(frame['intervals'])
+
+    return stats
+
+
+def print_summary(stats, stream=None):
+    """
+    Print a capture decode summary
+
+    Args:
+        stats: Dictionary from decode_capture
+        stream: Text stream (default: stdout)
+    """
+    stream = stream or sys.stdout
+    print("\n" + "="*60, file=stream)
+    print("WIEGAND CAPTURE SUMMARY", file=stream)
+    print("="*60, file=stream)
+    print(f"Frames:          {stats['frames']}", file=stream)
+    print(f"Parity errors:   {stats['bad_parity']}", file=stream)
+    print(f"Frames w/issues: {stats['with_issues']}", file=stream)
+    if stats['pulses']:
+        print(f"Pulse width:     {stats['width_total'] / stats['pulses']:.1f} us mean "
+              f"(firmware {WIEGAND_PULSE_WIDTH} us)", file=stream)
+    if stats['intervals']:
+        print(f"Pulse interval:  {stats['interval_total'] / stats['intervals']:.1f} us mean "
+              f"(firmware {WIEGAND_PULSE_INTERVAL} us)", file=stream)
+    print("="*60 + "\n", file=stream)
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Decode Wiegand frames from logic-analyzer captures of D0/D1',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Decode a VCD capture with signals named D0 and D1
+  python wiegand_capture.py -i door3.vcd -o frames.csv
+
+  # Decode a CSV export (time in seconds, then D0 and D1 columns)
+  python wiegand_capture.py -i door3.csv.gz --csv-columns "Time [s]" "Channel 0" "Channel 1"
+
+  # Resolve frames to full MAC addresses with a reverse index
+  python wiegand_capture.py -i door3.vcd --index credentials.idx -c 123
+        """
+    )
+
+    parser.add_argument('-i', '--input', required=True,
+                       help='Capture file (.vcd or .csv, optionally .gz/.zst); - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='Frame report file (default: stdout)')
+    parser.add_argument('--input-format', choices=['vcd', 'csv'],
+                       help='Capture format (default: from the file name, else csv)')
+    parser.add_argument('--d0', default='D0', help='VCD signal name of Data0 (default: D0)')
+    parser.add_argument('--d1', default='D1', help='VCD signal name of Data1 (default: D1)')
+    parser.add_argument('--csv-columns', nargs=3, default=['0', '1', '2'],
+                       metavar=('TIME', 'D0', 'D1'),
+                       help='CSV column names or indexes (default: 0 1 2)')
+    parser.add_argument('--time-unit', choices=['s', 'ms', 'us', 'ns'], default='s',
+                       help='Unit of the CSV time column (default: s)')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                       help='CSV sample value at or above which a line is high (default: 0.5)')
+    parser.add_argument('--frame-gap', type=float, default=DEFAULT_FRAME_GAP,
+                       help=f'Gap in us that ends a frame (default: {DEFAULT_FRAME_GAP})')
+    parser.add_argument('--glitch', type=float, default=DEFAULT_GLITCH,
+                       help=f'Drop pulses shorter than this many us (default: {DEFAULT_GLITCH})')
+    parser.add_argument('-c', '--facility-code', type=int,
+                       help='Flag W26 frames whose facility code differs from this')
+    parser.add_argument('--index', help='Reverse index from credential_index.py to resolve full MACs')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS[:2],
+                       help='Output file format (default: ndjson for .ndjson/.jsonl, else csv)')
+
+    args = parser.parse_args()
+
+    input_format = args.input_format or ('vcd' if '.vcd' in args.input.lower() else 'csv')
+    index = None
+    try:
+        if args.index:
+            from credential_index import CredentialIndex
+            index = CredentialIndex(args.index)
+
+        with open_input(args.input) as f:
+            if input_format == 'vcd':
+                edges = iter_vcd_edges(f, args.d0, args.d1)
+            else:
+                edges = iter_csv_edges(f, *args.csv_columns, args.time_unit, args.threshold)
+            stats = decode_capture(edges, args.output, args.facility_code, index,
+                                   args.frame_gap, args.glitch, args.output_format)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        if index is not None:
+            index.close()
+
+    print_summary(stats, sys.stderr if args.output == '-' else sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
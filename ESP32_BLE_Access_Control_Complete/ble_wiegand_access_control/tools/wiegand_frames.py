@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Wiegand / EM4100 Frame Encoder
+
+Builds the exact bit frames WiegandOut (wiegandOutput.h) puts on the wire,
+so frames for a whole fleet can be precomputed and checked offline instead
+of scraping the firmware's "Binary:" debug line.
+
+- 26/34-bit Wiegand: leading even parity over the upper half of the data
+  bits, the data bits MSB first, trailing odd parity over the lower half.
+- 40-bit EM4100: 8-bit version then 32-bit card ID, MSB first, no parity
+  (sendEM4100).
+
+Frames are handled as integers whose MSB is the first bit sent. Batches
+use NumPy (vectorized popcount for the parity bits) when it is installed,
+with a pure-Python fallback giving identical results.
+
+Author: Manus AI
+Date: October 2025
+"""
+
+import sys
+import json
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batches fall back to plain Python
+    np = None
+
+from credential_io import (DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, RecordWriter, iter_mac_lines,
+                           open_error_sink, open_input, open_output, output_format_for)
+from credential_formats import format_mac_batch, normalize_mac
+from credential_batch import iter_column_chunks
+
+
+# Format code -> frame length in bits
+FRAME_BITS = {'26': 26, '34': 34, '40': 40}
+
+# Format code -> batch engine columns for the two frame fields
+FRAME_FIELDS = {
+    '26': ('w26_facility_code', 'w26_card_number'),
+    '34': ('w34_facility_code', 'w34_card_number'),
+    '40': ('em4100_version', 'em4100_card_id'),
+}
+
+FRAME_COLUMNS = ['MAC Address', 'Format', 'Frame Hex', 'Binary']
+
+# MACs for the golden vectors: extremes, the README example, and single set
+# bits either side of the parity split of each format
+GOLDEN_MACS = [
+    '00:00:00:00:00:00',
+    'FF:FF:FF:FF:FF:FF',
+    'AA:BB:CC:DD:EE:FF',
+    '01:23:45:67:89:AB',
+    '00:00:00:00:00:01',
+    '00:00:00:00:08:00',
+    '00:00:00:00:10:00',
+    '00:00:00:00:80:00',
+    '00:00:00:01:00:00',
+    '00:00:80:00:00:00',
+    '80:00:00:00:00:00',
+    '12:34:56:78:9A:BC',
+]
+
+if np is not None:
+    _POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    _ONE = np.uint64(1)
+
+
+def _format_list(format_type):
+    """Expand '26', '34', '40' or 'all' into a list of format codes"""
+    return list(FRAME_BITS) if format_type == 'all' else [format_type]
+
+
+def frame_data(format_code, first, second):
+    """
+    Data value the firmware passes to WiegandOut for one credential
+
+    Args:
+        format_code: '26', '34' or '40'
+        first: Facility code (W26/W34) or version (EM4100)
+        second: Card number (W26/W34) or card ID (EM4100)
+
+    Returns:
+        Integer data value (without parity)
+    """
+    if format_code == '40':
+        return (first & 0xFF) << 32 | (second & 0xFFFFFFFF)
+    return (first << 16 | second) & ((1 << (FRAME_BITS[format_code] - 2)) - 1)
+
+
+def encode_frame(format_code, first, second):
+    """
+    Encode one frame, bit by bit, exactly as WiegandOut does
+
+    This is the reference the batch encoder and the golden vectors are
+    checked against.
+
+    Args:
+        format_code: '26', '34' or '40'
+        first: Facility code (W26/W34) or version (EM4100)
+        second: Card number (W26/W34) or card ID (EM4100)
+
+    Returns:
+        Dictionary with data, even_parity, odd_parity, frame and binary
+    """
+    bits = FRAME_BITS[format_code]
+    data = frame_data(format_code, first, second)
+
+    if format_code == '40':
+        sent = [(data >> i) & 1 for i in range(bits - 1, -1, -1)]
+        even = odd = None
+    else:
+        data_bits = bits - 2
+        # calculateEvenParity / calculateOddParity
+        upper = sum((data >> i) & 1 for i in range(data_bits - 1, data_bits // 2 - 1, -1))
+        lower = sum((data >> i) & 1 for i in range(data_bits // 2 - 1, -1, -1))
+        even = upper % 2
+        odd = 0 if lower % 2 else 1
+        sent = [even] + [(data >> i) & 1 for i in range(data_bits - 1, -1, -1)] + [odd]
+
+    binary = ''.join(str(bit) for bit in sent)
+    return {'data': data, 'even_parity': even, 'odd_parity': odd,
+            'frame': int(binary, 2), 'binary': binary}
+
+
+def _popcount(values):
+    """Per-element bit count of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.uint64)
+    counts = _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8)
+    return counts.sum(axis=1, dtype=np.uint64)
+
+
+def encode_frames(format_code, first, second):
+    """
+    Encode a batch of frames
+
+    Args:
+        format_code: '26', '34' or '40'
+        first: Sequence of facility codes (W26/W34) or versions (EM4100)
+        second: Sequence of card numbers (W26/W34) or card IDs (EM4100)
+
+    Returns:
+        uint64 array of frames with NumPy, else a list of ints
+    """
+    bits = FRAME_BITS[format_code]
+    if np is None:
+        return [encode_frame(format_code, a, b)['frame'] for a, b in zip(first, second)]
+
+    first = np.asarray(first, dtype=np.uint64)
+    second = np.asarray(second, dtype=np.uint64)
+    if format_code == '40':
+        return (first & np.uint64(0xFF)) << np.uint64(32) | (second & np.uint64(0xFFFFFFFF))
+
+    data_bits = bits - 2
+    half = np.uint64(data_bits // 2)
+    data = (first << np.uint64(16) | second) & np.uint64((1 << data_bits) - 1)
+    even = _popcount(data >> half) & _ONE
+    odd = (_popcount(data & ((_ONE << half) - _ONE)) & _ONE) ^ _ONE
+    return even << np.uint64(bits - 1) | data << _ONE | odd
+
+
+def check_parity(frames, bits):
+    """
+    Check the parity bits of received Wiegand frames
+
+    Args:
+        frames: Sequence of frame integers
+        bits: Frame length (26 or 34; EM4100 frames have no parity)
+
+    Returns:
+        Boolean array with NumPy, else a list of bools
+    """
+    data_bits = bits - 2
+    if np is None:
+        result = []
+        for frame in frames:
+            data = (frame >> 1) & ((1 << data_bits) - 1)
+            expected = encode_frame(str(bits), data >> 16, data & 0xFFFF)['frame']
+            result.append(expected == frame)
+        return result
+
+    frames = np.asarray(frames, dtype=np.uint64)
+    data = (frames >> _ONE) & np.uint64((1 << data_bits) - 1)
+    expected = encode_frames(str(bits), data >> np.uint64(16), data & np.uint64(0xFFFF))
+    return expected == frames
+
+
+def decode_frames(format_code, frames):
+    """
+    Split frames back into their two fields
+
+    Args:
+        format_code: '26', '34' or '40'
+        frames: Sequence of frame integers
+
+    Returns:
+        Tuple (first, second) of arrays with NumPy, else lists
+    """
+    if format_code == '40':
+        shift, mask, drop = 32, 0xFFFFFFFF, 0
+    else:
+        shift, mask, drop = 16, 0xFFFF, 1
+    data_mask = (1 << (FRAME_BITS[format_code] - 2 * drop)) - 1
+
+    if np is None:
+        data = [(frame >> drop) & data_mask for frame in frames]
+        return [d >> shift for d in data], [d & mask for d in data]
+
+    data = (np.asarray(frames, dtype=np.uint64) >> np.uint64(drop)) & np.uint64(data_mask)
+    return data >> np.uint64(shift), data & np.uint64(mask)
+
+
+def pack_frames(frames, bits):
+    """
+    Pack frames into bytes, MSB first, each padded to a whole byte count
+
+    A 26-bit frame takes 4 bytes, 34 and 40-bit frames take 5. The frame's
+    first bit is the top bit of its first byte; padding bits are zero.
+
+    Args:
+        frames: Sequence of frame integers
+        bits: Frame length
+
+    Returns:
+        Bytes of all frames, back to back
+    """
+    nbytes = (bits + 7) // 8
+    pad = nbytes * 8 - bits
+    if np is None:
+        return b''.join((frame << pad).to_bytes(nbytes, 'big') for frame in frames)
+
+    frames = np.asarray(frames, dtype=np.uint64) << np.uint64(pad)
+    return frames.astype('>u8').view(np.uint8).reshape(-1, 8)[:, 8 - nbytes:].tobytes()
+
+
+def frame_bit_array(frames, bits):
+    """
+    Frames as rows of bits, in send order
+
+    Args:
+        frames: Sequence of frame integers
+        bits: Frame length
+
+    Returns:
+        uint8 array of shape (len(frames), bits) with NumPy, else a list
+        of lists of 0/1
+    """
+    if np is None:
+        return [[(frame >> i) & 1 for i in range(bits - 1, -1, -1)] for frame in frames]
+
+    packed = np.frombuffer(pack_frames(frames, bits), dtype=np.uint8)
+    return np.unpackbits(packed.reshape(-1, (bits + 7) // 8), axis=1)[:, :bits]
+
+
+def frame_strings(frames, bits):
+    """
+    Frames as hex and as the '0101...' string of the firmware's Binary: line
+
+    Args:
+        frames: Sequence of frame integers
+        bits: Frame length
+
+    Returns:
+        Tuple (hex_strings, binary_strings)
+    """
+    frames = frames.tolist() if hasattr(frames, 'tolist') else frames
+    digits = (bits + 3) // 4
+    return ([f"{frame:0{digits}X}" for frame in frames],
+            [f"{frame:0{bits}b}" for frame in frames])
+
+
+def iter_frame_rows(mac_addresses, format_type='all', facility_code=123,
+                    chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Lazily encode the frames for a MAC list
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        format_type: '26', '34', '40', or 'all'
+        facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Yields:
+        Lists of (MAC, format, frame hex, binary) rows, per MAC in input order
+    """
+    formats = _format_list(format_type)
+    for values, columns, failed in iter_column_chunks(mac_addresses, format_type, facility_code,
+                                                      chunk_size, errors):
+        macs = format_mac_batch(values)
+        per_format = []
+        for code in formats:
+            first, second = (columns[key] for key in FRAME_FIELDS[code])
+            hexes, binaries = frame_strings(encode_frames(code, first, second), FRAME_BITS[code])
+            per_format.append([(code, h, b) for h, b in zip(hexes, binaries)])
+
+        rows = []
+        for i, mac in enumerate(macs):
+            if i not in failed:
+                rows.extend((mac,) + frames[i] for frames in per_format)
+        yield rows
+
+
+def write_packed(mac_addresses, output_file, format_code, facility_code=123,
+                 chunk_size=DEFAULT_CHUNK_SIZE, errors=None):
+    """
+    Write the frames of one format as packed bytes
+
+    Args:
+        mac_addresses: Iterable of MAC address strings
+        output_file: Binary output filename
+        format_code: '26', '34' or '40'
+        facility_code: Facility code for 26-bit format
+        chunk_size: MACs converted per batch
+        errors: Text stream for error lines (default: stderr)
+
+    Returns:
+        Number of frames written
+    """
+    count = 0
+    with open(output_file, 'wb') as out:
+        for values, columns, failed in iter_column_chunks(mac_addresses, format_code,
+                                                          facility_code, chunk_size, errors):
+            first, second = (columns[key] for key in FRAME_FIELDS[format_code])
+            frames = encode_frames(format_code, first, second)
+            if failed:
+                keep = [i for i in range(len(values)) if i not in failed]
+                frames = frames[keep] if hasattr(frames, 'shape') else [frames[i] for i in keep]
+            out.write(pack_frames(frames, FRAME_BITS[format_code]))
+            count += len(frames)
+    return count
+
+
+def golden_vectors(facility_code=123, macs=GOLDEN_MACS):
+    """
+    Build golden test vectors with the bit-by-bit reference encoder
+
+    Args:
+        facility_code: Facility code for 26-bit format
+        macs: MAC addresses to include
+
+    Returns:
+        List of vector dictionaries
+    """
+    from credential_formats import mac_to_em4100, mac_to_wiegand_26, mac_to_wiegand_34
+
+    vectors = []
+    for mac in macs:
+        w26 = mac_to_wiegand_26(mac, facility_code)
+        w34 = mac_to_wiegand_34(mac)
+        em = mac_to_em4100(mac)
+        fields = {
+            '26': (w26['facility_code'], w26['card_number']),
+            '34': (w34['facility_code'], w34['card_number']),
+            '40': (em['version'], em['card_id']),
+        }
+        for code, (first, second) in fields.items():
+            bits = FRAME_BITS[code]
+            frame = encode_frame(code, first, second)
+            vectors.append({
+                'mac': normalize_mac(mac),
+                'format': code,
+                'fields': [first, second],
+                'data': f"{frame['data']:X}",
+                'even_parity': frame['even_parity'],
+                'odd_parity': frame['odd_parity'],
+                'frame': f"{frame['frame']:0{(bits + 3) // 4}X}",
+                'binary': frame['binary'],
+                'packed': pack_frames([frame['frame']], bits).hex().upper(),
+            })
+    return vectors
+
+
+def check_golden(vectors):
+    """
+    Check the batch encoder against golden vectors
+
+    Args:
+        vectors: List of vector dictionaries from golden_vectors
+
+    Returns:
+        List of (vector, what, expected, got) mismatches
+    """
+    mismatches = []
+    for code in FRAME_BITS:
+        subset = [v for v in vectors if v['format'] == code]
+        if not subset:
+            continue
+        bits = FRAME_BITS[code]
+        frames = encode_frames(code, [v['fields'][0] for v in subset],
+                               [v['fields'][1] for v in subset])
+        hexes, binaries = frame_strings(frames, bits)
+        nbytes = (bits + 7) // 8
+        packed = pack_frames(frames, bits)
+        for i, vector in enumerate(subset):
+            got = {'frame': hexes[i], 'binary': binaries[i],
+                   'packed': packed[i * nbytes:(i + 1) * nbytes].hex().upper()}
+            for what, value in got.items():
+                if value != vector[what]:
+                    mismatches.append((vector, what, vector[what], value))
+    return mismatches
+
+
+def print_frame_info(format_code, first, second):
+    """
+    Print one frame the way the firmware's debug output shows it
+
+    Args:
+        format_code: '26', '34' or '40'
+        first: Facility code (W26/W34) or version (EM4100)
+        second: Card number (W26/W34) or card ID (EM4100)
+    """
+    frame = encode_frame(format_code, first, second)
+    kind = 'EM4100' if format_code == '40' else 'Wiegand'
+    print(f"\n{format_code}-bit {kind}:")
+    print(f"  Data: 0x{frame['data']:X}")
+    if format_code != '40':
+        print(f"  Even Parity: {frame['even_parity']}")
+        print(f"  Odd Parity: {frame['odd_parity']}")
+    print(f"  Binary: {frame['binary']}")
+    print(f"  Packed: {pack_frames([frame['frame']], FRAME_BITS[format_code]).hex().upper()}")
+
+
+def main():
+    """Main function for command-line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Encode BLE MAC addresses into on-wire Wiegand/EM4100 frames',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Show the frames for one MAC
+  python wiegand_frames.py -m AA:BB:CC:DD:EE:FF
+
+  # Frames for a fleet as CSV (MAC, format, hex, binary)
+  python wiegand_frames.py -i mac_list.txt -o frames.csv
+
+  # Packed 26-bit frames, 4 bytes each
+  python wiegand_frames.py -i mac_list.txt -f 26 --packed frames26.bin
+
+  # Write golden vectors, and check the encoder against them
+  python wiegand_frames.py --golden golden_frames.json
+  python wiegand_frames.py --check-golden golden_frames.json
+        """
+    )
+
+    parser.add_argument('-m', '--mac', help='Single MAC address to encode')
+    parser.add_argument('-i', '--input',
+                       help='Input file with MAC addresses (one per line); - for stdin, .gz/.zst accepted')
+    parser.add_argument('-o', '--output', default='-',
+                       help='Output CSV or NDJSON file for -i (default: stdout)')
+    parser.add_argument('-f', '--format', choices=['26', '34', '40', 'all'], default='all',
+                       help='Frame format (default: all)')
+    parser.add_argument('-c', '--facility-code', type=int, default=123,
+                       help='Facility code for 26-bit Wiegand format (default: 123)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS[:2],
+                       help='Output file format (default: ndjson for .ndjson/.jsonl, else csv)')
+    parser.add_argument('--packed', help='With -i, write packed frame bytes to this file instead (needs -f 26/34/40)')
+    parser.add_argument('--golden', help='Write golden test vectors as JSON to this file')
+    parser.add_argument('--check-golden', help='Check the encoder against a golden vector file')
+    parser.add_argument('--errors', help='Write per-MAC errors to this file (default: stderr)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                       help=f'MACs converted per batch (default: {DEFAULT_CHUNK_SIZE})')
+
+    args = parser.parse_args()
+
+    if not 0 <= args.facility_code <= 255:
+        print(f"ERROR: Facility code must be 0-255, got {args.facility_code}")
+        sys.exit(1)
+    if args.packed and (args.format == 'all' or not args.input):
+        parser.error('--packed needs -i and -f 26, 34 or 40')
+    if not (args.mac or args.input or args.golden or args.check_golden):
+        parser.print_help()
+        sys.exit(1)
+
+    try:
+        if args.mac:
+            mac = normalize_mac(args.mac)
+            vector = {v['format']: v for v in golden_vectors(args.facility_code, [mac])}
+            print(f"MAC: {mac}")
+            for code in _format_list(args.format):
+                print_frame_info(code, *vector[code]['fields'])
+
+        if args.input:
+            with open_input(args.input) as f, open_error_sink(args.errors) as errors:
+                if args.packed:
+                    count = write_packed(iter_mac_lines(f), args.packed, args.format,
+                                         args.facility_code, args.chunk_size, errors)
+                    print(f"{count} packed {args.format}-bit frames written to {args.packed}")
+                else:
+                    with open_output(args.output) as out:
+                        writer = RecordWriter(out, FRAME_COLUMNS,
+                                              output_format_for(args.output, args.output_format))
+                        for rows in iter_frame_rows(iter_mac_lines(f), args.format,
+                                                    args.facility_code, args.chunk_size, errors):
+                            writer.write_rows(rows)
+
+        if args.golden:
+            vectors = golden_vectors(args.facility_code)
+            with open(args.golden, 'w') as f:
+                json.dump({'facility_code': args.facility_code, 'vectors': vectors}, f, indent=2)
+            print(f"{len(vectors)} golden vectors written to {args.golden}")
+
+        if args.check_golden:
+            with open(args.check_golden) as f:
+                vectors = json.load(f)['vectors']
+            mismatches = check_golden(vectors)
+            for vector, what, expected, got in mismatches:
+                print(f"MISMATCH {vector['mac']} W{vector['format']} {what}: "
+                      f"expected {expected}, got {got}")
+            print(f"{len(vectors)} golden vectors checked, {len(mismatches)} mismatches")
+            if mismatches:
+                sys.exit(1)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: File not found: {e.filename}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()